@@ -0,0 +1,72 @@
+"""Responsiveness of the optimize API while jobs run, and feed loading for fresh vs repeated uploads.
+
+Usage:
+    python benchmarks/bench_api.py --rows 200000 --jobs 4 --workers 1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow import api  # noqa: E402
+from urbanflow.cli import _default_constraints, _default_objective  # noqa: E402
+from urbanflow.cache import FeedCache  # noqa: E402
+from urbanflow.jobs import JobQueue  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=200_000, help="stop_times rows of the synthetic feed")
+    ap.add_argument("--jobs", type=int, default=4)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--max-iters", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        feed = Path(td) / "feed.zip"
+        make_feed(feed, args.rows)
+        feed_mb = feed.stat().st_size / 1e6
+        files = {
+            "gtfs_zip": ("feed.zip", feed.read_bytes(), "application/zip"),
+            "constraints_json": ("constraints.json", json.dumps(_default_constraints()), "application/json"),
+            "objective_json": ("objective.json", json.dumps(_default_objective()), "application/json"),
+        }
+        api.set_queue(JobQueue(max_workers=args.workers, max_pending=args.jobs, root=Path(td) / "jobs", cache=FeedCache(Path(td) / "cache")))
+        with TestClient(api.app) as client:
+            submit, ids = [], []
+            for _ in range(args.jobs):
+                t0 = time.perf_counter()
+                ids.append(client.post("/api/v1/optimize", files=files, data={"sample_size": "500", "max_iters": str(args.max_iters)}).json()["job_id"])
+                submit.append(time.perf_counter() - t0)
+            status, t_start = [], time.perf_counter()
+            while True:
+                t0 = time.perf_counter()
+                states = [client.get(f"/api/v1/status/{i}").json()["status"] for i in ids]
+                status.append((time.perf_counter() - t0) / len(ids))
+                if all(s in ("succeeded", "failed", "cancelled") for s in states):
+                    break
+                time.sleep(0.2)
+            total = time.perf_counter() - t_start
+            timings = [client.get(f"/api/v1/results/{i}").json()["timings"] for i in ids]
+        api.set_queue(None)
+    ms = np.array(status) * 1e3
+    print(f"{args.jobs} jobs on {args.workers} worker(s), {feed_mb:.1f} MB feed: "
+          f"submit {np.mean(submit) * 1e3:.0f} ms mean, status p50 {np.median(ms):.1f} ms / p99 {np.percentile(ms, 99):.1f} ms "
+          f"over {total:.1f} s of optimization ({states.count('succeeded')} succeeded)")
+    # with one worker the first job parses the feed and every later one finds it cached
+    load = [sum(t.get(k, 0.0) for k in ("parse", "validate", "canonicalize", "build_graph", "cache_load", "cache_store")) for t in timings]
+    print(f"feed load: first upload {load[0]:.2f} s, identical re-uploads {np.mean(load[1:]) if len(load) > 1 else float('nan'):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Wall time and fleet count of vehicle blocking on a synthetic weekday schedule.
+
+Usage:
+    python benchmarks/bench_blocking.py --rows 1200000 --routes 500
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.exports.vehicle_block_writer import block_trips  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_200_000)
+    ap.add_argument("--routes", type=int, default=500)
+    ap.add_argument("--max-deadhead-m", type=float, default=3000.0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+
+    constraints = {"depots": [{"id": "D1", "lat": 40.5, "lon": -73.5}], "max_deadhead_m": args.max_deadhead_m}
+    t0 = time.perf_counter()
+    result = block_trips(canonical, constraints)
+    elapsed = time.perf_counter() - t0
+    blocks = result.blocks
+    print(f"{len(result.trips)} trips -> {result.fleet_size} vehicles in {elapsed:.2f} s")
+    print(f"trips per block: mean {blocks['n_trips'].mean():.2f}, max {blocks['n_trips'].max()}")
+    print(f"deadhead: {blocks['deadhead_s'].sum() / 3600:.0f} vehicle-hours")
+
+
+if __name__ == "__main__":
+    main()
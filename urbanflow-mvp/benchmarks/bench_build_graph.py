@@ -0,0 +1,92 @@
+"""Benchmark graph construction: per-row iterrows builder vs vectorized edge extraction.
+
+Usage:
+    python benchmarks/bench_build_graph.py --rows 1000000 --legacy-rows 200000
+
+The legacy builder is timed on ``--legacy-rows`` stop_times (it is too slow
+for the full size) and its rate is extrapolated for the speedup column.
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import networkx as nx
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    R = 6371000.0
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def legacy_build(canonical) -> nx.DiGraph:
+    stops = canonical["stops"]
+    stop_lookup = stops.set_index("stop_id")[["lat", "lon"]].to_dict("index")
+    G = nx.DiGraph()
+    for _, s in stops.iterrows():
+        G.add_node(str(s["stop_id"]), lat=float(s["lat"]), lon=float(s["lon"]))
+    st_sorted = canonical["stop_times"].sort_values(["trip_id", "stop_sequence"])
+    for trip_id, group in st_sorted.groupby("trip_id"):
+        prev_row = None
+        for _, r in group.iterrows():
+            if prev_row is not None:
+                u, v = str(prev_row["stop_id"]), str(r["stop_id"])
+                t = max(1, int(r["arrival_time_sec"] - prev_row["departure_time_sec"]))
+                s_u, s_v = stop_lookup.get(u), stop_lookup.get(v)
+                d = _haversine(s_u["lat"], s_u["lon"], s_v["lat"], s_v["lon"]) if s_u and s_v else 0.0
+                G.add_edge(u, v, travel_time=t, distance_m=d, trip_id=str(trip_id))
+            prev_row = r
+    return G
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--legacy-rows", type=int, default=100_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+
+    st = canonical["stop_times"]
+    t0 = time.perf_counter()
+    G = build_graph_from_canonical(canonical)
+    t_fast = time.perf_counter() - t0
+
+    small = dict(canonical)
+    legacy_trips = st["trip_id"].drop_duplicates().iloc[: max(1, args.legacy_rows // 40)]
+    small["stop_times"] = st[st["trip_id"].isin(set(legacy_trips))]
+    t0 = time.perf_counter()
+    legacy_build(small)
+    t_legacy = time.perf_counter() - t0
+    legacy_rate = len(small["stop_times"]) / t_legacy
+    t_legacy_full = len(st) / legacy_rate
+
+    print(f"stop_times rows:          {len(st):>12,}")
+    print(f"edges (unique u,v):       {G.number_of_edges():>12,}")
+    print(f"vectorized build:         {t_fast:>12.2f} s")
+    print(f"legacy build ({len(small['stop_times']):,} rows): {t_legacy:>8.2f} s  (~{t_legacy_full:.1f} s extrapolated)")
+    print(f"speedup:                  {t_legacy_full / t_fast:>12.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Time coverage_ratio: building the stop/point index, a full recount, and incremental stop closures.
+
+Usage:
+    python benchmarks/bench_coverage.py --stops 50000 --points 1000000 --moves 1000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from urbanflow.optimizer.coverage import CoverageIndex
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--stops", type=int, default=50_000)
+    ap.add_argument("--points", type=int, default=1_000_000, help="population points")
+    ap.add_argument("--moves", type=int, default=1000, help="stop closures evaluated")
+    ap.add_argument("--radius-m", type=float, default=400.0)
+    args = ap.parse_args()
+
+    # same extent as the synthetic feeds: one degree square
+    rng = np.random.default_rng(0)
+    s_lat, s_lon = rng.uniform(40, 41, args.stops), rng.uniform(-74, -73, args.stops)
+    p_lat, p_lon = rng.uniform(40, 41, args.points), rng.uniform(-74, -73, args.points)
+    ids = [f"S{i}" for i in range(args.stops)]
+
+    t0 = time.perf_counter()
+    index = CoverageIndex(ids, s_lat, s_lon, p_lat, p_lon, rng.uniform(1, 100, args.points), args.radius_m)
+    t_build = time.perf_counter() - t0
+    active = np.ones(args.stops, dtype=bool)
+    t0 = time.perf_counter()
+    full = index.ratio(active)
+    t_full = time.perf_counter() - t0
+    print(f"{args.stops:,} stops, {args.points:,} points, {len(index.indices):,} pairs within {args.radius_m:.0f} m: "
+          f"index {t_build:.2f} s, full recount {t_full * 1000:.1f} ms (coverage {full:.3f})")
+
+    state = index.state(active)
+    closed = rng.choice(args.stops, size=args.moves, replace=False)
+    t0 = time.perf_counter()
+    for i, s in enumerate(closed.tolist()):
+        ratio, change = state.after(remove=[ids[s]])
+        if i % 2 == 0:
+            state.apply(change)
+    t_inc = (time.perf_counter() - t0) / args.moves
+    active[closed[::2]] = False
+    assert abs(state.ratio - index.ratio(active)) < 1e-9
+    print(f"incremental: {t_inc * 1e6:.0f} us per closure ({t_full / t_inc:.0f}x faster than a recount)")
+
+
+if __name__ == "__main__":
+    main()
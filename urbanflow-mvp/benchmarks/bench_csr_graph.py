@@ -0,0 +1,58 @@
+"""Compare the nx.DiGraph and CSRGraph backends: build time, memory and LocalSearch runtime.
+
+Usage:
+    python benchmarks/bench_csr_graph.py --rows 1000000 --iters 200
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.optimizer.greedy_seed import GreedySeed  # noqa: E402
+from urbanflow.optimizer.local_search import LocalSearch  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--iters", type=int, default=200, help="LocalSearch iterations")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+
+    print(f"{'backend':<10}{'edges':>10}{'build s':>10}{'graph MB':>10}{'search s':>10}  removed")
+    for backend in ("networkx", "csr"):
+        t0 = time.perf_counter()
+        graph = build_graph_from_canonical(canonical, backend=backend)
+        t_build = time.perf_counter() - t0
+        # retained size of a second build (tracemalloc distorts the timing above)
+        del graph
+        tracemalloc.start()
+        graph = build_graph_from_canonical(canonical, backend=backend)
+        graph_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+
+        evaluator = Evaluator({"weights": {}}, sample_size=1000, seed=0)
+        seed = GreedySeed.create(graph, canonical, {}, evaluator.objective)
+        t0 = time.perf_counter()
+        best = LocalSearch.optimize(seed, evaluator, {}, max_iters=args.iters)
+        t_search = time.perf_counter() - t0
+        print(f"{backend:<10}{graph.number_of_edges():>10,}{t_build:>10.2f}{graph_mb:>10.1f}{t_search:>10.2f}  {len(best['removed_stops'])}")
+
+
+if __name__ == "__main__":
+    main()
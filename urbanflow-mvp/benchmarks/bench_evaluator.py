@@ -0,0 +1,52 @@
+"""Time passenger-level KPI evaluation (Evaluator.compute_kpis) on a generated network.
+
+Usage:
+    python benchmarks/bench_evaluator.py --rows 2000000 --samples 5000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.optimizer.simulation import TRANSFER_PENALTY_S  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2_000_000, help="stop_times rows (stops = rows / 200)")
+    ap.add_argument("--routes", type=int, default=1000)
+    ap.add_argument("--samples", type=int, default=5000)
+    ap.add_argument("--transfer-penalty", type=float, default=TRANSFER_PENALTY_S, help="seconds per boarding; 0 routes on in-vehicle time")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+
+    for backend in ("networkx", "csr"):
+        graph = build_graph_from_canonical(canonical, backend=backend)
+        evaluator = Evaluator({"weights": {}, "transfer_penalty_s": args.transfer_penalty}, sample_size=args.samples, seed=0)
+        t0 = time.perf_counter()
+        evaluator.simulator(canonical)
+        t_setup = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        kpis = evaluator.compute_kpis(graph, canonical)
+        t_eval = time.perf_counter() - t0
+        print(f"{backend}: {graph.number_of_nodes():,} stops, {graph.number_of_edges():,} edges, "
+              f"{args.samples:,} passengers: setup {t_setup:.2f} s, evaluate {t_eval:.3f} s")
+    print({k: round(v, 2) for k, v in kpis.items()})
+
+
+if __name__ == "__main__":
+    main()
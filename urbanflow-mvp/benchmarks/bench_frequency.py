@@ -0,0 +1,61 @@
+"""Wall time of headway allocation for many routes and time bands, and of re-timetabling the plan.
+
+Usage:
+    python benchmarks/bench_frequency.py --rows 500000 --routes 500 --band-s 1800
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.optimizer.frequency import FrequencyOptimizer, route_cycle_times, scheduled_demand, time_bands  # noqa: E402
+from urbanflow.optimizer.moves import TRANSFORMS  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--routes", type=int, default=500)
+    ap.add_argument("--band-s", type=int, default=1800)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+
+    t0 = time.perf_counter()
+    cycles = route_cycle_times(canonical)
+    bands = time_bands(canonical, band_s=args.band_s)
+    demand = scheduled_demand(canonical, cycles.route_ids, bands)
+    prep = time.perf_counter() - t0
+    print(f"{len(cycles.route_ids)} routes x {len(bands)} bands; cycle times + demand {prep * 1000:.1f} ms")
+
+    print(f"{'fleet':>8}{'alloc ms':>10}{'peak':>8}{'wait h':>12}{'unserved':>10}")
+    full = FrequencyOptimizer.optimize(canonical, {}, demand=demand, bands=bands, cycles=cycles)
+    for share in (0.05, 0.2, 0.5, 1.0):
+        fleet = max(1, int(full.fleet.max() * share))
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            plan = FrequencyOptimizer.optimize(canonical, {"fleet_size": fleet}, demand=demand, bands=bands, cycles=cycles)
+        ms = (time.perf_counter() - t0) / args.repeat * 1000
+        print(f"{fleet:>8}{ms:>10.2f}{plan.fleet.max():>8}{plan.expected_wait_s / 3600:>12.0f}{plan.unserved:>10.0f}")
+
+    t0 = time.perf_counter()
+    out = TRANSFORMS["set_headways"](canonical, plan.move())
+    print(f"set_headways: {len(out['trips'])} trips, {len(out['stop_times'])} stop_times in {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
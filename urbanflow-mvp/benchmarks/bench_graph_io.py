@@ -0,0 +1,55 @@
+"""Compare graph serialization: legacy pickle vs the memory-mappable .ufg format.
+
+Usage:
+    python benchmarks/bench_graph_io.py --rows 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.graph.graph_io import save_graph, load_graph  # noqa: E402
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--routes", type=int, default=5000, help="distinct stop patterns (sets the edge count)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        td = Path(td)
+        make_feed(td / "feed.zip", args.rows, n_routes=args.routes)
+        G = build_graph_from_canonical(canonicalize_feed(read_gtfs_zip(td / "feed.zip")))
+        print(f"graph: {G.number_of_nodes():,} nodes, {G.number_of_edges():,} edges")
+        print(f"{'variant':<26}{'save s':>10}{'load s':>10}{'file MB':>10}")
+        rows = [
+            ("pickle -> networkx", "g.pkl", "pickle", {"format": "pickle"}),
+            ("ufg -> networkx", "g.ufg", "ufg", {}),
+            ("ufg -> csr (read)", "g.ufg", "ufg", {"backend": "csr", "mmap": False}),
+            ("ufg -> csr (memmap)", "g.ufg", "ufg", {"backend": "csr"}),
+        ]
+        for name, fname, fmt, load_kwargs in rows:
+            path = td / fname
+            _, t_save = _timed(lambda: save_graph(G, path, format=fmt))
+            _, t_load = _timed(lambda: load_graph(path, **load_kwargs))
+            print(f"{name:<26}{t_save:>10.3f}{t_load:>10.3f}{path.stat().st_size / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Per-move cost of full vs incremental KPI evaluation for stop-removal moves.
+
+Usage:
+    python benchmarks/bench_incremental.py --rows 2000000 --samples 5000 --moves 50
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.optimizer.incremental import IncrementalEvaluator  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--routes", type=int, default=1000)
+    ap.add_argument("--samples", type=int, default=5000)
+    ap.add_argument("--moves", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+
+    graph = build_graph_from_canonical(canonical, backend="csr")
+    evaluator = Evaluator({"weights": {}}, sample_size=args.samples, seed=0)
+    inc = IncrementalEvaluator(evaluator)
+    t0 = time.perf_counter()
+    inc.reset(graph, canonical)
+    t_reset = time.perf_counter() - t0
+
+    rng = np.random.default_rng(0)
+    stops = rng.choice(graph.node_ids, size=args.moves, replace=False).tolist()
+    t0 = time.perf_counter()
+    for stop in stops:
+        inc.evaluate_move({"type": "remove_stop", "stop_id": stop})
+    t_inc = (time.perf_counter() - t0) / args.moves
+
+    full_moves = min(args.moves, 5)
+    t0 = time.perf_counter()
+    for stop in stops[:full_moves]:
+        cand = graph.copy()
+        cand.remove_node(stop)
+        evaluator.compute_kpis(cand, canonical)
+    t_full = (time.perf_counter() - t0) / full_moves
+
+    print(f"network: {graph.number_of_nodes():,} stops, {graph.number_of_edges():,} edges, {args.samples:,} passengers")
+    print(f"initial simulation:           {t_reset:8.3f} s")
+    print(f"full evaluation per move:     {t_full * 1e3:8.1f} ms")
+    print(f"incremental per move:         {t_inc * 1e3:8.1f} ms  "
+          f"({inc.passengers_rerouted / args.moves:.1f} passengers re-routed per move)")
+    print(f"speedup:                      {t_full / t_inc:8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Final score and runtime of the hill climb vs simulated annealing vs tabu search.
+
+Usage:
+    python benchmarks/bench_metaheuristic.py --rows 200000 --iters 200
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.optimizer.local_search import LocalSearch  # noqa: E402
+from urbanflow.optimizer.metaheuristic import MetaheuristicSearch  # noqa: E402
+from urbanflow.optimizer.solution import Solution  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--routes", type=int, default=100)
+    ap.add_argument("--samples", type=int, default=2000)
+    ap.add_argument("--iters", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+    graph = build_graph_from_canonical(canonical, backend="csr")
+
+    print(f"{'search':<12}{'wall s':>10}{'start':>12}{'best':>12}{'moves':>8}")
+    for search in ("hill", "annealing", "tabu"):
+        evaluator = Evaluator({"weights": {}}, sample_size=args.samples, seed=0)
+        trace, stats = [], {}
+        t0 = time.perf_counter()
+        if search == "hill":
+            best = LocalSearch.optimize(Solution(graph, canonical), evaluator, {}, max_iters=args.iters, trace=trace)
+        else:
+            best = MetaheuristicSearch.optimize(
+                Solution(graph, canonical), evaluator, {}, max_iters=args.iters, acceptance=search, trace=trace, stats=stats
+            )
+        elapsed = time.perf_counter() - t0
+        print(f"{search:<12}{elapsed:>10.2f}{trace[0]:>12.1f}{trace[-1]:>12.1f}{len(best.moves):>8}")
+        for name, outcomes in stats.get("outcomes", {}).items():
+            print(f"    {name:<20} weight {stats['weights'][name]:.2f}  {outcomes}")
+
+
+if __name__ == "__main__":
+    main()
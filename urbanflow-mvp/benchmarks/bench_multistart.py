@@ -0,0 +1,54 @@
+"""Wall time of N multi-start LocalSearch runs in-process vs across a process pool.
+
+Usage:
+    python benchmarks/bench_multistart.py --rows 2000000 --starts 8 --workers 1 2 4 8
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.optimizer.greedy_seed import GreedySeed  # noqa: E402
+from urbanflow.optimizer.multistart import MultiStartSearch  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--routes", type=int, default=1000)
+    ap.add_argument("--samples", type=int, default=5000)
+    ap.add_argument("--iters", type=int, default=200)
+    ap.add_argument("--starts", type=int, default=8)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+    graph = build_graph_from_canonical(canonical, backend="csr")
+    evaluator = Evaluator({"weights": {}}, sample_size=args.samples, seed=0)
+    seed = GreedySeed.create(graph, canonical, {}, evaluator.objective)
+
+    print(f"{'workers':>8}{'wall s':>10}{'speedup':>10}{'best score':>14}")
+    base = None
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        best, traces = MultiStartSearch.optimize(seed, evaluator, {}, max_iters=args.iters, workers=workers, starts=args.starts)
+        elapsed = time.perf_counter() - t0
+        base = base or elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{base / elapsed:>10.2f}{min(t['score'] for t in traces):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Wall time and peak RSS of the dense vs sparse OD demand generators.
+
+Usage:
+    python benchmarks/bench_od_generator.py --stops 15000 --density 0.01
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _legacy_dense(canonical, seed=None):
+    # the pre-sparse generator: two dense n x n float64 draws
+    rng = np.random.default_rng(seed)
+    stops = canonical["stops"]
+    n = len(stops)
+    base = rng.random((n, n))
+    np.fill_diagonal(base, 0.0)
+    od = base * (rng.random((n, n)) < 0.1)
+    od = od * (n * 10.0 / od.sum())
+    return pd.DataFrame(od, index=stops["stop_id"], columns=stops["stop_id"])
+
+
+def _stops(n: int) -> dict:
+    rng = np.random.default_rng(0)
+    return {"stops": pd.DataFrame({
+        "stop_id": [f"{i:06d}" for i in range(n)],
+        "lat": rng.uniform(40.0, 40.3, n),
+        "lon": rng.uniform(-74.0, -73.7, n),
+        "zone_id": [f"Z{i % 50}" for i in range(n)],
+    })}
+
+
+def _run_variant(variant: str, n: int, density: float, out: "mp.Queue") -> None:
+    from urbanflow.data.od_generator import aggregate_to_zones, generate_gravity_demand, generate_synthetic_demand
+
+    canonical = _stops(n)
+    t0 = time.perf_counter()
+    if variant == "legacy-dense":
+        od = _legacy_dense(canonical, seed=0)
+        rows = int(np.count_nonzero(od.to_numpy()))
+    elif variant == "uniform-sparse":
+        od = generate_synthetic_demand(canonical, seed=0, density=density)
+        rows = len(od)
+    else:
+        od = generate_gravity_demand(canonical)
+        rows = len(od)
+        aggregate_to_zones(od, canonical["stops"].set_index("stop_id")["zone_id"])
+    elapsed = time.perf_counter() - t0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out.put((variant, elapsed, rss / 1e6 if sys.platform == "darwin" else rss / 1e3, rows))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--stops", type=int, default=15_000)
+    ap.add_argument("--density", type=float, default=0.01)
+    ap.add_argument("--skip-legacy", action="store_true", help="the dense generator needs ~4 GB at 15k stops")
+    args = ap.parse_args()
+
+    variants = ([] if args.skip_legacy else ["legacy-dense"]) + ["uniform-sparse", "gravity+zones"]
+    ctx = mp.get_context("spawn")
+    print(f"{'variant':<18}{'wall s':>10}{'peak RSS MB':>14}{'OD pairs':>14}")
+    for variant in variants:
+        q = ctx.Queue()
+        p = ctx.Process(target=_run_variant, args=(variant, args.stops, args.density, q))
+        p.start()
+        name, elapsed, rss_mb, rows = q.get()
+        p.join()
+        print(f"{name:<18}{elapsed:>10.2f}{rss_mb:>14.0f}{rows:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compare GTFS ingestion paths: legacy inferred read vs typed schema reader.
+
+Usage:
+    python benchmarks/bench_read_gtfs.py --rows 2000000
+    python benchmarks/bench_read_gtfs.py --gtfs path/to/feed.zip
+
+Each variant runs in a fresh process so that peak RSS is measured per path.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing as mp
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+
+def make_feed(dst: Path, n_rows: int, stops_per_trip: int = 40, seed: int = 0, n_routes: int = 100) -> None:
+    rng = np.random.default_rng(seed)
+    n_trips = max(1, n_rows // stops_per_trip)
+    n_stops = max(stops_per_trip, n_rows // 200)
+    with zipfile.ZipFile(dst, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        lat = rng.uniform(40.0, 41.0, n_stops)
+        lon = rng.uniform(-74.0, -73.0, n_stops)
+        z.writestr("stops.txt", "stop_id,stop_name,stop_lat,stop_lon,zone_id,wheelchair_boarding\n" + "".join(
+            f"{i:06d},Stop {i},{lat[i]:.6f},{lon[i]:.6f},Z{i % 50},0\n" for i in range(n_stops)
+        ))
+        z.writestr("routes.txt", "route_id,agency_id,route_short_name,route_long_name,route_type\n" + "".join(
+            f"{r:04d},A,{r},Route {r},3\n" for r in range(n_routes)
+        ))
+        z.writestr("trips.txt", "route_id,service_id,trip_id,trip_headsign,shape_id,block_id\n" + "".join(
+            f"{t % n_routes:04d},WK,{t:08d},To {t % 7},,B{t % 900}\n" for t in range(n_trips)
+        ))
+        # each route runs one fixed stop pattern, as in real schedules
+        patterns = rng.integers(0, n_stops, (n_routes, stops_per_trip))
+        buf = io.StringIO()
+        buf.write("trip_id,arrival_time,departure_time,stop_id,stop_sequence,pickup_type,drop_off_type,shape_dist_traveled\n")
+        for t in range(n_trips):
+            start = 5 * 3600 + int(rng.integers(0, 18 * 3600))
+            stop_ids = patterns[t % n_routes]
+            for s in range(stops_per_trip):
+                sec = start + s * 90
+                hms = f"{sec // 3600:02d}:{(sec % 3600) // 60:02d}:{sec % 60:02d}"
+                buf.write(f"{t:08d},{hms},{hms},{stop_ids[s]:06d},{s + 1},0,0,{s * 400.0}\n")
+        z.writestr("stop_times.txt", buf.getvalue())
+
+
+def _legacy_read(path: Path) -> dict:
+    import pandas as pd
+
+    data = {}
+    with zipfile.ZipFile(path) as zf:
+        for name in ["stops.txt", "routes.txt", "trips.txt", "stop_times.txt"]:
+            with zf.open(name) as f:
+                data[name] = pd.read_csv(io.TextIOWrapper(f, encoding="utf-8"))
+    return data
+
+
+def _run_variant(variant: str, path: str, out: "mp.Queue") -> None:
+    from urbanflow.gtfs.parser import read_gtfs_zip
+
+    t0 = time.perf_counter()
+    if variant == "legacy":
+        feed = _legacy_read(Path(path))
+    elif variant == "typed-pandas":
+        feed = read_gtfs_zip(Path(path), engine="pandas")
+    elif variant == "typed-pyarrow":
+        feed = read_gtfs_zip(Path(path), engine="pyarrow")
+    else:
+        feed = read_gtfs_zip(Path(path), engine="pyarrow", categorical_ids=True)
+    elapsed = time.perf_counter() - t0
+    st = feed["stop_times.txt"]
+    mem_mb = st.memory_usage(deep=True).sum() / 1e6
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1e6 if sys.platform == "darwin" else rss / 1e3
+    out.put((variant, elapsed, rss_mb, mem_mb, str(st["stop_id"].dtype)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--gtfs", help="Existing GTFS zip to benchmark")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="stop_times rows for the generated feed")
+    args = ap.parse_args()
+
+    variants = ["legacy", "typed-pandas"]
+    try:
+        import pyarrow  # noqa: F401
+
+        variants += ["typed-pyarrow", "typed-pyarrow-categorical"]
+    except ImportError:
+        print("pyarrow not installed; skipping pyarrow variants")
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(args.gtfs) if args.gtfs else Path(td) / "bench_feed.zip"
+        if not args.gtfs:
+            make_feed(path, args.rows)
+        ctx = mp.get_context("spawn")
+        print(f"{'variant':<28}{'wall s':>10}{'peak RSS MB':>14}{'stop_times MB':>16}  stop_id dtype")
+        for variant in variants:
+            q = ctx.Queue()
+            p = ctx.Process(target=_run_variant, args=(variant, str(path), q))
+            p.start()
+            name, elapsed, rss_mb, mem_mb, dtype = q.get()
+            p.join()
+            print(f"{name:<28}{elapsed:>10.2f}{rss_mb:>14.1f}{mem_mb:>16.1f}  {dtype}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Latency of what-if edits on a resident scenario against re-uploading and rebuilding per edit.
+
+Usage:
+    python benchmarks/bench_scenarios.py --rows 400000 --edits 50
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.cli import _default_objective  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.scenarios import ScenarioStore  # noqa: E402
+from urbanflow.session import FeedSession  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=400_000, help="stop_times rows of the synthetic feed")
+    ap.add_argument("--edits", type=int, default=50)
+    ap.add_argument("--sample-size", type=int, default=2000)
+    args = ap.parse_args()
+
+    objective = _default_objective()
+    with tempfile.TemporaryDirectory() as td:
+        feed = Path(td) / "feed.zip"
+        make_feed(feed, args.rows)
+        data = feed.read_bytes()
+
+        t0 = time.perf_counter()
+        scenario = ScenarioStore().create(data, objective, sample_size=args.sample_size, seed=1)
+        load = time.perf_counter() - t0
+
+        rng = np.random.default_rng(0)
+        stops = [s for s in scenario.solution.graph.nodes]
+        picks = rng.choice(len(stops), args.edits, replace=False)
+        ms = [scenario.apply([{"type": "remove_stop", "stop_id": stops[i]}])["elapsed_ms"] for i in picks.tolist()]
+
+        # the old way: every edit re-parses the upload, rebuilds the graph and evaluates from scratch
+        t0 = time.perf_counter()
+        session = FeedSession(feed)
+        graph = session.graph.copy()
+        graph.remove_nodes_from([stops[i] for i in picks[:1].tolist()])
+        Evaluator(objective, sample_size=args.sample_size, seed=1).compute_kpis(graph, session.canonical)
+        rebuild = time.perf_counter() - t0
+
+    print(f"scenario load {load:.1f} s; remove_stop edit p50 {np.median(ms):.1f} ms / p95 {np.percentile(ms, 95):.1f} ms "
+          f"over {args.edits} edits; rebuild + full evaluation per edit {rebuild:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Per-candidate cost of copying the solution vs applying/reverting a move on a Solution.
+
+Usage:
+    python benchmarks/bench_solution.py --rows 2000000 --moves 200
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.optimizer.solution import Solution  # noqa: E402
+
+
+def _copying(graph, canonical, stops) -> None:
+    # previous representation: deep-copied seed, then a graph copy + list concat per candidate
+    best = copy.deepcopy({"graph": graph, "canonical": canonical, "changed_routes": [], "removed_stops": []})
+    for stop in stops:
+        cand_graph = best["graph"].copy()
+        cand_graph.remove_node(stop)
+        _ = best["removed_stops"] + [stop]
+
+
+def _overlay(graph, canonical, stops) -> None:
+    sol = Solution(graph, canonical)
+    for stop in stops:
+        sol.apply({"type": "remove_stop", "stop_id": stop})
+        sol.revert()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--routes", type=int, default=1000)
+    ap.add_argument("--moves", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+
+    print(f"{'backend':<10}{'variant':<10}{'ms/move':>10}{'peak MB':>10}")
+    for backend in ("networkx", "csr"):
+        graph = build_graph_from_canonical(canonical, backend=backend)
+        nodes = list(graph.nodes)
+        stops = np.random.default_rng(0).choice(len(nodes), size=args.moves, replace=False)
+        stops = [nodes[i] for i in stops.tolist()]
+        for name, fn in (("copy", _copying), ("overlay", _overlay)):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            fn(graph, canonical, stops)
+            elapsed = (time.perf_counter() - t0) / args.moves
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            print(f"{backend:<10}{name:<10}{elapsed * 1e3:>10.3f}{peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
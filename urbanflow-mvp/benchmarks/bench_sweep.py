@@ -0,0 +1,56 @@
+"""Wall time of a constraint/objective sweep on one loaded feed against loading the feed per variant.
+
+Usage:
+    python benchmarks/bench_sweep.py --rows 400000 --variants 8 --workers 1 2
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.cli import _default_constraints, _default_objective  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.optimizer.sweep import Sweep, expand_variants  # noqa: E402
+from urbanflow.session import FeedSession  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=400_000, help="stop_times rows of the synthetic feed")
+    ap.add_argument("--variants", type=int, default=8)
+    ap.add_argument("--samples", type=int, default=1000)
+    ap.add_argument("--iters", type=int, default=20)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    args = ap.parse_args()
+
+    constraints, objective = _default_constraints(), _default_objective()
+    spec = {"grid": {"objective.weights.p90_travel_time": [round(0.1 * (i + 1), 2) for i in range(args.variants)]}}
+    variants = expand_variants(spec)
+    with tempfile.TemporaryDirectory() as td:
+        feed = Path(td) / "feed.zip"
+        make_feed(feed, args.rows)
+
+        for workers in args.workers:
+            t0 = time.perf_counter()
+            session = FeedSession(feed)
+            evaluator = Evaluator(objective, sample_size=args.samples, seed=1)
+            Sweep.run(session.graph, session.canonical, constraints, objective, variants, evaluator, max_iters=args.iters, workers=workers)
+            print(f"sweep, one load, workers={workers}: {time.perf_counter() - t0:.1f} s for {len(variants)} variants")
+
+        # the old way: one `urbanflow run` per variant, each parsing and building the graph again
+        t0 = time.perf_counter()
+        for v in variants:
+            session = FeedSession(feed)
+            evaluator = Evaluator(objective, sample_size=args.samples, seed=1)
+            Sweep.run(session.graph, session.canonical, constraints, objective, [v], evaluator, max_iters=args.iters)
+        print(f"load per variant: {time.perf_counter() - t0:.1f} s for {len(variants)} variants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Rows per second and peak RSS of the synthetic AVL writer, against the row-by-row generator.
+
+Usage:
+    python benchmarks/bench_synthetic_avl.py --rows 10000000 --legacy-rows 20000
+    python benchmarks/bench_synthetic_avl.py --rows 1000000 --legacy-rows 0 --ping-interval 5
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from urbanflow.data.synthetic_avl import synthesize_avl
+
+
+def _legacy(canonical, out_csv, params):
+    # the previous generator: iterrows, a stops scan and pd.to_datetime per row, rows buffered in a list
+    rng = random.Random(int(params.get("seed", 42)))
+    stops, rows = canonical["stops"], []
+    for trip_id, group in canonical["stop_times"].groupby("trip_id"):
+        base_delay = rng.gauss(0, 30.0) if rng.random() < 0.2 else 0.0
+        for _, r in group.sort_values("stop_sequence").iterrows():
+            ts = int(r["arrival_time_sec"] + base_delay + rng.expovariate(1.0 / 20.0))
+            stop_row = stops.loc[stops["stop_id"] == str(r["stop_id"])].head(1)
+            rows.append({"trip_id": str(trip_id), "timestamp_iso": pd.to_datetime(ts, unit="s").isoformat(),
+                         "lat": float(stop_row["lat"].values[0]), "lon": float(stop_row["lon"].values[0]),
+                         "vehicle_id": f"veh_{hash(trip_id) % 1000}"})
+    with out_csv.open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _canonical(rows: int, n_stops: int = 10000, per_trip: int = 40, n_shapes: int = 500) -> dict:
+    rng = np.random.default_rng(0)
+    n_trips = rows // per_trip
+    stops = pd.DataFrame({
+        "stop_id": [f"S{i}" for i in range(n_stops)],
+        "lat": rng.uniform(40, 41, n_stops),
+        "lon": rng.uniform(-74, -73, n_stops),
+    })
+    trip = np.repeat(np.arange(n_trips), per_trip)
+    seq = np.tile(np.arange(1, per_trip + 1), n_trips)
+    start = rng.integers(5 * 3600, 23 * 3600, n_trips)
+    st = pd.DataFrame({
+        "trip_id": pd.Categorical.from_codes(trip, [f"T{i:08d}" for i in range(n_trips)]),
+        "stop_sequence": seq,
+        "stop_id": pd.Categorical.from_codes(rng.integers(0, n_stops, len(trip)), stops["stop_id"]),
+        "arrival_time_sec": start[trip] + 90 * (seq - 1),
+    })
+    # random-walk shapes of 200 points, one per trip of every n_shapes
+    walk = np.cumsum(rng.normal(0, 0.002, (n_shapes, 200, 2)), axis=1) + [40.5, -73.5]
+    shapes = pd.DataFrame({
+        "shape_id": np.repeat([f"SH{i}" for i in range(n_shapes)], 200),
+        "lat": walk[:, :, 0].ravel(),
+        "lon": walk[:, :, 1].ravel(),
+        "sequence": np.tile(np.arange(200), n_shapes),
+    })
+    trips = pd.DataFrame({"trip_id": st["trip_id"].cat.categories, "shape_id": [f"SH{i % n_shapes}" for i in range(n_trips)]})
+    return {"stops": stops, "stop_times": st, "trips": trips, "shapes": shapes}
+
+
+def _rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1e3
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--legacy-rows", type=int, default=20_000, help="rows for the row-by-row generator (0 to skip)")
+    ap.add_argument("--ping-interval", type=float, default=0.0, help="seconds between pings along shapes (0: one ping per stop)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        if args.legacy_rows:
+            small = _canonical(args.legacy_rows)
+            t0 = time.perf_counter()
+            _legacy(small, Path(td) / "legacy.csv", {})
+            rate = args.legacy_rows / (time.perf_counter() - t0)
+            print(f"row-by-row: {rate:,.0f} rows/s ({args.rows / rate / 3600:.1f} h for {args.rows:,} rows)")
+
+        canonical = _canonical(args.rows)
+        base = _rss_mb()
+        for suffix in (".csv", ".parquet"):
+            out = Path(td) / f"avl{suffix}"
+            t0 = time.perf_counter()
+            n = synthesize_avl(canonical, out, {"epoch": 1_700_000_000, "ping_interval_s": args.ping_interval})
+            elapsed = time.perf_counter() - t0
+            print(f"{suffix[1:]}: {n:,} pings from {args.rows:,} stop events in {elapsed:.1f} s ({n / elapsed:,.0f} rows/s), "
+                  f"{out.stat().st_size / 1e6:,.0f} MB, peak RSS +{_rss_mb() - base:,.0f} MB over the loaded feed")
+
+
+if __name__ == "__main__":
+    main()
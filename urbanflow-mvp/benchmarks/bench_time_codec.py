@@ -0,0 +1,98 @@
+"""Micro-benchmark: row-wise HH:MM:SS conversion vs the vectorized time codec.
+
+Usage:
+    python benchmarks/bench_time_codec.py --rows 2000000
+
+Checks that both paths produce identical seconds, strings and overnight
+offsets, then prints the wall time of each.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from urbanflow.gtfs.times import hms_to_seconds, seconds_to_hms, overnight_offsets
+
+
+def legacy_to_sec(t: str) -> int:
+    if pd.isna(t):
+        return 0
+    h, m, s = [int(x) for x in str(t).split(":")]
+    return h * 3600 + m * 60 + s
+
+
+def legacy_sec_to_hms(sec: int) -> str:
+    h = sec // 3600
+    m = (sec % 3600) // 60
+    s = sec % 60
+    return f"{h:02d}:{m:02d}:{s:02d}"
+
+
+def legacy_overnight(st: pd.DataFrame) -> pd.DataFrame:
+    st = st.copy()
+    for _, group in st.groupby("trip_id"):
+        prev = None
+        add = 0
+        for i in group.index:
+            if prev is not None and st.at[i, "arrival_time_sec"] + add < prev:
+                add += 24 * 3600
+            st.at[i, "arrival_time_sec"] += add
+            prev = st.at[i, "arrival_time_sec"]
+    return st
+
+
+def make_times(n: int, stops_per_trip: int = 30, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    trips = np.repeat(np.arange(n // stops_per_trip + 1), stops_per_trip)[:n]
+    start = np.repeat(rng.integers(4 * 3600, 27 * 3600, n // stops_per_trip + 1), stops_per_trip)[:n]
+    sec = start + np.tile(np.arange(stops_per_trip) * 120, n // stops_per_trip + 1)[:n]
+    # some feeds wrap after midnight instead of using 24+ hours
+    wrapped = np.where(rng.random(n) < 0.5, sec % 86400, sec)
+    return pd.DataFrame({
+        "trip_id": [f"T{t:07d}" for t in trips],
+        "arrival_time": pd.Series(seconds_to_hms(wrapped), dtype=object),
+        "stop_sequence": np.tile(np.arange(stops_per_trip), n // stops_per_trip + 1)[:n],
+    })
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--overnight-rows", type=int, default=100_000, help="rows for the (slow) legacy overnight loop")
+    args = ap.parse_args()
+
+    df = make_times(args.rows)
+    legacy_sec, t_legacy_parse = timed(lambda s: s.apply(legacy_to_sec).to_numpy(), df["arrival_time"])
+    fast_sec, t_fast_parse = timed(hms_to_seconds, df["arrival_time"])
+    assert np.array_equal(legacy_sec, fast_sec)
+
+    legacy_str, t_legacy_fmt = timed(lambda s: s.apply(legacy_sec_to_hms).to_numpy(), pd.Series(legacy_sec))
+    fast_str, t_fast_fmt = timed(seconds_to_hms, fast_sec)
+    assert list(legacy_str) == list(fast_str)
+
+    small = df.head(args.overnight_rows).copy()
+    small["arrival_time_sec"] = hms_to_seconds(small["arrival_time"]).astype(np.int64)
+    legacy_fix, t_legacy_fix = timed(legacy_overnight, small)
+    offsets, t_fast_fix = timed(overnight_offsets, small["trip_id"], small["arrival_time_sec"])
+    assert np.array_equal(legacy_fix["arrival_time_sec"].to_numpy(), small["arrival_time_sec"].to_numpy() + offsets)
+
+    print(f"{'stage':<22}{'rows':>12}{'row-wise s':>14}{'vectorized s':>14}{'speedup':>10}")
+    for stage, n, a, b in [
+        ("HH:MM:SS -> seconds", args.rows, t_legacy_parse, t_fast_parse),
+        ("seconds -> HH:MM:SS", args.rows, t_legacy_fmt, t_fast_fmt),
+        ("overnight rollover", len(small), t_legacy_fix, t_fast_fix),
+    ]:
+        print(f"{stage:<22}{n:>12}{a:>14.3f}{b:>14.3f}{a / max(b, 1e-9):>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare stop- and zone-resolution KPI evaluation, and time zone skims.
+
+Usage:
+    python benchmarks/bench_zones.py --rows 400000 --routes 500 --samples 100000 --cell-m 15000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_read_gtfs import make_feed  # noqa: E402
+
+from urbanflow.gtfs.parser import read_gtfs_zip  # noqa: E402
+from urbanflow.gtfs.canonicalizer import canonicalize_feed  # noqa: E402
+from urbanflow.graph.build_graph import build_graph_from_canonical  # noqa: E402
+from urbanflow.optimizer.evaluator import Evaluator  # noqa: E402
+from urbanflow.optimizer.zones import ZoneIndex, zone_skims  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2_000_000, help="stop_times rows (stops = rows / 200)")
+    ap.add_argument("--routes", type=int, default=1000)
+    ap.add_argument("--samples", type=int, default=100000)
+    ap.add_argument("--cell-m", type=float, default=15000.0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        path = Path(td) / "feed.zip"
+        make_feed(path, args.rows, n_routes=args.routes)
+        canonical = canonicalize_feed(read_gtfs_zip(path))
+    graph = build_graph_from_canonical(canonical, backend="csr")
+
+    results = {}
+    for label, cell_m in (("stops", None), ("zones", args.cell_m)):
+        evaluator = Evaluator({"weights": {}}, sample_size=args.samples, seed=0, zone_cell_m=cell_m)
+        t0 = time.perf_counter()
+        evaluator.simulator(canonical)
+        t_setup = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        results[label] = evaluator.compute_kpis(graph, canonical)
+        t_eval = time.perf_counter() - t0
+        print(f"{label}: {len(evaluator._sample[1]):,} simulated rows for {args.samples:,} passengers: "
+              f"setup {t_setup:.2f} s, evaluate {t_eval:.3f} s")
+    for key in ("passenger_weighted_travel_time", "served_ratio", "mean_transfers"):
+        print(f"  {key}: stops {results['stops'][key]:.2f}, zones {results['zones'][key]:.2f}")
+
+    zones = ZoneIndex.grid(canonical["stops"], args.cell_m)
+    t0 = time.perf_counter()
+    skims = zone_skims(graph, zones)
+    print(f"skims: {zones.n_zones:,} zones over {len(zones.stop_ids):,} stops in {time.perf_counter() - t0:.2f} s "
+          f"({(skims < float('inf')).mean():.0%} of pairs connected)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,201 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
-from pathlib import Path
-import shutil
-import tempfile
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional
 import json
 
-from .gtfs.parser import read_gtfs_zip
-from .gtfs.validator import validate_feed
-from .gtfs.canonicalizer import canonicalize_feed
-from .graph.build_graph import build_graph_from_canonical
-from .optimizer.evaluator import Evaluator
-from .optimizer.greedy_seed import GreedySeed
-from .optimizer.local_search import LocalSearch
+from pydantic import BaseModel
 
-app = FastAPI(title="UrbanFlow API", version="0.1.0")
+from .jobs import JobQueue, QueueFull
+from .scenarios import Scenario, ScenarioStore
 
+_queue: Optional[JobQueue] = None
+_scenarios: Optional[ScenarioStore] = None
 
-@app.post("/api/v1/optimize")
+
+def get_queue() -> JobQueue:
+    # created on first use, so importing the app starts no processes
+    global _queue
+    if _queue is None:
+        _queue = JobQueue.from_env()
+    return _queue
+
+
+def set_queue(queue: Optional[JobQueue]) -> None:
+    """Use ``queue`` (e.g. with a different concurrency limit) instead of the one from the environment."""
+    global _queue
+    if _queue is not None and _queue is not queue:
+        _queue.shutdown(wait=False)
+    _queue = queue
+
+
+def get_scenarios() -> ScenarioStore:
+    global _scenarios
+    if _scenarios is None:
+        _scenarios = ScenarioStore.from_env()
+    return _scenarios
+
+
+def set_scenarios(store: Optional[ScenarioStore]) -> None:
+    global _scenarios
+    _scenarios = store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    set_queue(None)
+    set_scenarios(None)
+
+
+app = FastAPI(title="UrbanFlow API", version="0.1.0", lifespan=lifespan)
+
+
+def _read_json(upload: UploadFile) -> dict:
+    try:
+        return json.load(upload.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{upload.filename or 'upload'} is not valid JSON: {e}")
+
+
+def _submit(
+    queue: JobQueue,
+    gtfs_zip: UploadFile,
+    constraints_json: UploadFile,
+    objective_json: UploadFile,
+    **params,
+) -> str:
+    # parsed straight from the spooled uploads: no copies to a temp dir
+    constraints = _read_json(constraints_json)
+    objective = _read_json(objective_json)
+    return queue.submit(gtfs_zip.file, constraints, objective, **params)
+
+
+@app.post("/api/v1/optimize", status_code=202)
 async def optimize(
     gtfs_zip: UploadFile = File(...),
     constraints_json: UploadFile = File(...),
     objective_json: UploadFile = File(...),
     sample_size: int = Form(2000),
     seed: int | None = Form(None),
+    max_iters: int = Form(200),
+):
+    """Queue an optimization job; poll ``status_url`` and fetch ``result_url`` once it succeeds.
+
+    Identical feeds are recognised by content hash, so a resubmitted feed
+    reuses the cached canonical tables and graph instead of being parsed again.
+    """
+    queue = get_queue()
+    if queue.full():
+        raise HTTPException(status_code=429, detail=f"{queue.max_pending} jobs already queued or running")
+    try:
+        # reading and hashing the upload happen off the event loop
+        job_id = await run_in_threadpool(
+            _submit, queue, gtfs_zip, constraints_json, objective_json,
+            sample_size=sample_size, seed=seed, max_iters=max_iters,
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JSONResponse(
+        {
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/v1/status/{job_id}",
+            "result_url": f"/api/v1/results/{job_id}",
+        },
+        status_code=202,
+    )
+
+
+@app.get("/api/v1/status/{job_id}")
+async def status(job_id: str):
+    """State, current stage, iteration and best KPIs so far of a job."""
+    info = get_queue().status(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return info
+
+
+@app.get("/api/v1/results/{job_id}")
+async def results(job_id: str):
+    """Baseline and optimized KPIs of a succeeded job (409 while it is not)."""
+    queue = get_queue()
+    info = queue.status(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if info["status"] == "failed":
+        raise HTTPException(status_code=500, detail=info.get("error", "Job failed"))
+    result = queue.result(job_id)
+    if result is None:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {info['status']}")
+    return {"job_id": job_id, **result}
+
+
+@app.post("/api/v1/cancel/{job_id}")
+async def cancel(job_id: str):
+    queue = get_queue()
+    if queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return {"job_id": job_id, "cancelled": queue.cancel(job_id), "status": queue.status(job_id)["status"]}
+
+
+class EditBatch(BaseModel):
+    edits: List[Dict[str, Any]]
+
+
+def _scenario(scenario_id: str) -> Scenario:
+    scenario = get_scenarios().get(scenario_id)
+    if scenario is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired scenario {scenario_id}")
+    return scenario
+
+
+def _create_scenario(gtfs_zip: UploadFile, objective_json: UploadFile, **params) -> dict:
+    scenario = get_scenarios().create(gtfs_zip.file, _read_json(objective_json), **params)
+    return {**scenario.summary(), "baseline": scenario.baseline, "timings": scenario.session.timing_report()}
+
+
+@app.post("/api/v1/scenarios", status_code=201)
+async def create_scenario(
+    gtfs_zip: UploadFile = File(...),
+    objective_json: UploadFile = File(...),
+    sample_size: int = Form(2000),
+    seed: int | None = Form(None),
 ):
-    with tempfile.TemporaryDirectory() as td:
-        td_path = Path(td)
-        gtfs_path = td_path / "feed.zip"
-        constraints_path = td_path / "constraints.json"
-        objective_path = td_path / "objective.json"
+    """Load a feed into a server-side scenario for what-if edits.
+
+    The canonical tables, graph and per-passenger evaluation stay in memory
+    until the scenario has been idle for ``URBANFLOW_SCENARIO_TTL_S`` or is
+    the least recently used of more than ``URBANFLOW_MAX_SCENARIOS``.
+    """
+    return await run_in_threadpool(_create_scenario, gtfs_zip, objective_json, sample_size=sample_size, seed=seed)
 
-        with gtfs_path.open("wb") as f:
-            shutil.copyfileobj(gtfs_zip.file, f)
-        with constraints_path.open("wb") as f:
-            shutil.copyfileobj(constraints_json.file, f)
-        with objective_path.open("wb") as f:
-            shutil.copyfileobj(objective_json.file, f)
 
-        constraints = json.loads(constraints_path.read_text(encoding="utf-8"))
-        objective = json.loads(objective_path.read_text(encoding="utf-8"))
+@app.get("/api/v1/scenarios/{scenario_id}")
+async def get_scenario(scenario_id: str):
+    scenario = _scenario(scenario_id)
+    return {**scenario.summary(), "baseline": scenario.baseline}
 
-        feed = read_gtfs_zip(gtfs_path)
-        _ = validate_feed(feed)
-        canonical = canonicalize_feed(feed)
-        graph = build_graph_from_canonical(canonical)
 
-        evaluator = Evaluator(objective=objective, sample_size=sample_size, seed=seed)
-        baseline = evaluator.compute_kpis(graph, canonical)
+@app.post("/api/v1/scenarios/{scenario_id}/edits")
+async def edit_scenario(scenario_id: str, batch: EditBatch):
+    """Apply a batch of edits (move dicts) and return the recomputed KPIs."""
+    scenario = _scenario(scenario_id)
+    try:
+        return await run_in_threadpool(scenario.apply, batch.edits)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        seed_solution = GreedySeed.create(graph, canonical, constraints, objective)
-        best_solution = LocalSearch.optimize(seed_solution, evaluator, constraints, max_iters=200)
-        optimized = evaluator.compute_kpis(best_solution["graph"], best_solution["canonical"])
 
-        return JSONResponse({
-            "baseline": baseline,
-            "optimized": optimized,
-            "notes": "MVP execution completed synchronously.",
-        })
+@app.post("/api/v1/scenarios/{scenario_id}/undo")
+async def undo_scenario(scenario_id: str, steps: int = 1):
+    scenario = _scenario(scenario_id)
+    return await run_in_threadpool(scenario.undo, steps)
 
 
+@app.delete("/api/v1/scenarios/{scenario_id}")
+async def delete_scenario(scenario_id: str):
+    if not get_scenarios().delete(scenario_id):
+        raise HTTPException(status_code=404, detail=f"Unknown or expired scenario {scenario_id}")
+    return {"scenario_id": scenario_id, "deleted": True}
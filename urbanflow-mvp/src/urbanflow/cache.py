@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import networkx as nx
+import pandas as pd
+
+from . import __version__
+from .gtfs.parser import GtfsSource
+from .graph.csr import CSRGraph
+from .graph.graph_io import save_graph, load_graph
+
+
+# Bump whenever the canonical tables or graph attributes change shape, so that
+# entries written by older code are never read back.
+CACHE_SCHEMA_VERSION = 4
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+CANONICAL_TABLES = ["stops", "routes", "trips", "stop_times", "frequencies", "shapes"]
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("URBANFLOW_CACHE_DIR")
+    if env:
+        return Path(env)
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "urbanflow"
+
+
+def hash_source(source: GtfsSource, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a GTFS zip's bytes (path or seekable file object)."""
+    digest = hashlib.sha256()
+    if hasattr(source, "read"):
+        source.seek(0)
+        for block in iter(lambda: source.read(block_size), b""):
+            digest.update(block)
+        source.seek(0)
+    else:
+        with Path(source).open("rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    key: str
+    path: Path
+    size_bytes: int
+    last_used: float
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class FeedCache:
+    """Content-addressed on-disk cache of canonical tables and graphs.
+
+    Entries are keyed by the SHA-256 of the GTFS zip plus the package and
+    cache schema versions. Canonical tables are stored as Parquet, the graph
+    in the memory-mappable ``.ufg`` format (see ``graph_io``) and the
+    validation report as JSON. The least recently
+    used entries are evicted once the cache grows beyond ``max_bytes``.
+    """
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root) if root is not None else default_cache_dir()
+        self.max_bytes = int(max_bytes)
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def key_for(self, source: GtfsSource) -> str:
+        return self.key_for_hash(hash_source(source))
+
+    @staticmethod
+    def key_for_hash(content_hash: str) -> str:
+        return f"{content_hash[:40]}-v{__version__}-s{CACHE_SCHEMA_VERSION}"
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def has(self, key: str) -> bool:
+        return (self._entry_dir(key) / "meta.json").exists()
+
+    def load(self, key: str, graph_backend: str = "networkx") -> Optional[Dict[str, Any]]:
+        entry = self._entry_dir(key)
+        meta_path = entry / "meta.json"
+        if not meta_path.exists():
+            return None
+        try:
+            canonical = {name: pd.read_parquet(entry / f"{name}.parquet") for name in CANONICAL_TABLES}
+            graph = load_graph(entry / "graph.ufg", backend=graph_backend)
+            report = json.loads((entry / "report.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            # partially evicted or corrupt entry: drop it and recompute
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        # mtime of meta.json is the LRU clock
+        os.utime(meta_path)
+        return {"canonical": canonical, "graph": graph, "report": report}
+
+    def store(
+        self,
+        key: str,
+        canonical: Dict[str, pd.DataFrame],
+        graph: Union[nx.DiGraph, CSRGraph],
+        report: Dict[str, Any],
+    ) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        final = self._entry_dir(key)
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        try:
+            for name in CANONICAL_TABLES:
+                canonical[name].to_parquet(tmp / f"{name}.parquet", index=False)
+            save_graph(graph, tmp / "graph.ufg")
+            (tmp / "report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+            meta = {"key": key, "version": __version__, "schema": CACHE_SCHEMA_VERSION, "created": time.time()}
+            (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            if final.exists():
+                shutil.rmtree(final, ignore_errors=True)
+            # atomic publish; a concurrent writer of the same key wins harmlessly
+            os.replace(tmp, final)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not self.has(key):
+                raise
+        self.prune()
+        return final
+
+    def entries(self) -> List[CacheEntry]:
+        if not self.root.exists():
+            return []
+        out: List[CacheEntry] = []
+        for entry in self.root.iterdir():
+            meta = entry / "meta.json"
+            if entry.is_dir() and meta.exists():
+                out.append(CacheEntry(
+                    key=entry.name,
+                    path=entry,
+                    size_bytes=_dir_size(entry),
+                    last_used=meta.stat().st_mtime,
+                ))
+        return sorted(out, key=lambda e: e.last_used, reverse=True)
+
+    def total_bytes(self) -> int:
+        return sum(e.size_bytes for e in self.entries())
+
+    def prune(self, max_bytes: Optional[int] = None) -> List[CacheEntry]:
+        """Evict least recently used entries until the cache fits in ``max_bytes``."""
+        limit = self.max_bytes if max_bytes is None else int(max_bytes)
+        entries = self.entries()
+        total = sum(e.size_bytes for e in entries)
+        removed: List[CacheEntry] = []
+        for entry in reversed(entries):
+            if total <= limit:
+                break
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total -= entry.size_bytes
+            removed.append(entry)
+        return removed
@@ -3,18 +3,34 @@ import json
 import os
 import sys
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 import tempfile
+import time
 import zipfile
 import io
 
-from .gtfs.parser import read_gtfs_zip
-from .gtfs.validator import validate_feed
-from .gtfs.canonicalizer import canonicalize_feed
-from .graph.build_graph import build_graph_from_canonical
-from .optimizer.evaluator import Evaluator
+import pandas as pd
+
+from .gtfs.streaming import DEFAULT_CHUNK_SIZE
+from .gtfs.times import DEFAULT_BAND_S
+from .session import FeedSession
+from .graph.build_graph import GRAPH_BACKENDS
+from .graph.calibration import MIN_OBSERVATIONS
+from .data.avl_ingest import MATCH_RADIUS_M
+from .cache import FeedCache, DEFAULT_MAX_BYTES
+from .optimizer.evaluator import Evaluator, KPI_KEYS
 from .optimizer.greedy_seed import GreedySeed
 from .optimizer.local_search import LocalSearch
+from .optimizer.metaheuristic import MetaheuristicSearch
+from .optimizer.multistart import MultiStartSearch, SEARCHES
+from .optimizer.sweep import Sweep, expand_variants
+from .optimizer.frequency import (
+    FrequencyOptimizer,
+    route_cycle_times,
+    sample_demand,
+    time_bands,
+    DEFAULT_LAYOVER_RATIO,
+)
 from .exports.gtfs_writer import write_gtfs_like
 from .exports.vehicle_block_writer import write_vehicle_blocks
 from .viz.folium_maps import write_before_after_map
@@ -136,14 +152,38 @@ def _create_sample_gtfs_zip(dst_zip: Path, sample_type: str = "basic") -> None:
         f.write(mem.getvalue())
 
 
+def _cache_from_args(args: argparse.Namespace) -> FeedCache:
+    cache_dir = getattr(args, "cache_dir", None)
+    return FeedCache(Path(cache_dir) if cache_dir else None)
+
+
+def _session_from_args(args: argparse.Namespace, gtfs_path: Path) -> FeedSession:
+    use_cache = hasattr(args, "no_cache") and not args.no_cache
+    return FeedSession(
+        gtfs_path,
+        csv_engine=getattr(args, "csv_engine", "pandas"),
+        stream=getattr(args, "stream", False),
+        chunk_size=int(getattr(args, "chunk_size", DEFAULT_CHUNK_SIZE)),
+        cache=_cache_from_args(args) if use_cache else None,
+        graph_backend=getattr(args, "graph_backend", "networkx"),
+    )
+
+
+def _print_timings(session: FeedSession) -> None:
+    print("Stage timings (s):")
+    for stage, seconds in session.timing_report().items():
+        print(f" - {stage}: {seconds:.3f}")
+
+
 def cmd_validate(args: argparse.Namespace) -> None:
     gtfs_path = Path(args.gtfs)
     out_path = Path(args.out)
-    feed = read_gtfs_zip(gtfs_path)
-    report = validate_feed(feed)
+    session = _session_from_args(args, gtfs_path)
+    report = session.report
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
     print(f"Wrote validation report to {out_path}")
+    _print_timings(session)
 
 
 def cmd_synth_avl(args: argparse.Namespace) -> None:
@@ -152,11 +192,28 @@ def cmd_synth_avl(args: argparse.Namespace) -> None:
     gtfs_path = Path(args.gtfs)
     out_path = Path(args.out)
     params = _load_json(Path(args.params)) if args.params else {}
+    if getattr(args, "ping_interval", None):
+        params["ping_interval_s"] = float(args.ping_interval)
+
+    session = _session_from_args(args, gtfs_path)
+    rows = synthesize_avl(session.canonical, out_path, params, fmt=getattr(args, "format", None))
+    print(f"Wrote {rows:,} synthetic AVL rows to {out_path}")
+
 
-    feed = read_gtfs_zip(gtfs_path)
-    canonical = canonicalize_feed(feed)
-    synthesize_avl(canonical, out_path, params)
-    print(f"Wrote synthetic AVL to {out_path}")
+def cmd_ingest_avl(args: argparse.Namespace) -> None:
+    gtfs_path = Path(args.gtfs)
+    out_path = Path(args.out)
+    session = _session_from_args(args, gtfs_path)
+    obs = session.calibrate(
+        Path(args.avl),
+        min_obs=int(args.min_obs),
+        match_radius_m=float(args.match_radius),
+        band_s=int(args.band),
+    )
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    pd.concat([obs.by_edge, obs.by_band], ignore_index=True).to_csv(out_path, index=False)
+    print(f"Matched {obs.matched:,} of {obs.pings:,} pings; wrote {len(obs.by_edge):,} edge travel times to {out_path}")
+    _print_timings(session)
 
 
 def cmd_visualize(args: argparse.Namespace) -> None:
@@ -167,47 +224,107 @@ def cmd_visualize(args: argparse.Namespace) -> None:
     print(f"Wrote before/after map to {out_path}")
 
 
-def cmd_run(args: argparse.Namespace) -> None:
+def cmd_run(args: argparse.Namespace, session: Optional[FeedSession] = None) -> None:
     gtfs_path = Path(args.gtfs)
     constraints = _load_json(Path(args.constraints))
     objective = _load_json(Path(args.objective))
     outdir = Path(args.outdir)
     sample_size = int(args.sample_size)
     seed = int(args.seed) if args.seed is not None else None
+    # the searches break ties with --seed too (their own default without one)
+    search_seed = seed if seed is not None else 42
 
     _ensure_outdir(outdir)
 
+    # shared with cmd_pipeline so that every stage runs once per invocation
+    if session is None:
+        session = _session_from_args(args, gtfs_path)
+
     # 1) Load and validate
-    feed = read_gtfs_zip(gtfs_path)
-    report = validate_feed(feed)
+    report = session.report
     (outdir / "validation_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
 
-    # 2) Canonicalize and build graph
-    canonical = canonicalize_feed(feed)
-    graph = build_graph_from_canonical(canonical)
+    # 2) Canonicalize and build graph (travel times calibrated to AVL observations when given)
+    canonical = session.canonical
+    avl = getattr(args, "avl", None)
+    if avl:
+        session.calibrate(Path(avl))
+    graph = session.graph
 
     # 3) Baseline evaluation (simple)
-    evaluator = Evaluator(objective=objective, sample_size=sample_size, seed=seed)
-    baseline = evaluator.compute_kpis(graph, canonical)
+    zone_cell_m = getattr(args, "zone_cell_m", None)
+    coverage_points = getattr(args, "coverage_points", None)
+    evaluator = Evaluator(
+        objective=objective,
+        sample_size=sample_size,
+        seed=seed,
+        zone_cell_m=float(zone_cell_m) if zone_cell_m else None,
+        coverage_points=pd.read_csv(coverage_points) if coverage_points else None,
+    )
+    baseline = session.baseline_kpis(evaluator)
     (outdir / "baseline_kpi_report.json").write_text(json.dumps(baseline, indent=2), encoding="utf-8")
 
     # 4) Greedy seed + local search
-    seed_solution = GreedySeed.create(graph, canonical, constraints, objective)
-    best_solution = LocalSearch.optimize(
-        seed_solution,
-        evaluator=evaluator,
-        constraints=constraints,
-        max_iters=int(args.max_iters),
-    )
+    with session.timed("optimize"):
+        seed_solution = GreedySeed.create(graph, canonical, constraints, objective, calibration=session.calibration)
+        workers = int(getattr(args, "workers", 1) or 1)
+        search = getattr(args, "search", "hill") or "hill"
+        if workers > 1:
+            best_solution, traces = MultiStartSearch.optimize(
+                seed_solution,
+                evaluator=evaluator,
+                constraints=constraints,
+                max_iters=int(args.max_iters),
+                workers=workers,
+                seed=search_seed,
+                search=search,
+            )
+            (outdir / "search_traces.json").write_text(json.dumps(traces, indent=2), encoding="utf-8")
+        elif search != "hill":
+            best_solution = MetaheuristicSearch.optimize(
+                seed_solution,
+                evaluator=evaluator,
+                constraints=constraints,
+                max_iters=int(args.max_iters),
+                seed=search_seed,
+                acceptance=search,
+            )
+        else:
+            best_solution = LocalSearch.optimize(
+                seed_solution,
+                evaluator=evaluator,
+                constraints=constraints,
+                max_iters=int(args.max_iters),
+                seed=search_seed,
+            )
+
+    # 4b) Headways per route and time band under the fleet budget
+    if getattr(args, "headways", False):
+        with session.timed("headways"):
+            canonical_best = best_solution["canonical"]
+            cycles = route_cycle_times(canonical_best, float(constraints.get("layover_ratio", DEFAULT_LAYOVER_RATIO)))
+            bands = time_bands(canonical_best, constraints.get("time_bands"), int(constraints.get("band_s", DEFAULT_BAND_S)))
+            demand = None
+            if constraints.get("daily_riders"):
+                # the evaluator's passenger sample, scaled to riders, so vehicle_capacity applies
+                sample = evaluator.simulator(canonical_best).sample
+                demand = sample_demand(canonical_best, cycles.route_ids, bands, sample, total=float(constraints["daily_riders"]))
+            plan = FrequencyOptimizer.optimize(canonical_best, constraints, demand=demand, bands=bands, cycles=cycles)
+            plan.to_frame().to_csv(outdir / "headways.csv", index=False)
+            best_solution.apply(plan.move())
 
     # 5) Exports
-    export_dir = outdir / "optimized_gtfs"
-    export_dir.mkdir(parents=True, exist_ok=True)
-    write_gtfs_like(best_solution, export_dir)
-    write_vehicle_blocks(best_solution, outdir / "vehicle_blocks.csv")
+    with session.timed("export"):
+        # the search result is an overlay on the shared base graph; export a standalone copy
+        best_solution = best_solution.materialize()
+        export_dir = outdir / "optimized_gtfs"
+        export_dir.mkdir(parents=True, exist_ok=True)
+        write_gtfs_like(best_solution, export_dir)
+        blocks = write_vehicle_blocks(best_solution, outdir / "vehicle_blocks.csv", constraints)
 
     # 6) KPI report + diff + map
-    optimized_kpis = evaluator.compute_kpis(best_solution["graph"], best_solution["canonical"])
+    with session.timed("optimized_kpis"):
+        optimized_kpis = evaluator.compute_kpis(best_solution["graph"], best_solution["canonical"])
     (outdir / "kpi_report.json").write_text(json.dumps({
         "baseline": baseline, "optimized": optimized_kpis
     }, indent=2), encoding="utf-8")
@@ -218,7 +335,8 @@ def cmd_run(args: argparse.Namespace) -> None:
         "# Scenario Diff\n\n"
         f"- Routes changed: {len(best_solution.get('changed_routes', []))}\n"
         f"- Stops removed: {len(best_solution.get('removed_stops', []))}\n"
-        f"- Fleet size constraint: {constraints.get('fleet_size')}\n",
+        f"- Fleet size constraint: {constraints.get('fleet_size')}\n"
+        f"- Vehicles required (blocking): {blocks.fleet_size}\n",
         encoding="utf-8",
     )
 
@@ -229,7 +347,82 @@ def cmd_run(args: argparse.Namespace) -> None:
     after_json.write_text(json.dumps({"kpis": optimized_kpis}, indent=2), encoding="utf-8")
     write_before_after_map(before_json, after_json, outdir / "before_after_map.html")
 
+    _write_json(outdir / "stage_timings.json", session.timing_report())
     print(f"Run completed. Outputs in: {outdir}")
+    _print_timings(session)
+
+def cmd_sweep(args: argparse.Namespace) -> None:
+    gtfs_path = Path(args.gtfs)
+    constraints = _load_json(Path(args.constraints)) if args.constraints else _default_constraints()
+    objective = _load_json(Path(args.objective)) if args.objective else _default_objective()
+    variants = expand_variants(_load_json(Path(args.variants)))
+    outdir = Path(args.outdir)
+    seed = int(args.seed) if args.seed is not None else None
+    _ensure_outdir(outdir)
+
+    # the feed is parsed, canonicalized and (optionally) calibrated once for every variant
+    session = _session_from_args(args, gtfs_path)
+    canonical = session.canonical
+    avl = getattr(args, "avl", None)
+    if avl:
+        session.calibrate(Path(avl))
+    graph = session.graph
+
+    zone_cell_m = getattr(args, "zone_cell_m", None)
+    coverage_points = getattr(args, "coverage_points", None)
+    evaluator = Evaluator(
+        objective=objective,
+        sample_size=int(args.sample_size),
+        seed=seed,
+        zone_cell_m=float(zone_cell_m) if zone_cell_m else None,
+        coverage_points=pd.read_csv(coverage_points) if coverage_points else None,
+    )
+    with session.timed("sweep"):
+        table = Sweep.run(
+            graph,
+            canonical,
+            constraints,
+            objective,
+            variants,
+            evaluator,
+            max_iters=int(args.max_iters),
+            workers=int(getattr(args, "workers", 1) or 1),
+            search=getattr(args, "search", "hill") or "hill",
+            headways=getattr(args, "headways", False),
+            seed=seed,
+            calibration=session.calibration,
+        )
+    table.to_csv(outdir / "sweep_results.csv", index=False)
+    table[table["pareto"]].to_csv(outdir / "pareto_front.csv", index=False)
+    _write_json(outdir / "stage_timings.json", session.timing_report())
+    print(f"Swept {len(variants)} variants; {int(table['pareto'].sum())} of {len(table)} rows (with the baseline) on the Pareto front. Outputs in: {outdir}")
+    _print_timings(session)
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if n < 1024 or unit == "GiB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+    return f"{n} B"
+
+
+def cmd_cache_ls(args: argparse.Namespace) -> None:
+    cache = _cache_from_args(args)
+    entries = cache.entries()
+    print(f"Cache: {cache.root} ({len(entries)} entries, {_format_bytes(sum(e.size_bytes for e in entries))})")
+    for e in entries:
+        used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e.last_used))
+        print(f" - {e.key}  {_format_bytes(e.size_bytes):>10}  last used {used}")
+
+
+def cmd_cache_prune(args: argparse.Namespace) -> None:
+    cache = _cache_from_args(args)
+    max_bytes = 0 if args.all else int(args.max_bytes)
+    removed = cache.prune(max_bytes=max_bytes)
+    freed = sum(e.size_bytes for e in removed)
+    print(f"Removed {len(removed)} cache entries ({_format_bytes(freed)}) from {cache.root}")
+
 
 def cmd_pipeline(args: argparse.Namespace) -> None:
     # One-shot pipeline: optionally create sample GTFS and default configs, run, and print KPI deltas
@@ -255,10 +448,10 @@ def cmd_pipeline(args: argparse.Namespace) -> None:
         if not args.objective:
             _write_json(objective_path, _default_objective())
 
-        # Validate
+        # Validate (the session is handed to cmd_run, which reuses the parse and report)
+        session = _session_from_args(args, gtfs_zip)
         report_path = outdir / "validation_report.json"
-        feed = read_gtfs_zip(gtfs_zip)
-        report = validate_feed(feed)
+        report = session.report
         _write_json(report_path, report)
 
         # Run
@@ -270,8 +463,20 @@ def cmd_pipeline(args: argparse.Namespace) -> None:
             sample_size=str(args.sample_size),
             seed=str(args.seed) if args.seed is not None else None,
             max_iters=str(args.max_iters),
+            csv_engine=args.csv_engine,
+            stream=args.stream,
+            chunk_size=args.chunk_size,
+            no_cache=args.no_cache,
+            cache_dir=args.cache_dir,
+            graph_backend=args.graph_backend,
+            workers=args.workers,
+            search=args.search,
+            headways=args.headways,
+            zone_cell_m=args.zone_cell_m,
+            coverage_points=args.coverage_points,
+            avl=args.avl,
         )
-        cmd_run(run_ns)
+        cmd_run(run_ns, session=session)
 
         # Print KPI deltas
         kpi_file = outdir / "kpi_report.json"
@@ -282,8 +487,7 @@ def cmd_pipeline(args: argparse.Namespace) -> None:
             def delta(key: str) -> float:
                 return float(o.get(key, 0) - b.get(key, 0))
             print("KPI deltas (optimized - baseline):")
-            keys = ["average_travel_time", "passenger_weighted_travel_time", "p50_travel_time", "p90_travel_time", "on_time_percentage", "coverage_ratio"]
-            for k in keys:
+            for k in KPI_KEYS:
                 print(f" - {k}: {delta(k):.2f}")
         else:
             print("kpi_report.json not found; pipeline completed without KPI summary.")
@@ -296,14 +500,30 @@ def build_parser() -> argparse.ArgumentParser:
     p_validate = sub.add_parser("validate", help="Validate a GTFS feed and write a report")
     p_validate.add_argument("--gtfs", required=True, help="Path to GTFS zip")
     p_validate.add_argument("--out", required=True, help="Path to write validation_report.json")
+    p_validate.add_argument("--csv-engine", choices=["pandas", "pyarrow"], default="pandas", help="CSV backend for reading the GTFS zip")
+    p_validate.add_argument("--stream", action="store_true", help="Stream stop_times.txt in trip-aligned chunks (bounded memory)")
+    p_validate.add_argument("--chunk-size", default=str(DEFAULT_CHUNK_SIZE), help="Rows per stop_times chunk in --stream mode")
     p_validate.set_defaults(func=cmd_validate)
 
     p_synth = sub.add_parser("synth_avl", help="Generate synthetic AVL CSV")
     p_synth.add_argument("--gtfs", required=True, help="Path to GTFS zip")
-    p_synth.add_argument("--out", required=True, help="Path to write synthetic_avl.csv")
+    p_synth.add_argument("--out", required=True, help="Path to write synthetic_avl.csv (or .parquet)")
+    p_synth.add_argument("--format", choices=["csv", "parquet"], default=None, help="Output format (default: from --out's suffix); parquet needs the arrow extra")
     p_synth.add_argument("--params", required=False, help="Path to synthetic params JSON")
+    p_synth.add_argument("--ping-interval", default=None, help="Emit a ping every N seconds along each trip's shape (or between stops) instead of one per stop")
+    p_synth.add_argument("--csv-engine", choices=["pandas", "pyarrow"], default="pandas", help="CSV backend for reading the GTFS zip")
     p_synth.set_defaults(func=cmd_synth_avl)
 
+    p_ingest = sub.add_parser("ingest_avl", help="Map-match AVL pings to stops and write observed edge travel times")
+    p_ingest.add_argument("--gtfs", required=True, help="Path to GTFS zip")
+    p_ingest.add_argument("--avl", required=True, help="AVL CSV or Parquet with trip_id, timestamp_iso, lat, lon, vehicle_id")
+    p_ingest.add_argument("--out", required=True, help="Path to write edge_travel_times.csv")
+    p_ingest.add_argument("--match-radius", default=str(MATCH_RADIUS_M), help="Pings farther than this (metres) from every stop are dropped")
+    p_ingest.add_argument("--band", default=str(DEFAULT_BAND_S), help="Time-of-day band width (seconds) for the per-band percentiles")
+    p_ingest.add_argument("--min-obs", default=str(MIN_OBSERVATIONS), help="Observations an edge needs before its travel time is replaced")
+    p_ingest.add_argument("--csv-engine", choices=["pandas", "pyarrow"], default="pandas", help="CSV backend for reading the GTFS zip")
+    p_ingest.set_defaults(func=cmd_ingest_avl)
+
     p_viz = sub.add_parser("visualize", help="Create a before/after map HTML")
     p_viz.add_argument("--before", required=True, help="Path to baseline json")
     p_viz.add_argument("--after", required=True, help="Path to optimized json")
@@ -318,6 +538,18 @@ def build_parser() -> argparse.ArgumentParser:
     p_run.add_argument("--sample-size", default="5000", help="Sampling size for evaluator")
     p_run.add_argument("--seed", default=None, help="Random seed")
     p_run.add_argument("--max_iters", default="500", help="Max iterations for local search")
+    p_run.add_argument("--csv-engine", choices=["pandas", "pyarrow"], default="pandas", help="CSV backend for reading the GTFS zip")
+    p_run.add_argument("--stream", action="store_true", help="Stream stop_times.txt in trip-aligned chunks (bounded memory)")
+    p_run.add_argument("--chunk-size", default=str(DEFAULT_CHUNK_SIZE), help="Rows per stop_times chunk in --stream mode")
+    p_run.add_argument("--no-cache", action="store_true", help="Do not read or write the canonical table/graph cache")
+    p_run.add_argument("--cache-dir", help="Cache directory (default: $URBANFLOW_CACHE_DIR or ~/.cache/urbanflow)")
+    p_run.add_argument("--graph-backend", choices=list(GRAPH_BACKENDS), default="networkx", help="Graph representation used by the optimizer")
+    p_run.add_argument("--workers", default="1", help="Independent local-search starts run in parallel processes; the best is kept")
+    p_run.add_argument("--search", choices=list(SEARCHES), default="hill", help="hill: stop-drop hill climb; annealing/tabu: metaheuristic over the full move library")
+    p_run.add_argument("--headways", action="store_true", help="Re-timetable every route at headways allocated per time band under the fleet budget (writes headways.csv)")
+    p_run.add_argument("--zone-cell-m", default=None, help="Evaluate at zone resolution: passengers grouped by grid cells of this size (metres) and departure hour")
+    p_run.add_argument("--coverage-points", default=None, help="CSV of lat, lon and population (or weight) points for coverage_ratio; defaults to demand at the stops")
+    p_run.add_argument("--avl", default=None, help="AVL CSV or Parquet (as written by synth_avl); edge travel times are calibrated to the observed medians before evaluation")
     p_run.set_defaults(func=cmd_run)
 
     p_pipe = sub.add_parser("pipeline", help="One-shot pipeline: validate + run + KPI deltas")
@@ -330,8 +562,54 @@ def build_parser() -> argparse.ArgumentParser:
     p_pipe.add_argument("--sample-size", default="1000", help="Sampling size for evaluator")
     p_pipe.add_argument("--seed", default="42", help="Random seed")
     p_pipe.add_argument("--max_iters", default="200", help="Max iterations for local search")
+    p_pipe.add_argument("--csv-engine", choices=["pandas", "pyarrow"], default="pandas", help="CSV backend for reading the GTFS zip")
+    p_pipe.add_argument("--stream", action="store_true", help="Stream stop_times.txt in trip-aligned chunks (bounded memory)")
+    p_pipe.add_argument("--chunk-size", default=str(DEFAULT_CHUNK_SIZE), help="Rows per stop_times chunk in --stream mode")
+    p_pipe.add_argument("--no-cache", action="store_true", help="Do not read or write the canonical table/graph cache")
+    p_pipe.add_argument("--cache-dir", help="Cache directory (default: $URBANFLOW_CACHE_DIR or ~/.cache/urbanflow)")
+    p_pipe.add_argument("--graph-backend", choices=list(GRAPH_BACKENDS), default="networkx", help="Graph representation used by the optimizer")
+    p_pipe.add_argument("--workers", default="1", help="Independent local-search starts run in parallel processes; the best is kept")
+    p_pipe.add_argument("--search", choices=list(SEARCHES), default="hill", help="hill: stop-drop hill climb; annealing/tabu: metaheuristic over the full move library")
+    p_pipe.add_argument("--headways", action="store_true", help="Re-timetable every route at headways allocated per time band under the fleet budget (writes headways.csv)")
+    p_pipe.add_argument("--zone-cell-m", default=None, help="Evaluate at zone resolution: passengers grouped by grid cells of this size (metres) and departure hour")
+    p_pipe.add_argument("--coverage-points", default=None, help="CSV of lat, lon and population (or weight) points for coverage_ratio; defaults to demand at the stops")
+    p_pipe.add_argument("--avl", default=None, help="AVL CSV or Parquet (as written by synth_avl); edge travel times are calibrated to the observed medians before evaluation")
     p_pipe.set_defaults(func=cmd_pipeline)
 
+    p_sweep = sub.add_parser("sweep", help="Optimize a grid of constraint/objective variants on one loaded feed; writes a KPI table and its Pareto front")
+    p_sweep.add_argument("--gtfs", required=True, help="Path to GTFS zip")
+    p_sweep.add_argument("--variants", required=True, help='Path to sweep JSON: {"grid": {"constraints.fleet_size": [30, 40], ...}, "variants": [{"name": ..., "objective.weights.coverage_ratio": 0.5}]}')
+    p_sweep.add_argument("--constraints", help="Path to base constraints JSON (defaults will be generated if omitted)")
+    p_sweep.add_argument("--objective", help="Path to base objective JSON (defaults will be generated if omitted)")
+    p_sweep.add_argument("--outdir", required=True, help="Output directory")
+    p_sweep.add_argument("--sample-size", default="1000", help="Sampling size for evaluator (one sample shared by every variant)")
+    p_sweep.add_argument("--seed", default="42", help="Random seed")
+    p_sweep.add_argument("--max_iters", default="200", help="Max iterations for local search per variant")
+    p_sweep.add_argument("--workers", default="1", help="Variants run in parallel processes sharing one memory-mapped graph")
+    p_sweep.add_argument("--search", choices=list(SEARCHES), default="hill", help="hill: stop-drop hill climb; annealing/tabu: metaheuristic over the full move library")
+    p_sweep.add_argument("--headways", action="store_true", help="Re-timetable every route at headways allocated per time band under each variant's fleet budget")
+    p_sweep.add_argument("--csv-engine", choices=["pandas", "pyarrow"], default="pandas", help="CSV backend for reading the GTFS zip")
+    p_sweep.add_argument("--stream", action="store_true", help="Stream stop_times.txt in trip-aligned chunks (bounded memory)")
+    p_sweep.add_argument("--chunk-size", default=str(DEFAULT_CHUNK_SIZE), help="Rows per stop_times chunk in --stream mode")
+    p_sweep.add_argument("--no-cache", action="store_true", help="Do not read or write the canonical table/graph cache")
+    p_sweep.add_argument("--cache-dir", help="Cache directory (default: $URBANFLOW_CACHE_DIR or ~/.cache/urbanflow)")
+    p_sweep.add_argument("--graph-backend", choices=list(GRAPH_BACKENDS), default="networkx", help="Graph representation used by the optimizer")
+    p_sweep.add_argument("--zone-cell-m", default=None, help="Evaluate at zone resolution: passengers grouped by grid cells of this size (metres) and departure hour")
+    p_sweep.add_argument("--coverage-points", default=None, help="CSV of lat, lon and population (or weight) points for coverage_ratio; defaults to demand at the stops")
+    p_sweep.add_argument("--avl", default=None, help="AVL CSV or Parquet; edge travel times are calibrated to the observed medians once, before every variant")
+    p_sweep.set_defaults(func=cmd_sweep)
+
+    p_cache = sub.add_parser("cache", help="Inspect or prune the canonical table/graph cache")
+    cache_sub = p_cache.add_subparsers(dest="cache_command", required=True)
+    p_cache_ls = cache_sub.add_parser("ls", help="List cache entries, most recently used first")
+    p_cache_ls.add_argument("--cache-dir", help="Cache directory (default: $URBANFLOW_CACHE_DIR or ~/.cache/urbanflow)")
+    p_cache_ls.set_defaults(func=cmd_cache_ls)
+    p_cache_prune = cache_sub.add_parser("prune", help="Evict least recently used entries down to a size budget")
+    p_cache_prune.add_argument("--cache-dir", help="Cache directory (default: $URBANFLOW_CACHE_DIR or ~/.cache/urbanflow)")
+    p_cache_prune.add_argument("--max-bytes", default=str(DEFAULT_MAX_BYTES), help="Size budget to prune down to")
+    p_cache_prune.add_argument("--all", action="store_true", help="Remove every entry")
+    p_cache_prune.set_defaults(func=cmd_cache_prune)
+
     return parser
 
 
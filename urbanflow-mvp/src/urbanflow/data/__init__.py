@@ -1,3 +1,3 @@
-__all__ = ["synthetic_avl", "od_generator"]
+__all__ = ["synthetic_avl", "od_generator", "avl_ingest"]
 
 
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterator, Sequence, Tuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from ..graph.build_graph import project_xy
+from ..gtfs.times import DEFAULT_BAND_S, SECONDS_PER_DAY
+from .synthetic_avl import AVL_CHUNK_ROWS, AVL_COLUMNS
+
+
+# a ping within this distance of a stop counts as being at the stop
+MATCH_RADIUS_M = 50.0
+# relative accuracy of the travel-time quantile sketches
+SKETCH_ALPHA = 0.01
+EDGE_TIME_COLUMNS = ["u", "v", "band_start_s", "count", "p50", "p90"]
+
+
+class QuantileSketch:
+    """Mergeable log-bucket histograms per integer key (DDSketch-style).
+
+    A positive value ``x`` lands in bucket ``ceil(log_gamma(x))`` with
+    ``gamma = (1 + alpha) / (1 - alpha)``, so any quantile is recovered to
+    within relative error ``alpha`` from bucket counts alone. Counts are kept
+    as sorted ``key * MAX_BUCKETS + bucket`` codes; adding a batch sorts and
+    sums it into them, so memory is bounded by the occupied buckets rather
+    than the number of values.
+    """
+
+    # bucket indices per key; enough for alpha down to ~1e-5 on values up to a day in seconds
+    MAX_BUCKETS = 1 << 20
+
+    def __init__(self, alpha: float = SKETCH_ALPHA) -> None:
+        self.alpha = float(alpha)
+        self.gamma = (1 + self.alpha) / (1 - self.alpha)
+        self.codes = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def _reduce(self, codes: np.ndarray, counts: np.ndarray) -> None:
+        order = np.argsort(codes, kind="stable")
+        codes, counts = codes[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=np.int64)
+        self.codes = codes[starts]
+        self.counts = np.add.reduceat(counts, starts) if len(starts) else np.empty(0, dtype=np.int64)
+
+    def add(self, keys: np.ndarray, values: np.ndarray) -> None:
+        """Record ``values`` (> 0; others are ignored) under integer ``keys`` >= 0."""
+        values = np.asarray(values, dtype=np.float64)
+        ok = values > 0
+        bucket = np.clip(np.ceil(np.log(values[ok]) / np.log(self.gamma)), 0, self.MAX_BUCKETS - 1).astype(np.int64)
+        codes = np.asarray(keys, dtype=np.int64)[ok] * self.MAX_BUCKETS + bucket
+        self._reduce(np.r_[self.codes, codes], np.r_[self.counts, np.ones(len(codes), dtype=np.int64)])
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self._reduce(np.r_[self.codes, other.codes], np.r_[self.counts, other.counts])
+
+    def regroup(self, divisor: int) -> "QuantileSketch":
+        """Sketch of keys ``key // divisor`` (e.g. dropping a time band from the key)."""
+        out = QuantileSketch(self.alpha)
+        key, bucket = np.divmod(self.codes, self.MAX_BUCKETS)
+        out._reduce((key // int(divisor)) * self.MAX_BUCKETS + bucket, self.counts)
+        return out
+
+    def quantiles(self, qs: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(keys, counts per key, ``(keys, len(qs))`` quantile estimates)."""
+        key, bucket = np.divmod(self.codes, self.MAX_BUCKETS)
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.empty(0, dtype=np.int64)
+        cum = np.cumsum(self.counts)
+        before = np.r_[0, cum][starts]
+        n = np.add.reduceat(self.counts, starts) if len(starts) else np.empty(0, dtype=np.int64)
+        value = 2 * self.gamma ** bucket / (self.gamma + 1)
+        out = np.empty((len(starts), len(qs)))
+        for j, q in enumerate(qs):
+            rank = before + np.maximum(np.ceil(q * n), 1)
+            out[:, j] = value[np.searchsorted(cum, rank, side="left")]
+        return key[starts], n, out
+
+
+def iter_avl_file(path: Path, chunk_rows: int = AVL_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """AVL rows (``AVL_COLUMNS``) from CSV or Parquet, ``chunk_rows`` at a time."""
+    path = Path(path)
+    if path.suffix.lower() in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=int(chunk_rows), columns=AVL_COLUMNS):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(
+        path,
+        usecols=AVL_COLUMNS,
+        dtype={"trip_id": str, "timestamp_iso": str, "lat": "float64", "lon": "float64", "vehicle_id": str},
+        chunksize=int(chunk_rows),
+    )
+
+
+@dataclass
+class AVLObservations:
+    """Observed stop-to-stop travel times.
+
+    ``by_band`` has one row per (edge, time band) and ``by_edge`` one per
+    edge (``band_start_s`` -1), with observation counts and sketched
+    median / 90th percentile seconds.
+    """
+
+    by_band: pd.DataFrame
+    by_edge: pd.DataFrame
+    pings: int
+    matched: int
+
+
+def _visits(trip: np.ndarray, stop: np.ndarray, t0: np.ndarray, t1: np.ndarray) -> Tuple[np.ndarray, ...]:
+    # consecutive rows of one trip at one stop merge into a visit (first arrival, last departure)
+    new = np.r_[True, (trip[1:] != trip[:-1]) | (stop[1:] != stop[:-1])] if len(trip) else np.empty(0, dtype=bool)
+    starts = np.flatnonzero(new)
+    t1 = np.maximum.reduceat(t1, starts) if len(starts) else t1
+    return trip[starts], stop[starts], t0[starts], t1
+
+
+def ingest_avl(
+    path: Path,
+    canonical: Dict[str, pd.DataFrame],
+    match_radius_m: float = MATCH_RADIUS_M,
+    band_s: int = DEFAULT_BAND_S,
+    chunk_rows: int = AVL_CHUNK_ROWS,
+    alpha: float = SKETCH_ALPHA,
+) -> AVLObservations:
+    """Stream an AVL file and sketch observed travel times per stop-to-stop edge.
+
+    Each chunk's pings are matched to the nearest stop within
+    ``match_radius_m`` (one ``cKDTree`` query); unmatched pings are dropped.
+    A trip's matched pings, in time order, collapse into stop visits, and
+    consecutive visits ``u -> v`` give an observation ``first ping at v -
+    last ping at u`` in the time band of the departure (time of day of the
+    UTC timestamp). Each trip's last visit carries over to the next chunk,
+    so a trip may span chunks as long as its pings are in time order.
+    """
+    stops = canonical["stops"].drop_duplicates("stop_id", keep="first").dropna(subset=["lat", "lon"])
+    stop_ids = stops["stop_id"].astype(str).to_numpy(dtype=object)
+    n_stops = len(stop_ids)
+    lat = stops["lat"].to_numpy(dtype=np.float64)
+    lon = stops["lon"].to_numpy(dtype=np.float64)
+    lat0 = float(lat.mean()) if n_stops else 0.0
+    tree = cKDTree(project_xy(lat, lon, lat0)) if n_stops else None
+    n_bands = max(1, -(-SECONDS_PER_DAY // int(band_s)))
+    sketch = QuantileSketch(alpha)
+    carry = pd.DataFrame({"trip_id": pd.Series(dtype=object), "stop": np.empty(0, dtype=np.int64),
+                          "t0": np.empty(0, dtype=np.int64), "t1": np.empty(0, dtype=np.int64)})
+    pings = matched = 0
+    for chunk in iter_avl_file(path, chunk_rows):
+        pings += len(chunk)
+        if tree is None or chunk.empty:
+            continue
+        ping_xy = project_xy(chunk["lat"].to_numpy(dtype=np.float64), chunk["lon"].to_numpy(dtype=np.float64), lat0)
+        _, stop = tree.query(ping_xy, distance_upper_bound=float(match_radius_m))
+        ts = pd.to_datetime(chunk["timestamp_iso"], format="ISO8601", utc=True).to_numpy(dtype="datetime64[s]").astype(np.int64)
+        keep = (stop < n_stops) & chunk["trip_id"].notna().to_numpy()
+        matched += int(keep.sum())
+        rows = pd.DataFrame({"trip_id": chunk["trip_id"].to_numpy(dtype=object)[keep], "stop": stop[keep],
+                             "t0": ts[keep], "t1": ts[keep]})
+        # carried visits first: they precede this chunk's pings of the same trip
+        rows = pd.concat([carry, rows], ignore_index=True)
+        codes, trips = pd.factorize(rows["trip_id"])
+        order = np.lexsort((rows["t0"].to_numpy(), codes))
+        trip, stop_v, t0, t1 = _visits(codes[order], rows["stop"].to_numpy()[order], rows["t0"].to_numpy()[order],
+                                       rows["t1"].to_numpy()[order])
+        same = trip[1:] == trip[:-1]
+        u, v = stop_v[:-1][same], stop_v[1:][same]
+        depart = t1[:-1][same]
+        travel = t0[1:][same] - depart
+        band = (depart % SECONDS_PER_DAY) // int(band_s)
+        sketch.add((u * n_stops + v) * n_bands + band, travel)
+        last = np.r_[~same, True] if len(trip) else np.empty(0, dtype=bool)
+        carry = pd.DataFrame({"trip_id": np.asarray(trips, dtype=object)[trip[last]], "stop": stop_v[last],
+                              "t0": t0[last], "t1": t1[last]})
+
+    def frame(sk: QuantileSketch, banded: bool) -> pd.DataFrame:
+        key, count, q = sk.quantiles([0.5, 0.9])
+        edge, band = (np.divmod(key, n_bands) if banded else (key, np.full(len(key), -1)))
+        u, v = np.divmod(edge, max(n_stops, 1))
+        return pd.DataFrame({
+            "u": stop_ids[u], "v": stop_ids[v],
+            "band_start_s": np.where(band >= 0, band * int(band_s), -1),
+            "count": count, "p50": q[:, 0], "p90": q[:, 1],
+        }, columns=EDGE_TIME_COLUMNS)
+
+    return AVLObservations(frame(sketch, True), frame(sketch.regroup(n_bands), False), pings, matched)
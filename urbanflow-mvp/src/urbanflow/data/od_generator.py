@@ -1,26 +1,177 @@
 from __future__ import annotations
 
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Union
 import numpy as np
 import pandas as pd
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.spatial import cKDTree
 
+from ..graph.build_graph import haversine_m, project_xy
 
-def generate_synthetic_demand(canonical: Dict[str, pd.DataFrame], seed: int | None = None) -> pd.DataFrame:
+
+# long-format demand: one row per origin/destination pair with nonzero trips
+DEMAND_COLUMNS = ["origin", "destination", "trips"]
+# destinations per origin considered by the gravity model (nearest stops)
+GRAVITY_DESTINATIONS = 64
+# distance decay of the gravity model: exp(-d / GRAVITY_SCALE_M)
+GRAVITY_SCALE_M = 3000.0
+TRIPS_PER_STOP = 10.0
+
+Demand = Union[pd.DataFrame, csr_matrix]
+
+
+def _stop_ids(canonical: Dict[str, pd.DataFrame]) -> pd.Index:
+    return pd.Index(canonical["stops"]["stop_id"].astype(str)).drop_duplicates()
+
+
+def _long(origin: np.ndarray, dest: np.ndarray, trips: np.ndarray, stop_ids: pd.Index, total: float) -> pd.DataFrame:
+    keep = trips > 0
+    trips = trips[keep]
+    if trips.size and trips.sum() > 0:
+        trips = trips * (total / trips.sum())
+    # stop IDs as categoricals over the sorted IDs: int32 codes per row instead of object pointers
+    categories = np.sort(stop_ids.to_numpy().astype(str))
+    code = np.empty(len(stop_ids), dtype=np.int32)
+    code[np.argsort(stop_ids.to_numpy().astype(str), kind="stable")] = np.arange(len(stop_ids), dtype=np.int32)
+    return pd.DataFrame({
+        "origin": pd.Categorical.from_codes(code[origin[keep]], categories=categories),
+        "destination": pd.Categorical.from_codes(code[dest[keep]], categories=categories),
+        "trips": trips,
+    }, columns=DEMAND_COLUMNS)
+
+
+def generate_synthetic_demand(
+    canonical: Dict[str, pd.DataFrame],
+    seed: int | None = None,
+    density: float = 0.1,
+    total: Optional[float] = None,
+) -> pd.DataFrame:
+    """Random long-format OD demand over about ``density`` of all stop pairs.
+
+    Pairs are drawn directly (duplicates merged), so memory scales with the
+    number of nonzero pairs rather than stops squared. Trips are uniform
+    random weights scaled to ``total`` (``TRIPS_PER_STOP`` per stop by default).
+    """
     rng = np.random.default_rng(seed)
-    stops = canonical["stops"]
-    n = len(stops)
-    # simple origin weight proportional to 1, destination proportional to 1,
-    # then reduce diagonal to avoid self-travel
-    base = rng.random((n, n))
-    np.fill_diagonal(base, 0.0)
-    # sparsify
-    mask = rng.random((n, n)) < 0.1
-    od = base * mask
-    # normalize to daily total demand ~ n*10
-    total = od.sum()
-    if total > 0:
-        od = od * (n * 10.0 / total)
-    df = pd.DataFrame(od, index=stops["stop_id"], columns=stops["stop_id"])
-    return df
+    stop_ids = _stop_ids(canonical)
+    n = len(stop_ids)
+    total = float(total) if total is not None else n * TRIPS_PER_STOP
+    if n < 2:
+        return pd.DataFrame(columns=DEMAND_COLUMNS)
+    k = int(rng.binomial(n * (n - 1), min(max(float(density), 0.0), 1.0)))
+    origin = rng.integers(0, n, size=k)
+    # any stop but the origin
+    dest = rng.integers(0, n - 1, size=k)
+    dest += dest >= origin
+    codes = np.sort(origin.astype(np.int64) * n + dest)
+    codes = codes[np.r_[True, codes[1:] != codes[:-1]]]
+    return _long(codes // n, codes % n, rng.random(codes.size), stop_ids, total)
+
+
+def stop_activity(canonical: Dict[str, pd.DataFrame]) -> np.ndarray:
+    """Scheduled stop events per stop (1 for stops without service), a trip-end weight."""
+    stop_ids = _stop_ids(canonical)
+    st = canonical.get("stop_times")
+    counts = np.zeros(len(stop_ids))
+    if st is not None and not st.empty:
+        codes = stop_ids.get_indexer(st["stop_id"].astype(str))
+        counts = np.bincount(codes[codes >= 0], minlength=len(stop_ids)).astype(np.float64)
+    return np.maximum(counts, 1.0)
 
 
+def generate_gravity_demand(
+    canonical: Dict[str, pd.DataFrame],
+    total: Optional[float] = None,
+    destinations: int = GRAVITY_DESTINATIONS,
+    scale_m: float = GRAVITY_SCALE_M,
+    weights: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """Gravity-model OD demand: trips(i, j) ~ w_i * w_j * exp(-d_ij / scale_m).
+
+    ``weights`` default to ``stop_activity``. Each origin is paired with its
+    ``destinations`` nearest stops (a KD-tree query), so the table has at
+    most n * ``destinations`` rows; great-circle distances are computed for
+    those pairs only, as arrays.
+    """
+    stop_ids = _stop_ids(canonical)
+    n = len(stop_ids)
+    total = float(total) if total is not None else n * TRIPS_PER_STOP
+    if n < 2:
+        return pd.DataFrame(columns=DEMAND_COLUMNS)
+    stops = canonical["stops"].drop_duplicates("stop_id").set_index(canonical["stops"]["stop_id"].drop_duplicates().astype(str))
+    lat = stops.loc[stop_ids, "lat"].to_numpy(dtype=np.float64)
+    lon = stops.loc[stop_ids, "lon"].to_numpy(dtype=np.float64)
+    w = stop_activity(canonical) if weights is None else np.asarray(weights, dtype=np.float64)
+    # equirectangular metres to find neighbours; haversine for the decay
+    xy = project_xy(lat, lon, lat.mean())
+    k = min(int(destinations) + 1, n)
+    _, nn = cKDTree(xy).query(xy, k=k)
+    origin = np.repeat(np.arange(n), k)
+    dest = nn.reshape(-1)
+    keep = dest != origin
+    origin, dest = origin[keep], dest[keep]
+    d = haversine_m(lat[origin], lon[origin], lat[dest], lon[dest])
+    return _long(origin, dest, w[origin] * w[dest] * np.exp(-d / float(scale_m)), stop_ids, total)
+
+
+def demand_long(demand: Demand, stop_ids: Optional[pd.Index] = None) -> pd.DataFrame:
+    """Long-format (origin, destination, trips) view of a long table, a dense
+    origin x destination DataFrame or a sparse matrix over ``stop_ids``."""
+    if isinstance(demand, pd.DataFrame) and set(DEMAND_COLUMNS) <= set(demand.columns):
+        out = demand[DEMAND_COLUMNS]
+    elif isinstance(demand, pd.DataFrame):
+        coo = coo_matrix(demand.to_numpy(dtype=np.float64))
+        out = pd.DataFrame({
+            "origin": np.asarray(demand.index.astype(str), dtype=object)[coo.row],
+            "destination": np.asarray(demand.columns.astype(str), dtype=object)[coo.col],
+            "trips": coo.data,
+        })
+    else:
+        if stop_ids is None:
+            raise ValueError("stop_ids are required to label a sparse demand matrix")
+        coo = coo_matrix(demand)
+        ids = np.asarray(stop_ids, dtype=object)
+        out = pd.DataFrame({"origin": ids[coo.row], "destination": ids[coo.col], "trips": coo.data})
+    return out[out["trips"] > 0].reset_index(drop=True)
+
+
+def to_sparse(demand: Demand, stop_ids: pd.Index) -> csr_matrix:
+    """Stop x stop CSR matrix of ``demand`` with rows/columns in ``stop_ids`` order
+    (duplicate pairs summed, unknown stops dropped)."""
+    od = demand_long(demand, stop_ids)
+    o = stop_ids.get_indexer(od["origin"].astype(str))
+    d = stop_ids.get_indexer(od["destination"].astype(str))
+    keep = (o >= 0) & (d >= 0)
+    n = len(stop_ids)
+    return coo_matrix((od["trips"].to_numpy(dtype=np.float64)[keep], (o[keep], d[keep])), shape=(n, n)).tocsr()
+
+
+def aggregate_to_zones(
+    demand: Demand,
+    zones: Union[pd.Series, Dict[str, Any]],
+    stop_ids: Optional[pd.Index] = None,
+) -> pd.DataFrame:
+    """Sum demand by (origin zone, destination zone); ``zones`` maps stop_id to zone.
+
+    Stops without a zone keep their own ID as zone. Returns a long table with
+    ``origin_zone``, ``destination_zone`` and ``trips``.
+    """
+    od = demand_long(demand, stop_ids)
+    zones = pd.Series(zones)
+    zones.index = zones.index.astype(str)
+    zones = zones[~zones.index.duplicated(keep="last")].dropna().astype(str)
+    o = od["origin"].astype(str)
+    d = od["destination"].astype(str)
+    out = pd.DataFrame({
+        "origin_zone": o.map(zones).fillna(o),
+        "destination_zone": d.map(zones).fillna(d),
+        "trips": od["trips"].to_numpy(),
+    })
+    return out.groupby(["origin_zone", "destination_zone"], sort=True, as_index=False)["trips"].sum()
+
+
+def stop_zones(canonical: Dict[str, pd.DataFrame]) -> pd.Series:
+    """The stops table's ``zone_id`` by stop_id."""
+    stops = canonical["stops"]
+    return pd.Series(stops["zone_id"].to_numpy(), index=stops["stop_id"].astype(str).to_numpy())
+
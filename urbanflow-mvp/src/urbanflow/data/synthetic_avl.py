@@ -1,51 +1,263 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Any, Dict, Iterator, Optional, Tuple
 from pathlib import Path
-import math
-import random
-import csv
 import time
+import zlib
 
+import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
 
+from ..graph.build_graph import haversine_m, project_xy
 
-def synthesize_avl(canonical: Dict[str, pd.DataFrame], out_csv: Path, params: Dict[str, Any]) -> None:
-    rng = random.Random(int(params.get("seed", 42)))
+
+AVL_COLUMNS = ["trip_id", "timestamp_iso", "lat", "lon", "vehicle_id"]
+AVL_FORMATS = ("csv", "parquet")
+# output rows generated and written at a time (whole trips, so chunks run slightly over)
+AVL_CHUNK_ROWS = 1_000_000
+VEHICLE_POOL = 1000
+# offset separating trips (s) or shapes (m) when their values are searched as one sorted array;
+# longer than any trip or shape
+_SPAN = 1e8
+
+
+def vehicle_ids(trip_ids: np.ndarray, pool: int = VEHICLE_POOL) -> np.ndarray:
+    """``veh_<crc32(trip_id) % pool>``: the same vehicle for a trip in every run (unlike ``hash``)."""
+    return np.array([f"veh_{zlib.crc32(str(t).encode('utf-8')) % pool}" for t in trip_ids.tolist()], dtype=object)
+
+
+def _codes(values: pd.Series, index: pd.Index) -> np.ndarray:
+    # position in ``index`` per row (-1 if absent); categoricals are looked up once per category
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = np.r_[index.get_indexer(values.cat.categories.astype(str)), -1]
+        return lookup[values.cat.codes.to_numpy()]
+    return index.get_indexer(values.astype(str))
+
+
+def _trip_order(stop_times: pd.DataFrame) -> tuple:
+    # trip codes over the sorted trip IDs and a row order grouping trips in stop_sequence order;
+    # canonical stop_times usually already are, which saves sorting a full-feed index
+    trip = stop_times["trip_id"]
+    ids = trip.cat.categories if isinstance(trip.dtype, pd.CategoricalDtype) else trip.dropna().unique()
+    trip_ids = pd.Index(ids).astype(str).unique().sort_values()
+    codes = _codes(trip, trip_ids)
+    seq = stop_times["stop_sequence"].to_numpy(dtype=np.int64)
+    step_trip = np.diff(codes)
+    if (step_trip >= 0).all() and ((step_trip > 0) | (np.diff(seq) > 0)).all():
+        return codes, trip_ids.to_numpy(dtype=object), None
+    return codes, trip_ids.to_numpy(dtype=object), np.lexsort((seq, codes))
+
+
+class _ShapePaths:
+    """Shape polylines as flat arrays: cumulative metres per point and a k-d tree for snapping stops.
+
+    Points of all shapes sit in one tree, with the shape code as a third
+    coordinate ``_SPAN`` metres apart, so a query never leaves its shape.
+    """
+
+    def __init__(self, shapes: Optional[pd.DataFrame], lat0: float) -> None:
+        shapes = shapes if shapes is not None else pd.DataFrame(columns=["shape_id", "lat", "lon"])
+        codes, ids = pd.factorize(shapes["shape_id"].astype(str), sort=True)
+        order = np.argsort(codes, kind="stable")
+        self.code = codes[order].astype(np.int64)
+        self.lat = shapes["lat"].to_numpy(dtype=np.float64)[order]
+        self.lon = shapes["lon"].to_numpy(dtype=np.float64)[order]
+        n = np.bincount(self.code, minlength=len(ids))
+        self.ptr = np.r_[0, np.cumsum(n)]
+        self.ids = pd.Index(np.asarray(ids, dtype=object))
+        # shapes need two points to be a path
+        self.usable = n >= 2
+        seg = np.r_[0.0, haversine_m(self.lat[:-1], self.lon[:-1], self.lat[1:], self.lon[1:])] if len(self.lat) else np.empty(0)
+        seg[self.ptr[:-1][n > 0]] = 0.0
+        cum = np.cumsum(seg)
+        self.cum = cum - np.repeat(cum[self.ptr[:-1][n > 0]], n[n > 0])
+        self.lat0 = lat0
+        xy = project_xy(self.lat, self.lon, lat0)
+        self.tree = cKDTree(np.column_stack([xy, self.code * _SPAN])) if len(self.lat) else None
+        self.key = self.code * _SPAN + self.cum
+
+    def shape_codes(self, trips: pd.DataFrame, trip_ids: np.ndarray) -> np.ndarray:
+        """Shape code per trip (-1 without a usable shape)."""
+        if "shape_id" not in trips.columns or self.tree is None:
+            return np.full(len(trip_ids), -1, dtype=np.int64)
+        trips = trips.drop_duplicates("trip_id", keep="last")
+        shape_of = pd.Series(trips["shape_id"].to_numpy(), index=trips["trip_id"].astype(str).to_numpy()).reindex(trip_ids)
+        codes = self.ids.get_indexer(shape_of.dropna().astype(str).reindex(shape_of.index))
+        return np.where((codes >= 0) & self.usable[np.maximum(codes, 0)], codes, -1)
+
+    def snap(self, shape: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Metres along ``shape`` of the point nearest each (lat, lon)."""
+        _, v = self.tree.query(np.column_stack([project_xy(lat, lon, self.lat0), shape * _SPAN]))
+        return self.cum[v]
+
+    def locate(self, shape: np.ndarray, dist: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(lat, lon) ``dist`` metres along ``shape``."""
+        v = np.searchsorted(self.key, shape * _SPAN + dist, side="right") - 1
+        v = np.clip(v, self.ptr[shape], self.ptr[shape + 1] - 2)
+        length = self.cum[v + 1] - self.cum[v]
+        f = np.clip(np.where(length > 0, (dist - self.cum[v]) / np.where(length > 0, length, 1.0), 0.0), 0.0, 1.0)
+        return self.lat[v] + f * (self.lat[v + 1] - self.lat[v]), self.lon[v] + f * (self.lon[v + 1] - self.lon[v])
+
+
+def _interpolated_pings(
+    trip: np.ndarray,
+    t: np.ndarray,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    shape: np.ndarray,
+    phase: np.ndarray,
+    interval: float,
+    paths: _ShapePaths,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Pings every ``interval`` s between the stop events of whole trips (rows grouped by trip).
+
+    Returns (trip code, time, lat, lon) per ping. All trips are handled at
+    once: events and pings are keyed ``trip * _SPAN + time`` so one
+    ``searchsorted`` finds each ping's segment. Trips with a shape move along
+    it (stops snapped to their nearest shape point); the rest along straight
+    stop-to-stop segments.
+    """
+    first = np.r_[True, trip[1:] != trip[:-1]]
+    local = np.cumsum(first) - 1
+    start = np.flatnonzero(first)
+    end = np.r_[start[1:], len(trip)] - 1
+    # vehicles never go back in time or along their shape
+    t = pd.Series(t).groupby(local).cummax().to_numpy()
+    tr = trip[start]
+    count = np.maximum(np.floor((t[end] - t[start] - phase[tr]) / interval).astype(np.int64) + 1, 0)
+    ping = np.repeat(np.arange(len(start)), count)
+    step = np.arange(len(ping)) - np.repeat(np.cumsum(count) - count, count)
+    pt = t[start][ping] + phase[tr][ping] + step * interval
+    i = np.searchsorted(t + local * _SPAN, ping * _SPAN + pt, side="right") - 1
+    i = np.clip(i, start[ping], np.maximum(end[ping] - 1, start[ping]))
+    k = np.minimum(i + 1, end[ping])
+    dt = t[k] - t[i]
+    f = np.clip(np.where(dt > 0, (pt - t[i]) / np.where(dt > 0, dt, 1.0), 0.0), 0.0, 1.0)
+    p_lat = lat[i] + f * (lat[k] - lat[i])
+    p_lon = lon[i] + f * (lon[k] - lon[i])
+    s = shape[tr][ping]
+    on_shape = s >= 0
+    if on_shape.any():
+        ev = shape[trip] >= 0
+        dist = np.zeros(len(trip))
+        dist[ev] = paths.snap(shape[trip][ev], lat[ev], lon[ev])
+        dist = pd.Series(dist).groupby(local).cummax().to_numpy()
+        d = dist[i] + f * (dist[k] - dist[i])
+        p_lat[on_shape], p_lon[on_shape] = paths.locate(s[on_shape], d[on_shape])
+    return tr[ping], pt, p_lat, p_lon
+
+
+def iter_avl_chunks(
+    canonical: Dict[str, pd.DataFrame],
+    params: Dict[str, Any],
+    chunk_rows: int = AVL_CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Synthetic AVL pings in trip-aligned chunks of about ``chunk_rows``.
+
+    Each trip is late by ``N(0, delay_std)`` with probability
+    ``percent_of_trips_delayed``, and every stop adds an exponential dwell of
+    mean ``mean_dwell`` (NumPy ``Generator`` draws per trip / per chunk, so
+    output is deterministic for a seed and chunk size). By default there is
+    one ping per stop event, at the stop. With ``ping_interval_s`` pings come
+    every that many seconds (from a random per-trip phase), interpolated
+    along the trip's shape or between its stops. Stop events at unknown
+    stops (or without a trip) are skipped. Timestamps are seconds after
+    ``epoch`` (default: now), formatted as ISO 8601 in one call per chunk.
+    """
+    rng = np.random.default_rng(int(params.get("seed", 42)))
     mean_dwell = float(params.get("mean_dwell", 20.0))  # seconds
     delay_std = float(params.get("delay_std", 30.0))    # seconds
     delayed_frac = float(params.get("percent_of_trips_delayed", 0.2))
+    epoch = int(params.get("epoch", time.time()))
+    interval = float(params.get("ping_interval_s") or 0.0)
+
+    stops = canonical["stops"].drop_duplicates("stop_id", keep="first")
+    stop_index = pd.Index(stops["stop_id"].astype(str))
+    lat = stops["lat"].to_numpy(dtype=np.float64)
+    lon = stops["lon"].to_numpy(dtype=np.float64)
+    st = canonical["stop_times"]
+    if st.empty:
+        return
+    trip_codes, trip_ids, order = _trip_order(st)
+    n_trips = len(trip_ids)
+    delay = np.where(rng.random(n_trips) < delayed_frac, rng.normal(0.0, delay_std, n_trips), 0.0)
+    vehicles = vehicle_ids(trip_ids)
+    # per-row columns are converted a chunk at a time
+    stop_col = st["stop_id"]
+    arrival = st["arrival_time_sec"].to_numpy()
+
+    # chunk boundaries on trip starts, in output order, by expected rows per trip
+    sorted_trips = trip_codes if order is None else trip_codes[order]
+    starts = np.r_[np.flatnonzero(np.r_[True, sorted_trips[1:] != sorted_trips[:-1]]), len(st)]
+    rows_per_trip = np.diff(starts).astype(np.float64)
+    if interval > 0:
+        phase = rng.random(n_trips) * interval
+        paths = _ShapePaths(canonical.get("shapes"), float(np.nanmean(lat)) if len(lat) else 0.0)
+        shape = paths.shape_codes(canonical["trips"], trip_ids)
+        sorted_arrival = arrival if order is None else arrival[order]
+        span = np.maximum.reduceat(sorted_arrival, starts[:-1]) - np.minimum.reduceat(sorted_arrival, starts[:-1])
+        rows_per_trip = span / interval + 1
+        del sorted_arrival
+    cum = np.r_[0.0, np.cumsum(rows_per_trip)]
+    cut = np.searchsorted(cum, np.arange(0.0, cum[-1], max(1, int(chunk_rows))), side="right") - 1
+    bounds = np.unique(np.r_[starts[cut], len(st)])
+    for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        rows = slice(a, b) if order is None else order[a:b]
+        trip = trip_codes[rows]
+        stop = _codes(stop_col.iloc[rows], stop_index)
+        dwell = rng.exponential(mean_dwell, size=b - a)
+        t = arrival[rows].astype(np.float64) + delay[trip] + dwell
+        keep = (stop >= 0) & (trip >= 0)
+        trip, stop, t = trip[keep], stop[keep], t[keep]
+        if interval > 0:
+            trip, t, p_lat, p_lon = _interpolated_pings(trip, t, lat[stop], lon[stop], shape, phase, interval, paths)
+        else:
+            p_lat, p_lon = lat[stop], lon[stop]
+        ts = epoch + np.trunc(t).astype(np.int64)
+        yield pd.DataFrame({
+            "trip_id": trip_ids[trip],
+            "timestamp_iso": np.datetime_as_string(ts.astype("datetime64[s]"), unit="s"),
+            "lat": p_lat,
+            "lon": p_lon,
+            "vehicle_id": vehicles[trip],
+        }, columns=AVL_COLUMNS)
+
 
-    stops = canonical["stops"]
-    stop_times = canonical["stop_times"]
-
-    rows = []
-    now = int(time.time())
-    for trip_id, group in stop_times.groupby("trip_id"):
-        base_delay = rng.gauss(0, delay_std) if rng.random() < delayed_frac else 0.0
-        for _, r in group.sort_values("stop_sequence").iterrows():
-            dwell = rng.expovariate(1.0 / mean_dwell)
-            ts = now + int(r["arrival_time_sec"] + base_delay + dwell)
-            stop_id = str(r["stop_id"])
-            # crude position: use stop lat/lon
-            stop_row = stops.loc[stops["stop_id"] == stop_id].head(1)
-            if stop_row.empty:
-                continue
-            lat = float(stop_row["lat"].values[0])
-            lon = float(stop_row["lon"].values[0])
-            rows.append({
-                "trip_id": str(trip_id),
-                "timestamp_iso": pd.to_datetime(ts, unit="s").isoformat(),
-                "lat": lat,
-                "lon": lon,
-                "vehicle_id": f"veh_{hash(trip_id) % 1000}",
-            })
-
-    out_csv.parent.mkdir(parents=True, exist_ok=True)
-    with out_csv.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["trip_id", "timestamp_iso", "lat", "lon", "vehicle_id"])
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row)
+def synthesize_avl(
+    canonical: Dict[str, pd.DataFrame],
+    out_path: Path,
+    params: Dict[str, Any],
+    fmt: Optional[str] = None,
+) -> int:
+    """Write synthetic AVL (see ``iter_avl_chunks``) to CSV or Parquet, chunk by chunk.
 
+    ``fmt`` defaults to ``params["format"]``, else the file suffix. Memory
+    stays at one chunk (``params["chunk_rows"]``) however many rows are
+    written; Parquet needs the ``arrow`` extra. Returns the number of rows.
+    """
+    fmt = fmt or params.get("format") or ("parquet" if out_path.suffix.lower() in (".parquet", ".pq") else "csv")
+    if fmt not in AVL_FORMATS:
+        raise ValueError(f"Unknown AVL format {fmt!r}; expected one of {AVL_FORMATS}")
+    chunks = iter_avl_chunks(canonical, params, int(params.get("chunk_rows", AVL_CHUNK_ROWS)))
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
 
+        schema = pa.schema([
+            ("trip_id", pa.string()), ("timestamp_iso", pa.string()),
+            ("lat", pa.float64()), ("lon", pa.float64()), ("vehicle_id", pa.string()),
+        ])
+        with pq.ParquetWriter(out_path, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                written += len(chunk)
+        return written
+    with out_path.open("w", newline="", encoding="utf-8") as f:
+        f.write(",".join(AVL_COLUMNS) + "\n")
+        for chunk in chunks:
+            chunk.to_csv(f, header=False, index=False)
+            written += len(chunk)
+    return written
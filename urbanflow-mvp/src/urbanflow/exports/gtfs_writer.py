@@ -4,6 +4,8 @@ from typing import Dict, Any
 from pathlib import Path
 import pandas as pd
 
+from ..gtfs.times import seconds_to_hms
+
 
 def write_gtfs_like(solution: Dict[str, Any], outdir: Path) -> None:
     canonical = solution["canonical"]
@@ -26,14 +28,8 @@ def write_gtfs_like(solution: Dict[str, Any], outdir: Path) -> None:
     ].to_csv(outdir / "trips.txt", index=False)
 
     st = canonical["stop_times"].copy()
-    def sec_to_hms(sec: int) -> str:
-        h = sec // 3600
-        m = (sec % 3600) // 60
-        s = sec % 60
-        return f"{h:02d}:{m:02d}:{s:02d}"
-
-    st["arrival_time"] = st["arrival_time_sec"].apply(sec_to_hms)
-    st["departure_time"] = st["departure_time_sec"].apply(sec_to_hms)
+    st["arrival_time"] = seconds_to_hms(st["arrival_time_sec"])
+    st["departure_time"] = seconds_to_hms(st["departure_time_sec"])
     st[
         ["trip_id", "arrival_time", "departure_time", "stop_sequence", "stop_id", "timepoint"]
     ].to_csv(outdir / "stop_times.txt", index=False)
@@ -1,34 +1,164 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
-import csv
+import heapq
+import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
 
+from ..graph.build_graph import haversine_m, project_xy
+from ..gtfs.canonicalizer import trip_extents
 
-def write_vehicle_blocks(solution: Dict[str, Any], out_csv: Path) -> None:
-    canonical = solution["canonical"]
-    st = canonical["stop_times"]
-    trips = canonical["trips"]
-
-    # naive blocks: one trip per block for MVP
-    rows = []
-    for trip_id, group in st.groupby("trip_id"):
-        start_time = int(group["departure_time_sec"].min())
-        end_time = int(group["arrival_time_sec"].max())
-        rows.append({
-            "block_id": f"block_{trip_id}",
-            "route_sequence": ",".join(sorted(set(trips.loc[trips['trip_id'] == trip_id, 'route_id'].astype(str)))),
-            "trip_start_time": start_time,
-            "trip_end_time": end_time,
-            "vehicle_id": "",
-        })
 
-    out_csv.parent.mkdir(parents=True, exist_ok=True)
-    with out_csv.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["block_id", "route_sequence", "trip_start_time", "trip_end_time", "vehicle_id"])
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+MIN_LAYOVER_S = 300
+DEADHEAD_SPEED_MPS = 8.0
+MAX_DEADHEAD_M = 3000.0
+# nearest terminals considered for a deadhead between trips
+DEADHEAD_CANDIDATES = 8
+BLOCK_COLUMNS = [
+    "block_id", "route_sequence", "trip_start_time", "trip_end_time", "vehicle_id",
+    "service_id", "depot_id", "n_trips", "trip_sequence", "deadhead_s",
+]
+
+
+@dataclass
+class VehicleBlocks:
+    """Trips chained into vehicle duties.
+
+    ``trips`` has one row per trip in block order with the deadhead driven
+    before it (from the depot for a block's first trip); ``blocks`` one row
+    per block with its pull-in deadhead included in ``deadhead_s``.
+    """
+
+    trips: pd.DataFrame
+    blocks: pd.DataFrame
+
+    @property
+    def fleet_size(self) -> int:
+        """Vehicles needed: blocks of the busiest service day."""
+        if self.blocks.empty:
+            return 0
+        return int(self.blocks.groupby("service_id").size().max())
+
+
+def block_trips(canonical: Dict[str, pd.DataFrame], constraints: Optional[Dict[str, Any]] = None) -> VehicleBlocks:
+    """Chain each service day's trips into blocks with a greedy sweep.
 
+    Trips are taken in start-time order. A trip goes to the earliest-free
+    vehicle idle at its first stop, or failing that at the nearest terminal
+    (among ``DEADHEAD_CANDIDATES`` within ``max_deadhead_m``) from which it
+    can deadhead in time; a vehicle is free ``min_layover_s`` after its last
+    trip ends. Otherwise a new vehicle pulls out of the nearest depot in
+    ``depots``. Idle vehicles sit in one heap per terminal, so blocking is
+    O(trips log trips). Without deadheads this is the interval-scheduling
+    sweep, which uses the fewest vehicles.
+    """
+    constraints = constraints or {}
+    layover = int(constraints.get("min_layover_s", MIN_LAYOVER_S))
+    speed = float(constraints.get("deadhead_speed_mps", DEADHEAD_SPEED_MPS))
+    max_deadhead = float(constraints.get("max_deadhead_m", MAX_DEADHEAD_M))
+    trips = canonical["trips"].drop_duplicates("trip_id", keep="last")
+    ext = trip_extents(canonical["stop_times"])
+    info = pd.DataFrame({
+        "route_id": trips["route_id"].astype(str).to_numpy(),
+        "service_id": trips["service_id"].astype(str).to_numpy(),
+    }, index=trips["trip_id"].astype(str).to_numpy())
+    ext = ext.join(info, on="trip_id").fillna({"route_id": "", "service_id": ""})
+    if ext.empty:
+        return VehicleBlocks(ext.assign(block_id=[], deadhead_s=[]), pd.DataFrame(columns=BLOCK_COLUMNS))
 
+    # terminals: stops where a trip starts or ends
+    term_codes, terminals = pd.factorize(pd.concat([ext["first_stop"], ext["last_stop"]], ignore_index=True))
+    first, last = term_codes[: len(ext)], term_codes[len(ext):]
+    stops = canonical["stops"].drop_duplicates("stop_id", keep="last")
+    coords = stops.set_index(stops["stop_id"].astype(str))[["lat", "lon"]].reindex(terminals).to_numpy(dtype=np.float64)
+    known = ~np.isnan(coords).any(axis=1)
+    lat, lon = np.nan_to_num(coords[:, 0]), np.nan_to_num(coords[:, 1])
+    n_terms = len(terminals)
+
+    # deadhead candidates per terminal, nearest first (itself at 0 s)
+    candidates: List[List[Tuple[int, int]]] = [[(t, 0)] for t in range(n_terms)]
+    if known.sum() > 1 and max_deadhead > 0:
+        idx = np.flatnonzero(known)
+        xy = project_xy(lat[idx], lon[idx], float(lat[idx].mean()))
+        k = min(DEADHEAD_CANDIDATES + 1, len(idx))
+        _, nn = cKDTree(xy).query(xy, k=k, distance_upper_bound=max_deadhead)
+        nn = nn.reshape(len(idx), k)
+        for row, t in enumerate(idx.tolist()):
+            near = idx[nn[row][(nn[row] < len(idx))]]
+            near = near[near != t]
+            dist = haversine_m(lat[t], lon[t], lat[near], lon[near])
+            candidates[t].extend(zip(near.tolist(), np.ceil(dist / speed).astype(np.int64).tolist()))
+
+    # pull-out/pull-in deadhead from each terminal's nearest depot
+    depots = constraints.get("depots") or []
+    depot_of = np.full(n_terms, "", dtype=object)
+    depot_s = np.zeros(n_terms, dtype=np.int64)
+    if depots:
+        d_lat = np.array([float(d["lat"]) for d in depots])
+        d_lon = np.array([float(d["lon"]) for d in depots])
+        dist = haversine_m(lat[:, None], lon[:, None], d_lat[None, :], d_lon[None, :])
+        nearest = dist.argmin(axis=1)
+        depot_of[:] = np.array([str(d.get("id", i)) for i, d in enumerate(depots)], dtype=object)[nearest]
+        depot_s = np.where(known, np.ceil(dist[np.arange(n_terms), nearest] / speed), 0).astype(np.int64)
+
+    start = ext["start"].to_numpy(dtype=np.int64)
+    end = ext["end"].to_numpy(dtype=np.int64)
+    service = pd.factorize(ext["service_id"])[0]
+    order = np.lexsort((end, start, service))
+    block = np.empty(len(ext), dtype=np.int64)
+    deadhead = np.zeros(len(ext), dtype=np.int64)
+    block_depot: List[int] = []
+    block_last: List[int] = []
+    idle: Dict[int, List[Tuple[int, int]]] = {}
+    current = -1
+    for i in order.tolist():
+        if service[i] != current:
+            # vehicles do not carry over between service days
+            current, idle = service[i], {}
+        s, t0 = first[i], start[i]
+        chosen = None
+        for t, dh in candidates[s]:
+            heap = idle.get(t)
+            if heap and heap[0][0] + dh <= t0:
+                chosen = heapq.heappop(heap)[1]
+                deadhead[i] = dh
+                break
+        if chosen is None:
+            chosen = len(block_depot)
+            block_depot.append(s)
+            block_last.append(i)
+            deadhead[i] = depot_s[s]
+        block[i] = chosen
+        block_last[chosen] = i
+        heapq.heappush(idle.setdefault(last[i], []), (end[i] + layover, chosen))
+
+    out = ext.assign(block_id=block, deadhead_s=deadhead).iloc[np.lexsort((start, block))].reset_index(drop=True)
+    n_blocks = len(block_depot)
+    names = np.array([f"block_{b + 1:05d}" for b in range(n_blocks)], dtype=object)
+    pull_in = depot_s[last[np.asarray(block_last, dtype=np.int64)]]
+    g = out.groupby("block_id", sort=True)
+    blocks = pd.DataFrame({
+        "block_id": names,
+        "route_sequence": g["route_id"].agg(",".join).to_numpy(),
+        "trip_start_time": g["start"].first().to_numpy(),
+        "trip_end_time": g["end"].last().to_numpy(),
+        "vehicle_id": np.array([f"V{b + 1:05d}" for b in range(n_blocks)], dtype=object),
+        "service_id": g["service_id"].first().to_numpy(),
+        "depot_id": depot_of[np.asarray(block_depot, dtype=np.int64)],
+        "n_trips": g.size().to_numpy(),
+        "trip_sequence": g["trip_id"].agg(",".join).to_numpy(),
+        "deadhead_s": g["deadhead_s"].sum().to_numpy() + pull_in,
+    })
+    out["block_id"] = names[out["block_id"].to_numpy()]
+    return VehicleBlocks(out, blocks)
+
+
+def write_vehicle_blocks(solution: Dict[str, Any], out_csv: Path, constraints: Optional[Dict[str, Any]] = None) -> VehicleBlocks:
+    """Block the solution's trips (see ``block_trips``) and write one row per block."""
+    blocks = block_trips(solution["canonical"], constraints)
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    blocks.blocks[BLOCK_COLUMNS].to_csv(out_csv, index=False)
+    return blocks
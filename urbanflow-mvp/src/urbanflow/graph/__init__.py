@@ -1,3 +1,3 @@
-__all__ = ["build_graph", "graph_io"]
+__all__ = ["build_graph", "csr", "graph_io", "calibration"]
 
 
@@ -1,51 +1,302 @@
 from __future__ import annotations
 
-from typing import Dict, Tuple
-import math
+from typing import Dict, Optional, Tuple, Union
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+from .calibration import EdgeCalibration
+from .csr import CSRGraph
 
-def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000.0
-    p1 = math.radians(lat1)
-    p2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
 
+EARTH_RADIUS_M = 6371000.0
 
-def build_graph_from_canonical(canonical: Dict[str, pd.DataFrame]) -> nx.DiGraph:
-    stops = canonical["stops"]
-    stop_times = canonical["stop_times"]
-    trips = canonical["trips"]
+GRAPH_BACKENDS = ("networkx", "csr")
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in meters; accepts scalars or arrays (degrees)."""
+    p1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    p2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    dphi = p2 - p1
+    dl = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+    a = np.sin(dphi / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def project_xy(lat, lon, lat0: float) -> np.ndarray:
+    """``(n, 2)`` equirectangular x/y metres about latitude ``lat0``: accurate
+    enough for nearest-neighbour and grid queries at city scale."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return np.column_stack([np.radians(lon) * np.cos(np.radians(lat0)), np.radians(lat)]) * EARTH_RADIUS_M
+
+
+def _edge_codes(stop_times: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    # one row per consecutive stop pair of each trip, from shifted sorted arrays; stops and trips
+    # are factorized once and the pairs carry int codes into the returned stop and trip IDs
+    stop, stop_ids = pd.factorize(stop_times["stop_id"].astype(str))
+    # trip codes follow the sorted trip IDs, so ordering by code is ordering by ID
+    trip, trip_ids = pd.factorize(stop_times["trip_id"], sort=True)
+    # NaN trip ids sort last and never form edges
+    trip = np.where(trip < 0, len(trip_ids), trip)
+    seq = stop_times["stop_sequence"].to_numpy(dtype=np.float64, na_value=np.nan)
+    order = np.lexsort((seq, trip))
+    trip, stop = trip[order], stop[order]
+    arr = stop_times["arrival_time_sec"].to_numpy(dtype=np.int64)[order]
+    dep = stop_times["departure_time_sec"].to_numpy(dtype=np.int64)[order]
+    same_trip = (trip[1:] == trip[:-1]) & (trip[1:] < len(trip_ids))
+    edges = pd.DataFrame({
+        "u": stop[:-1][same_trip],
+        "v": stop[1:][same_trip],
+        "travel_time": np.maximum(1, arr[1:] - dep[:-1])[same_trip],
+        "trip_id": trip[1:][same_trip],
+    })
+    return edges, np.asarray(stop_ids, dtype=object), np.asarray(trip_ids.astype(str), dtype=object)
+
+
+def _edge_rows(stop_times: pd.DataFrame) -> pd.DataFrame:
+    # the edge rows with stop and trip IDs, for callers that concatenate them (streaming chunks)
+    edges, stop_ids, trip_ids = _edge_codes(stop_times)
+    return edges.assign(
+        u=stop_ids[edges["u"].to_numpy()],
+        v=stop_ids[edges["v"].to_numpy()],
+        trip_id=trip_ids[edges["trip_id"].to_numpy()],
+    )
+
+
+def _grouped_tuples(groups: np.ndarray, codes: np.ndarray, labels: np.ndarray, n_groups: int) -> list:
+    # sorted distinct ``labels[codes]`` per group, as tuples; codes follow the order of ``labels``
+    k = max(1, len(labels))
+    key = np.sort(groups.astype(np.int64) * k + codes)
+    # distinct keys of the sorted array (np.unique hashes first, which is slower here)
+    first = np.ones(len(key), dtype=bool)
+    first[1:] = key[1:] != key[:-1]
+    key = key[first]
+    ends = np.cumsum(np.bincount(key // k, minlength=n_groups)).tolist()
+    flat = labels[key % k].tolist()
+    return [tuple(flat[a:b]) for a, b in zip([0] + ends[:-1], ends)]
+
+
+_AGGREGATED_COLUMNS = [
+    "u", "v", "travel_time", "distance_m", "trip_count",
+    "travel_time_min", "travel_time_mean", "travel_time_median", "trip_ids", "route_ids",
+]
+
+
+def _trip_route_ids(trips: Optional[pd.DataFrame], trip_ids: np.ndarray) -> Optional[np.ndarray]:
+    # route ID of each trip ("" when unknown), the last trips row winning; None without a trips table
+    if trips is None or trips.empty:
+        return None
+    trip_routes = trips.drop_duplicates("trip_id", keep="last")
+    # one lookup per distinct trip, not per edge row
+    at = pd.Index(trip_routes["trip_id"].astype(str)).get_indexer(trip_ids)
+    routes = trip_routes["route_id"].astype(str).to_numpy(dtype=object)
+    return np.where(at >= 0, routes[at], "").astype(object)
+
+
+def _stop_coords(stops: pd.DataFrame, stop_ids: np.ndarray) -> np.ndarray:
+    # (n, 2) lat/lon of each stop, NaN when it has none
+    coords = stops.drop_duplicates("stop_id", keep="last")
+    coords = coords.set_index(coords["stop_id"].astype(str))[["lat", "lon"]].astype(np.float64)
+    return coords.reindex(stop_ids).to_numpy()
+
+
+def _aggregate_codes(
+    edges: pd.DataFrame,
+    stop_ids: np.ndarray,
+    trip_ids: np.ndarray,
+    coords: np.ndarray,
+    trip_routes: Optional[np.ndarray],
+) -> pd.DataFrame:
+    # aggregate_edges over int-coded edge rows (see _edge_codes); trip codes follow sorted trip IDs,
+    # ``coords`` and ``trip_routes`` follow the stop and trip codes (see _stop_coords, _trip_route_ids)
+    if edges.empty:
+        return pd.DataFrame(columns=_AGGREGATED_COLUMNS)
+    n_stops = len(stop_ids)
+    # pairs numbered in order of first appearance
+    codes, pairs = pd.factorize(edges["u"].to_numpy(dtype=np.int64) * n_stops + edges["v"].to_numpy(dtype=np.int64))
+    n = len(pairs)
+    travel = edges["travel_time"].to_numpy(dtype=np.int64)
+    trip = edges["trip_id"].to_numpy(dtype=np.int64)
 
-    stop_lookup = stops.set_index("stop_id")[["lat", "lon"]].to_dict("index")
+    # min and median from travel times sorted within each pair
+    count = np.bincount(codes, minlength=n)
+    starts = np.cumsum(count) - count
+    ordered = travel[np.lexsort((travel, codes))]
+    lo = ordered[starts + (count - 1) // 2]
+    hi = ordered[starts + count // 2]
+    median = (lo + hi) / 2.0
+    mean = np.bincount(codes, weights=travel, minlength=n) / count
+
+    trip_tuples = _grouped_tuples(codes, trip, trip_ids, n)
+    if trip_routes is not None:
+        route_of_trip, route_ids = pd.factorize(trip_routes, sort=True)
+        route = route_of_trip[trip]
+        route_ids = np.asarray(route_ids, dtype=object)
+        served = route_ids[route] != ""
+        route_tuples = _grouped_tuples(codes[served], route[served], route_ids, n)
+    else:
+        route_tuples = [()] * n
+
+    u_code, v_code = pairs // n_stops, pairs % n_stops
+    cu, cv = coords[u_code], coords[v_code]
+    distance = np.nan_to_num(haversine_m(cu[:, 0], cu[:, 1], cv[:, 0], cv[:, 1]), nan=0.0)
+
+    return pd.DataFrame({
+        "u": stop_ids[u_code],
+        "v": stop_ids[v_code],
+        "travel_time": np.maximum(1, np.rint(median)).astype(np.int64),
+        "distance_m": distance,
+        "trip_count": count.astype(np.int64),
+        "travel_time_min": ordered[starts].astype(np.int64),
+        "travel_time_mean": mean.astype(np.float64),
+        "travel_time_median": median.astype(np.float64),
+        "trip_ids": trip_tuples,
+        "route_ids": route_tuples,
+    })
+
+
+def aggregate_edges(
+    edges: pd.DataFrame,
+    stops: pd.DataFrame,
+    trips: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Reduce per-trip edge rows to one row per (u, v).
+
+    Each directed stop pair gets the number of traversals, min/mean/median
+    travel time, the sorted trip and route IDs serving it, and the haversine
+    distance between the two stops (0 if a stop has no coordinates).
+    ``travel_time`` is the median, rounded to whole seconds.
+    """
+    if edges.empty:
+        return pd.DataFrame(columns=_AGGREGATED_COLUMNS)
+    # stops and trips to int codes once; everything after groups on int64
+    endpoints, stop_ids = pd.factorize(pd.concat([edges["u"], edges["v"]], ignore_index=True))
+    trip, trip_ids = pd.factorize(edges["trip_id"], sort=True, use_na_sentinel=False)
+    codes = pd.DataFrame({
+        "u": endpoints[:len(edges)],
+        "v": endpoints[len(edges):],
+        "travel_time": edges["travel_time"].to_numpy(dtype=np.int64),
+        "trip_id": trip,
+    })
+    stop_ids, trip_ids = np.asarray(stop_ids, dtype=object), np.asarray(trip_ids, dtype=object)
+    return _aggregate_codes(codes, stop_ids, trip_ids, _stop_coords(stops, stop_ids), _trip_route_ids(trips, trip_ids))
+
+
+def _csr_from_aggregated(stops: pd.DataFrame, agg: pd.DataFrame) -> CSRGraph:
+    # node order and attributes follow nx: first occurrence wins the slot, last row the attributes
+    ids = stops["stop_id"].astype(str)
+    last = stops.assign(_id=ids.to_numpy()).drop_duplicates("_id", keep="last").set_index("_id")
+    nodes = pd.Index(ids.drop_duplicates())
+    endpoints = np.column_stack([agg["u"].to_numpy(dtype=object), agg["v"].to_numpy(dtype=object)]).ravel()
+    extra = pd.Index(pd.unique(endpoints)).difference(nodes, sort=False)
+    node_attrs = {}
+    for k in ("lat", "lon"):
+        col = last[k].reindex(nodes).to_numpy(dtype=np.float64)
+        if len(extra):
+            # endpoints missing from stops carry no attributes, as in nx
+            col = np.concatenate([col.astype(object), np.full(len(extra), None, dtype=object)])
+        node_attrs[k] = col
+    nodes = nodes.append(extra)
+    u = nodes.get_indexer(agg["u"])
+    v = nodes.get_indexer(agg["v"])
+    edge_attrs = {c: agg[c].to_numpy() for c in agg.columns if c not in ("u", "v")}
+    return CSRGraph.from_arrays(nodes.tolist(), u, v, node_attrs, edge_attrs)
+
+
+def _graph_from_edge_rows(
+    stops: pd.DataFrame,
+    edges: pd.DataFrame,
+    trips: Optional[pd.DataFrame] = None,
+    backend: str = "networkx",
+) -> Union[nx.DiGraph, CSRGraph]:
+    _check_backend(backend)
+    return _graph_from_aggregated(stops, aggregate_edges(edges, stops, trips), backend)
+
+
+def _check_backend(backend: str) -> None:
+    if backend not in GRAPH_BACKENDS:
+        raise ValueError(f"Unknown graph backend {backend!r}; expected one of {GRAPH_BACKENDS}")
+
+
+def _graph_from_aggregated(stops: pd.DataFrame, agg: pd.DataFrame, backend: str) -> Union[nx.DiGraph, CSRGraph]:
+    if backend == "csr":
+        return _csr_from_aggregated(stops, agg)
 
     G = nx.DiGraph()
-    for _, s in stops.iterrows():
-        G.add_node(str(s["stop_id"]), lat=float(s["lat"]), lon=float(s["lon"]))
-
-    # edges from sequential stops on each trip
-    st_sorted = stop_times.sort_values(["trip_id", "stop_sequence"])
-    for trip_id, group in st_sorted.groupby("trip_id"):
-        prev_row = None
-        for _, r in group.iterrows():
-            if prev_row is not None:
-                u = str(prev_row["stop_id"])
-                v = str(r["stop_id"])
-                t = max(1, int(r["arrival_time_sec"] - prev_row["departure_time_sec"]))
-                s_u = stop_lookup.get(u)
-                s_v = stop_lookup.get(v)
-                if s_u and s_v:
-                    d = _haversine(s_u["lat"], s_u["lon"], s_v["lat"], s_v["lon"])
-                else:
-                    d = 0.0
-                G.add_edge(u, v, travel_time=t, distance_m=d, trip_id=str(trip_id))
-            prev_row = r
+    node_ids = stops["stop_id"].astype(str).tolist()
+    lats = stops["lat"].astype(np.float64).tolist()
+    lons = stops["lon"].astype(np.float64).tolist()
+    G.add_nodes_from((n, {"lat": la, "lon": lo}) for n, la, lo in zip(node_ids, lats, lons))
 
+    attr_cols = [c for c in agg.columns if c not in ("u", "v")]
+    columns = [agg[c].tolist() for c in attr_cols]
+    G.add_edges_from(
+        (u, v, dict(zip(attr_cols, values)))
+        for u, v, *values in zip(agg["u"].tolist(), agg["v"].tolist(), *columns)
+    )
     return G
 
 
+def changed_edges(
+    graph: Union[nx.DiGraph, CSRGraph],
+    canonical: Dict[str, pd.DataFrame],
+    before: pd.DataFrame,
+    after: pd.DataFrame,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Edges a schedule edit changed, without rebuilding the graph.
+
+    ``before`` and ``after`` are the stop times of the edited trips in the
+    tables ``graph`` was built from and in ``canonical``, the edited tables.
+    Returns the ``u``/``v`` pairs those trips serve in either, and the
+    aggregated edges (as ``aggregate_edges``) of the pairs still served in
+    ``canonical``; a pair missing from the second frame has no trips left.
+    The other trips on each pair are read from the graph's ``trip_ids``, so
+    only their stop times are re-aggregated, and stop coordinates from its
+    nodes.
+    """
+    touched = set()
+    for rows in (before, after):
+        edges, stop_ids, _ = _edge_codes(rows)
+        touched.update(zip(stop_ids[edges["u"].to_numpy()].tolist(), stop_ids[edges["v"].to_numpy()].tolist()))
+    pairs = pd.DataFrame(sorted(touched), columns=["u", "v"], dtype=object)
+    serving = set(after["trip_id"].astype(str))
+    for u, v in touched:
+        if isinstance(graph, CSRGraph):
+            serving.update(graph.get_edge_attr(u, v, "trip_ids", ()))
+        else:
+            serving.update((graph.get_edge_data(u, v) or {}).get("trip_ids", ()))
+    st = canonical["stop_times"]
+    edges, stop_ids, trip_ids = _edge_codes(st[st["trip_id"].astype(str).isin(serving).to_numpy()])
+    # only the changed pairs: other trips on them also serve unchanged pairs
+    code = {s: i for i, s in enumerate(stop_ids.tolist())}
+    n = len(stop_ids)
+    wanted = [code[u] * n + code[v] for u, v in touched if u in code and v in code]
+    keep = np.isin(edges["u"].to_numpy(dtype=np.int64) * n + edges["v"].to_numpy(dtype=np.int64), wanted)
+    trips = canonical.get("trips")
+    if trips is not None:
+        trips = trips[trips["trip_id"].astype(str).isin(serving).to_numpy()]
+    coords = np.full((n, 2), np.nan)
+    for i, sid in enumerate(stop_ids.tolist()):
+        if graph.has_node(sid):
+            attrs = graph.nodes[sid]
+            coords[i] = (attrs.get("lat", np.nan), attrs.get("lon", np.nan))
+    agg = _aggregate_codes(edges[keep].reset_index(drop=True), stop_ids, trip_ids, coords, _trip_route_ids(trips, trip_ids))
+    return pairs, agg
+
+
+def build_graph_from_canonical(
+    canonical: Dict[str, pd.DataFrame],
+    backend: str = "networkx",
+    calibration: Optional[EdgeCalibration] = None,
+) -> Union[nx.DiGraph, CSRGraph]:
+    # edges from sequential stops on each trip, aggregated per stop pair; with ``calibration``
+    # the scheduled travel times are replaced by the observed ones
+    _check_backend(backend)
+    stops = canonical["stops"]
+    edges, stop_ids, trip_ids = _edge_codes(canonical["stop_times"])
+    agg = _aggregate_codes(edges, stop_ids, trip_ids, _stop_coords(stops, stop_ids), _trip_route_ids(canonical.get("trips"), trip_ids))
+    graph = _graph_from_aggregated(stops, agg, backend)
+    return calibration.apply(graph) if calibration is not None else graph
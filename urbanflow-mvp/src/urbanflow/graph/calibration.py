@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Union
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from .csr import CSRGraph
+
+
+# edges with fewer AVL observations keep their scheduled travel time
+MIN_OBSERVATIONS = 5
+
+
+def calibrate_graph(
+    graph: Union[nx.DiGraph, CSRGraph],
+    by_edge: pd.DataFrame,
+    min_obs: int = MIN_OBSERVATIONS,
+    quantile: str = "p50",
+) -> Union[nx.DiGraph, CSRGraph]:
+    """Copy of ``graph`` with ``travel_time`` replaced by observed travel times.
+
+    ``by_edge`` is ``AVLObservations.by_edge`` (``u``, ``v``, ``count``,
+    ``p50``, ``p90``). Edges with at least ``min_obs`` observations get
+    ``travel_time`` = the rounded ``quantile`` column (``"p90"`` routes on
+    reliable rather than typical times); every edge gains
+    ``observed_count``, ``travel_time_p50`` and ``travel_time_p90`` (0 / NaN
+    where unobserved). Observations of pairs that are not graph edges are
+    ignored. ``graph`` itself is not modified.
+    """
+    if quantile not in ("p50", "p90"):
+        raise ValueError(f"Unknown quantile {quantile!r}; expected 'p50' or 'p90'")
+    if isinstance(graph, CSRGraph):
+        n = len(graph.node_ids)
+        index = pd.Index(graph.node_ids)
+        edge_key = pd.Index(graph.edge_src.astype(np.int64) * n + graph.indices.astype(np.int64))
+        u = index.get_indexer(by_edge["u"].astype(str))
+        v = index.get_indexer(by_edge["v"].astype(str))
+        known = (u >= 0) & (v >= 0)
+        eid = np.full(len(by_edge), -1, dtype=np.int64)
+        eid[known] = edge_key.get_indexer(u[known].astype(np.int64) * n + v[known])
+        hit = eid >= 0
+        n_edges = len(graph.indices)
+        count = np.zeros(n_edges, dtype=np.int64)
+        p50 = np.full(n_edges, np.nan)
+        p90 = np.full(n_edges, np.nan)
+        count[eid[hit]] = by_edge["count"].to_numpy()[hit]
+        p50[eid[hit]] = by_edge["p50"].to_numpy()[hit]
+        p90[eid[hit]] = by_edge["p90"].to_numpy()[hit]
+        use = count >= int(min_obs)
+        travel = np.asarray(graph.edge_attrs["travel_time"]).astype(np.int64)
+        chosen = {"p50": p50, "p90": p90}[quantile]
+        travel[use] = np.maximum(1, np.rint(chosen[use])).astype(np.int64)
+        out = graph.copy()
+        # attribute arrays are shared between copies, so replace rather than write into them
+        out.edge_attrs = {
+            **graph.edge_attrs,
+            "travel_time": travel.astype(np.int32),
+            "observed_count": count.astype(np.int32),
+            "travel_time_p50": p50.astype(np.float32),
+            "travel_time_p90": p90.astype(np.float32),
+        }
+        return out
+
+    out = graph.copy()
+    nx.set_edge_attributes(out, 0, "observed_count")
+    nx.set_edge_attributes(out, float("nan"), "travel_time_p50")
+    nx.set_edge_attributes(out, float("nan"), "travel_time_p90")
+    for a, b, c, q50, q90 in zip(
+        by_edge["u"].astype(str), by_edge["v"].astype(str), by_edge["count"].tolist(), by_edge["p50"].tolist(), by_edge["p90"].tolist()
+    ):
+        if not out.has_edge(a, b):
+            continue
+        data = out.edges[a, b]
+        data.update(observed_count=int(c), travel_time_p50=float(q50), travel_time_p90=float(q90))
+        if c >= int(min_obs):
+            data["travel_time"] = max(1, int(round(q50 if quantile == "p50" else q90)))
+    return out
+
+
+def calibrate_edges(
+    edges: pd.DataFrame,
+    by_edge: pd.DataFrame,
+    min_obs: int = MIN_OBSERVATIONS,
+    quantile: str = "p50",
+) -> pd.DataFrame:
+    """``calibrate_graph`` for aggregated edge rows (``u``, ``v``, ``travel_time``, ...)."""
+    if quantile not in ("p50", "p90"):
+        raise ValueError(f"Unknown quantile {quantile!r}; expected 'p50' or 'p90'")
+    obs = by_edge.assign(u=by_edge["u"].astype(str), v=by_edge["v"].astype(str))
+    obs = obs.drop_duplicates(["u", "v"], keep="last").set_index(["u", "v"])
+    at = obs.index.get_indexer(pd.MultiIndex.from_arrays([edges["u"].astype(str), edges["v"].astype(str)]))
+    hit = at >= 0
+    count = np.zeros(len(edges), dtype=np.int64)
+    p50 = np.full(len(edges), np.nan)
+    p90 = np.full(len(edges), np.nan)
+    count[hit] = obs["count"].to_numpy()[at[hit]]
+    p50[hit] = obs["p50"].to_numpy(dtype=np.float64)[at[hit]]
+    p90[hit] = obs["p90"].to_numpy(dtype=np.float64)[at[hit]]
+    use = count >= int(min_obs)
+    travel = edges["travel_time"].to_numpy(dtype=np.int64).copy()
+    chosen = {"p50": p50, "p90": p90}[quantile]
+    travel[use] = np.maximum(1, np.rint(chosen[use])).astype(np.int64)
+    return edges.assign(travel_time=travel, observed_count=count, travel_time_p50=p50, travel_time_p90=p90)
+
+
+@dataclass(frozen=True)
+class EdgeCalibration:
+    """The ``calibrate_graph`` arguments of a calibrated network, so graphs
+    rebuilt from its schedule (route-level moves, re-timetabling) get the same
+    observed travel times."""
+
+    by_edge: pd.DataFrame
+    min_obs: int = MIN_OBSERVATIONS
+    quantile: str = "p50"
+
+    def apply(self, graph: Union[nx.DiGraph, CSRGraph]) -> Union[nx.DiGraph, CSRGraph]:
+        return calibrate_graph(graph, self.by_edge, min_obs=self.min_obs, quantile=self.quantile)
+
+    def apply_edges(self, edges: pd.DataFrame) -> pd.DataFrame:
+        return calibrate_edges(edges, self.by_edge, min_obs=self.min_obs, quantile=self.quantile)
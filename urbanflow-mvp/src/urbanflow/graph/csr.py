@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def _compact_array(values: np.ndarray) -> np.ndarray:
+    # ints -> int32 when they fit, floats -> float32, anything else stays object
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        if values.size == 0 or (values.min() >= INT32_MIN and values.max() <= INT32_MAX):
+            return values.astype(np.int32)
+        return values.astype(np.int64)
+    if values.dtype.kind == "f":
+        return values.astype(np.float32)
+    return values.astype(object)
+
+
+class RaggedColumn:
+    """Tuple-of-strings attribute stored as int32 codes into a shared vocabulary.
+
+    Row ``i`` is ``vocab[codes[offsets[i]:offsets[i+1]]]``.
+    """
+
+    def __init__(self, offsets: np.ndarray, codes: np.ndarray, vocab: Sequence[str]) -> None:
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.vocab = list(vocab)
+
+    @classmethod
+    def from_tuples(cls, values: Sequence[Sequence[Any]]) -> "RaggedColumn":
+        lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+        flat = [x for v in values for x in v]
+        codes, vocab = pd.factorize(pd.Series(flat, dtype=object), sort=False) if flat else (np.empty(0), [])
+        return cls(np.concatenate([[0], np.cumsum(lengths)]), codes, list(vocab))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Tuple[Any, ...]:
+        vocab = self.vocab
+        return tuple(vocab[c] for c in self.codes[self.offsets[i]:self.offsets[i + 1]].tolist())
+
+    def take(self, rows: np.ndarray) -> "RaggedColumn":
+        starts, ends = self.offsets[rows], self.offsets[np.asarray(rows) + 1]
+        lengths = ends - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        # positions of every element of the selected rows, in row order
+        pos = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return RaggedColumn(offsets, self.codes[pos], self.vocab)
+
+    def append(self, values: Sequence[Sequence[Any]]) -> "RaggedColumn":
+        """Copy with ``values`` added as rows after the existing ones."""
+        other = RaggedColumn.from_tuples(values)
+        codes = pd.Index(self.vocab).get_indexer(other.vocab) if other.vocab else np.empty(0, dtype=np.int64)
+        unseen = codes < 0
+        codes[unseen] = len(self.vocab) + np.arange(int(unseen.sum()))
+        return RaggedColumn(
+            np.concatenate([self.offsets, self.offsets[-1] + other.offsets[1:]]),
+            np.concatenate([self.codes, codes[other.codes].astype(np.int32)]),
+            self.vocab + [w for w, new in zip(other.vocab, unseen.tolist()) if new],
+        )
+
+    def tolist(self) -> List[Tuple[Any, ...]]:
+        vocab = self.vocab
+        flat = [vocab[c] for c in self.codes.tolist()]
+        bounds = self.offsets.tolist()
+        return [tuple(flat[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.offsets.nbytes + self.codes.nbytes + sum(len(v) + 49 for v in map(str, self.vocab)))
+
+
+Column = Union[np.ndarray, RaggedColumn]
+
+
+def _compact_column(values: Any, compact: bool = True) -> Column:
+    if isinstance(values, RaggedColumn):
+        return values
+    values = np.asarray(values)
+    if values.dtype == object and len(values) and all(isinstance(v, tuple) for v in values):
+        return RaggedColumn.from_tuples(values)
+    if values.dtype.kind in "iuf" and not compact:
+        return values.astype(np.int64 if values.dtype.kind in "iu" else np.float64)
+    return _compact_array(values)
+
+
+def _take(column: Column, rows: np.ndarray) -> Column:
+    return column.take(rows) if isinstance(column, RaggedColumn) else column[rows]
+
+
+def _appended(column: Column, values: List[Any]) -> Column:
+    # ``column`` followed by ``values``; numeric columns are re-compacted
+    if isinstance(column, RaggedColumn):
+        return column.append([tuple(v or ()) for v in values])
+    added = np.asarray(values) if column.dtype != object else np.asarray(values, dtype=object)
+    if column.dtype.kind in "iuf" and added.dtype.kind in "iuf":
+        return _compact_array(np.concatenate([column, added]))
+    return np.concatenate([column.astype(object), added.astype(object)])
+
+
+def _column_from_values(values: List[Any], compact: bool = True) -> Column:
+    first = next((v for v in values if v is not None), None)
+    if isinstance(first, (int, float, np.integer, np.floating)) and not isinstance(first, bool):
+        arr = np.asarray(values) if len(values) else np.empty(0)
+        if arr.dtype.kind in "iuf":
+            return _compact_column(arr, compact)
+    if isinstance(first, tuple) and all(isinstance(v, tuple) for v in values):
+        return RaggedColumn.from_tuples(values)
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+
+class _NodeView:
+    def __init__(self, graph: "CSRGraph") -> None:
+        self._g = graph
+
+    def __iter__(self) -> Iterator[str]:
+        ids = self._g.node_ids
+        return (ids[i] for i in np.flatnonzero(self._g.alive).tolist())
+
+    def __len__(self) -> int:
+        return self._g.number_of_nodes()
+
+    def __contains__(self, n: Any) -> bool:
+        return self._g.has_node(n)
+
+    def __getitem__(self, n: str) -> Dict[str, Any]:
+        return self._g._node_attrs(self._g._index_of(n))
+
+    def __call__(self, data: bool = False) -> Iterator[Any]:
+        if not data:
+            return iter(self)
+        g = self._g
+        return ((g.node_ids[i], g._node_attrs(i)) for i in np.flatnonzero(g.alive).tolist())
+
+
+class _EdgeView:
+    def __init__(self, graph: "CSRGraph") -> None:
+        self._g = graph
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return self()
+
+    def __len__(self) -> int:
+        return self._g.number_of_edges()
+
+    def __contains__(self, edge: Tuple[str, str]) -> bool:
+        return self._g.has_edge(*edge)
+
+    def __getitem__(self, edge: Tuple[str, str]) -> Dict[str, Any]:
+        return self._g.get_edge_data(*edge)
+
+    def __call__(self, data: bool = False) -> Iterator[Any]:
+        g = self._g
+        eids = np.flatnonzero(g.edge_mask())
+        ids = g.node_ids
+        us = g.edge_src[eids].tolist()
+        vs = g.indices[eids].tolist()
+        if not data:
+            return ((ids[u], ids[v]) for u, v in zip(us, vs))
+        names = list(g.edge_attrs)
+        cols = [_take(g.edge_attrs[k], eids).tolist() for k in names]
+        return (
+            (ids[u], ids[v], {k: x for k, x in zip(names, row) if x is not None})
+            for u, v, *row in zip(us, vs, *cols)
+        )
+
+
+class CSRGraph:
+    """Directed graph stored as compressed sparse rows over integer stop indices.
+
+    Node ``i`` is ``node_ids[i]``; its out-edges are ``indptr[i]:indptr[i+1]``
+    of ``indices`` (target node) and of every array in ``edge_attrs``. Integer
+    attributes are kept as int32 and floats as float32, tuples (``trip_ids``,
+    ``route_ids``) as :class:`RaggedColumn` codes and anything else as object
+    arrays. The structure is immutable and shared between copies:
+    removing a node only clears its bit in ``alive`` and adjusts the per-node
+    degree counters, so ``copy()`` costs O(nodes) rather than O(edges).
+
+    A subset of the ``nx.DiGraph`` API (``nodes``, ``edges``, ``degree``,
+    ``has_edge``, ``remove_node``, ``copy``, ...) is provided for existing
+    callers; attribute dicts it returns are read-only snapshots.
+    """
+
+    def __init__(
+        self,
+        node_ids: Sequence[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        node_attrs: Optional[Mapping[str, Column]] = None,
+        edge_attrs: Optional[Mapping[str, Column]] = None,
+        rev_indptr: Optional[np.ndarray] = None,
+        rev_eids: Optional[np.ndarray] = None,
+    ) -> None:
+        # arrays are used as given (they may be read-only memmaps); only the
+        # per-instance removal state below is allocated
+        self.node_ids: List[str] = list(node_ids)
+        indptr, indices = np.asanyarray(indptr), np.asanyarray(indices)
+        self.indptr = indptr if indptr.dtype == np.int64 else indptr.astype(np.int64)
+        self.indices = indices if indices.dtype == np.int32 else indices.astype(np.int32)
+        self.node_attrs: Dict[str, Column] = dict(node_attrs or {})
+        self.edge_attrs: Dict[str, Column] = dict(edge_attrs or {})
+        n = len(self.node_ids)
+        if rev_indptr is None or rev_eids is None:
+            # reverse CSR: in-edges of node i are edge ids rev_eids[rev_indptr[i]:rev_indptr[i+1]]
+            rev_eids = np.argsort(self.indices, kind="stable").astype(np.int64)
+            rev_indptr = np.concatenate([[0], np.cumsum(np.bincount(self.indices, minlength=n))]).astype(np.int64)
+        self.rev_indptr = rev_indptr
+        self.rev_eids = rev_eids
+        self._edge_src: Optional[np.ndarray] = None
+        self._node_index: Optional[Dict[str, int]] = None
+        self.alive = np.ones(n, dtype=bool)
+        self.out_deg = np.diff(self.indptr).astype(np.int32)
+        self.in_deg = np.diff(self.rev_indptr).astype(np.int32)
+        self._n_nodes = n
+        self._n_edges = len(self.indices)
+
+    @property
+    def _index(self) -> Dict[str, int]:
+        if self._node_index is None:
+            self._node_index = {nid: i for i, nid in enumerate(self.node_ids)}
+        return self._node_index
+
+    @property
+    def edge_src(self) -> np.ndarray:
+        """Source node index of every edge id."""
+        if self._edge_src is None:
+            self._edge_src = np.repeat(np.arange(len(self.node_ids), dtype=np.int32), np.diff(self.indptr))
+        return self._edge_src
+
+    def _materialize(self) -> None:
+        # build the lazy edge sources and node index once, so that copies share them
+        self._edge_src = self.edge_src
+        self._node_index = self._index
+
+    # -- construction / conversion -------------------------------------------------
+
+    @classmethod
+    def from_arrays(
+        cls,
+        node_ids: Sequence[str],
+        u: np.ndarray,
+        v: np.ndarray,
+        node_attrs: Optional[Mapping[str, Any]] = None,
+        edge_attrs: Optional[Mapping[str, Any]] = None,
+        compact: bool = True,
+    ) -> "CSRGraph":
+        """Build from edge endpoint indices into ``node_ids``; the edge order
+        within each source node is preserved. ``compact=False`` keeps 64-bit
+        numeric attributes."""
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        order = np.argsort(u, kind="stable")
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(u, minlength=len(node_ids)))])
+        return cls(
+            node_ids,
+            indptr,
+            v[order],
+            {k: _compact_column(a, compact) for k, a in (node_attrs or {}).items()},
+            {k: _take(_compact_column(a, compact), order) for k, a in (edge_attrs or {}).items()},
+        )
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph, compact: bool = True) -> "CSRGraph":
+        nodes = [str(n) for n in graph.nodes]
+        index = {n: i for i, n in enumerate(graph.nodes)}
+        node_keys = sorted({k for _, d in graph.nodes(data=True) for k in d})
+        node_attrs = {k: _column_from_values([graph.nodes[n].get(k) for n in graph.nodes], compact) for k in node_keys}
+        edges = list(graph.edges(data=True))
+        u = np.fromiter((index[a] for a, _, _ in edges), dtype=np.int64, count=len(edges))
+        v = np.fromiter((index[b] for _, b, _ in edges), dtype=np.int64, count=len(edges))
+        edge_keys = sorted({k for _, _, d in edges for k in d})
+        edge_attrs = {k: _column_from_values([d.get(k) for _, _, d in edges], compact) for k in edge_keys}
+        return cls.from_arrays(nodes, u, v, node_attrs, edge_attrs, compact=compact)
+
+    def to_networkx(self) -> nx.DiGraph:
+        G = nx.DiGraph()
+        G.add_nodes_from(self.nodes(data=True))
+        G.add_edges_from(self.edges(data=True))
+        return G
+
+    def copy(self) -> "CSRGraph":
+        # structure and attribute arrays are shared; only the mutable state is copied
+        self._materialize()
+        new = object.__new__(CSRGraph)
+        new.__dict__.update(self.__dict__)
+        new.alive = self.alive.copy()
+        new.out_deg = self.out_deg.copy()
+        new.in_deg = self.in_deg.copy()
+        return new
+
+    def replace_edges(
+        self,
+        drop: Sequence[Tuple[Any, Any]],
+        u: Sequence[Any],
+        v: Sequence[Any],
+        edge_attrs: Mapping[str, List[Any]],
+    ) -> "CSRGraph":
+        """Copy without the edges ``drop`` and with edges ``u[i] -> v[i]``
+        carrying ``edge_attrs`` values added (all given as node IDs).
+
+        Costs O(edges) in array operations. Attributes the new edges lack are
+        0 / NaN / empty / ``None`` by column type; removed nodes stay removed.
+        """
+        keep = np.ones(len(self.indices), dtype=bool)
+        for a, b in drop:
+            e = self._edge_id(a, b)
+            if e is not None:
+                keep[e] = False
+        kept = np.flatnonzero(keep)
+        n_new = len(u)
+        index = self._index
+        u = np.fromiter((index[a] for a in u), dtype=np.int64, count=n_new)
+        v = np.fromiter((index[b] for b in v), dtype=np.int64, count=n_new)
+        attrs: Dict[str, Column] = {}
+        for name, column in self.edge_attrs.items():
+            values = edge_attrs.get(name)
+            if values is None:
+                kind = None if isinstance(column, RaggedColumn) else column.dtype.kind
+                values = [() if kind is None else 0 if kind in "iu" else np.nan if kind == "f" else None] * n_new
+            attrs[name] = _appended(_take(column, kept), list(values))
+        for name, values in edge_attrs.items():
+            if name not in attrs:
+                attrs[name] = _column_from_values([None] * len(kept) + list(values))
+        src = np.concatenate([self.edge_src[kept], u])
+        dst = np.concatenate([self.indices[kept], v])
+        new = CSRGraph.from_arrays(self.node_ids, src, dst, self.node_attrs, attrs)
+        new._node_index = index
+        if self._n_nodes != len(self.node_ids):
+            live = self.alive[new.edge_src] & self.alive[new.indices]
+            n = len(self.node_ids)
+            new.alive = self.alive.copy()
+            new.out_deg = np.bincount(new.edge_src[live], minlength=n).astype(np.int32)
+            new.in_deg = np.bincount(new.indices[live], minlength=n).astype(np.int32)
+            new._n_nodes = self._n_nodes
+            new._n_edges = int(live.sum())
+        return new
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "CSRGraph":
+        return self.copy()
+
+    # -- vectorized access ---------------------------------------------------------
+
+    def edge_mask(self) -> np.ndarray:
+        """Boolean mask over edge ids of edges whose endpoints are both alive."""
+        if self._n_nodes == len(self.node_ids):
+            return np.ones(len(self.indices), dtype=bool)
+        return self.alive[self.edge_src] & self.alive[self.indices]
+
+    def edge_values(self, name: str) -> Column:
+        """Values of an edge attribute for the live edges."""
+        values = self.edge_attrs[name]
+        if self._n_nodes == len(self.node_ids):
+            return values
+        return _take(values, np.flatnonzero(self.edge_mask()))
+
+    def degree_array(self) -> np.ndarray:
+        """In + out degree per node index (0 for removed nodes)."""
+        return self.out_deg + self.in_deg
+
+    def node_index(self, n: str) -> int:
+        return self._index_of(n)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.indptr, self.indices, self.rev_eids, self.rev_indptr,
+                  self.alive, self.out_deg, self.in_deg, *self.node_attrs.values(), *self.edge_attrs.values()]
+        return int(sum(a.nbytes for a in arrays))
+
+    # -- nx.DiGraph-compatible subset ---------------------------------------------
+
+    @property
+    def nodes(self) -> _NodeView:
+        return _NodeView(self)
+
+    @property
+    def edges(self) -> _EdgeView:
+        return _EdgeView(self)
+
+    def is_directed(self) -> bool:
+        return True
+
+    def number_of_nodes(self) -> int:
+        return self._n_nodes
+
+    def number_of_edges(self) -> int:
+        return self._n_edges
+
+    def __len__(self) -> int:
+        return self._n_nodes
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.nodes)
+
+    def __contains__(self, n: Any) -> bool:
+        return self.has_node(n)
+
+    def has_node(self, n: Any) -> bool:
+        i = self._index.get(n)
+        return i is not None and bool(self.alive[i])
+
+    def _index_of(self, n: Any) -> int:
+        i = self._index.get(n)
+        if i is None or not self.alive[i]:
+            raise nx.NetworkXError(f"The node {n} is not in the digraph.")
+        return i
+
+    def _edge_id(self, u: Any, v: Any) -> Optional[int]:
+        i, j = self._index.get(u), self._index.get(v)
+        if i is None or j is None or not (self.alive[i] and self.alive[j]):
+            return None
+        start, end = self.indptr[i], self.indptr[i + 1]
+        hits = np.flatnonzero(self.indices[start:end] == j)
+        return int(start + hits[0]) if hits.size else None
+
+    def has_edge(self, u: Any, v: Any) -> bool:
+        return self._edge_id(u, v) is not None
+
+    @staticmethod
+    def _row(columns: Mapping[str, Column], i: int) -> Dict[str, Any]:
+        attrs = {}
+        for k, col in columns.items():
+            x = col[i]
+            x = x.item() if isinstance(x, np.generic) else x
+            if x is not None:
+                attrs[k] = x
+        return attrs
+
+    def _node_attrs(self, i: int) -> Dict[str, Any]:
+        return self._row(self.node_attrs, i)
+
+    def get_edge_data(self, u: Any, v: Any, default: Any = None) -> Any:
+        e = self._edge_id(u, v)
+        if e is None:
+            return default
+        return self._row(self.edge_attrs, e)
+
+    def get_edge_attr(self, u: Any, v: Any, name: str, default: Any = None) -> Any:
+        """One attribute of edge (u, v), without materializing the others."""
+        e = self._edge_id(u, v)
+        col = self.edge_attrs.get(name)
+        if e is None or col is None:
+            return default
+        x = col[e]
+        x = x.item() if isinstance(x, np.generic) else x
+        return default if x is None else x
+
+    def successors(self, n: Any) -> Iterator[str]:
+        i = self._index_of(n)
+        targets = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        return (self.node_ids[j] for j in targets[self.alive[targets]].tolist())
+
+    neighbors = successors
+
+    def predecessors(self, n: Any) -> Iterator[str]:
+        i = self._index_of(n)
+        sources = self.edge_src[self.rev_eids[self.rev_indptr[i]:self.rev_indptr[i + 1]]]
+        return (self.node_ids[j] for j in sources[self.alive[sources]].tolist())
+
+    def _degree(self, counts: np.ndarray, n: Any = None) -> Any:
+        if n is not None:
+            return int(counts[self._index_of(n)])
+        alive = np.flatnonzero(self.alive)
+        return zip([self.node_ids[i] for i in alive.tolist()], counts[alive].tolist())
+
+    def degree(self, n: Any = None) -> Any:
+        return self._degree(self.degree_array(), n)
+
+    def in_degree(self, n: Any = None) -> Any:
+        return self._degree(self.in_deg, n)
+
+    def out_degree(self, n: Any = None) -> Any:
+        return self._degree(self.out_deg, n)
+
+    def remove_node(self, n: Any) -> None:
+        i = self._index_of(n)
+        out_targets = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        out_targets = out_targets[self.alive[out_targets] & (out_targets != i)]
+        in_sources = self.edge_src[self.rev_eids[self.rev_indptr[i]:self.rev_indptr[i + 1]]]
+        in_sources = in_sources[self.alive[in_sources] & (in_sources != i)]
+        np.subtract.at(self.in_deg, out_targets, 1)
+        np.subtract.at(self.out_deg, in_sources, 1)
+        # self-loops count once in out_deg and once in in_deg
+        self._n_edges -= int(self.out_deg[i]) + len(in_sources)
+        self.alive[i] = False
+        self.out_deg[i] = 0
+        self.in_deg[i] = 0
+        self._n_nodes -= 1
+
+    def restore_node(self, n: Any) -> None:
+        """Undo ``remove_node(n)``; edges to nodes that are still removed stay hidden."""
+        i = self._index.get(n)
+        if i is None:
+            raise nx.NetworkXError(f"The node {n} is not in the graph.")
+        if self.alive[i]:
+            raise nx.NetworkXError(f"The node {n} is in the digraph.")
+        self.alive[i] = True
+        out_targets = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        out_targets = out_targets[self.alive[out_targets]]
+        in_sources = self.edge_src[self.rev_eids[self.rev_indptr[i]:self.rev_indptr[i + 1]]]
+        in_sources = in_sources[self.alive[in_sources]]
+        self.out_deg[i] = len(out_targets)
+        self.in_deg[i] = len(in_sources)
+        out_targets = out_targets[out_targets != i]
+        in_sources = in_sources[in_sources != i]
+        np.add.at(self.in_deg, out_targets, 1)
+        np.add.at(self.out_deg, in_sources, 1)
+        self._n_edges += int(self.out_deg[i]) + len(in_sources)
+        self._n_nodes += 1
+
+    def remove_nodes_from(self, nodes: Sequence[Any]) -> None:
+        for n in nodes:
+            if self.has_node(n):
+                self.remove_node(n)
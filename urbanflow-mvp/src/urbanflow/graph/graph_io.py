@@ -1,18 +1,243 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import json
+import os
 import pickle
+import struct
+import uuid
+
 import networkx as nx
+import numpy as np
 
+from .build_graph import GRAPH_BACKENDS
+from .csr import CSRGraph, RaggedColumn, Column, _take
+
+
+# Single-file graph format:
+#   MAGIC | uint32 format version | uint32 reserved | uint64 header length | JSON header
+#   followed by raw little-endian arrays, each starting on an ALIGN-byte boundary.
+# The header maps every array name to its dtype, shape and offset from the start
+# of the data section, and describes how node/edge attribute columns are encoded.
+MAGIC = b"UFGRAPH\x00"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREFIX = struct.Struct("<8sIIQ")
+
+GRAPH_FORMATS = ("ufg", "pickle")
+Graph = Union[nx.DiGraph, CSRGraph]
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # string dictionary: utf-8 bytes of all values + int64 byte offsets
+    encoded = [v.encode("utf-8") for v in values]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _decode_strings(offsets: np.ndarray, data: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[a:b].decode("utf-8") for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _encode_column(prefix: str, column: Column, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    if isinstance(column, RaggedColumn):
+        arrays[f"{prefix}.offsets"] = column.offsets
+        arrays[f"{prefix}.codes"] = column.codes
+        arrays[f"{prefix}.vocab.offsets"], arrays[f"{prefix}.vocab.data"] = _encode_strings([str(v) for v in column.vocab])
+        return {"kind": "ragged"}
+    if column.dtype != object:
+        arrays[f"{prefix}.values"] = np.ascontiguousarray(column)
+        return {"kind": "array"}
+    # object columns: None becomes an invalid slot; numbers keep a numeric array, anything else a string dictionary
+    valid = np.fromiter((v is not None for v in column), dtype=bool, count=len(column))
+    present = [v for v in column if v is not None]
+    meta: Dict[str, Any] = {}
+    if not valid.all():
+        arrays[f"{prefix}.valid"] = valid
+    if all(isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool) for v in present):
+        values = np.zeros(len(column), dtype=np.float64)
+        values[valid] = np.asarray(present, dtype=np.float64)
+        arrays[f"{prefix}.values"] = values
+        meta["kind"] = "array"
+    else:
+        vocab, codes = np.unique(np.asarray([str(v) for v in present], dtype=object), return_inverse=True)
+        full = np.full(len(column), -1, dtype=np.int32)
+        full[valid] = codes
+        arrays[f"{prefix}.codes"] = full
+        arrays[f"{prefix}.vocab.offsets"], arrays[f"{prefix}.vocab.data"] = _encode_strings(vocab.tolist())
+        meta["kind"] = "strings"
+    return meta
+
+
+def _decode_column(prefix: str, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> Column:
+    kind = meta["kind"]
+    if kind == "ragged":
+        vocab = _decode_strings(arrays[f"{prefix}.vocab.offsets"], arrays[f"{prefix}.vocab.data"])
+        return RaggedColumn(arrays[f"{prefix}.offsets"], arrays[f"{prefix}.codes"], vocab)
+    if kind == "array":
+        values = arrays[f"{prefix}.values"]
+    elif kind == "strings":
+        vocab = np.asarray(_decode_strings(arrays[f"{prefix}.vocab.offsets"], arrays[f"{prefix}.vocab.data"]) + [None], dtype=object)
+        values = vocab[arrays[f"{prefix}.codes"]]
+    else:
+        raise ValueError(f"Unknown column kind {kind!r} in graph file")
+    valid = arrays.get(f"{prefix}.valid")
+    if valid is not None:
+        values = values.astype(object)
+        values[~valid] = None
+    return values
 
-def save_graph(graph: nx.DiGraph, path: Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("wb") as f:
-        pickle.dump(graph, f)
 
+def _graph_arrays(graph: CSRGraph) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    arrays: Dict[str, np.ndarray] = {
+        "indptr": graph.indptr,
+        "indices": graph.indices,
+        "rev_indptr": graph.rev_indptr,
+        "rev_eids": graph.rev_eids,
+    }
+    arrays["node_ids.offsets"], arrays["node_ids.data"] = _encode_strings(graph.node_ids)
+    header: Dict[str, Any] = {"num_nodes": len(graph.node_ids), "num_edges": int(len(graph.indices))}
+    header["node_columns"] = {k: _encode_column(f"node.{k}", c, arrays) for k, c in graph.node_attrs.items()}
+    header["edge_columns"] = {k: _encode_column(f"edge.{k}", c, arrays) for k, c in graph.edge_attrs.items()}
+    return header, arrays
 
-def load_graph(path: Path) -> nx.DiGraph:
+
+def _live_csr(graph: Graph) -> CSRGraph:
+    # attribute values are written as they are held in memory, never narrowed: networkx
+    # attributes as 64-bit columns, CSR columns in their own dtypes
+    if not isinstance(graph, CSRGraph):
+        return CSRGraph.from_networkx(graph, compact=False)
+    if graph.number_of_nodes() == len(graph.node_ids):
+        return graph
+    # drop removed nodes so the file holds exactly the live graph; edges stay grouped by source
+    live = np.flatnonzero(graph.alive)
+    eids = np.flatnonzero(graph.edge_mask())
+    remap = np.cumsum(graph.alive) - 1
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(remap[graph.edge_src[eids]], minlength=len(live)))])
+    return CSRGraph(
+        [graph.node_ids[i] for i in live.tolist()],
+        indptr,
+        remap[graph.indices[eids]],
+        {k: _take(c, live) for k, c in graph.node_attrs.items()},
+        {k: _take(c, eids) for k, c in graph.edge_attrs.items()},
+    )
+
+
+def _write_ufg(graph: Graph, path: Path) -> None:
+    header, arrays = _graph_arrays(_live_csr(graph))
+    entries = {}
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arrays[name] = arr
+        entries[name] = {"dtype": arr.dtype.newbyteorder("<").str, "shape": list(arr.shape), "offset": offset}
+        offset = _aligned(offset + arr.nbytes)
+    header["arrays"] = entries
+    header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+    data_start = _aligned(_PREFIX.size + len(header_bytes))
+
+    # write next to the target and rename, so readers never map a partial file
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes)))
+            f.write(header_bytes)
+            for name, arr in arrays.items():
+                f.seek(data_start + entries[name]["offset"])
+                f.write(arr.astype(arr.dtype.newbyteorder("<"), copy=False).tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _read_header(path: Path) -> Tuple[Dict[str, Any], int]:
+    with path.open("rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size or prefix[:8] != MAGIC:
+            raise ValueError(f"{path} is not an urbanflow graph file (pickled graphs need format='pickle')")
+        _, version, _, header_len = _PREFIX.unpack(prefix)
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} uses graph format v{version}; this version reads up to v{FORMAT_VERSION}")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    return header, _aligned(_PREFIX.size + header_len)
+
+
+def _read_ufg(path: Path, backend: str, mmap: bool) -> Graph:
+    header, data_start = _read_header(path)
+    arrays: Dict[str, np.ndarray] = {}
     with path.open("rb") as f:
-        return pickle.load(f)
+        for name, entry in header["arrays"].items():
+            dtype = np.dtype(entry["dtype"])
+            shape = tuple(entry["shape"])
+            count = int(np.prod(shape)) if shape else 1
+            if mmap and count:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + entry["offset"], shape=shape)
+            else:
+                f.seek(data_start + entry["offset"])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+    graph = CSRGraph(
+        _decode_strings(arrays["node_ids.offsets"], arrays["node_ids.data"]),
+        arrays["indptr"],
+        arrays["indices"],
+        {k: _decode_column(f"node.{k}", m, arrays) for k, m in header["node_columns"].items()},
+        {k: _decode_column(f"edge.{k}", m, arrays) for k, m in header["edge_columns"].items()},
+        rev_indptr=arrays["rev_indptr"],
+        rev_eids=arrays["rev_eids"],
+    )
+    return graph.to_networkx() if backend == "networkx" else graph
+
+
+def save_graph(graph: Graph, path: Path, format: str = "ufg") -> None:
+    """Write a graph (``nx.DiGraph`` or :class:`CSRGraph`).
+
+    ``format="ufg"`` (default) writes the versioned binary format: string ID
+    dictionary, CSR and reverse-CSR arrays and one typed column per attribute.
+    It contains no executable data and can be memory-mapped by ``load_graph``.
+    Attributes keep their in-memory precision whichever backend the graph
+    uses (networkx numbers as 64-bit columns); removed CSR nodes are dropped.
+    ``format="pickle"`` is the legacy pickled ``nx.DiGraph``.
+    """
+    if format not in GRAPH_FORMATS:
+        raise ValueError(f"Unknown graph format {format!r}; expected one of {GRAPH_FORMATS}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if format == "pickle":
+        if isinstance(graph, CSRGraph):
+            graph = graph.to_networkx()
+        with path.open("wb") as f:
+            pickle.dump(graph, f)
+        return
+    _write_ufg(graph, path)
+
 
+def load_graph(
+    path: Path,
+    backend: str = "networkx",
+    mmap: bool = True,
+    format: Optional[str] = None,
+) -> Graph:
+    """Read a graph written by ``save_graph``.
 
+    With ``backend="csr"`` and ``mmap=True`` the arrays are read-only
+    ``numpy.memmap`` views of the file, so processes loading the same file
+    share its pages through the OS cache and loading costs O(nodes).
+    Pickle files are only read with an explicit ``format="pickle"``.
+    """
+    if format not in (None, *GRAPH_FORMATS):
+        raise ValueError(f"Unknown graph format {format!r}; expected one of {GRAPH_FORMATS}")
+    if backend not in GRAPH_BACKENDS:
+        raise ValueError(f"Unknown graph backend {backend!r}; expected one of {GRAPH_BACKENDS}")
+    if format == "pickle":
+        with path.open("rb") as f:
+            graph = pickle.load(f)
+        return CSRGraph.from_networkx(graph) if backend == "csr" else graph
+    return _read_ufg(path, backend, mmap)
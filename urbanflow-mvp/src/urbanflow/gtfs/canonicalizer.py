@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import numpy as np
 import pandas as pd
 
+from .times import hms_to_seconds
 
-def canonicalize_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+
+def canonicalize_static(feed: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
     stops = feed["stops.txt"].copy()
     routes = feed["routes.txt"].copy()
     trips = feed["trips.txt"].copy()
-    stop_times = feed["stop_times.txt"].copy()
     frequencies = feed.get("frequencies.txt", pd.DataFrame())
 
     # enforce basic schemas and types
@@ -33,22 +35,6 @@ def canonicalize_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
     if "shape_id" not in trips.columns:
         trips["shape_id"] = None
 
-    # normalize times to seconds
-    def to_sec(t: str) -> int:
-        if pd.isna(t):
-            return 0
-        h, m, s = [int(x) for x in str(t).split(":")]
-        return h * 3600 + m * 60 + s
-
-    st = stop_times.copy()
-    st["arrival_time_sec"] = st["arrival_time"].apply(to_sec)
-    st["departure_time_sec"] = st["departure_time"].apply(to_sec)
-    if "timepoint" not in st.columns:
-        st["timepoint"] = 1
-    st = st[
-        ["trip_id", "arrival_time_sec", "departure_time_sec", "stop_sequence", "stop_id", "timepoint"]
-    ].sort_values(["trip_id", "stop_sequence"])
-
     frequencies = frequencies.copy()
     if not frequencies.empty:
         # keep core fields if exists
@@ -59,8 +45,64 @@ def canonicalize_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
         "stops": stops.reset_index(drop=True),
         "routes": routes.reset_index(drop=True),
         "trips": trips.reset_index(drop=True),
-        "stop_times": st.reset_index(drop=True),
         "frequencies": frequencies.reset_index(drop=True),
+        "shapes": canonicalize_shapes(feed.get("shapes.txt")),
+    }
+
+
+SHAPE_COLUMNS = ["shape_id", "lat", "lon", "sequence"]
+
+
+def canonicalize_shapes(shapes: Optional[pd.DataFrame]) -> pd.DataFrame:
+    # polyline points ordered by shape, then sequence; empty (with columns) when the feed has none
+    if shapes is None or shapes.empty:
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in zip(SHAPE_COLUMNS, ["object", "float64", "float64", "int64"])})
+    out = shapes.rename(columns={"shape_pt_lat": "lat", "shape_pt_lon": "lon", "shape_pt_sequence": "sequence"})
+    out = out[SHAPE_COLUMNS].astype({"shape_id": str, "lat": "float64", "lon": "float64", "sequence": "int64"})
+    return out.sort_values(["shape_id", "sequence"], kind="stable").reset_index(drop=True)
+
+
+def canonicalize_stop_times(stop_times: pd.DataFrame) -> pd.DataFrame:
+    # rows without a stop_sequence cannot be placed in their trip (the validator reports them)
+    st = stop_times[stop_times["stop_sequence"].notna().to_numpy()].copy()
+    st["stop_sequence"] = st["stop_sequence"].astype("int32")
+    # normalize times to seconds
+    st["arrival_time_sec"] = hms_to_seconds(st["arrival_time"])
+    st["departure_time_sec"] = hms_to_seconds(st["departure_time"])
+    if "timepoint" not in st.columns:
+        st["timepoint"] = 1
+    st = st[
+        ["trip_id", "arrival_time_sec", "departure_time_sec", "stop_sequence", "stop_id", "timepoint"]
+    ].sort_values(["trip_id", "stop_sequence"])
+    return st.reset_index(drop=True)
+
+
+def canonicalize_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    static = canonicalize_static(feed)
+    return {
+        "stops": static["stops"],
+        "routes": static["routes"],
+        "trips": static["trips"],
+        "stop_times": canonicalize_stop_times(feed["stop_times.txt"]),
+        "frequencies": static["frequencies"],
+        "shapes": static["shapes"],
     }
 
 
+def trip_extents(stop_times: pd.DataFrame) -> pd.DataFrame:
+    """One row per trip: first/last stop, first departure, last arrival and stop count."""
+    codes, trip_ids = pd.factorize(stop_times["trip_id"].astype(str))
+    order = np.lexsort((stop_times["stop_sequence"].to_numpy(), codes))
+    codes = codes[order]
+    bounds = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=np.int64)
+    ends = np.r_[bounds[1:], len(order)]
+    first, last = order[bounds], order[ends - 1]
+    stop_ids = stop_times["stop_id"].astype(str).to_numpy()
+    return pd.DataFrame({
+        "trip_id": np.asarray(trip_ids, dtype=object)[codes[bounds]],
+        "first_stop": stop_ids[first],
+        "last_stop": stop_ids[last],
+        "start": stop_times["departure_time_sec"].to_numpy(dtype=np.int64)[first],
+        "end": stop_times["arrival_time_sec"].to_numpy(dtype=np.int64)[last],
+        "stops": ends - bounds,
+    })
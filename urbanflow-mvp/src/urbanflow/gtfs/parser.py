@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Union
 from pathlib import Path
-import io
+import csv
 import zipfile
 
 import pandas as pd
@@ -25,28 +25,308 @@ OPTIONAL_FILES = [
     "transfers.txt",
 ]
 
+# Per-file column types. IDs and clock times stay strings so that values like
+# "00123" or "25:10:00" survive untouched; numeric columns get the narrowest
+# dtype that holds valid GTFS values, except coordinates, which stay float64
+# (float32 is off by up to about a metre at city latitudes). Nullable ("Int8",
+# ...) dtypes are used for integer columns that may be left blank.
+GTFS_SCHEMAS: Dict[str, Dict[str, str]] = {
+    "stops.txt": {
+        "stop_id": "str",
+        "stop_name": "str",
+        "stop_lat": "float64",
+        "stop_lon": "float64",
+        "zone_id": "str",
+    },
+    "routes.txt": {
+        "route_id": "str",
+        "route_short_name": "str",
+        "route_long_name": "str",
+        "route_type": "int16",
+    },
+    "trips.txt": {
+        "trip_id": "str",
+        "route_id": "str",
+        "service_id": "str",
+        "trip_headsign": "str",
+        "shape_id": "str",
+    },
+    "stop_times.txt": {
+        "trip_id": "str",
+        "arrival_time": "str",
+        "departure_time": "str",
+        "stop_id": "str",
+        "stop_sequence": "Int32",
+        "timepoint": "Int8",
+    },
+    "frequencies.txt": {
+        "trip_id": "str",
+        "start_time": "str",
+        "end_time": "str",
+        "headway_secs": "int32",
+        "exact_times": "Int8",
+    },
+    "shapes.txt": {
+        "shape_id": "str",
+        "shape_pt_lat": "float64",
+        "shape_pt_lon": "float64",
+        "shape_pt_sequence": "int32",
+        "shape_dist_traveled": "float32",
+    },
+    "agency.txt": {"agency_id": "str"},
+    "calendar.txt": {"service_id": "str"},
+    "calendar_dates.txt": {"service_id": "str", "date": "str", "exception_type": "Int8"},
+    "transfers.txt": {"from_stop_id": "str", "to_stop_id": "str", "transfer_type": "Int8", "min_transfer_time": "Int32"},
+}
 
-def _read_csv_from_zip(zf: zipfile.ZipFile, member: str) -> Optional[pd.DataFrame]:
+# Files whose columns are pruned to the schema above (the columns used by the
+# validator and canonicalizer). Other files keep every column, read as strings.
+PRUNED_FILES = {"stops.txt", "routes.txt", "trips.txt", "stop_times.txt", "frequencies.txt", "shapes.txt"}
+
+# ID columns that repeat heavily in large tables and may be loaded as categoricals
+CATEGORICAL_ID_COLUMNS = {
+    "stop_times.txt": ["trip_id", "stop_id"],
+    "shapes.txt": ["shape_id"],
+}
+
+ENGINES = ("pandas", "pyarrow")
+
+# a GTFS zip on disk or an open, seekable binary file object (e.g. an upload)
+GtfsSource = Union[Path, BinaryIO]
+
+
+@dataclass(frozen=True)
+class ReadPlan:
+    """Resolved columns and dtypes for reading one GTFS member."""
+
+    usecols: Optional[List[str]]
+    dtypes: Dict[str, str]
+    rename: Dict[str, str]
+
+
+def _read_header(zf: zipfile.ZipFile, member: str) -> List[str]:
+    with zf.open(member) as f:
+        line = f.readline()
+    text = line.decode("utf-8-sig").strip()
+    if not text:
+        return []
+    return next(csv.reader([text]))
+
+
+def _plan_member(
+    member: str,
+    header: List[str],
+    prune_columns: bool = True,
+    categorical_ids: bool = False,
+) -> ReadPlan:
+    schema = dict(GTFS_SCHEMAS.get(member, {}))
+    if categorical_ids:
+        for col in CATEGORICAL_ID_COLUMNS.get(member, []):
+            schema[col] = "category"
+    prune = prune_columns and member in PRUNED_FILES
+
+    usecols: List[str] = []
+    dtypes: Dict[str, str] = {}
+    rename: Dict[str, str] = {}
+    for raw in header:
+        name = raw.strip()
+        if prune and name not in schema:
+            continue
+        usecols.append(raw)
+        # unknown columns are kept as strings rather than guessed
+        dtypes[raw] = schema.get(name, "str")
+        if raw != name:
+            rename[raw] = name
+    return ReadPlan(usecols=usecols if prune else None, dtypes=dtypes, rename=rename)
+
+
+def _csv_dtypes(plan: ReadPlan) -> Dict[str, str]:
+    # the C parser reads nullable ints about twice as slowly as floats, so they are read as
+    # float64 (exact over their range) and converted by _nullable_ints
+    return {c: "float64" if t.startswith("Int") else t for c, t in plan.dtypes.items()}
+
+
+def _nullable_ints(df: pd.DataFrame, plan: ReadPlan) -> pd.DataFrame:
+    # raises on fractional values, as reading them as ints would
+    return df.astype({c: t for c, t in plan.dtypes.items() if t.startswith("Int") and c in df.columns})
+
+
+def _read_member_pandas(zf: zipfile.ZipFile, member: str, plan: ReadPlan) -> pd.DataFrame:
+    with zf.open(member) as f:
+        # read the binary stream directly; only blank fields count as missing so
+        # IDs such as "NA" or "null" are kept verbatim
+        df = pd.read_csv(
+            f,
+            usecols=plan.usecols,
+            dtype=_csv_dtypes(plan),
+            encoding="utf-8-sig",
+            keep_default_na=False,
+            na_values=[""],
+        )
+    return _nullable_ints(df, plan)
+
+
+def _arrow_type(dtype: str):
+    import pyarrow as pa
+
+    return {
+        "str": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "float32": pa.float32(),
+        "float64": pa.float64(),
+        "int16": pa.int16(),
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "Int8": pa.int8(),
+        "Int32": pa.int32(),
+    }[dtype]
+
+
+def _read_member_pyarrow(zf: zipfile.ZipFile, member: str, plan: ReadPlan) -> pd.DataFrame:
+    import pyarrow.csv as pacsv
+
+    convert = pacsv.ConvertOptions(
+        column_types={c: _arrow_type(t) for c, t in plan.dtypes.items()},
+        include_columns=plan.usecols,
+        null_values=[""],
+        strings_can_be_null=True,
+    )
+    with zf.open(member) as f:
+        table = pacsv.read_csv(f, convert_options=convert)
+    df = table.to_pandas()
+    # align numeric dtypes with the pandas backend (arrow turns nullable ints
+    # into floats); string columns are already object/str with missing as null
+    return df.astype({c: t for c, t in plan.dtypes.items() if c in df.columns and t != "str"})
+
+
+def _open_zip(source: GtfsSource) -> zipfile.ZipFile:
+    if hasattr(source, "read"):
+        source.seek(0)
+        return zipfile.ZipFile(source, "r")
+    path = Path(source)
+    if not path.exists():
+        raise FileNotFoundError(f"GTFS path not found: {path}")
+    return zipfile.ZipFile(path, "r")
+
+
+def _read_csv_from_zip(
+    zf: zipfile.ZipFile,
+    member: str,
+    engine: str = "pandas",
+    prune_columns: bool = True,
+    categorical_ids: bool = False,
+) -> Optional[pd.DataFrame]:
     try:
-        with zf.open(member) as f:
-            # pandas infers types; keep strings where necessary
-            return pd.read_csv(io.TextIOWrapper(f, encoding="utf-8"))
+        header = _read_header(zf, member)
     except KeyError:
         return None
+    if not header:
+        return pd.DataFrame()
+    plan = _plan_member(member, header, prune_columns=prune_columns, categorical_ids=categorical_ids)
+    if engine == "pyarrow":
+        df = _read_member_pyarrow(zf, member, plan)
+    else:
+        df = _read_member_pandas(zf, member, plan)
+    if plan.rename:
+        df = df.rename(columns=plan.rename)
+    return df
 
 
-def read_gtfs_zip(path: Path) -> Dict[str, pd.DataFrame]:
-    if not path.exists():
-        raise FileNotFoundError(f"GTFS path not found: {path}")
-    with zipfile.ZipFile(path, "r") as zf:
+def read_gtfs_zip(
+    path: GtfsSource,
+    engine: str = "pandas",
+    prune_columns: bool = True,
+    categorical_ids: bool = False,
+    exclude: Sequence[str] = (),
+) -> Dict[str, pd.DataFrame]:
+    """Read a GTFS zip into typed DataFrames keyed by file name.
+
+    ``engine`` selects the CSV backend ("pandas" or "pyarrow"). With
+    ``prune_columns`` the core files are limited to the columns of
+    ``GTFS_SCHEMAS``; ``categorical_ids`` loads the repeated IDs of
+    ``stop_times.txt``/``shapes.txt`` as categoricals to save memory.
+    Members listed in ``exclude`` are skipped (e.g. ``stop_times.txt`` when
+    it is streamed with ``iter_stop_times_chunks``).
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown CSV engine: {engine} (expected one of {ENGINES})")
+    with _open_zip(path) as zf:
         data: Dict[str, pd.DataFrame] = {}
         for name in REQUIRED_FILES + OPTIONAL_FILES:
-            df = _read_csv_from_zip(zf, name)
+            if name in exclude:
+                continue
+            df = _read_csv_from_zip(
+                zf,
+                name,
+                engine=engine,
+                prune_columns=prune_columns,
+                categorical_ids=categorical_ids,
+            )
             if df is not None:
                 data[name] = df
-        missing = [f for f in REQUIRED_FILES if f not in data]
+        missing = [f for f in REQUIRED_FILES if f not in data and f not in exclude]
         if missing:
             raise ValueError(f"Missing required GTFS files: {missing}")
         return data
 
 
+def iter_stop_times_chunks(
+    path: GtfsSource,
+    chunk_size: int = 500_000,
+    prune_columns: bool = True,
+) -> Iterator[pd.DataFrame]:
+    """Yield ``stop_times.txt`` in trip-aligned chunks of about ``chunk_size`` rows.
+
+    Rows of the trip that straddles a chunk boundary are carried over to the
+    next chunk, so every trip is contained in exactly one chunk. This relies
+    on the file being grouped by ``trip_id`` (as virtually all feeds are); a
+    trip that reappears after its chunk was emitted raises ``ValueError``.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+    member = "stop_times.txt"
+    with _open_zip(path) as zf:
+        try:
+            header = _read_header(zf, member)
+        except KeyError:
+            raise ValueError(f"Missing required GTFS files: {[member]}") from None
+        plan = _plan_member(member, header, prune_columns=prune_columns)
+        emitted: set = set()
+        carry: Optional[pd.DataFrame] = None
+        with zf.open(member) as f:
+            reader = pd.read_csv(
+                f,
+                usecols=plan.usecols,
+                dtype=_csv_dtypes(plan),
+                encoding="utf-8-sig",
+                keep_default_na=False,
+                na_values=[""],
+                chunksize=chunk_size,
+            )
+            for chunk in reader:
+                chunk = _nullable_ints(chunk, plan)
+                if plan.rename:
+                    chunk = chunk.rename(columns=plan.rename)
+                if carry is not None and not carry.empty:
+                    chunk = pd.concat([carry, chunk], ignore_index=True)
+                # hold back the trip at the end of the chunk; it may continue
+                is_tail = chunk["trip_id"] == chunk["trip_id"].iloc[-1]
+                carry = chunk[is_tail]
+                body = chunk[~is_tail]
+                if body.empty:
+                    continue
+                yield _checked_chunk(body.reset_index(drop=True), emitted)
+        if carry is not None and not carry.empty:
+            yield _checked_chunk(carry.reset_index(drop=True), emitted)
+
+
+def _checked_chunk(chunk: pd.DataFrame, emitted: set) -> pd.DataFrame:
+    trip_ids = set(chunk["trip_id"].unique())
+    split = trip_ids & emitted
+    if split:
+        raise ValueError(
+            "stop_times.txt is not grouped by trip_id (trips split across chunks: "
+            f"{sorted(split)[:5]}); use the non-streaming reader for this feed"
+        )
+    emitted.update(trip_ids)
+    return chunk
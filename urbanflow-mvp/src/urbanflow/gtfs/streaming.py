@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from typing import Dict, Any, List, Set
+
+import pandas as pd
+
+from .parser import GtfsSource, read_gtfs_zip, iter_stop_times_chunks
+from .canonicalizer import canonicalize_static, canonicalize_stop_times
+from .validator import (
+    _reference_ids,
+    _missing_stop_time_refs,
+    _stop_time_ref_errors,
+    _blank_sequence_rows,
+    _blank_sequence_warnings,
+    _trip_ref_errors,
+    _table_warnings,
+    _deadhead_warnings,
+    _report,
+)
+from ..graph.build_graph import _edge_rows, _graph_from_edge_rows
+
+
+DEFAULT_CHUNK_SIZE = 500_000
+
+
+def stream_feed(
+    path: GtfsSource,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    engine: str = "pandas",
+    graph_backend: str = "networkx",
+) -> Dict[str, Any]:
+    """Validate, canonicalize and build the graph of a feed in one streaming pass.
+
+    Only the small tables are loaded whole; ``stop_times.txt`` is read in
+    trip-aligned chunks of about ``chunk_size`` rows. Each chunk is converted
+    to canonical seconds, checked against the stop/trip IDs and reduced to its
+    edge rows, so the raw string rows of at most one chunk are alive at a time.
+    Returns the same ``report``/``canonical``/``graph`` as the in-memory path.
+    """
+    feed = read_gtfs_zip(path, engine=engine, exclude=["stop_times.txt"])
+    ids = _reference_ids(feed)
+
+    missing: Dict[str, Set[str]] = {"stop_id": set(), "trip_id": set()}
+    canonical_chunks: List[pd.DataFrame] = []
+    edge_chunks: List[pd.DataFrame] = []
+    n_rows = 0
+    n_blank = 0
+    n_chunks = 0
+    for chunk in iter_stop_times_chunks(path, chunk_size=chunk_size):
+        n_chunks += 1
+        n_rows += len(chunk)
+        for col, bad in _missing_stop_time_refs(chunk, ids).items():
+            missing[col].update(bad)
+        n_blank += _blank_sequence_rows(chunk)
+        st = canonicalize_stop_times(chunk)
+        del chunk
+        edge_chunks.append(_edge_rows(st))
+        canonical_chunks.append(st)
+
+    errors = _stop_time_ref_errors(missing)
+    errors.extend(_trip_ref_errors(feed, ids))
+    warnings = _table_warnings(feed) + _blank_sequence_warnings(n_blank) + _deadhead_warnings(feed)
+
+    static = canonicalize_static(feed)
+    stop_times = _concat_sorted(canonical_chunks, ["trip_id", "stop_sequence"])
+    edges = _concat_sorted(edge_chunks, ["trip_id"])
+    canonical = {
+        "stops": static["stops"],
+        "routes": static["routes"],
+        "trips": static["trips"],
+        "stop_times": stop_times,
+        "frequencies": static["frequencies"],
+        "shapes": static["shapes"],
+    }
+    return {
+        "report": _report(errors, warnings),
+        "canonical": canonical,
+        "graph": _graph_from_edge_rows(static["stops"], edges, static["trips"], backend=graph_backend),
+        "stats": {"chunks": n_chunks, "stop_times_rows": n_rows, "chunk_size": int(chunk_size)},
+    }
+
+
+def _concat_sorted(frames: List[pd.DataFrame], by: List[str]) -> pd.DataFrame:
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    # chunks follow file order; restore the trip ordering of the in-memory path
+    return df.sort_values(by, kind="stable").reset_index(drop=True)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+SECONDS_PER_DAY = 24 * 3600
+# width of a time-of-day band (s), for headway planning and AVL percentiles
+DEFAULT_BAND_S = 3600
+
+# byte offsets of the digits in a fixed-width "HH:MM:SS" string
+_HMS_DIGITS = np.array([0, 1, 3, 4, 6, 7])
+_HMS_WEIGHTS = np.array([36000, 3600, 600, 60, 10, 1], dtype=np.int64)
+
+
+def _as_series(values: Any) -> pd.Series:
+    if isinstance(values, pd.Series):
+        return values.reset_index(drop=True)
+    return pd.Series(np.asarray(values, dtype=object))
+
+
+def _parse_fixed_width(text: np.ndarray) -> np.ndarray | None:
+    # fast path: every value is "H:MM:SS" or "HH:MM:SS"; work on the UCS-4
+    # code points of a fixed-width unicode array, no per-row Python
+    text = text.astype(str)
+    lengths = np.char.str_len(text)
+    if text.size == 0 or not np.all((lengths == 7) | (lengths == 8)):
+        return None
+    cp = text.astype("U8").view(np.uint32).reshape(-1, 8).copy()
+    short = lengths == 7
+    if short.any():
+        # right-align "H:MM:SS" as "0H:MM:SS"
+        cp[short, 1:] = cp[short, :-1]
+        cp[short, 0] = ord("0")
+    if not (np.all(cp[:, 2] == ord(":")) and np.all(cp[:, 5] == ord(":"))):
+        return None
+    digits = cp[:, _HMS_DIGITS].astype(np.int64) - ord("0")
+    if np.any((digits < 0) | (digits > 9)):
+        return None
+    return digits @ _HMS_WEIGHTS
+
+
+def _parse_split(text: pd.Series, errors: str) -> np.ndarray:
+    parts = text.str.split(":", expand=True)
+    n = len(text)
+    if parts.shape[1] < 3:
+        parts = parts.reindex(columns=range(3))
+    # only rows with exactly three fields are valid times
+    valid = parts.iloc[:, :3].notna().all(axis=1).to_numpy().copy()
+    if parts.shape[1] > 3:
+        valid &= parts.iloc[:, 3:].isna().all(axis=1).to_numpy()
+    nums = [pd.to_numeric(parts[i].astype(str).str.strip(), errors="coerce").to_numpy(dtype=float) for i in range(3)]
+    h, m, s = nums
+    valid &= ~(np.isnan(h) | np.isnan(m) | np.isnan(s))
+    valid &= (h == np.round(h)) & (m == np.round(m)) & (s == np.round(s))
+    if errors == "raise" and not valid.all():
+        bad = text.to_numpy()[~valid][0]
+        raise ValueError(f"Invalid GTFS time: {bad!r}")
+    out = np.zeros(n, dtype=np.int64)
+    out[valid] = (h[valid] * 3600 + m[valid] * 60 + s[valid]).astype(np.int64)
+    return out
+
+
+def hms_to_seconds(values: Any, errors: str = "raise") -> np.ndarray:
+    """Convert GTFS ``H:MM:SS`` times (may exceed 24h) to int32 seconds.
+
+    Missing values map to 0. Malformed values raise ``ValueError`` with
+    ``errors="raise"`` and map to 0 with ``errors="coerce"``.
+    """
+    if errors not in ("raise", "coerce"):
+        raise ValueError(f"errors must be 'raise' or 'coerce', got {errors!r}")
+    series = _as_series(values)
+    out = np.zeros(len(series), dtype=np.int32)
+    present = series.notna().to_numpy()
+    if not present.any():
+        return out
+    text = series[present].astype(str)
+    parsed = _parse_fixed_width(text.to_numpy(dtype=object))
+    if parsed is None:
+        parsed = _parse_split(text.reset_index(drop=True), errors)
+    out[present] = parsed
+    return out
+
+
+def seconds_to_hms(seconds: Any) -> np.ndarray:
+    """Format integer seconds as zero-padded ``HH:MM:SS`` strings (hours may exceed 23)."""
+    sec = np.asarray(seconds, dtype=np.int64)
+    h = sec // 3600
+    m = (sec % 3600) // 60
+    s = sec % 60
+    if sec.size and (h.min() < 0 or h.max() > 99):
+        # rare: negative or 3+ digit hours; format via pandas strings
+        def pad(x: np.ndarray) -> pd.Series:
+            return pd.Series(x).astype(str).str.zfill(2)
+        return (pad(h) + ":" + pad(m) + ":" + pad(s)).to_numpy(dtype=object)
+    u = np.empty((sec.size, 8), dtype=np.uint8)
+    u[:, 2] = u[:, 5] = ord(":")
+    for col, value in ((0, h // 10), (1, h % 10), (3, m // 10), (4, m % 10), (6, s // 10), (7, s % 10)):
+        u[:, col] = value + ord("0")
+    return u.view("S8").ravel().astype("U8").astype(object)
+
+
+def overnight_offsets(trip_ids: Any, arrival_sec: Any) -> np.ndarray:
+    """Per-row day offsets (in seconds) that make each trip's arrivals non-decreasing.
+
+    Rows must already be sorted by trip and stop_sequence. Every time the
+    arrival drops below the previous stop's arrival within a trip, a further
+    24h is added to that row and all following rows of the trip; this is a
+    cumulative count of drops per trip.
+    """
+    arr = np.asarray(arrival_sec, dtype=np.int64)
+    trips = np.asarray(trip_ids, dtype=object)
+    n = arr.size
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+    new_trip = np.ones(n, dtype=bool)
+    new_trip[1:] = trips[1:] != trips[:-1]
+    drops = np.zeros(n, dtype=np.int64)
+    drops[1:] = arr[1:] < arr[:-1]
+    drops[new_trip] = 0
+    total = np.cumsum(drops)
+    starts = np.flatnonzero(new_trip)
+    base = np.repeat(total[starts], np.diff(np.append(starts, n)))
+    return ((total - base) * SECONDS_PER_DAY).astype(np.int32)
@@ -1,81 +1,84 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Set
 import pandas as pd
 
+from .times import hms_to_seconds, overnight_offsets
 
-def _ref_integrity(feed: Dict[str, pd.DataFrame]) -> List[str]:
-    errors: List[str] = []
-    stops = feed["stops.txt"]
-    trips = feed["trips.txt"]
-    routes = feed["routes.txt"]
-    stop_times = feed["stop_times.txt"]
-    shapes = feed.get("shapes.txt")
 
-    stop_ids = set(stops["stop_id"].astype(str))
-    trip_ids = set(trips["trip_id"].astype(str))
-    route_ids = set(routes["route_id"].astype(str))
+def _reference_ids(feed: Dict[str, pd.DataFrame]) -> Dict[str, Set[str]]:
+    shapes = feed.get("shapes.txt")
     if shapes is not None and not shapes.empty:
         shape_ids = set(shapes["shape_id"].astype(str))
     else:
         shape_ids = set()
+    return {
+        "stop_id": set(feed["stops.txt"]["stop_id"].astype(str)),
+        "trip_id": set(feed["trips.txt"]["trip_id"].astype(str)),
+        "route_id": set(feed["routes.txt"]["route_id"].astype(str)),
+        "shape_id": shape_ids,
+    }
 
+
+def _missing_stop_time_refs(stop_times: pd.DataFrame, ids: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
     # stop_times -> stop_id, trip_id
-    for col, valid in [("stop_id", stop_ids), ("trip_id", trip_ids)]:
-        bad = set(stop_times[col].astype(str)) - valid
+    return {col: set(stop_times[col].astype(str)) - ids[col] for col in ["stop_id", "trip_id"]}
+
+
+def _stop_time_ref_errors(missing: Dict[str, Set[str]]) -> List[str]:
+    errors: List[str] = []
+    for col in ["stop_id", "trip_id"]:
+        bad = missing.get(col)
         if bad:
             errors.append(f"stop_times.{col} references missing ids: {list(bad)[:5]}...")
+    return errors
+
+
+def _blank_sequence_rows(stop_times: pd.DataFrame) -> int:
+    return int(stop_times["stop_sequence"].isna().sum())
 
+
+def _blank_sequence_warnings(n_rows: int) -> List[str]:
+    if n_rows:
+        return [f"stop_times.stop_sequence is blank in {n_rows} rows; they are dropped"]
+    return []
+
+
+def _trip_ref_errors(feed: Dict[str, pd.DataFrame], ids: Dict[str, Set[str]]) -> List[str]:
+    errors: List[str] = []
+    trips = feed["trips.txt"]
     # trips -> route_id, shape_id
-    bad_routes = set(trips["route_id"].astype(str)) - route_ids
+    bad_routes = set(trips["route_id"].astype(str)) - ids["route_id"]
     if bad_routes:
         errors.append(f"trips.route_id references missing ids: {list(bad_routes)[:5]}...")
-    if "shape_id" in trips.columns and shape_ids:
-        missing_shapes = set(trips["shape_id"].dropna().astype(str)) - shape_ids
+    if "shape_id" in trips.columns and ids["shape_id"]:
+        missing_shapes = set(trips["shape_id"].dropna().astype(str)) - ids["shape_id"]
         if missing_shapes:
             errors.append(f"trips.shape_id references missing ids: {list(missing_shapes)[:5]}...")
+    return errors
+
 
+def _ref_integrity(feed: Dict[str, pd.DataFrame]) -> List[str]:
+    ids = _reference_ids(feed)
+    errors = _stop_time_ref_errors(_missing_stop_time_refs(feed["stop_times.txt"], ids))
+    errors.extend(_trip_ref_errors(feed, ids))
     return errors
 
 
 def _normalize_times(stop_times: pd.DataFrame) -> pd.DataFrame:
-    def to_seconds(t: str) -> int:
-        if pd.isna(t):
-            return 0
-        parts = str(t).split(":")
-        h, m, s = [int(p) for p in parts] if len(parts) == 3 else (0, 0, 0)
-        return h * 3600 + m * 60 + s
-
     st = stop_times.copy()
-    st["arrival_time_sec"] = st["arrival_time"].apply(to_seconds)
-    st["departure_time_sec"] = st["departure_time"].apply(to_seconds)
-    # naive overnight handling: ensure sequence non-decreasing by adding 24h when needed
+    st["arrival_time_sec"] = hms_to_seconds(st["arrival_time"], errors="coerce")
+    st["departure_time_sec"] = hms_to_seconds(st["departure_time"], errors="coerce")
+    # overnight handling: ensure sequence non-decreasing by adding 24h when needed
     st.sort_values(["trip_id", "stop_sequence"], inplace=True)
-    for trip_id, group in st.groupby("trip_id"):
-        prev = None
-        add = 0
-        idx = group.index
-        for i in idx:
-            if prev is not None and st.at[i, "arrival_time_sec"] + add < prev:
-                add += 24 * 3600
-            st.at[i, "arrival_time_sec"] += add
-            st.at[i, "departure_time_sec"] += add
-            prev = st.at[i, "arrival_time_sec"]
+    offsets = overnight_offsets(st["trip_id"], st["arrival_time_sec"])
+    st["arrival_time_sec"] += offsets
+    st["departure_time_sec"] += offsets
     return st
 
 
-def validate_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
-    errors = []
-    warnings = []
-
-    # required files present
-    required = ["stops.txt", "routes.txt", "trips.txt", "stop_times.txt"]
-    missing = [f for f in required if f not in feed]
-    if missing:
-        errors.append(f"Missing required files: {missing}")
-
-    errors.extend(_ref_integrity(feed))
-
+def _table_warnings(feed: Dict[str, pd.DataFrame]) -> List[str]:
+    warnings: List[str] = []
     # duplicates
     for name in ["stops.txt", "routes.txt", "trips.txt"]:
         df = feed[name]
@@ -84,16 +87,20 @@ def validate_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
             dups = df[df.duplicated([key])]
             if not dups.empty:
                 warnings.append(f"{name} has duplicate IDs: {len(dups)}")
+    return warnings
 
-    # times normalized preview
-    st_norm = _normalize_times(feed["stop_times.txt"])
+
+def _deadhead_warnings(feed: Dict[str, pd.DataFrame]) -> List[str]:
     # lightweight heuristic for non-revenue trips (deadhead) - flag headsigns like NOT IN SERVICE
     trips = feed["trips.txt"]
     if "trip_headsign" in trips.columns:
         deadhead = trips["trip_headsign"].astype(str).str.contains("NOT IN SERVICE|DEADHEAD", case=False, na=False)
         if deadhead.any():
-            warnings.append(f"Detected {int(deadhead.sum())} potential non-revenue trips by headsign pattern")
+            return [f"Detected {int(deadhead.sum())} potential non-revenue trips by headsign pattern"]
+    return []
 
+
+def _report(errors: List[str], warnings: List[str]) -> Dict[str, Any]:
     return {
         "status": "ok" if not errors else "error",
         "errors": errors,
@@ -102,3 +109,22 @@ def validate_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
     }
 
 
+def validate_feed(feed: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
+    errors = []
+    warnings = []
+
+    # required files present
+    required = ["stops.txt", "routes.txt", "trips.txt", "stop_times.txt"]
+    missing = [f for f in required if f not in feed]
+    if missing:
+        errors.append(f"Missing required files: {missing}")
+
+    errors.extend(_ref_integrity(feed))
+    warnings.extend(_table_warnings(feed))
+    warnings.extend(_blank_sequence_warnings(_blank_sequence_rows(feed["stop_times.txt"])))
+
+    # times normalized preview
+    st_norm = _normalize_times(feed["stop_times.txt"])
+    warnings.extend(_deadhead_warnings(feed))
+
+    return _report(errors, warnings)
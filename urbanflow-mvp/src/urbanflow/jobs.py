@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Union
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from .cache import FeedCache, hash_source
+from .session import FeedSession
+from .optimizer.evaluator import Evaluator
+from .optimizer.greedy_seed import GreedySeed
+from .optimizer.local_search import LocalSearch
+
+
+# optimization jobs running at once (one process each)
+DEFAULT_MAX_WORKERS = 2
+# queued + running jobs accepted before submit refuses new ones
+DEFAULT_MAX_PENDING = 16
+# finished jobs whose status and results are kept
+DEFAULT_JOB_HISTORY = 100
+# minimum seconds between progress writes of a running job
+PROGRESS_INTERVAL_S = 0.5
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _write_json_atomic(path: Path, payload: Dict[str, Any]) -> None:
+    # readers in the API process never see a half-written file
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(payload, default=float), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class _Progress:
+    """Worker-side reporter: progress goes to ``progress.json`` in the job directory,
+    and a ``cancel`` file there stops the job at its next report."""
+
+    def __init__(self, job_dir: Path, max_iters: int) -> None:
+        self.job_dir = job_dir
+        self.max_iters = int(max_iters)
+        self.state: Dict[str, Any] = {"stage": "queued", "iteration": 0, "max_iters": self.max_iters}
+        self._last = 0.0
+
+    def check(self) -> None:
+        if (self.job_dir / "cancel").exists():
+            raise JobCancelled()
+
+    def stage(self, name: str, **extra: Any) -> None:
+        self.check()
+        self.state.update(stage=name, **extra)
+        self._flush()
+
+    def iteration(self, it: int, best_score: float, best_kpis: Dict[str, float]) -> None:
+        self.state.update(iteration=it, best_score=best_score, best_kpis=best_kpis)
+        now = time.monotonic()
+        if now - self._last >= PROGRESS_INTERVAL_S or it == self.max_iters:
+            self.check()
+            self._flush()
+
+    def _flush(self) -> None:
+        self._last = time.monotonic()
+        _write_json_atomic(self.job_dir / "progress.json", self.state)
+
+
+def run_optimize_job(
+    job_dir: str,
+    feed: Optional[bytes],
+    feed_key: Optional[str],
+    cache_dir: Optional[str],
+    constraints: Dict[str, Any],
+    objective: Dict[str, Any],
+    sample_size: int,
+    seed: Optional[int],
+    max_iters: int,
+) -> Dict[str, Any]:
+    """Evaluate and optimize one feed (run in a worker process).
+
+    The canonical tables and graph for ``feed_key`` are loaded from the cache
+    at ``cache_dir`` when it has them. Otherwise ``feed``, the zip's bytes,
+    is opened in memory, so an entry evicted after the job was queued is
+    rebuilt (and cached again) instead of failing the job.
+    """
+    job_dir = Path(job_dir)
+    progress = _Progress(job_dir, max_iters)
+    try:
+        progress.stage("load")
+        session = FeedSession(
+            io.BytesIO(feed) if feed is not None else None,
+            cache=FeedCache(Path(cache_dir)) if cache_dir else None,
+            cache_key=feed_key,
+        )
+        _ = session.report
+        canonical = session.canonical
+        graph = session.graph
+
+        progress.stage("baseline", cache_hit=session.cache_hit)
+        evaluator = Evaluator(objective=objective, sample_size=sample_size, seed=seed)
+        baseline = session.baseline_kpis(evaluator)
+
+        progress.stage("optimize", baseline_kpis=baseline)
+        with session.timed("optimize"):
+            seed_solution = GreedySeed.create(graph, canonical, constraints, objective)
+            best_solution = LocalSearch.optimize(
+                seed_solution,
+                evaluator,
+                constraints,
+                max_iters=max_iters,
+                seed=seed if seed is not None else 42,
+                progress=progress.iteration,
+            )
+        progress.stage("optimized_kpis")
+        with session.timed("optimized_kpis"):
+            optimized = evaluator.compute_kpis(best_solution["graph"], best_solution["canonical"])
+        # last check: a cancel that arrives now still ends the job as cancelled
+        progress.stage("done")
+    except JobCancelled:
+        return {"status": "cancelled"}
+    return {
+        "status": "succeeded",
+        "result": {
+            "baseline": baseline,
+            "optimized": optimized,
+            "timings": session.timing_report(),
+            "cache_hit": session.cache_hit,
+        },
+    }
+
+
+@dataclass
+class Job:
+    job_id: str
+    job_dir: Path
+    future: Future
+    feed_key: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+
+class JobQueue:
+    """Bounded pool of worker processes running optimization jobs.
+
+    ``submit`` only hashes the feed and hands the job to a
+    ``ProcessPoolExecutor`` of ``max_workers`` processes, so callers
+    (the API's event loop) never wait on parsing or search. At most
+    ``max_pending`` jobs may be queued or running; beyond that ``submit``
+    raises :class:`QueueFull`. Workers report progress through files in the
+    job directory, which ``status`` reads without blocking on the job.
+
+    Feeds are identified by the SHA-256 of their bytes. With a ``cache``
+    (the default when pyarrow is installed), a worker loads a feed whose
+    canonical tables and graph are cached from there and only parses the
+    bytes it is sent when the entry is missing, e.g. evicted while the job
+    was queued. Uploads are never written to disk; a job's directory only
+    holds progress files.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        root: Optional[Path] = None,
+        history: int = DEFAULT_JOB_HISTORY,
+        cache: Optional[FeedCache] = None,
+    ) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.history = int(history)
+        self._own_root = root is None
+        self.root = Path(tempfile.mkdtemp(prefix="urbanflow-jobs-")) if root is None else Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # spawned workers do not inherit the server's threads or open sockets
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.cache = cache if cache is not None and FeedCache.available() else None
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        """Queue sized by ``URBANFLOW_API_WORKERS`` / ``URBANFLOW_API_MAX_PENDING``."""
+        return cls(
+            max_workers=int(os.environ.get("URBANFLOW_API_WORKERS", DEFAULT_MAX_WORKERS)),
+            max_pending=int(os.environ.get("URBANFLOW_API_MAX_PENDING", DEFAULT_MAX_PENDING)),
+            cache=FeedCache(),
+        )
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(not job.future.done() for job in self._jobs.values())
+
+    def full(self) -> bool:
+        return self.pending() >= self.max_pending
+
+    def submit(
+        self,
+        feed: Union[bytes, BinaryIO],
+        constraints: Dict[str, Any],
+        objective: Dict[str, Any],
+        sample_size: int = 2000,
+        seed: Optional[int] = None,
+        max_iters: int = 200,
+    ) -> str:
+        """Queue an optimization of the GTFS zip ``feed`` (bytes or a seekable file); returns the job ID."""
+        if isinstance(feed, bytes):
+            key = FeedCache.key_for_hash(hashlib.sha256(feed).hexdigest())
+        else:
+            key = FeedCache.key_for_hash(hash_source(feed))
+        # sent even when cached: the entry may be evicted before the worker gets to it
+        if not isinstance(feed, bytes):
+            feed.seek(0)
+            feed = feed.read()
+        with self._lock:
+            if sum(not job.future.done() for job in self._jobs.values()) >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already queued or running")
+            job_dir = self.root / uuid.uuid4().hex
+            job_dir.mkdir()
+            future = self._pool.submit(
+                run_optimize_job,
+                str(job_dir),
+                feed,
+                key,
+                str(self.cache.root) if self.cache is not None else None,
+                constraints,
+                objective,
+                int(sample_size),
+                seed,
+                int(max_iters),
+            )
+            job = Job(job_dir.name, job_dir, future, feed_key=key)
+            self._jobs[job.job_id] = job
+        future.add_done_callback(lambda _f, job=job: self._finished(job))
+        return job.job_id
+
+    def _finished(self, job: Job) -> None:
+        job.finished_at = time.time()
+        with self._lock:
+            done = sorted((j for j in self._jobs.values() if j.finished_at is not None), key=lambda j: j.finished_at)
+            for old in done[:max(0, len(done) - self.history)]:
+                del self._jobs[old.job_id]
+                shutil.rmtree(old.job_dir, ignore_errors=True)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """State (queued, running, succeeded, failed, cancelled) and the last reported progress."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        out: Dict[str, Any] = {"job_id": job_id, "feed_key": job.feed_key, "submitted_at": job.submitted_at}
+        try:
+            out["progress"] = json.loads((job.job_dir / "progress.json").read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            out["progress"] = None
+        if job.future.cancelled():
+            out["status"] = "cancelled"
+        elif job.future.done():
+            error = job.future.exception()
+            out["status"] = "failed" if error is not None else job.future.result()["status"]
+            if error is not None:
+                out["error"] = str(error)
+            out["finished_at"] = job.finished_at
+        elif (job.job_dir / "cancel").exists():
+            out["status"] = "cancelling"
+        else:
+            out["status"] = "running" if out["progress"] is not None else "queued"
+        return out
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Result of a succeeded job (``None`` otherwise)."""
+        job = self.get(job_id)
+        if job is None or not job.future.done() or job.future.cancelled() or job.future.exception() is not None:
+            return None
+        return job.future.result().get("result")
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or ask a running one to stop at its next progress report."""
+        job = self.get(job_id)
+        if job is None or job.future.done():
+            return False
+        if not job.future.cancel():
+            (job.job_dir / "cancel").touch()
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.future.done() and not job.future.cancel():
+                (job.job_dir / "cancel").touch()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        if self._own_root:
+            shutil.rmtree(self.root, ignore_errors=True)
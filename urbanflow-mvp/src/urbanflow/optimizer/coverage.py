@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from ..data.od_generator import demand_long, stop_activity
+from ..graph.build_graph import project_xy
+from ..graph.csr import CSRGraph
+from .simulation import _network
+
+
+COVERAGE_RADIUS_M = 400.0
+
+
+class CoverageIndex:
+    """Demand points within ``radius_m`` of each stop, from a k-d tree pair query.
+
+    Built once per stops table: projected stop and point coordinates go into
+    two ``cKDTree``s and ``sparse_distance_matrix`` lists every (stop, point)
+    pair within the radius, stored CSR-style by stop. Coverage for a set of
+    active stops is then a ``bincount``; ``state`` keeps per-point counts of
+    active stops in range so opening or closing stops touches only their own
+    points.
+    """
+
+    def __init__(
+        self,
+        stop_ids: Iterable[Any],
+        stop_lat: np.ndarray,
+        stop_lon: np.ndarray,
+        point_lat: np.ndarray,
+        point_lon: np.ndarray,
+        weight: Optional[np.ndarray] = None,
+        radius_m: float = COVERAGE_RADIUS_M,
+    ) -> None:
+        self.stop_ids = pd.Index(np.asarray(list(stop_ids), dtype=object).astype(str))
+        self.radius_m = float(radius_m)
+        point_lat = np.asarray(point_lat, dtype=np.float64)
+        self.weight = np.ones(len(point_lat)) if weight is None else np.asarray(weight, dtype=np.float64)
+        self.total = float(self.weight.sum())
+        stop_lat = np.asarray(stop_lat, dtype=np.float64)
+        lat0 = float(np.nanmean(stop_lat)) if len(stop_lat) else 0.0
+        stops_xy = project_xy(stop_lat, stop_lon, lat0)
+        points_xy = project_xy(point_lat, point_lon, lat0)
+        # stops without coordinates cover nothing
+        located = np.flatnonzero(~np.isnan(stops_xy).any(axis=1))
+        pairs = cKDTree(stops_xy[located]).sparse_distance_matrix(cKDTree(points_xy), self.radius_m, output_type="ndarray")
+        stop = located[pairs["i"]]
+        order = np.argsort(stop, kind="stable")
+        self.indptr = np.r_[0, np.cumsum(np.bincount(stop, minlength=len(self.stop_ids)))]
+        self.indices = pairs["j"][order].astype(np.int64)
+
+    @classmethod
+    def for_canonical(
+        cls,
+        canonical: Dict[str, pd.DataFrame],
+        demand: Optional[Any] = None,
+        points: Optional[pd.DataFrame] = None,
+        radius_m: float = COVERAGE_RADIUS_M,
+    ) -> "CoverageIndex":
+        """Index over the canonical stops.
+
+        ``points`` (``lat``, ``lon`` and an optional ``weight`` or
+        ``population`` column) are e.g. census centroids. Without them the
+        points are the stops' own locations, weighted by their trip ends in
+        ``demand`` or else by ``stop_activity``, so coverage is the share of
+        today's demand still within reach of an open stop.
+        """
+        stops = canonical["stops"].drop_duplicates("stop_id", keep="first")
+        ids = stops["stop_id"].astype(str)
+        lat = stops["lat"].to_numpy(dtype=np.float64)
+        lon = stops["lon"].to_numpy(dtype=np.float64)
+        if points is not None:
+            w_col = next((c for c in ("weight", "population") if c in points.columns), None)
+            weight = points[w_col].to_numpy(dtype=np.float64) if w_col else None
+            return cls(ids, lat, lon, points["lat"].to_numpy(), points["lon"].to_numpy(), weight, radius_m)
+        if demand is not None:
+            od = demand_long(demand, pd.Index(ids))
+            ends = pd.concat([
+                od["trips"].groupby(od["origin"].astype(str)).sum(),
+                od["trips"].groupby(od["destination"].astype(str)).sum(),
+            ]).groupby(level=0).sum()
+            weight = ends.reindex(ids.to_numpy()).fillna(0.0).to_numpy()
+        else:
+            weight = stop_activity(canonical)
+        return cls(ids, lat, lon, lat, lon, weight, radius_m)
+
+    def active_stops(self, graph: Union[nx.DiGraph, CSRGraph]) -> np.ndarray:
+        """Per-stop mask of stops that are open nodes of ``graph``."""
+        net = _network(graph)
+        idx = self.stop_ids.get_indexer(pd.Index(net.node_ids).astype(str))
+        active = np.zeros(len(self.stop_ids), dtype=bool)
+        active[idx[(idx >= 0) & net.alive]] = True
+        return active
+
+    def counts(self, active: np.ndarray) -> np.ndarray:
+        """Active stops within the radius of each point."""
+        hits = self.indices[np.repeat(np.asarray(active, dtype=bool), np.diff(self.indptr))]
+        return np.bincount(hits, minlength=len(self.weight)).astype(np.int32)
+
+    def ratio(self, active: np.ndarray) -> float:
+        """Weighted share of points within the radius of an active stop."""
+        if self.total <= 0:
+            return 1.0
+        return float(self.weight[self.counts(active) > 0].sum() / self.total)
+
+    def state(self, active: np.ndarray) -> "CoverageState":
+        return CoverageState(self, np.asarray(active, dtype=bool).copy())
+
+
+class CoverageState:
+    """Running coverage of one set of active stops, updated in O(affected points)."""
+
+    def __init__(self, index: CoverageIndex, active: np.ndarray) -> None:
+        self.index = index
+        self.active = active
+        self.counts = index.counts(active)
+        self.covered = float(index.weight[self.counts > 0].sum())
+
+    @property
+    def ratio(self) -> float:
+        return self.covered / self.index.total if self.index.total > 0 else 1.0
+
+    def _points(self, stops: Iterable[Any], to_active: bool) -> Tuple[np.ndarray, np.ndarray]:
+        idx = self.index.stop_ids.get_indexer(pd.Index([str(s) for s in stops]))
+        idx = np.unique(idx[idx >= 0])
+        # only stops whose state actually changes
+        idx = idx[self.active[idx] != to_active]
+        ptr = self.index.indptr
+        pts = np.concatenate([self.index.indices[ptr[s]:ptr[s + 1]] for s in idx.tolist()] or [np.empty(0, dtype=np.int64)])
+        return idx, pts
+
+    def after(self, remove: Iterable[Any] = (), add: Iterable[Any] = ()) -> Tuple[float, Tuple[Any, ...]]:
+        """Coverage ratio once ``remove`` close and ``add`` open, and the change for ``apply``."""
+        r_idx, r_pts = self._points(remove, False)
+        a_idx, a_pts = self._points(add, True)
+        pts, inv = np.unique(np.r_[r_pts, a_pts], return_inverse=True)
+        step = np.r_[-np.ones(len(r_pts)), np.ones(len(a_pts))]
+        new = self.counts[pts] + np.bincount(inv, weights=step, minlength=len(pts)).astype(np.int32)
+        was = self.counts[pts] > 0
+        covered = self.covered + float(self.index.weight[pts] @ ((new > 0).astype(np.float64) - was))
+        total = self.index.total
+        return (covered / total if total > 0 else 1.0), (r_idx, a_idx, pts, new, covered)
+
+    def apply(self, change: Tuple[Any, ...]) -> None:
+        r_idx, a_idx, pts, new, covered = change
+        self.active[r_idx] = False
+        self.active[a_idx] = True
+        self.counts[pts] = new
+        self.covered = covered
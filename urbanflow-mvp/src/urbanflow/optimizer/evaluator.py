@@ -1,16 +1,63 @@
 from __future__ import annotations
 
-from typing import Dict, Any
-import random
+from typing import Dict, Any, Optional, Tuple, Union
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+from ..graph.csr import CSRGraph
+from .simulation import PassengerSimulator, ODSample, sample_od, Timetable, MAX_WAIT_S, TRANSFER_PENALTY_S, UNREACHABLE_PENALTY_S
+from .zones import coarsen_sample, zone_index_for
+from .coverage import CoverageIndex
+
+
+# timetables kept per Evaluator; a search alternates between its current tables and one candidate's
+SIMULATOR_CACHE_SIZE = 4
+# per-passenger results averaged over the passengers who arrive
+SERVED_MEANS = ("wait", "in_vehicle", "walk", "transfers")
+
 
 class Evaluator:
-    def __init__(self, objective: Dict[str, Any], sample_size: int = 5000, seed: int | None = None) -> None:
+    """Passenger-level KPI evaluation.
+
+    ``sample_size`` passengers are drawn once from ``demand`` (a long
+    origin/destination/trips table such as ``generate_synthetic_demand``
+    returns, or a stop x stop matrix; uniform over stop pairs when omitted) and reused for every graph evaluated, so KPI
+    differences between candidates are not sampling noise. Routes minimize
+    in-vehicle time plus ``objective["transfer_penalty_s"]`` (default
+    ``TRANSFER_PENALTY_S``) per boarding; 0 routes on in-vehicle time alone.
+
+    With ``zone_cell_m`` the sample is evaluated at zone resolution: stops are
+    grouped into grid cells of that size and passengers sharing origin zone,
+    destination zone and departure hour are routed once, between the zones'
+    busiest stops, and weighted by their count.
+
+    ``coverage_ratio`` is the weighted share of demand points (``coverage_points``,
+    or the stops' own demand, see ``CoverageIndex.for_canonical``) within
+    ``coverage_radius_m`` of an open stop.
+    """
+
+    def __init__(
+        self,
+        objective: Dict[str, Any],
+        sample_size: int = 5000,
+        seed: int | None = None,
+        demand: Optional[pd.DataFrame] = None,
+        zone_cell_m: Optional[float] = None,
+        coverage_points: Optional[pd.DataFrame] = None,
+    ) -> None:
         self.objective = objective or {"weights": {}}
         self.sample_size = int(sample_size)
-        self.rng = random.Random(seed)
+        self.seed = seed
+        self.demand = demand
+        self.zone_cell_m = float(zone_cell_m) if zone_cell_m else None
+        self.coverage_points = coverage_points
+        self._coverage: Optional[Tuple[pd.DataFrame, CoverageIndex]] = None
+        self._sample: Optional[Tuple[pd.DataFrame, ODSample]] = None
+        self._simulators: Dict[Tuple[int, int], Tuple[pd.DataFrame, pd.DataFrame, PassengerSimulator]] = {}
+        self._pair_codes = np.empty(0, dtype=np.int64)
+        self._pair_weights = np.empty(0)
+        self._weights: Optional[np.ndarray] = None
 
     def _estimate_wait_time(self, canonical: Dict[str, pd.DataFrame]) -> float:
         freqs = canonical.get("frequencies")
@@ -19,27 +66,160 @@ class Evaluator:
             return 300.0
         return float(freqs["headway_secs"].mean() / 2.0)
 
-    def _avg_in_vehicle_time(self, graph: nx.DiGraph) -> float:
-        # approximate by average edge travel time
-        if graph.number_of_edges() == 0:
-            return 0.0
-        return float(sum(d.get("travel_time", 0) for _, _, d in graph.edges(data=True)) / graph.number_of_edges())
-
-    def compute_kpis(self, graph: nx.DiGraph, canonical: Dict[str, pd.DataFrame]) -> Dict[str, float]:
-        wait = self._estimate_wait_time(canonical)
-        in_vehicle = self._avg_in_vehicle_time(graph)
-        # P90 ~ mean + 1.28*std (rough proxy); assume std ~ 0.5 * mean for MVP
-        mean_tt = wait + in_vehicle
-        std_tt = 0.5 * mean_tt
-        p90 = mean_tt + 1.28 * std_tt
-        coverage_ratio = 1.0  # placeholder; compute via radius and stop coverage later
+    def simulator(self, canonical: Dict[str, pd.DataFrame]) -> PassengerSimulator:
+        # one passenger sample per stop table, one timetable per (trips, stop_times) pair: route-level
+        # moves replace those tables but keep the stops, so every candidate is scored on the same sample
+        stops = canonical["stops"]
+        timetable = None
+        if self._sample is None or self._sample[0] is not stops:
+            timetable = Timetable(canonical)
+            stop_ids = stops["stop_id"].astype(str).drop_duplicates().tolist()
+            sample = sample_od(
+                stop_ids,
+                self.sample_size,
+                np.random.default_rng(self.seed),
+                timetable.service_span,
+                demand=self.demand,
+            )
+            if self.zone_cell_m is not None:
+                zones, reps = zone_index_for(canonical, self.zone_cell_m)
+                sample = coarsen_sample(sample, zones, reps)
+            self._sample = (stops, sample)
+            self._weights = sample.weight
+            self._simulators.clear()
+            # distinct OD pairs, for the unweighted average travel time
+            self._pair_codes = pd.MultiIndex.from_arrays([sample.origin, sample.destination]).factorize()[0]
+            self._pair_weights = np.bincount(self._pair_codes, weights=sample.weight)
+        key = (id(canonical["trips"]), id(canonical["stop_times"]))
+        entry = self._simulators.pop(key, None)
+        # the tables are kept in the entry so their ids cannot be reused while it is cached
+        if entry is None or entry[0] is not canonical["trips"] or entry[1] is not canonical["stop_times"]:
+            simulator = PassengerSimulator(
+                canonical,
+                self._sample[1],
+                fallback_wait=self._estimate_wait_time(canonical),
+                max_wait=float(self.objective.get("max_wait_s", MAX_WAIT_S)),
+                unreachable_penalty=float(self.objective.get("unreachable_penalty_s", UNREACHABLE_PENALTY_S)),
+                timetable=timetable if timetable is not None else Timetable(canonical),
+                transfer_penalty=float(self.objective.get("transfer_penalty_s", TRANSFER_PENALTY_S)),
+            )
+            entry = (canonical["trips"], canonical["stop_times"], simulator)
+        self._simulators[key] = entry
+        while len(self._simulators) > SIMULATOR_CACHE_SIZE:
+            self._simulators.pop(next(iter(self._simulators)))
+        return entry[2]
+
+    def coverage_index(self, canonical: Dict[str, pd.DataFrame]) -> CoverageIndex:
+        # like the passenger sample, one index per stops table
+        stops = canonical["stops"]
+        if self._coverage is None or self._coverage[0] is not stops:
+            index = CoverageIndex.for_canonical(
+                canonical,
+                demand=self.demand,
+                points=self.coverage_points,
+                radius_m=float(self.objective.get("coverage_radius_m", 400)),
+            )
+            self._coverage = (stops, index)
+        return self._coverage[1]
+
+    def compute_kpis(self, graph: Union[nx.DiGraph, CSRGraph], canonical: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+        sim = self.simulator(canonical)
+        index = self.coverage_index(canonical)
+        return self.kpis_from_results(sim.run(graph), coverage=index.ratio(index.active_stops(graph)))
+
+    def row_weights(self, n: int) -> np.ndarray:
+        """Passengers each of the ``n`` sample rows stands for (zone-resolution samples), else ones."""
+        return self._weights if self._weights is not None and len(self._weights) == n else np.ones(n)
+
+    def kpi_sums(self, res: Dict[str, np.ndarray], rows: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """Weighted sums behind every KPI but the percentiles and coverage.
+
+        ``res`` holds the results of sample ``rows`` (all rows when omitted),
+        in that order. Sums over disjoint rows add up, so replacing some
+        passengers' results changes them by a difference of two small sums.
+        """
+        total = res["total"]
+        rows = np.arange(total.size) if rows is None else np.asarray(rows, dtype=np.int64)
+        w = self.row_weights(len(self._pair_codes))[rows]
+        reached = res["reached"]
+        rw = np.where(reached, w, 0.0)
+        budget = float(self.objective.get("max_travel_time_s", 3600))
+        sums = {
+            "weight": float(w.sum()),
+            "reached_rows": float(np.count_nonzero(reached)),
+            "reached_weight": float(rw.sum()),
+            # each OD pair's mean, summed over pairs: sum of total * w / (weight of the row's pair)
+            "pair_means": float((total * w / self._pair_weights[self._pair_codes[rows]]).sum()),
+            "total": float((total * w).sum()),
+            "on_time": float(w[total <= budget].sum()),
+        }
+        for c in SERVED_MEANS:
+            sums[c] = float((res[c] * rw).sum())
+            sums[f"{c}_all"] = float((res[c] * w).sum())
+        return sums
+
+    def kpis_from_sums(self, sums: Dict[str, float], p50: float, p90: float, coverage: float) -> Dict[str, float]:
+        """The KPI dict from ``kpi_sums`` over the whole sample, its travel-time percentiles and coverage."""
+        # means over the passengers who arrive, or over everyone when nobody does
+        suffix, served = ("", sums["reached_weight"]) if sums["reached_rows"] else ("_all", sums["weight"])
         return {
-            "average_travel_time": float(mean_tt),
-            "passenger_weighted_travel_time": float(mean_tt),  # proxy
-            "p50_travel_time": float(mean_tt),
-            "p90_travel_time": float(p90),
-            "on_time_percentage": 0.9,  # placeholder
-            "coverage_ratio": float(coverage_ratio),
+            "average_travel_time": sums["pair_means"] / len(self._pair_weights),
+            "passenger_weighted_travel_time": sums["total"] / sums["weight"],
+            "p50_travel_time": p50,
+            "p90_travel_time": p90,
+            # share of passengers arriving within the objective's travel-time budget
+            "on_time_percentage": sums["on_time"] / sums["weight"],
+            "coverage_ratio": float(coverage),
+            "mean_wait_time": sums[f"wait{suffix}"] / served,
+            "mean_in_vehicle_time": sums[f"in_vehicle{suffix}"] / served,
+            "mean_walk_time": sums[f"walk{suffix}"] / served,
+            "mean_transfers": sums[f"transfers{suffix}"] / served,
+            "served_ratio": sums["reached_weight"] / sums["weight"],
         }
 
+    def kpis_from_results(self, res: Dict[str, np.ndarray], coverage: Optional[float] = None) -> Dict[str, float]:
+        """Aggregate per-passenger simulation results into the KPI dict.
+
+        Without ``coverage`` the ratio falls back to the share of passengers
+        with an open stop within the radius at both ends.
+        """
+        total = res["total"]
+        if total.size == 0:
+            kpis = dict.fromkeys(KPI_KEYS, 0.0)
+            if coverage is not None:
+                kpis["coverage_ratio"] = float(coverage)
+            return kpis
+        w = self.row_weights(total.size)
+        if coverage is None:
+            radius = float(self.objective.get("coverage_radius_m", 400))
+            coverage = float(np.average((res["access_m"] <= radius) & (res["egress_m"] <= radius), weights=w))
+        return self.kpis_from_sums(
+            self.kpi_sums(res),
+            _weighted_percentile(total, w, 50),
+            _weighted_percentile(total, w, 90),
+            coverage,
+        )
+
+
+def _weighted_percentile(values: np.ndarray, weights: np.ndarray, q: float) -> float:
+    # np.percentile's "linear" method when all weights are 1
+    if np.all(weights == 1):
+        return float(np.percentile(values, q))
+    order = np.argsort(values, kind="stable")
+    cum = np.cumsum(weights[order])
+    return float(values[order][min(np.searchsorted(cum, q / 100.0 * cum[-1]), len(cum) - 1)])
+
 
+KPI_KEYS = [
+    "average_travel_time",
+    "passenger_weighted_travel_time",
+    "p50_travel_time",
+    "p90_travel_time",
+    "on_time_percentage",
+    "coverage_ratio",
+    "mean_wait_time",
+    "mean_in_vehicle_time",
+    "mean_walk_time",
+    "mean_transfers",
+    "served_ratio",
+]
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+from ..gtfs.canonicalizer import trip_extents
+from ..gtfs.times import DEFAULT_BAND_S, hms_to_seconds
+from .simulation import ODSample
+
+
+# headways a schedule may use, longest first (s)
+HEADWAY_LADDER_S = (3600, 2400, 1800, 1200, 900, 720, 600, 480, 360, 300, 240, 180, 120)
+# terminal layover as a share of running time
+DEFAULT_LAYOVER_RATIO = 0.10
+
+
+def trip_routes(trips: pd.DataFrame) -> pd.Series:
+    """route_id by trip_id, as strings."""
+    trips = trips.drop_duplicates("trip_id", keep="last")
+    return pd.Series(trips["route_id"].astype(str).to_numpy(), index=trips["trip_id"].astype(str).to_numpy())
+
+
+@dataclass
+class RouteCycles:
+    """Round-trip cycle time of each route and the trip each direction is timetabled from."""
+
+    route_ids: np.ndarray
+    cycle_s: np.ndarray
+    # one row per (route, direction): route_id, template trip_id, its first departure
+    templates: pd.DataFrame
+
+
+def route_cycle_times(canonical: Dict[str, pd.DataFrame], layover_ratio: float = DEFAULT_LAYOVER_RATIO) -> RouteCycles:
+    """Cycle time per route from the median running time of its trips.
+
+    A direction is the set of the route's trips starting at the same stop.
+    The cycle is the sum of the directions' median running times (twice the
+    one direction's for routes timetabled one way) plus ``layover_ratio``.
+    """
+    st, trips = canonical["stop_times"], canonical["trips"]
+    empty = RouteCycles(np.empty(0, dtype=object), np.empty(0), pd.DataFrame(columns=["route_id", "trip_id", "start"]))
+    if st.empty or trips.empty:
+        return empty
+    ext = trip_extents(st)
+    per_trip = pd.DataFrame({
+        "trip_id": ext["trip_id"],
+        "route_id": ext["trip_id"].map(trip_routes(trips)),
+        "origin": ext["first_stop"],
+        "start": ext["start"],
+        "duration": np.maximum(ext["end"] - ext["start"], 0),
+        "stops": ext["stops"],
+    }).dropna(subset=["route_id"])
+    if per_trip.empty:
+        return empty
+    directions = per_trip.groupby(["route_id", "origin"], sort=True)
+    running = directions["duration"].median()
+    per_route = running.groupby(level="route_id")
+    cycle = per_route.sum() * np.where(per_route.size() == 1, 2.0, 1.0) * (1.0 + float(layover_ratio))
+    # the direction's longest trip (then earliest) carries its full stop pattern
+    templates = (
+        per_trip.sort_values(["route_id", "origin", "stops", "start"], ascending=[True, True, False, True], kind="stable")
+        .drop_duplicates(["route_id", "origin"])[["route_id", "trip_id", "start"]]
+        .reset_index(drop=True)
+    )
+    return RouteCycles(cycle.index.to_numpy(dtype=object), cycle.to_numpy(dtype=np.float64), templates)
+
+
+def time_bands(canonical: Dict[str, pd.DataFrame], bands: Optional[Sequence[Sequence[Any]]] = None, band_s: int = DEFAULT_BAND_S) -> np.ndarray:
+    """``(n, 2)`` band start/end seconds: ``bands`` (seconds or ``H:MM:SS``), or
+    ``band_s`` slices of the scheduled service span."""
+    if bands:
+        flat = [b for band in bands for b in band]
+        if all(isinstance(b, str) for b in flat):
+            flat = hms_to_seconds(pd.Series(flat))
+        out = np.asarray(flat, dtype=np.int64).reshape(-1, 2)
+        if (out[:, 1] <= out[:, 0]).any():
+            raise ValueError("Every time band must end after it starts")
+        return out
+    dep = canonical["stop_times"]["departure_time_sec"].to_numpy(dtype=np.int64)
+    if dep.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    lo = dep.min() // band_s * band_s
+    hi = -(-(dep.max() + 1) // band_s) * band_s
+    starts = np.arange(lo, hi, band_s, dtype=np.int64)
+    return np.column_stack([starts, starts + band_s])
+
+
+def _band_of(times: np.ndarray, bands: np.ndarray) -> np.ndarray:
+    # -1 outside every band
+    i = np.searchsorted(bands[:, 0], times, side="right") - 1
+    inside = (i >= 0) & (times < bands[np.maximum(i, 0), 1])
+    return np.where(inside, i, -1)
+
+
+def scheduled_demand(canonical: Dict[str, pd.DataFrame], route_ids: np.ndarray, bands: np.ndarray) -> np.ndarray:
+    """Stop departures per route and band in the current timetable, a demand
+    proxy that keeps the existing service pattern."""
+    st, trips = canonical["stop_times"], canonical["trips"]
+    trip_route = trip_routes(trips)
+    r = pd.Index(route_ids).get_indexer(st["trip_id"].astype(str).map(trip_route))
+    b = _band_of(st["departure_time_sec"].to_numpy(dtype=np.int64), bands)
+    keep = (r >= 0) & (b >= 0)
+    out = np.zeros((len(route_ids), len(bands)))
+    np.add.at(out, (r[keep], b[keep]), 1.0)
+    return out
+
+
+def sample_demand(
+    canonical: Dict[str, pd.DataFrame],
+    route_ids: np.ndarray,
+    bands: np.ndarray,
+    sample: ODSample,
+    total: Optional[float] = None,
+) -> np.ndarray:
+    """Sampled passengers per route and band: each passenger counts toward the
+    routes serving their origin stop (split evenly) in the band they depart.
+    Scaled to ``total`` passengers when given."""
+    st, trips = canonical["stop_times"], canonical["trips"]
+    trip_route = trip_routes(trips)
+    serving = pd.DataFrame({
+        "stop": st["stop_id"].astype(str).to_numpy(),
+        "route": pd.Index(route_ids).get_indexer(st["trip_id"].astype(str).map(trip_route)),
+    })
+    serving = serving[serving["route"] >= 0].drop_duplicates()
+    share = 1.0 / serving.groupby("stop")["route"].transform("size")
+    pax = pd.DataFrame({"stop": np.asarray(sample.origin).astype(str), "band": _band_of(np.asarray(sample.depart, dtype=np.int64), bands)})
+    pax = pax[pax["band"] >= 0].merge(serving.assign(share=share.to_numpy()), on="stop")
+    out = np.zeros((len(route_ids), len(bands)))
+    np.add.at(out, (pax["route"].to_numpy(), pax["band"].to_numpy()), pax["share"].to_numpy())
+    if total is not None and out.sum() > 0:
+        out *= float(total) / out.sum()
+    return out
+
+
+@dataclass
+class FrequencyPlan:
+    """Headway and vehicles per route and time band."""
+
+    route_ids: np.ndarray
+    bands: np.ndarray
+    headway_s: np.ndarray
+    vehicles: np.ndarray
+    demand: np.ndarray
+    fleet_size: Optional[int]
+
+    @property
+    def fleet(self) -> np.ndarray:
+        """Vehicles in service per band."""
+        return self.vehicles.sum(axis=0)
+
+    @property
+    def unserved(self) -> float:
+        """Demand in (route, band) services the plan does not run."""
+        return float(self.demand[self.headway_s <= 0].sum())
+
+    @property
+    def expected_wait_s(self) -> float:
+        """Passenger wait at random arrivals (half the headway), summed over demand."""
+        return float((self.demand * self.headway_s / 2.0).sum())
+
+    def to_frame(self) -> pd.DataFrame:
+        n_routes, n_bands = self.headway_s.shape
+        return pd.DataFrame({
+            "route_id": np.repeat(self.route_ids, n_bands),
+            "start": np.tile(self.bands[:, 0], n_routes),
+            "end": np.tile(self.bands[:, 1], n_routes),
+            "headway_s": self.headway_s.ravel(),
+            "vehicles": self.vehicles.ravel(),
+            "demand": self.demand.ravel(),
+        })
+
+    def move(self) -> Dict[str, Any]:
+        """The ``set_headways`` move that timetables this plan."""
+        return {"type": "set_headways", "headways": self.to_frame()[["route_id", "start", "end", "headway_s"]].to_dict("records")}
+
+
+def _band_prefix(key: np.ndarray, cost: np.ndarray, budget: np.ndarray) -> np.ndarray:
+    # one row per band: which items fit in the band's budget when taken in ascending ``key`` order
+    # (invalid items carry key +inf); costs are >= 0, so those form a prefix of the order
+    order = np.argsort(key, axis=1, kind="stable")
+    spent = np.cumsum(np.take_along_axis(cost, order, axis=1), axis=1)
+    fits = np.zeros(key.shape, dtype=bool)
+    np.put_along_axis(fits, order, (spent <= budget[:, None]) & (np.take_along_axis(key, order, axis=1) < np.inf), axis=1)
+    return fits
+
+
+class FrequencyOptimizer:
+    @staticmethod
+    def optimize(
+        canonical: Dict[str, pd.DataFrame],
+        constraints: Dict[str, Any],
+        demand: Optional[np.ndarray] = None,
+        bands: Optional[np.ndarray] = None,
+        cycles: Optional[RouteCycles] = None,
+    ) -> FrequencyPlan:
+        """Allocate headways per route and band to minimise passenger wait under the fleet budget.
+
+        ``demand`` is passengers per (route, band); when omitted,
+        ``scheduled_demand`` weights the routes and capacity is not checked.
+        Each served route starts at the longest headway on ``HEADWAY_LADDER_S``
+        within ``max_headway_s`` that keeps the average load within
+        ``vehicle_capacity``. Routes do not run in bands without demand, nor
+        in bands where ``fleet_size`` (unlimited when not set) cannot cover
+        them at that starting headway.
+
+        A step down the ladder saves ``demand * dh / 2`` seconds of wait and
+        needs the increase in ``ceil(cycle / h)`` vehicles. Steps are taken in
+        order of wait saved per vehicle until a band's fleet is used up; the
+        ratios are made non-increasing along each route's ladder, so a route's
+        steps come in ladder order. All routes and bands are allocated in one
+        sort.
+        """
+        constraints = constraints or {}
+        cycles = cycles if cycles is not None else route_cycle_times(canonical, float(constraints.get("layover_ratio", DEFAULT_LAYOVER_RATIO)))
+        bands = bands if bands is not None else time_bands(canonical, constraints.get("time_bands"), int(constraints.get("band_s", DEFAULT_BAND_S)))
+        passengers = demand is not None
+        demand = demand if passengers else scheduled_demand(canonical, cycles.route_ids, bands)
+        demand = np.asarray(demand, dtype=np.float64)
+        fleet_size = constraints.get("fleet_size")
+        fleet = float(fleet_size) if fleet_size is not None else np.inf
+        n_routes, n_bands = len(cycles.route_ids), len(bands)
+        if demand.shape != (n_routes, n_bands):
+            raise ValueError(f"demand must have shape (routes, bands) = {(n_routes, n_bands)}, got {demand.shape}")
+
+        ladder = np.asarray(HEADWAY_LADDER_S, dtype=np.float64)
+        min_h = float(constraints.get("min_headway_s", ladder[-1]))
+        max_h = float(constraints.get("max_headway_s", ladder[0]))
+        ladder = ladder[(ladder >= min_h) & (ladder <= max_h)]
+        if ladder.size == 0:
+            raise ValueError(f"No headway in {HEADWAY_LADDER_S} lies within [{min_h}, {max_h}]")
+        # (routes, bands, levels)
+        vehicles = np.ceil(cycles.cycle_s[:, None, None] / ladder[None, None, :])
+        vehicles = np.broadcast_to(vehicles, (n_routes, n_bands, ladder.size))
+        wait = demand[:, :, None] * ladder / 2.0
+
+        # longest headway whose average load fits a vehicle; the scheduled-service proxy is not passengers
+        capacity = float(constraints.get("vehicle_capacity", 0) or 0)
+        start = np.zeros((n_routes, n_bands), dtype=np.int64)
+        if capacity > 0 and passengers:
+            rate = demand / (bands[:, 1] - bands[:, 0])[None, :]
+            fits = rate[:, :, None] * ladder <= capacity
+            start = np.where(fits.any(axis=2), fits.argmax(axis=2), ladder.size - 1)
+
+        # minimum service: when a band cannot run every route with demand at its starting headway,
+        # the (route, band) services with the least demand per vehicle are dropped
+        base_v = np.take_along_axis(vehicles, start[:, :, None], axis=2)[:, :, 0]
+        with np.errstate(divide="ignore"):
+            key = np.where(demand > 0, -demand / np.maximum(base_v, 1.0), np.inf)
+        served = _band_prefix(key.T, base_v.T, np.full(n_bands, fleet)).T
+
+        gain = wait[:, :, :-1] - wait[:, :, 1:]
+        cost = vehicles[:, :, 1:] - vehicles[:, :, :-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(cost > 0, gain / cost, np.inf)
+        before = np.arange(ladder.size - 1)[None, None, :] < start[:, :, None]
+        ratio = np.minimum.accumulate(np.where(before, np.inf, ratio), axis=2)
+        # per band, steps in (route, level) order; the stable sort keeps a route's equal-ratio steps in ladder order
+        key = np.where(~before & served[:, :, None], -ratio, np.inf).transpose(1, 0, 2).reshape(n_bands, -1)
+        budget = fleet - (base_v * served).sum(axis=0)
+        fits = _band_prefix(key, np.ascontiguousarray(cost.transpose(1, 0, 2)).reshape(n_bands, -1), budget)
+        taken = fits.reshape(n_bands, n_routes, -1).sum(axis=2).T
+
+        level = start + taken
+        headway = np.where(served, ladder[level], 0.0)
+        used = np.where(served, np.take_along_axis(vehicles, level[:, :, None], axis=2)[:, :, 0], 0)
+        return FrequencyPlan(cycles.route_ids, bands, headway, used.astype(np.int64), demand, fleet_size)
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from typing import Dict, Any
-import copy
+from typing import Dict, Any, Optional
 import networkx as nx
 import pandas as pd
 
+from ..graph.calibration import EdgeCalibration
+from .solution import Solution
+
 
 class GreedySeed:
     @staticmethod
@@ -13,14 +15,7 @@ class GreedySeed:
         canonical: Dict[str, pd.DataFrame],
         constraints: Dict[str, Any],
         objective: Dict[str, Any],
-    ) -> Dict[str, Any]:
-        # MVP seed: copy baseline as starting point
-        seed_solution = {
-            "graph": graph,
-            "canonical": canonical,
-            "changed_routes": [],
-            "removed_stops": [],
-        }
-        return copy.deepcopy(seed_solution)
-
-
+        calibration: Optional[EdgeCalibration] = None,
+    ) -> Solution:
+        # MVP seed: baseline as starting point; Solution never modifies graph or canonical
+        return Solution(graph, canonical, calibration=calibration)
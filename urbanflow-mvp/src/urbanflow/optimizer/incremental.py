@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from ..graph.csr import CSRGraph
+from .coverage import CoverageState
+from .evaluator import Evaluator
+from .simulation import PassengerSimulator, _Network
+from .solution import RouteChange
+
+
+# evaluated-but-uncommitted moves kept for commit(), e.g. one tabu neighbourhood
+MAX_PENDING = 16
+RESULT_COLUMNS = ["total", "wait", "in_vehicle", "walk", "access_m", "egress_m", "transfers", "reached"]
+
+
+def _weight_at_or_below(values: np.ndarray, cum: np.ndarray, x: np.ndarray) -> np.ndarray:
+    # total weight of the sorted ``values`` <= each ``x``; ``cum`` is their running weight
+    i = np.searchsorted(values, x, side="right")
+    return np.where(i > 0, cum[np.maximum(i, 1) - 1], 0.0) if len(values) else np.zeros(np.shape(x))
+
+
+def _lerp(a: float, b: float, t: float) -> float:
+    # the interpolation np.percentile uses, so results match it to the bit
+    d = b - a
+    return b - d * (1 - t) if t >= 0.5 else a + d * t
+
+
+class _SortedTotals:
+    """The sample's travel times kept sorted with running weights.
+
+    A percentile after replacing ``m`` passengers' times is found by binary
+    search over the kept order plus the ``m`` old and new times, in
+    O(m log n) instead of a re-sort of all ``n``; ``replace`` updates the
+    order in O(n) array moves.
+    """
+
+    def __init__(self, total: np.ndarray, weights: np.ndarray) -> None:
+        self.weights = weights
+        self.unit = bool(np.all(weights == 1))
+        self.order = np.argsort(total, kind="stable")
+        self.pos = np.empty(len(total), dtype=np.int64)
+        self._index()
+        self.values = total[self.order]
+        self.cum = np.cumsum(weights[self.order])
+
+    def _index(self) -> None:
+        self.pos[self.order] = np.arange(len(self.order))
+
+    def percentiles(self, qs: Tuple[float, ...], rows: np.ndarray, new: np.ndarray) -> List[float]:
+        """Percentiles (as ``evaluator._weighted_percentile``) once ``rows`` take the times ``new``."""
+        n = len(self.values)
+        old = self.values[self.pos[rows]]
+        w = self.weights[rows]
+        o_sort, n_sort = np.argsort(old, kind="stable"), np.argsort(new, kind="stable")
+        old_v, old_cum = old[o_sort], np.cumsum(w[o_sort])
+        new_v, new_cum = new[n_sort], np.cumsum(w[n_sort])
+
+        def weight_le(x: np.ndarray) -> np.ndarray:
+            return (_weight_at_or_below(self.values, self.cum, x)
+                    - _weight_at_or_below(old_v, old_cum, x) + _weight_at_or_below(new_v, new_cum, x))
+
+        def smallest_reaching(targets: np.ndarray) -> np.ndarray:
+            # smallest time whose weight at or below it reaches each target: the least kept
+            # time that does (found by bisection) or the least new one, whichever is lower
+            lo, hi = np.zeros(len(targets), dtype=np.int64), np.full(len(targets), n, dtype=np.int64)
+            while (lo < hi).any():
+                mid = (lo + hi) // 2
+                ok = weight_le(self.values[np.minimum(mid, n - 1)]) >= targets
+                lo, hi = np.where((lo < hi) & ~ok, mid + 1, lo), np.where((lo < hi) & ok, mid, hi)
+            kept = np.where(lo < n, self.values[np.minimum(lo, n - 1)], np.inf)
+            j = np.searchsorted(weight_le(new_v), targets, side="left") if len(new_v) else np.zeros(len(targets), dtype=np.int64)
+            added = np.where(j < len(new_v), new_v[np.minimum(j, len(new_v) - 1)], np.inf) if len(new_v) else kept
+            return np.minimum(kept, added)
+
+        if self.unit:
+            # np.percentile's linear method between the order statistics around (n - 1) * q
+            h = [(n - 1) * (q / 100.0) for q in qs]
+            lo = [int(np.floor(x)) for x in h]
+            ranks = np.asarray([[k, min(k + 1, n - 1)] for k in lo], dtype=np.float64) + 1.0
+            v = smallest_reaching(ranks.ravel()).reshape(-1, 2)
+            return [_lerp(float(a), float(b), x - k) for (a, b), x, k in zip(v.tolist(), h, lo)]
+        total_w = float(weight_le(np.asarray([np.inf]))[0])
+        v = smallest_reaching(np.asarray([q / 100.0 * total_w for q in qs]))
+        if np.isinf(v).any():
+            # rounding left a target just above every running weight: take the maximum, as the full path does
+            v = np.where(np.isinf(v), max(float(self.values[-1]), float(new_v[-1]) if len(new_v) else -np.inf), v)
+        return v.tolist()
+
+    def replace(self, rows: np.ndarray, new: np.ndarray) -> None:
+        """Give ``rows`` the times ``new``."""
+        keep = np.ones(len(self.order), dtype=bool)
+        keep[self.pos[rows]] = False
+        order, values = self.order[keep], self.values[keep]
+        srt = np.argsort(new, kind="stable")
+        at = np.searchsorted(values, new[srt], side="right")
+        self.order = np.insert(order, at, np.asarray(rows, dtype=np.int64)[srt])
+        self.values = np.insert(values, at, new[srt])
+        self.cum = np.cumsum(self.weights[self.order])
+        self._index()
+
+
+class IncrementalEvaluator:
+    """Delta KPI evaluation of stop-removal and route-level moves.
+
+    ``reset`` simulates every sampled passenger once and indexes which stops
+    each passenger's path (and snapped origin/destination) touches. Removing
+    a stop can only change the trips of passengers indexed under it: every
+    other passenger's shortest path avoids the stop, so it is still shortest.
+    ``evaluate_move`` therefore closes the stop in the routing network in
+    place, re-routes just those passengers from their own origins and
+    reopens it; the candidate KPIs follow from running sums and the sorted
+    travel times, updated by the re-routed passengers only. Their results are
+    kept aside until ``commit`` makes one of the moves evaluated since the
+    last commit the new base state and re-aggregates the stored results. Coverage is kept the same way: only the demand
+    points within the radius of the removed stop are re-counted.
+
+    A route-level move comes with the ``Solution.last_change`` of the graph
+    it was applied to. Only its changed edges are replaced in a copy of the
+    routing network and only its trips' departures in the timetable. The
+    re-routed passengers are those riding a changed hop, boarding one of the
+    edited trips' routes at a stop it serves or touching a removed stop, plus
+    those a cheaper or new edge could give a cheaper path: with ``a`` the
+    stops where such edges start, passenger ``s -> t`` is re-routed when
+    ``dist(s, a) + new_dist(a, t)`` undercuts its current path for some
+    ``a`` (three batched Dijkstras from those stops). Any other passenger
+    keeps a path that is still shortest (up to ties) and unchanged waits.
+
+    Moves are dicts: ``{"type": "remove_stop", "stop_id": ...}`` or a
+    route-level move. Without a ``change``, or if the move changes the
+    fallback wait, a route-level move falls back to a full evaluation of the
+    ``graph`` (and ``canonical`` tables) passed with it.
+    """
+
+    def __init__(self, evaluator: Evaluator) -> None:
+        self.evaluator = evaluator
+        self.graph: Optional[Union[nx.DiGraph, CSRGraph]] = None
+        self.canonical: Optional[Dict[str, pd.DataFrame]] = None
+        self.kpis: Dict[str, float] = {}
+        self._net: Optional[_Network] = None
+        self._sim: Optional[PassengerSimulator] = None
+        self._results: Dict[str, np.ndarray] = {}
+        self._sums: Dict[str, float] = {}
+        self._totals: Optional[_SortedTotals] = None
+        self._passengers_at: Dict[int, Set[int]] = {}
+        # passengers riding each stop-to-stop hop (u, v), and looking up departures at each (stop, route)
+        self._riders: Dict[Tuple[int, int], Set[int]] = {}
+        self._boarders: Dict[Tuple[int, Optional[str]], Set[int]] = {}
+        self._paths: List[List[int]] = []
+        self._boardings: List[List[Tuple[int, Optional[str]]]] = []
+        self._origins = np.empty(0, dtype=np.int64)
+        self._destinations = np.empty(0, dtype=np.int64)
+        self._costs = np.empty(0)
+        self._coverage: Optional[CoverageState] = None
+        # id(move) -> (move, state to adopt on commit), for moves evaluated since the last commit
+        self._pending: Dict[int, Tuple[Dict[str, Any], Any]] = {}
+        self.moves_evaluated = 0
+        self.passengers_rerouted = 0
+
+    def reset(self, graph: Union[nx.DiGraph, CSRGraph], canonical: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+        self.graph = graph
+        self.canonical = canonical
+        self._sim = self.evaluator.simulator(canonical)
+        self._net = self._sim.network(graph)
+        res = self._sim.run(graph, net=self._net, with_paths=True)
+        self._paths = res.pop("paths")
+        self._boardings = res.pop("boardings")
+        self._origins = res.pop("origins")
+        self._destinations = res.pop("destinations")
+        self._costs = res.pop("costs")
+        self._results = res
+        self._passengers_at, self._riders, self._boarders = {}, {}, {}
+        for k, (path, boarded) in enumerate(zip(self._paths, self._boardings)):
+            self._index(k, path, boarded)
+        index = self.evaluator.coverage_index(canonical)
+        self._coverage = index.state(index.active_stops(graph))
+        self._pending = {}
+        self.kpis = self.evaluator.kpis_from_results(res, coverage=self._coverage.ratio)
+        if res["total"].size:
+            self._sums = self.evaluator.kpi_sums(res)
+            self._totals = _SortedTotals(res["total"], self.evaluator.row_weights(res["total"].size))
+        return self.kpis
+
+    def evaluate_move(
+        self,
+        move: Dict[str, Any],
+        graph: Optional[Union[nx.DiGraph, CSRGraph]] = None,
+        canonical: Optional[Dict[str, pd.DataFrame]] = None,
+        change: Optional[RouteChange] = None,
+    ) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """KPIs after ``move`` and their delta against the current state."""
+        if self._net is None:
+            raise RuntimeError("IncrementalEvaluator.reset() must be called first")
+        self.moves_evaluated += 1
+        node = self._net.index.get(move.get("stop_id")) if move.get("type") == "remove_stop" else None
+        if move.get("type") != "remove_stop":
+            if graph is None:
+                raise ValueError(f"Move type {move.get('type')!r} needs the candidate graph for a full evaluation")
+            canonical = canonical if canonical is not None else self.canonical
+            fallback_wait = self.evaluator._estimate_wait_time(canonical)
+            if change is None or fallback_wait != self._sim.fallback_wait:
+                kpis = self.evaluator.compute_kpis(graph, canonical)
+                state: Tuple[Any, ...] = ("full", graph, canonical)
+            else:
+                kpis, state = self._route_move(graph, canonical, change, fallback_wait)
+        elif node is None or not self._net.alive[node]:
+            kpis = dict(self.kpis)
+            state = ("noop",)
+        else:
+            affected = np.fromiter(sorted(self._passengers_at.get(node, ())), dtype=np.int64)
+            coverage, cov_change = self._coverage.after(remove=[move["stop_id"]])
+            if affected.size:
+                undo = self._net.close([node])
+                try:
+                    sub = self._sim.run(self.graph, net=self._net, passengers=affected, with_paths=True)
+                finally:
+                    self._net.reopen(undo)
+            else:
+                sub = None
+            kpis = self._kpis_after(affected, sub, coverage)
+            state = ("remove", node, affected, sub, cov_change)
+        self._pending[id(move)] = (move, state)
+        # rejected candidates are never committed; keep only the most recent ones
+        while len(self._pending) > MAX_PENDING:
+            self._pending.pop(next(iter(self._pending)))
+        delta = {k: kpis[k] - self.kpis.get(k, 0.0) for k in kpis}
+        return kpis, delta
+
+    def _kpis_after(self, affected: np.ndarray, sub: Optional[Dict[str, Any]], coverage: float) -> Dict[str, float]:
+        # KPIs once ``affected`` passengers take the results ``sub``
+        self.passengers_rerouted += len(affected)
+        if not affected.size:
+            return dict(self.kpis, coverage_ratio=float(coverage))
+        old = self.evaluator.kpi_sums({c: self._results[c][affected] for c in RESULT_COLUMNS}, affected)
+        new = self.evaluator.kpi_sums(sub, affected)
+        sums = {k: v + new[k] - old[k] for k, v in self._sums.items()}
+        p50, p90 = self._totals.percentiles((50, 90), affected, sub["total"])
+        return self.evaluator.kpis_from_sums(sums, p50, p90, coverage)
+
+    def _route_move(
+        self,
+        graph: Union[nx.DiGraph, CSRGraph],
+        canonical: Dict[str, pd.DataFrame],
+        change: RouteChange,
+        fallback_wait: float,
+    ) -> Tuple[Dict[str, float], Tuple[Any, ...]]:
+        net = self._net
+
+        def nodes(ids: pd.Series) -> np.ndarray:
+            return np.fromiter((net.index.get(s, -1) for s in ids.tolist()), dtype=np.int64, count=len(ids))
+
+        pu, pv = nodes(change.pairs["u"]), nodes(change.pairs["v"])
+        eu, ev = nodes(change.edges["u"]), nodes(change.edges["v"])
+        known = (eu >= 0) & (ev >= 0)
+        weight = change.edges["travel_time"].to_numpy(dtype=np.float64)[known]
+        routes = change.edges["route_ids"].tolist() if "route_ids" in change.edges else None
+        routes = [r for r, k in zip(routes, known.tolist()) if k] if routes is not None else None
+        drop = (pu >= 0) & (pv >= 0)
+        new_net, (a_src, a_dst, a_w) = net.with_edges(pu[drop], pv[drop], eu[known], ev[known], weight, routes)
+        removed = [net.index[s] for s in change.removed_stops if s in net.index]
+        if removed:
+            new_net.close(removed)
+
+        # riders of a changed hop, passengers boarding an edited trip's route at one of its stops,
+        # everyone touching a removed stop and those the added entries can take a cheaper way
+        affected = set().union(
+            *(self._riders.get(pair, ()) for pair in zip(pu.tolist(), pv.tolist())),
+            *(self._passengers_at.get(node, ()) for node in removed),
+        )
+        for rows in (change.before, change.after):
+            rows = rows[rows["route_id"].notna().to_numpy()]
+            for stop, route in set(zip(rows["stop_id"].astype(str).tolist(), rows["route_id"].astype(str).tolist())):
+                node = net.index.get(stop)
+                if node is not None:
+                    affected.update(self._boarders.get((node, route), ()), self._boarders.get((node, None), ()))
+        affected.update(self._shortened(net, new_net, a_src, a_dst, a_w))
+        affected = np.fromiter(sorted(affected), dtype=np.int64, count=len(affected))
+
+        pairs = list(zip(change.pairs["u"].tolist(), change.pairs["v"].tolist()))
+        sim = self._sim.patched(self._sim.timetable.patched(change.before, change.after), fallback_wait, pairs)
+        sub = sim.run(graph, net=new_net, passengers=affected, with_paths=True) if affected.size else None
+        coverage, cov_change = self._coverage.after(remove=change.removed_stops)
+        kpis = self._kpis_after(affected, sub, coverage)
+        return kpis, ("route", graph, canonical, new_net, sim, affected, sub, cov_change)
+
+    def _shortened(self, net: _Network, new_net: _Network, src: np.ndarray, dst: np.ndarray, weight: np.ndarray) -> List[int]:
+        # passengers whose path the entries added to ``net`` (making ``new_net``) can make cheaper.
+        # Entries ``net`` has at the same or a lower cost change nothing; a cheaper path leaves ``net``
+        # at some a for a run of the others to some c, and unless that run beats net's own a -> c it
+        # can be swapped for it, so the first run starts at an a that gains. With a prefix in
+        # ``net``, the path then costs at least dist(s, a) + new_dist(a, t)
+        size = net.matrix.shape[0]
+        prev = np.full(len(src), np.inf)
+        inside = np.flatnonzero((src < size) & (dst < size))
+        if inside.size:
+            # no entry reads as 0 (stored costs are at least 1e-6)
+            found = np.asarray(net.matrix[src[inside], dst[inside]]).ravel()
+            prev[inside] = np.where(found > 0, found, np.inf)
+        new = np.isfinite(weight) & (weight < prev)
+        src, dst, weight = src[new], dst[new], weight[new]
+        ends, inv = np.unique(np.r_[src, dst], return_inverse=True)
+        k = len(src)
+        starts = np.unique(inv[:k][src < size])
+        rows = np.flatnonzero((self._origins >= 0) & (self._destinations >= 0))
+        if not len(starts) or not len(rows):
+            return []
+        old = ends < size
+        through = dijkstra(csr_matrix((weight, (inv[:k], inv[k:])), shape=(len(ends),) * 2), directed=True, indices=starts)[:, old]
+        if not np.isfinite(through).any():
+            return []
+        dist = dijkstra(net.matrix, directed=True, indices=ends[starts])
+        gains = np.flatnonzero((through < dist[:, ends[old]]).any(axis=1))
+        if not len(gains):
+            return []
+        nodes = ends[starts[gains]]
+        dests = self._destinations[rows]
+        before = dist[gains][:, dests]
+        after = dijkstra(new_net.matrix, directed=True, indices=nodes)[:, dests]
+        to_node = dijkstra(net.matrix.T.tocsr(), directed=True, indices=nodes)[:, self._origins[rows]]
+        least = np.where(after < before, to_node + after, np.inf).min(axis=0)
+        # with slack for sums rounded along different paths
+        return rows[least < self._costs[rows] + 1e-6].tolist()
+
+    def _index(self, k: int, path: List[int], boarded: List[Tuple[int, Optional[str]]], add: bool = True) -> None:
+        # file passenger ``k`` under the stops, hops and boardings of its trip (or take it out)
+        keys = [
+            (self._passengers_at, path),
+            (self._riders, [(u, v) for u, v in zip(path[:-1], path[1:]) if u != v]),
+            (self._boarders, boarded),
+        ]
+        for index, items in keys:
+            for item in items:
+                if add:
+                    index.setdefault(item, set()).add(k)
+                else:
+                    index[item].discard(k)
+
+    def commit(self, move: Dict[str, Any]) -> None:
+        """Adopt ``move``, which must have been evaluated since the last commit."""
+        pending = self._pending.get(id(move))
+        if pending is None or pending[0] is not move:
+            raise ValueError("commit() expects a move passed to evaluate_move() since the last commit")
+        state = pending[1]
+        self._pending = {}
+        if state[0] == "full":
+            self.reset(state[1], state[2])
+            return
+        if state[0] == "noop":
+            return
+        if state[0] == "route":
+            _, self.graph, self.canonical, self._net, self._sim, affected, sub, cov_change = state
+        else:
+            _, node, affected, sub, cov_change = state
+            self._net.close([node])
+        if affected.size:
+            for k, new_path, boarded in zip(affected.tolist(), sub["paths"], sub["boardings"]):
+                self._index(k, self._paths[k], self._boardings[k], add=False)
+                self._index(k, new_path, boarded)
+                self._paths[k], self._boardings[k] = new_path, boarded
+            self._origins[affected] = sub["origins"]
+            self._destinations[affected] = sub["destinations"]
+            self._costs[affected] = sub["costs"]
+            self._totals.replace(affected, sub["total"])
+            for c in RESULT_COLUMNS:
+                self._results[c][affected] = sub[c]
+        self._coverage.apply(cov_change)
+        # re-aggregated from the stored results (O(n) vector sums, no routing), so running sums never drift
+        self.kpis = self.evaluator.kpis_from_results(self._results, coverage=self._coverage.ratio)
+        self._sums = self.evaluator.kpi_sums(self._results)
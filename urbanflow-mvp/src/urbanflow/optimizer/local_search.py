@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional, Set
 import random
-import copy
-import networkx as nx
-import pandas as pd
+import numpy as np
+
+from ..graph.csr import CSRGraph
+from .incremental import IncrementalEvaluator
+from .solution import Solution
 
 
 class LocalSearch:
@@ -14,42 +16,72 @@ class LocalSearch:
         evaluator,
         constraints: Dict[str, Any],
         max_iters: int = 500,
-    ) -> Dict[str, Any]:
-        # MVP: perform a few random tweaks with hill-climb acceptance on proxy objective
-        rng = random.Random(42)
-        best = copy.deepcopy(solution)
-        best_score = LocalSearch._score(evaluator.compute_kpis(best["graph"], best["canonical"]), evaluator.objective)
-        for _ in range(int(max_iters)):
-            cand = LocalSearch._propose_move(best, rng)
-            cand_score = LocalSearch._score(evaluator.compute_kpis(cand["graph"], cand["canonical"]), evaluator.objective)
+        seed: Optional[int] = 42,
+        trace: Optional[List[float]] = None,
+        progress: Optional[Callable[[int, float, Dict[str, float]], None]] = None,
+    ) -> Solution:
+        # ``progress(iteration, best_score, best_kpis)`` is called after every iteration; it may raise to stop the search
+        # MVP: hill-climb over stop removals on the proxy objective; ``seed`` breaks ties between candidates
+        rng = random.Random(seed)
+        # moves go to a fork's move log; the caller's solution and its graph are left as they are
+        best = Solution.coerce(solution).fork()
+        # candidates differ from best by one removed stop, so only the passengers using it are re-simulated
+        incremental = IncrementalEvaluator(evaluator)
+        best_kpis = incremental.reset(best.graph, best.canonical)
+        best_score = LocalSearch._score(best_kpis, evaluator.objective)
+        if trace is not None:
+            trace.append(best_score)
+        # stops rejected since the last accepted move; accepting a move changes degrees and KPIs, so they are retried
+        rejected: Set[Any] = set()
+        for it in range(int(max_iters)):
+            move = LocalSearch._propose_move(best, rng, rejected)
+            if move is None:
+                break
+            cand_kpis, _ = incremental.evaluate_move(move)
+            cand_score = LocalSearch._score(cand_kpis, evaluator.objective)
             if cand_score < best_score:
-                best = cand
+                incremental.commit(move)
+                best.apply(move)
                 best_score = cand_score
+                best_kpis = cand_kpis
+                rejected.clear()
+            else:
+                rejected.add(move["stop_id"])
+            if trace is not None:
+                trace.append(best_score)
+            if progress is not None:
+                progress(it + 1, best_score, best_kpis)
         return best
 
     @staticmethod
-    def _propose_move(solution: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
-        # Very simple move: randomly drop a low-degree stop and then restore (simulates exploration)
-        graph: nx.DiGraph = solution["graph"]
-        canonical = solution["canonical"]
-        degrees = {n: graph.degree(n) for n in graph.nodes}
+    def _propose_move(
+        solution: Solution,
+        rng: random.Random,
+        rejected: Optional[Set[Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        # Very simple move: drop one of the lowest-degree dead-end stops, chosen at random
+        graph = solution.graph
+        rejected = rejected or set()
+        if isinstance(graph, CSRGraph):
+            return LocalSearch._propose_move_csr(graph, rng, rejected)
+        degrees = {n: d for n, d in graph.degree() if d < 2 and n not in rejected}
         if not degrees:
-            return copy.deepcopy(solution)
-        sorted_nodes = sorted(degrees.items(), key=lambda x: x[1])
-        node_to_remove = sorted_nodes[0][0]
-        cand_graph = graph.copy()
-        if cand_graph.has_node(node_to_remove) and cand_graph.degree(node_to_remove) < 2:
-            cand_graph.remove_node(node_to_remove)
-            removed = solution.get("removed_stops", []) + [node_to_remove]
-        else:
-            removed = solution.get("removed_stops", [])
-        cand = {
-            "graph": cand_graph,
-            "canonical": canonical,
-            "changed_routes": solution.get("changed_routes", []),
-            "removed_stops": removed,
-        }
-        return cand
+            return None
+        low = min(degrees.values())
+        return {"type": "remove_stop", "stop_id": rng.choice([n for n, d in degrees.items() if d == low])}
+
+    @staticmethod
+    def _propose_move_csr(graph: CSRGraph, rng: random.Random, rejected: Set[Any]) -> Optional[Dict[str, Any]]:
+        # same move as above on degree arrays; candidates stay in node order so both backends draw the same stop
+        degrees = graph.degree_array()
+        open_ = graph.alive & (degrees < 2)
+        if rejected:
+            open_[[graph.node_index(n) for n in rejected]] = False
+        cand = np.flatnonzero(open_)
+        if cand.size == 0:
+            return None
+        cand = cand[degrees[cand] == degrees[cand].min()]
+        return {"type": "remove_stop", "stop_id": graph.node_ids[rng.choice(cand.tolist())]}
 
     @staticmethod
     def _score(kpis: Dict[str, float], objective: Dict[str, Any]) -> float:
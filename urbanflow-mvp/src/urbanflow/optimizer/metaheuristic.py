@@ -0,0 +1,436 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import heapq
+import math
+import random
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from ..graph.build_graph import haversine_m
+from .incremental import IncrementalEvaluator
+from .local_search import LocalSearch
+from .solution import Solution
+
+
+ACCEPTANCE = ("annealing", "tabu")
+# constraint keys read by the move library, with their defaults
+CONSOLIDATION_RADIUS_M = 400.0
+EXTENSION_RADIUS_M = 1500.0
+EXTENSION_SPEED_MPS = 6.0
+HEADWAY_FACTORS = (0.5, 2.0)
+# adaptive move weights (roulette wheel): reward per outcome, blended in every SEGMENT uses
+REWARDS = {"best": 3.0, "improved": 2.0, "accepted": 1.0, "rejected": 0.0}
+SEGMENT = 50
+REACTION = 0.3
+MIN_WEIGHT = 0.05
+
+
+class DegreeHeap:
+    """Stops ordered by degree, updated in O(log n) per stop whose degree changed.
+
+    Entries are pushed again on every change instead of being updated in
+    place; stale ones (old degree, or stop removed) are dropped when popped.
+    """
+
+    def __init__(self, graph: Any) -> None:
+        self.rebuild(graph)
+
+    def rebuild(self, graph: Any) -> None:
+        self.degree: Dict[Any, int] = dict(graph.degree())
+        self._order = {n: i for i, n in enumerate(self.degree)}
+        self._heap = [(d, self._order[n], n) for n, d in self.degree.items()]
+        heapq.heapify(self._heap)
+
+    def update(self, graph: Any, nodes: Iterable[Any]) -> None:
+        for n in nodes:
+            if not graph.has_node(n):
+                self.degree.pop(n, None)
+                continue
+            d = graph.degree(n)
+            if self.degree.get(n) != d:
+                self.degree[n] = d
+                heapq.heappush(self._heap, (d, self._order.setdefault(n, len(self._order)), n))
+
+    def lowest(
+        self,
+        k: int,
+        accept: Callable[[Any, int], bool],
+        max_degree: Optional[int] = None,
+        max_scan: int = 256,
+    ) -> List[Any]:
+        """Up to ``k`` stops of degree <= ``max_degree`` passing ``accept(stop, degree)``, lowest degree first."""
+        found: List[Any] = []
+        kept: List[Tuple[int, int, Any]] = []
+        seen = set()
+        while self._heap and len(found) < k and len(kept) < max_scan:
+            entry = heapq.heappop(self._heap)
+            d, _, n = entry
+            if self.degree.get(n) != d or n in seen:
+                continue
+            seen.add(n)
+            kept.append(entry)
+            if max_degree is not None and d > max_degree:
+                break
+            if accept(n, d):
+                found.append(n)
+        for entry in kept:
+            heapq.heappush(self._heap, entry)
+        return found
+
+
+class RouteIndex:
+    """Stop pattern of each route (its longest trip) and the routes at each stop."""
+
+    def __init__(self, canonical: Dict[str, pd.DataFrame]) -> None:
+        trips, st = canonical["trips"], canonical["stop_times"]
+        self.tables = (trips, st)
+        trip_route = pd.Series(trips["route_id"].astype(str).to_numpy(), index=trips["trip_id"].astype(str).to_numpy())
+        trip_route = trip_route[~trip_route.index.duplicated(keep="last")]
+        tid = st["trip_id"].astype(str)
+        counts = tid.value_counts()
+        per_trip = pd.DataFrame({"trip": counts.index, "route": counts.index.map(trip_route), "n": counts.to_numpy()}).dropna()
+        self.trip_counts: Dict[str, int] = per_trip.groupby("route")["trip"].size().to_dict()
+        rep = per_trip.sort_values(["route", "n"], ascending=[True, False], kind="stable").drop_duplicates("route")
+        rows = st[tid.isin(rep["trip"]).to_numpy()].sort_values(["trip_id", "stop_sequence"], kind="stable")
+        stops_of = rows.groupby(rows["trip_id"].astype(str), sort=False)["stop_id"].agg(lambda s: s.astype(str).tolist())
+        self.patterns: Dict[str, List[str]] = {trip_route[t]: p for t, p in stops_of.items()}
+        self.routes = sorted(self.patterns)
+        self.starting_at: Dict[str, List[str]] = {}
+        passing: Dict[str, List[str]] = {}
+        for route in self.routes:
+            pattern = self.patterns[route]
+            self.starting_at.setdefault(pattern[0], []).append(route)
+            for stop in pattern[1:-1]:
+                passing.setdefault(stop, []).append(route)
+        # interior stops of two or more routes, where their trips can be interlined
+        self.shared = {s: rs for s, rs in passing.items() if len(set(rs)) > 1}
+        self.shared_stops = sorted(self.shared)
+
+
+class SearchContext:
+    """What the move library needs about the current solution."""
+
+    def __init__(self, solution: Solution, constraints: Dict[str, Any]) -> None:
+        self.solution = solution
+        self.constraints = constraints or {}
+        self.heap = DegreeHeap(solution.graph)
+        self._routes: Optional[RouteIndex] = None
+        stops = solution.canonical["stops"].drop_duplicates("stop_id", keep="last")
+        self.stop_ids = stops["stop_id"].astype(str).tolist()
+        self.latlon = stops[["lat", "lon"]].to_numpy(dtype=np.float64)
+        # equirectangular metres are accurate enough for radius queries
+        lat0 = math.radians(float(self.latlon[:, 0].mean())) if len(self.latlon) else 0.0
+        xy = np.column_stack([self.latlon[:, 0] * 110_540.0, self.latlon[:, 1] * 111_320.0 * math.cos(lat0)])
+        self.tree = cKDTree(xy) if len(xy) else None
+        self._xy = xy
+        self._row = {s: i for i, s in enumerate(self.stop_ids)}
+
+    @property
+    def routes(self) -> RouteIndex:
+        trips, st = self.solution.canonical["trips"], self.solution.canonical["stop_times"]
+        if self._routes is None or self._routes.tables[0] is not trips or self._routes.tables[1] is not st:
+            self._routes = RouteIndex(self.solution.canonical)
+        return self._routes
+
+    def near(self, stop: str, radius_m: float) -> List[str]:
+        """Open stops within ``radius_m`` of ``stop``, excluding it."""
+        i = self._row.get(stop)
+        if i is None or self.tree is None:
+            return []
+        graph = self.solution.graph
+        return [self.stop_ids[j] for j in self.tree.query_ball_point(self._xy[i], radius_m) if j != i and graph.has_node(self.stop_ids[j])]
+
+    def distance_m(self, a: str, b: str) -> float:
+        (la1, lo1), (la2, lo2) = self.latlon[self._row[a]], self.latlon[self._row[b]]
+        return float(haversine_m(la1, lo1, la2, lo2))
+
+
+# move name -> proposer(context, rng) returning a move dict or None when none applies
+MOVES: Dict[str, Callable[[SearchContext, random.Random], Optional[Dict[str, Any]]]] = {}
+
+
+def register_move(name: str) -> Callable:
+    def wrap(fn: Callable[[SearchContext, random.Random], Optional[Dict[str, Any]]]) -> Callable:
+        MOVES[name] = fn
+        return fn
+    return wrap
+
+
+@register_move("drop_stop")
+def _propose_drop_stop(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    # the LocalSearch move: a lowest-degree dead-end stop
+    cands = ctx.heap.lowest(5, lambda n, d: True, max_degree=1)
+    return {"type": "remove_stop", "stop_id": rng.choice(cands)} if cands else None
+
+
+@register_move("stop_consolidation")
+def _propose_consolidation(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    # a low-degree through stop with another open stop within walking distance
+    radius = float(ctx.constraints.get("consolidation_radius_m", CONSOLIDATION_RADIUS_M))
+    cands = ctx.heap.lowest(5, lambda n, d: d >= 2 and bool(ctx.near(str(n), radius)))
+    return {"type": "consolidate_stop", "stop_id": rng.choice(cands)} if cands else None
+
+
+@register_move("route_truncation")
+def _propose_truncation(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    routes = [r for r in ctx.routes.routes if len(ctx.routes.patterns[r]) > 2]
+    if not routes:
+        return None
+    return {"type": "truncate_route", "route_id": rng.choice(routes), "end": rng.choice(["first", "last"])}
+
+
+@register_move("route_extension")
+def _propose_extension(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    if not ctx.routes.routes:
+        return None
+    route = rng.choice(ctx.routes.routes)
+    end = rng.choice(["first", "last"])
+    pattern = ctx.routes.patterns[route]
+    terminal = pattern[-1] if end == "last" else pattern[0]
+    radius = float(ctx.constraints.get("extension_radius_m", EXTENSION_RADIUS_M))
+    on_route = set(pattern)
+    cands = [s for s in ctx.near(terminal, radius) if s not in on_route]
+    if not cands:
+        return None
+    stop = rng.choice(cands)
+    speed = float(ctx.constraints.get("extension_speed_mps", EXTENSION_SPEED_MPS))
+    return {
+        "type": "extend_route",
+        "route_id": route,
+        "end": end,
+        "stop_id": stop,
+        "travel_time_s": max(1.0, ctx.distance_m(terminal, stop) / speed),
+    }
+
+
+@register_move("headway_change")
+def _propose_headway(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    routes = [r for r in ctx.routes.routes if ctx.routes.trip_counts.get(r, 0) > 1]
+    if not routes:
+        return None
+    factors = ctx.constraints.get("headway_factors", HEADWAY_FACTORS)
+    return {"type": "change_headway", "route_id": rng.choice(routes), "factor": float(rng.choice(list(factors)))}
+
+
+@register_move("route_merge")
+def _propose_merge(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    # a route and one that starts where it ends
+    pairs = [
+        (r, other)
+        for r in ctx.routes.routes
+        for other in ctx.routes.starting_at.get(ctx.routes.patterns[r][-1], [])
+        if other != r
+    ]
+    if not pairs:
+        return None
+    route, other = rng.choice(pairs)
+    return {"type": "merge_routes", "route_id": route, "other": other}
+
+
+@register_move("route_split")
+def _propose_split(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    routes = [r for r in ctx.routes.routes if len(ctx.routes.patterns[r]) >= 4]
+    if not routes:
+        return None
+    route = rng.choice(routes)
+    pattern = ctx.routes.patterns[route]
+    return {"type": "split_route", "route_id": route, "stop_id": pattern[rng.randrange(1, len(pattern) - 1)]}
+
+
+@register_move("interline_swap")
+def _propose_interline(ctx: SearchContext, rng: random.Random) -> Optional[Dict[str, Any]]:
+    if not ctx.routes.shared_stops:
+        return None
+    stop = rng.choice(ctx.routes.shared_stops)
+    route, other = rng.sample(sorted(set(ctx.routes.shared[stop])), 2)
+    return {"type": "interline_swap", "route_id": route, "other": other, "stop_id": stop}
+
+
+def move_attributes(move: Dict[str, Any]) -> List[Hashable]:
+    """What a move changes, for the tabu list: its routes, or its stop for stop removals."""
+    if move.get("route_id") is None:
+        return [("stop", move.get("stop_id"))]
+    return [("route", r) for r in (move.get("route_id"), move.get("other")) if r is not None]
+
+
+class AdaptiveWeights:
+    """Roulette-wheel move selection; weights follow each move's recent rewards."""
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.weights = {n: 1.0 for n in names}
+        self._score = dict.fromkeys(self.weights, 0.0)
+        self._uses = dict.fromkeys(self.weights, 0)
+        self.counts = {n: dict.fromkeys(REWARDS, 0) for n in self.weights}
+        self._since_update = 0
+
+    def choose(self, rng: random.Random, exclude: Iterable[str] = ()) -> Optional[str]:
+        names = [n for n in self.weights if n not in set(exclude)]
+        if not names:
+            return None
+        return rng.choices(names, weights=[self.weights[n] for n in names])[0]
+
+    def reward(self, name: str, outcome: str) -> None:
+        self._score[name] += REWARDS[outcome]
+        self._uses[name] += 1
+        self.counts[name][outcome] += 1
+        self._since_update += 1
+        if self._since_update >= SEGMENT:
+            for n, uses in self._uses.items():
+                if uses:
+                    self.weights[n] = max(MIN_WEIGHT, (1 - REACTION) * self.weights[n] + REACTION * self._score[n] / uses)
+            self._score = dict.fromkeys(self.weights, 0.0)
+            self._uses = dict.fromkeys(self.weights, 0)
+            self._since_update = 0
+
+
+class MetaheuristicSearch:
+    @staticmethod
+    def optimize(
+        solution: Dict[str, Any],
+        evaluator,
+        constraints: Dict[str, Any],
+        max_iters: int = 500,
+        seed: Optional[int] = 42,
+        acceptance: str = "annealing",
+        moves: Optional[Iterable[str]] = None,
+        trace: Optional[List[float]] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> Solution:
+        """Simulated annealing or tabu search over the ``MOVES`` library.
+
+        Each iteration draws a move type by its adaptive weight and asks it
+        for a concrete move. ``annealing`` accepts a worse candidate with
+        probability exp(-delta / T), T cooling geometrically from
+        ``constraints["initial_temperature"]`` (2% of the start score) to a
+        thousandth of it. ``tabu`` evaluates ``tabu_neighbourhood`` (6)
+        candidates, moves to the best whose stops/routes were not changed in
+        the last ``tabu_tenure`` (10) iterations, unless it beats the best
+        found. Every move is scored incrementally (see
+        ``IncrementalEvaluator``). Returns the best solution seen; ``trace`` gets the
+        best score per iteration and ``stats`` per-move outcome counts and
+        final weights.
+        """
+        if acceptance not in ACCEPTANCE:
+            raise ValueError(f"Unknown acceptance {acceptance!r}; expected one of {ACCEPTANCE}")
+        names = list(moves) if moves is not None else list(MOVES)
+        unknown = [n for n in names if n not in MOVES]
+        if unknown:
+            raise ValueError(f"Unknown moves {unknown}; expected some of {sorted(MOVES)}")
+        constraints = constraints or {}
+        objective = evaluator.objective
+        rng = random.Random(seed)
+        start = Solution.coerce(solution)
+        current = start.fork()
+        incremental = IncrementalEvaluator(evaluator)
+        score = LocalSearch._score(incremental.reset(current.graph, current.canonical), objective)
+        best_score, best_moves = score, []
+        if trace is not None:
+            trace.append(best_score)
+
+        ctx = SearchContext(current, constraints)
+        weights = AdaptiveWeights(names)
+        tabu_until: Dict[Hashable, int] = {}
+        tenure = int(constraints.get("tabu_tenure", 10))
+        neighbourhood = int(constraints.get("tabu_neighbourhood", 6)) if acceptance == "tabu" else 1
+        temperature = float(constraints.get("initial_temperature", 0.02 * abs(score) or 1.0))
+        cooling = 1e-3 ** (1.0 / max(1, int(max_iters)))
+
+        for it in range(int(max_iters)):
+            cands: List[Tuple[float, str, Dict[str, Any]]] = []
+            exhausted: List[str] = []
+            while len(cands) < neighbourhood:
+                name = weights.choose(rng, exclude=exhausted)
+                if name is None:
+                    break
+                move = MOVES[name](ctx, rng)
+                if move is None:
+                    exhausted.append(name)
+                    continue
+                cand_score = MetaheuristicSearch._evaluate(current, incremental, move, objective)
+                # route-level moves were applied to score them; annealing keeps an accepted one applied
+                if acceptance == "tabu" and move["type"] != "remove_stop":
+                    current.revert()
+                cands.append((cand_score, name, move))
+            if not cands:
+                break
+
+            if acceptance == "annealing":
+                chosen = cands[0]
+                delta = chosen[0] - score
+                accept = delta < 0 or rng.random() < math.exp(-delta / max(temperature, 1e-12))
+                temperature *= cooling
+            else:
+                allowed = [
+                    c for c in cands
+                    if c[0] < best_score or all(tabu_until.get(a, -1) < it for a in move_attributes(c[2]))
+                ]
+                chosen = min(allowed, key=lambda c: c[0]) if allowed else cands[0]
+                accept = bool(allowed)
+            for c in cands:
+                if c is not chosen:
+                    weights.reward(c[1], "rejected")
+
+            cand_score, name, move = chosen
+            if accept:
+                outcome = "best" if cand_score < best_score else "improved" if cand_score < score else "accepted"
+                MetaheuristicSearch._adopt(current, incremental, ctx, move, applied=acceptance == "annealing")
+                score = cand_score
+                for a in move_attributes(move):
+                    tabu_until[a] = it + tenure
+                if cand_score < best_score:
+                    best_score, best_moves = cand_score, list(current.moves)
+            else:
+                outcome = "rejected"
+                if move["type"] != "remove_stop" and acceptance == "annealing":
+                    current.revert()
+            weights.reward(name, outcome)
+            if trace is not None:
+                trace.append(best_score)
+
+        if stats is not None:
+            stats["weights"] = dict(weights.weights)
+            stats["outcomes"] = weights.counts
+            stats["moves_evaluated"] = incremental.moves_evaluated
+        if len(current.moves) == len(best_moves):
+            return current
+        best = start.fork()
+        for move in best_moves:
+            best.apply(move)
+        return best
+
+    @staticmethod
+    def _evaluate(current: Solution, incremental: IncrementalEvaluator, move: Dict[str, Any], objective: Dict[str, Any]) -> float:
+        if move["type"] == "remove_stop":
+            kpis, _ = incremental.evaluate_move(move)
+        else:
+            # left applied; the caller reverts it unless it is adopted
+            current.apply(move)
+            kpis, _ = incremental.evaluate_move(move, current.graph, current.canonical, current.last_change)
+        return LocalSearch._score(kpis, objective)
+
+    @staticmethod
+    def _adopt(
+        current: Solution,
+        incremental: IncrementalEvaluator,
+        ctx: SearchContext,
+        move: Dict[str, Any],
+        applied: bool,
+    ) -> None:
+        incremental.commit(move)
+        if move["type"] == "remove_stop":
+            graph = current.graph
+            stop = move["stop_id"]
+            touched = {stop, *graph.predecessors(stop), *graph.successors(stop)}
+            current.apply(move)
+            ctx.heap.update(current.graph, touched)
+            return
+        if not applied:
+            current.apply(move)
+        change = current.last_change
+        if change is None:
+            ctx.heap.rebuild(current.graph)
+        else:
+            ctx.heap.update(current.graph, change.stops)
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+import pandas as pd
+
+from .frequency import route_cycle_times, trip_routes
+
+
+# Route-level moves as pure transforms of the canonical tables. Each returns a
+# new canonical dict that shares every table it does not change, so a
+# solution can undo a move by keeping the previous dict.
+Canonical = Dict[str, pd.DataFrame]
+TRANSFORMS: Dict[str, Callable[[Canonical, Dict[str, Any]], Canonical]] = {}
+# transforms that only change the trips of the routes named by ``route_id`` / ``other``
+ROUTE_MOVES = ("truncate_route", "extend_route", "change_headway", "merge_routes", "split_route", "interline_swap")
+
+
+def register_transform(name: str) -> Callable:
+    def wrap(fn: Callable[[Canonical, Dict[str, Any]], Canonical]) -> Callable:
+        TRANSFORMS[name] = fn
+        return fn
+    return wrap
+
+
+def _with(canonical: Canonical, **tables: pd.DataFrame) -> Canonical:
+    new = dict(canonical)
+    new.update(tables)
+    return new
+
+
+def _route_trip_mask(canonical: Canonical, route_id: Any) -> np.ndarray:
+    trips = canonical["trips"]
+    trip_ids = trips.loc[trips["route_id"].astype(str) == str(route_id), "trip_id"].astype(str)
+    return canonical["stop_times"]["trip_id"].astype(str).isin(trip_ids).to_numpy()
+
+
+def _sorted_rows(st: pd.DataFrame, mask: np.ndarray) -> pd.DataFrame:
+    return st[mask].sort_values(["trip_id", "stop_sequence"], kind="stable")
+
+
+def _concat(st: pd.DataFrame, keep: np.ndarray, *parts: pd.DataFrame) -> pd.DataFrame:
+    # unchanged rows keep their position; rewritten rows go last with the source dtypes
+    # (categorical IDs become strings, since moves create new trip and route IDs)
+    out = pd.concat([st[keep], *parts], ignore_index=True)
+    dtypes = {c: "str" if isinstance(dt, pd.CategoricalDtype) else dt for c, dt in st.dtypes.items()}
+    return out.astype(dtypes)
+
+
+def _tables(canonical: Canonical, *names: str) -> tuple:
+    # row labels are used to drop and replace rows, so they must be unique
+    return tuple(t if t.index.is_unique else t.reset_index(drop=True) for t in (canonical[n] for n in names))
+
+
+def _trip_ids(trips: pd.DataFrame, routes: set) -> set:
+    return set(trips.loc[trips["route_id"].astype(str).isin(routes).to_numpy(), "trip_id"].astype(str))
+
+
+def touched_trips(before: Canonical, after: Canonical, move: Dict[str, Any]) -> Optional[set]:
+    """IDs of the trips whose stops, times or route ``move`` may have changed
+    between ``before`` and ``after`` (its result), or ``None`` for a move
+    type not listed here.
+
+    Trips of the routes a move names, in either table, plus trips it created;
+    for ``consolidate_stop`` the trips that called at the stop.
+    """
+    kind = move.get("type")
+    if kind == "consolidate_stop":
+        st = before["stop_times"]
+        return set(st.loc[(st["stop_id"].astype(str) == str(move["stop_id"])).to_numpy(), "trip_id"].astype(str))
+    if kind == "set_headways":
+        routes = set(pd.DataFrame(move["headways"], columns=["route_id", "start", "end", "headway_s"])["route_id"].astype(str))
+    elif kind in ROUTE_MOVES:
+        routes = {str(move[k]) for k in ("route_id", "other") if move.get(k) is not None}
+    else:
+        return None
+    trips = _trip_ids(before["trips"], routes)
+    if after["trips"] is not before["trips"]:
+        new = set(after["trips"]["trip_id"].astype(str))
+        trips |= _trip_ids(after["trips"], routes) | (new - set(before["trips"]["trip_id"].astype(str)))
+    return trips
+
+
+@register_transform("consolidate_stop")
+def consolidate_stop(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Trips skip ``stop_id``; its riders walk to a nearby stop."""
+    st = canonical["stop_times"]
+    return _with(canonical, stop_times=st[(st["stop_id"].astype(str) != str(move["stop_id"])).to_numpy()].reset_index(drop=True))
+
+
+@register_transform("truncate_route")
+def truncate_route(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Drop the first or last stop (``end``) of every trip of the route that has more than two."""
+    st, = _tables(canonical, "stop_times")
+    rows = _sorted_rows(st, _route_trip_mask(canonical, move["route_id"]))
+    seq = rows.groupby("trip_id", sort=False)["stop_sequence"]
+    edge = seq.transform("max" if move.get("end", "last") == "last" else "min")
+    drop = rows.index[(rows["stop_sequence"] == edge) & (seq.transform("size") > 2)]
+    return _with(canonical, stop_times=st.drop(index=drop).reset_index(drop=True))
+
+
+@register_transform("extend_route")
+def extend_route(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Add ``stop_id`` beyond the first or last stop of every trip, ``travel_time_s`` away."""
+    st = canonical["stop_times"]
+    mask = _route_trip_mask(canonical, move["route_id"])
+    rows = _sorted_rows(st, mask)
+    last = move.get("end", "last") == "last"
+    ends = rows.drop_duplicates("trip_id", keep="last" if last else "first").copy()
+    dt = int(round(float(move["travel_time_s"])))
+    if last:
+        ends["arrival_time_sec"] = ends["departure_time_sec"] + dt
+        ends["stop_sequence"] = ends["stop_sequence"] + 1
+    else:
+        ends["arrival_time_sec"] = ends["arrival_time_sec"] - dt
+        ends["stop_sequence"] = ends["stop_sequence"] - 1
+    ends["departure_time_sec"] = ends["arrival_time_sec"]
+    ends["stop_id"] = str(move["stop_id"])
+    return _with(canonical, stop_times=_concat(st, np.ones(len(st), dtype=bool), ends))
+
+
+@register_transform("change_headway")
+def change_headway(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Scale the route's headway by ``factor``: keep every k-th trip (factor k >= 2)
+    or insert k-1 evenly spaced copies between consecutive trips (factor 1/k)."""
+    st, trips = canonical["stop_times"], canonical["trips"]
+    mask = _route_trip_mask(canonical, move["route_id"])
+    rows = st[mask]
+    starts = rows.groupby("trip_id", sort=False)["departure_time_sec"].min().sort_values(kind="stable")
+    factor = float(move["factor"])
+    if factor >= 1.0:
+        k = max(1, int(round(factor)))
+        dropped = set(starts.index[np.arange(len(starts)) % k != 0].astype(str))
+        keep_st = ~st["trip_id"].astype(str).isin(dropped).to_numpy()
+        keep_trips = ~trips["trip_id"].astype(str).isin(dropped).to_numpy()
+        return _with(canonical, stop_times=st[keep_st].reset_index(drop=True), trips=trips[keep_trips].reset_index(drop=True))
+    k = max(1, int(round(1.0 / factor)))
+    gaps = starts.shift(-1) - starts
+    new_st, new_trips = [], []
+    trip_rows = trips.drop_duplicates("trip_id").set_index(trips.drop_duplicates("trip_id")["trip_id"].astype(str))
+    for j in range(1, k):
+        offsets = (gaps * j / k).dropna().round().astype(np.int64)
+        offsets = offsets[offsets > 0]
+        if offsets.empty:
+            continue
+        ids = offsets.index.astype(str)
+        copy_st = rows[rows["trip_id"].astype(str).isin(ids)].copy()
+        shift = copy_st["trip_id"].astype(str).map(offsets.set_axis(ids)).to_numpy()
+        copy_st["arrival_time_sec"] = copy_st["arrival_time_sec"] + shift
+        copy_st["departure_time_sec"] = copy_st["departure_time_sec"] + shift
+        copy_st["trip_id"] = copy_st["trip_id"].astype(str) + f"+h{j}"
+        copy_trips = trip_rows.loc[ids].reset_index(drop=True)
+        copy_trips["trip_id"] = copy_trips["trip_id"].astype(str) + f"+h{j}"
+        new_st.append(copy_st)
+        new_trips.append(copy_trips)
+    if not new_st:
+        return canonical
+    return _with(
+        canonical,
+        stop_times=_concat(st, np.ones(len(st), dtype=bool), *new_st),
+        trips=_concat(trips, np.ones(len(trips), dtype=bool), *new_trips),
+    )
+
+
+@register_transform("merge_routes")
+def merge_routes(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Run the trips of ``other`` as ``route_id``, so riders continuing between them do not transfer."""
+    trips, routes = canonical["trips"].copy(), canonical["routes"]
+    other = trips["route_id"].astype(str) == str(move["other"])
+    trips.loc[other, "route_id"] = str(move["route_id"])
+    routes = routes[(routes["route_id"].astype(str) != str(move["other"])).to_numpy()].reset_index(drop=True)
+    return _with(canonical, trips=trips, routes=routes)
+
+
+@register_transform("split_route")
+def split_route(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Cut every trip of the route at ``stop_id``; the part after it runs as a new route."""
+    st, trips, routes = _tables(canonical, "stop_times", "trips", "routes")
+    route, stop = str(move["route_id"]), str(move["stop_id"])
+    new_route = f"{route}~{stop}"
+    mask = _route_trip_mask(canonical, route)
+    rows = _sorted_rows(st, mask)
+    at = rows.loc[rows["stop_id"].astype(str) == stop].drop_duplicates("trip_id").set_index("trip_id")["stop_sequence"]
+    cut = rows["trip_id"].map(at)
+    last = rows.groupby("trip_id", sort=False)["stop_sequence"].transform("max")
+    # only trips that run past the cut stop are split; the cut stop ends one part and starts the other
+    split = cut.notna() & (cut < last)
+    tail = rows[split & (rows["stop_sequence"] >= cut)].copy()
+    if tail.empty:
+        return canonical
+    head = rows[split & (rows["stop_sequence"] <= cut)]
+    tail["trip_id"] = tail["trip_id"].astype(str) + f"~{stop}"
+    split_trips = head["trip_id"].astype(str).unique()
+    tail_trips = trips[trips["trip_id"].astype(str).isin(split_trips).to_numpy()].copy()
+    tail_trips["trip_id"] = tail_trips["trip_id"].astype(str) + f"~{stop}"
+    tail_trips["route_id"] = new_route
+    route_row = routes[(routes["route_id"].astype(str) == route).to_numpy()].head(1).copy()
+    route_row["route_id"] = new_route
+    keep = ~st.index.isin(rows.index[split.to_numpy()])
+    return _with(
+        canonical,
+        stop_times=_concat(st, keep, head, tail),
+        trips=_concat(trips, np.ones(len(trips), dtype=bool), tail_trips),
+        routes=_concat(routes, np.ones(len(routes), dtype=bool), route_row),
+    )
+
+
+@register_transform("interline_swap")
+def interline_swap(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Exchange the parts after ``stop_id`` between trips of ``route_id`` and ``other``.
+
+    Trips of both routes are paired in order of their time at the stop; each
+    keeps its own part up to the stop and continues on its partner's part,
+    shifted so it leaves the stop at the time the trip reaches it.
+    """
+    st, = _tables(canonical, "stop_times")
+    stop = str(move["stop_id"])
+    parts = []
+    for route in (move["route_id"], move["other"]):
+        rows = _sorted_rows(st, _route_trip_mask(canonical, route))
+        at = rows.loc[rows["stop_id"].astype(str) == stop].drop_duplicates("trip_id")
+        at = at.set_index("trip_id")[["stop_sequence", "arrival_time_sec"]].sort_values("arrival_time_sec", kind="stable")
+        parts.append((rows, at))
+    (rows_a, at_a), (rows_b, at_b) = parts
+    n = min(len(at_a), len(at_b))
+    if n == 0:
+        return canonical
+    pairs = [(at_a.iloc[:n], at_b.iloc[:n]), (at_b.iloc[:n], at_a.iloc[:n])]
+    rewritten, touched = [], []
+    for (own, partner), rows_own, rows_partner in zip(pairs, (rows_a, rows_b), (rows_b, rows_a)):
+        own_trips, partner_trips = own.index.astype(str), partner.index.astype(str)
+        # heads stay with their trip
+        seq_own = rows_own["trip_id"].astype(str).map(pd.Series(own["stop_sequence"].to_numpy(), index=own_trips))
+        rewritten.append(rows_own[seq_own.notna() & (rows_own["stop_sequence"] <= seq_own)])
+        touched.append(rows_own.index[seq_own.notna()])
+        # tails move to the paired trip, re-timed and re-sequenced from its stop
+        owner = pd.Series(own_trips, index=partner_trips)
+        d_time = pd.Series(own["arrival_time_sec"].to_numpy() - partner["arrival_time_sec"].to_numpy(), index=partner_trips)
+        d_seq = pd.Series(own["stop_sequence"].to_numpy() - partner["stop_sequence"].to_numpy(), index=partner_trips)
+        pid = rows_partner["trip_id"].astype(str)
+        seq_partner = pid.map(pd.Series(partner["stop_sequence"].to_numpy(), index=partner_trips))
+        tail = rows_partner[seq_partner.notna() & (rows_partner["stop_sequence"] > seq_partner)].copy()
+        tid = tail["trip_id"].astype(str)
+        shift = tid.map(d_time).to_numpy()
+        tail["arrival_time_sec"] = tail["arrival_time_sec"] + shift
+        tail["departure_time_sec"] = tail["departure_time_sec"] + shift
+        tail["stop_sequence"] = tail["stop_sequence"] + tid.map(d_seq).to_numpy()
+        tail["trip_id"] = tid.map(owner).to_numpy()
+        rewritten.append(tail)
+    keep = ~st.index.isin(touched[0].append(touched[1]))
+    return _with(canonical, stop_times=_concat(st, keep, *rewritten))
+
+
+@register_transform("set_headways")
+def set_headways(canonical: Canonical, move: Dict[str, Any]) -> Canonical:
+    """Retimetable routes at the ``headways`` given per band (records of
+    ``route_id``, ``start``, ``end``, ``headway_s``, as ``FrequencyPlan.move``
+    builds them).
+
+    Each direction of a listed route runs its template trip (see
+    ``route_cycle_times``) every ``headway_s`` from ``start`` until ``end``
+    (no trips for a headway of 0); the route's previous trips are replaced.
+    """
+    plan = pd.DataFrame(move["headways"], columns=["route_id", "start", "end", "headway_s"])
+    plan["route_id"] = plan["route_id"].astype(str)
+    routes = set(plan["route_id"])
+    plan = plan[plan["headway_s"] > 0]
+    if not routes:
+        return canonical
+    st, trips = _tables(canonical, "stop_times", "trips")
+    templates = route_cycle_times(canonical).templates
+    templates = templates[templates["route_id"].isin(routes)]
+    # departures of every band: start, start + h, ... before end
+    n = np.ceil((plan["end"] - plan["start"]) / plan["headway_s"]).astype(np.int64).to_numpy()
+    row = np.repeat(np.arange(len(plan)), n)
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    departures = pd.DataFrame({
+        "route_id": plan["route_id"].to_numpy()[row],
+        "dep": plan["start"].to_numpy(dtype=np.int64)[row] + k * plan["headway_s"].to_numpy(dtype=np.int64)[row],
+    }).drop_duplicates()
+    runs = templates.merge(departures, on="route_id")
+    runs["new_trip"] = runs["trip_id"].astype(str) + "@" + runs["dep"].astype(str)
+
+    tid = st["trip_id"].astype(str)
+    pattern = st[tid.isin(templates["trip_id"]).to_numpy()].assign(trip_id=lambda d: d["trip_id"].astype(str))
+    new_st = pattern.merge(runs[["trip_id", "start", "dep", "new_trip"]], on="trip_id")
+    shift = (new_st["dep"] - new_st["start"]).to_numpy()
+    new_st["arrival_time_sec"] = new_st["arrival_time_sec"] + shift
+    new_st["departure_time_sec"] = new_st["departure_time_sec"] + shift
+    new_st = new_st.assign(trip_id=new_st["new_trip"])[list(st.columns)]
+    trip_rows = trips.drop_duplicates("trip_id", keep="last").assign(trip_id=lambda d: d["trip_id"].astype(str))
+    new_trips = trip_rows.merge(runs[["trip_id", "new_trip"]], on="trip_id")
+    new_trips = new_trips.assign(trip_id=new_trips["new_trip"])[list(trips.columns)]
+
+    replaced = trip_routes(trips)
+    replaced = set(replaced.index[replaced.isin(routes)])
+    out = {
+        "stop_times": _concat(st, ~tid.isin(replaced).to_numpy(), new_st),
+        "trips": _concat(trips, ~trips["trip_id"].astype(str).isin(replaced).to_numpy(), new_trips),
+    }
+    freqs = canonical.get("frequencies")
+    if freqs is not None and not freqs.empty and "trip_id" in freqs.columns:
+        out["frequencies"] = freqs[~freqs["trip_id"].astype(str).isin(replaced).to_numpy()].reset_index(drop=True)
+    return _with(canonical, **out)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from ..graph.calibration import EdgeCalibration
+from ..graph.csr import CSRGraph
+from ..graph.graph_io import load_graph, save_graph
+from .evaluator import Evaluator
+from .local_search import LocalSearch
+from .metaheuristic import MetaheuristicSearch, ACCEPTANCE
+from .solution import Solution
+
+
+SEARCHES = ("hill",) + ACCEPTANCE
+# per-process state set by _init_worker: the base solution and an evaluator, reused by every start in that worker
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(
+    graph_path: str,
+    backend: str,
+    canonical: Dict[str, pd.DataFrame],
+    history: Tuple[List[Any], List[Any], Optional[EdgeCalibration]],
+    evaluator_args: Dict[str, Any],
+) -> None:
+    # the graph file is memory-mapped, so all workers share its pages instead of unpickling a copy each
+    graph = load_graph(Path(graph_path), backend=backend, mmap=True)
+    _WORKER["solution"] = Solution(graph, canonical, *history)
+    _WORKER["evaluator"] = Evaluator(**evaluator_args)
+
+
+def _run_start(seed: int, constraints: Dict[str, Any], max_iters: int, search: str = "hill") -> Dict[str, Any]:
+    trace: List[float] = []
+    t0 = time.perf_counter()
+    solution, evaluator = _WORKER["solution"], _WORKER["evaluator"]
+    if search == "hill":
+        best = LocalSearch.optimize(solution, evaluator, constraints, max_iters=max_iters, seed=seed, trace=trace)
+    else:
+        best = MetaheuristicSearch.optimize(
+            solution, evaluator, constraints, max_iters=max_iters, seed=seed, acceptance=search, trace=trace
+        )
+    # only the move log goes back to the parent, never the graph
+    return {
+        "seed": seed,
+        "score": trace[-1],
+        "moves": best.moves,
+        "trace": trace,
+        "seconds": time.perf_counter() - t0,
+        "pid": os.getpid(),
+    }
+
+
+class MultiStartSearch:
+    @staticmethod
+    def optimize(
+        solution: Dict[str, Any],
+        evaluator: Evaluator,
+        constraints: Dict[str, Any],
+        max_iters: int = 500,
+        workers: int = 1,
+        starts: Optional[int] = None,
+        seeds: Optional[Sequence[int]] = None,
+        search: str = "hill",
+        seed: int = 42,
+    ) -> Tuple[Solution, List[Dict[str, Any]]]:
+        """Run independent searches with different seeds and keep the best.
+
+        ``search`` is one of ``SEARCHES``: the ``LocalSearch`` hill climb or a
+        ``MetaheuristicSearch`` acceptance rule.
+
+        Starts run in a pool of ``workers`` processes (``starts`` defaults to
+        ``workers``), seeded ``seed``, ``seed + 1``, ... unless ``seeds`` are
+        given. The base graph is written once to a ``.ufg`` file that
+        every worker memory-maps read-only. All starts score candidates on the
+        same passenger sample, so their scores are comparable. Returns the best
+        solution (as moves on top of ``solution``) and one convergence record
+        per start: seed, final score, best score after each iteration, wall
+        time and worker pid.
+        """
+        if search not in SEARCHES:
+            raise ValueError(f"Unknown search {search!r}; expected one of {SEARCHES}")
+        base = Solution.coerce(solution)
+        workers = max(1, int(workers))
+        if seeds is None:
+            seeds = [int(seed) + i for i in range(int(starts or workers))]
+        sample_seed = evaluator.seed if evaluator.seed is not None else random.Random().randrange(2**31)
+        evaluator_args = {
+            "objective": evaluator.objective,
+            "sample_size": evaluator.sample_size,
+            "seed": sample_seed,
+            "demand": evaluator.demand,
+            "zone_cell_m": evaluator.zone_cell_m,
+            "coverage_points": evaluator.coverage_points,
+        }
+        backend = "csr" if isinstance(base.graph, CSRGraph) else "networkx"
+        history = (base.changed_routes, base.removed_stops, base.calibration)
+
+        if workers == 1:
+            # in-process: the current graph is the base, so returned move logs hold only the new moves
+            _WORKER["solution"] = Solution(base.graph, base.canonical, *history)
+            _WORKER["evaluator"] = evaluator if evaluator.seed is not None else Evaluator(**evaluator_args)
+            results = [_run_start(s, constraints, max_iters, search) for s in seeds]
+        else:
+            with tempfile.TemporaryDirectory(prefix="urbanflow-multistart-") as td:
+                graph_path = Path(td) / "base.ufg"
+                save_graph(base.graph, graph_path)
+                init_args = (str(graph_path), backend, base.canonical, history, evaluator_args)
+                with ProcessPoolExecutor(max_workers=min(workers, len(seeds)), initializer=_init_worker, initargs=init_args) as pool:
+                    n = len(seeds)
+                    results = list(pool.map(_run_start, seeds, [constraints] * n, [max_iters] * n, [search] * n))
+        _WORKER.clear()
+
+        winner = min(results, key=lambda r: r["score"])
+        best = base.fork()
+        for move in winner["moves"]:
+            best.apply(move)
+        traces = [{k: r[k] for k in ("seed", "score", "trace", "seconds", "pid")} for r in results]
+        return best, traces
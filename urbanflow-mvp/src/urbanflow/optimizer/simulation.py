@@ -0,0 +1,667 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+import copy
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from ..data.od_generator import demand_long
+from ..graph.build_graph import haversine_m
+from ..graph.csr import CSRGraph, RaggedColumn
+
+
+WALK_SPEED_MPS = 1.3
+DEFAULT_MAX_SOURCES = 256
+DEFAULT_BATCH_SOURCES = 64
+# travel time charged to passengers the network cannot carry
+UNREACHABLE_PENALTY_S = 7200.0
+MAX_WAIT_S = 3600.0
+# routing cost of boarding a vehicle, so a passenger rides a few minutes longer rather than change
+# routes at every stop where another one is marginally faster
+TRANSFER_PENALTY_S = 300.0
+# neighbours fetched per KD-tree query when snapping to the nearest open stop
+SNAP_NEIGHBOURS = 8
+
+
+@dataclass
+class ODSample:
+    """Sampled passengers: origin/destination stop IDs and departure time (s).
+
+    ``weight`` is how many passengers each row stands for (1 when omitted),
+    as set by ``zones.coarsen_sample``.
+    """
+
+    origin: np.ndarray
+    destination: np.ndarray
+    depart: np.ndarray
+    weight: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.origin)
+
+
+def _as_ids(values: pd.Series) -> pd.Series:
+    # categorical IDs (as the demand generators return) are factorized by code, not re-encoded
+    return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype(str)
+
+
+def sample_od(
+    stop_ids: List[str],
+    size: int,
+    rng: np.random.Generator,
+    service_span: Tuple[int, int],
+    demand: Optional[pd.DataFrame] = None,
+    max_sources: int = DEFAULT_MAX_SOURCES,
+) -> ODSample:
+    """Draw ``size`` passengers from origin-destination ``demand`` (a long
+    origin/destination/trips table, an origin x destination DataFrame or
+    anything ``demand_long`` accepts).
+
+    Origins are drawn from the row totals and destinations from each origin's
+    row, in at most ``max_sources`` origin clusters, so one shortest-path tree
+    per cluster serves all of its passengers. Every passenger is still an
+    exact draw from the joint OD distribution. Without ``demand`` every
+    ordered pair of distinct stops is equally likely.
+    """
+    size = int(size)
+    empty = ODSample(np.empty(0, dtype=object), np.empty(0, dtype=object), np.empty(0, dtype=np.int64))
+    n_clusters = min(size, int(max_sources))
+    if size <= 0:
+        return empty
+    per_cluster = np.full(n_clusters, size // n_clusters)
+    per_cluster[: size % n_clusters] += 1
+
+    if demand is None:
+        origins = dests = np.asarray(stop_ids, dtype=object)
+        n = len(origins)
+        if n < 2:
+            return empty
+        o_idx = np.repeat(rng.integers(0, n, size=n_clusters), per_cluster)
+        # uniform over the other n - 1 stops
+        d_idx = rng.integers(0, n - 1, size=size)
+        d_idx += d_idx >= o_idx
+    else:
+        # long (origin, destination, trips) rows sorted by origin, then destination: one slice per
+        # origin, and the same draws whatever order the rows came in
+        od = demand_long(demand)
+        o_codes, origins = pd.factorize(_as_ids(od["origin"]), sort=True)
+        d_codes, dest_ids = pd.factorize(_as_ids(od["destination"]), sort=True)
+        order = np.lexsort((d_codes, o_codes))
+        dests = np.asarray(dest_ids, dtype=object)[d_codes[order]]
+        trips = od["trips"].to_numpy(dtype=np.float64)[order]
+        row_totals = np.bincount(o_codes, weights=od["trips"].to_numpy(dtype=np.float64), minlength=len(origins))
+        if row_totals.sum() <= 0:
+            return empty
+        origins = np.asarray(origins, dtype=object)
+        ptr = np.r_[0, np.cumsum(np.bincount(o_codes, minlength=len(origins)))]
+        cluster_rows = rng.choice(len(origins), size=n_clusters, p=row_totals / row_totals.sum())
+        o_idx = np.repeat(cluster_rows, per_cluster)
+        d_idx = np.empty(size, dtype=np.int64)
+        start = 0
+        for row, k in zip(cluster_rows.tolist(), per_cluster.tolist()):
+            lo, hi = ptr[row], ptr[row + 1]
+            weights = trips[lo:hi]
+            d_idx[start:start + k] = lo + rng.choice(hi - lo, size=k, p=weights / weights.sum())
+            start += k
+    depart = rng.integers(service_span[0], max(service_span[0] + 1, service_span[1]), size=size)
+    return ODSample(origins[o_idx], dests[d_idx], depart.astype(np.int64))
+
+
+class Timetable:
+    """Sorted departure times per (stop, route) for boarding-time lookups."""
+
+    def __init__(self, canonical: Dict[str, pd.DataFrame]) -> None:
+        st = canonical.get("stop_times")
+        trips = canonical.get("trips")
+        self.route_codes: Dict[str, int] = {}
+        self.departures: Dict[Tuple[str, int], List[int]] = {}
+        self.service_span = (0, 86400)
+        if st is None or st.empty or trips is None or trips.empty:
+            return
+        routes = trips.drop_duplicates("trip_id", keep="last").set_index("trip_id")["route_id"].astype(str)
+        route_of = st["trip_id"].map(routes)
+        codes, uniques = pd.factorize(route_of)
+        self.route_codes = {r: i for i, r in enumerate(uniques.tolist())}
+        dep = st["departure_time_sec"].to_numpy(dtype=np.int64)
+        self.service_span = (int(dep.min()), int(dep.max()))
+        stop_codes, stop_ids = pd.factorize(st["stop_id"].astype(str))
+        keep = codes >= 0
+        key = stop_codes[keep].astype(np.int64) * max(1, len(uniques)) + codes[keep]
+        dep = dep[keep]
+        order = np.lexsort((dep, key))
+        key, dep = key[order], dep[order]
+        bounds = np.flatnonzero(np.r_[True, key[1:] != key[:-1], True])
+        deps = dep.tolist()
+        stops = stop_ids.tolist()
+        n_routes = max(1, len(uniques))
+        self.departures = {
+            (stops[k // n_routes], k % n_routes): deps[a:b]
+            for k, a, b in zip(key[bounds[:-1]].tolist(), bounds[:-1].tolist(), bounds[1:].tolist())
+        }
+
+    def patched(self, removed: pd.DataFrame, added: pd.DataFrame) -> "Timetable":
+        """Copy with the departures in ``removed`` taken out and those in
+        ``added`` put in (``stop_id``, ``route_id``, ``departure_time_sec``
+        rows, e.g. the stop times of edited trips before and after the edit).
+        New routes get new codes; ``service_span`` is kept."""
+        new = object.__new__(Timetable)
+        new.service_span = self.service_span
+        new.route_codes = dict(self.route_codes)
+        new.departures = dict(self.departures)
+        changes: Dict[Tuple[str, int], Tuple[List[int], List[int]]] = {}
+        for slot, rows in enumerate((removed, added)):
+            rows = rows[rows["route_id"].notna().to_numpy()]
+            for stop, route, dep in zip(
+                rows["stop_id"].astype(str).tolist(),
+                rows["route_id"].astype(str).tolist(),
+                rows["departure_time_sec"].to_numpy(dtype=np.int64).tolist(),
+            ):
+                code = new.route_codes.setdefault(route, len(new.route_codes))
+                changes.setdefault((stop, code), ([], []))[slot].append(dep)
+        for key, (gone, extra) in changes.items():
+            left = Counter(gone)
+            deps = []
+            for dep in new.departures.get(key, ()):
+                if left[dep]:
+                    left[dep] -= 1
+                else:
+                    deps.append(dep)
+            deps = sorted(deps + extra)
+            if deps:
+                new.departures[key] = deps
+            else:
+                new.departures.pop(key, None)
+        return new
+
+    def route_mask(self, route_ids: Any) -> int:
+        mask = 0
+        for r in route_ids or ():
+            code = self.route_codes.get(str(r))
+            if code is not None:
+                mask |= 1 << code
+        return mask
+
+    def next_departure(self, stop_id: str, mask: int, t: float) -> Optional[float]:
+        """Earliest departure at or after ``t`` of any route in ``mask``."""
+        best = None
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            deps = self.departures.get((stop_id, low.bit_length() - 1))
+            if not deps:
+                continue
+            i = bisect_left(deps, t)
+            # after the last departure the next one is tomorrow's first
+            dep = deps[i] if i < len(deps) else deps[0] + 86400
+            if best is None or dep < best:
+                best = dep
+        return best
+
+
+def _tie_break(u: np.ndarray, v: np.ndarray, routes: np.ndarray) -> np.ndarray:
+    # a tiny cost (under 1e-5 s) per (from stop, to stop, route) entry, fixed by their IDs, so that
+    # equal-cost paths are told apart the same way however the routing network was numbered
+    h = pd.util.hash_array(np.asarray(u, dtype=object)) * np.uint64(31) + pd.util.hash_array(np.asarray(v, dtype=object))
+    h = h * np.uint64(131) + pd.util.hash_array(np.asarray(routes, dtype=object))
+    return ((h % np.uint64(1 << 20)).astype(np.float64) + 1.0) * 1e-11
+
+
+@dataclass
+class _Network:
+    node_ids: List[str]
+    index: Dict[str, int]
+    src: np.ndarray
+    dst: np.ndarray
+    weight: np.ndarray
+    alive: np.ndarray
+    matrix: Optional[csr_matrix] = None
+    # (node indices with coordinates, their coordinates, KD-tree over them), built on first snap;
+    # closed nodes stay in the tree and are skipped when querying
+    tree: Optional[Tuple[np.ndarray, np.ndarray, cKDTree]] = None
+    # matrix entries of each node's in-edges: in_pos[in_ptr[i]:in_ptr[i+1]], built on first close
+    in_ptr: Optional[np.ndarray] = None
+    in_pos: Optional[np.ndarray] = None
+    # with a transfer penalty the matrix has, after the stop nodes, one node per (stop, route served
+    # there): boarding from the stop costs ``penalty``, rides link a route's nodes and alighting is
+    # free. ``stop_of`` maps every matrix node to its stop, ``route_of`` gives the route of node n + j
+    penalty: float = 0.0
+    stop_of: Optional[np.ndarray] = None
+    route_of: List[str] = field(default_factory=list)
+    # (stop index, route) -> matrix node, built on first with_edges
+    route_nodes: Optional[Dict[Tuple[int, str], int]] = None
+
+    def __post_init__(self) -> None:
+        if self.stop_of is None:
+            self.stop_of = np.arange(len(self.node_ids))
+        if self.matrix is None:
+            size = len(self.stop_of)
+            keep = self.alive[self.stop_of[self.src]] & self.alive[self.stop_of[self.dst]]
+            self.matrix = csr_matrix((self.weight[keep], (self.src[keep], self.dst[keep])), shape=(size, size))
+
+    def _entries(self, nodes: List[int]) -> np.ndarray:
+        # matrix data positions of every edge into or out of ``nodes`` and their route nodes
+        m = self.matrix
+        if self.in_pos is None:
+            self.in_pos = np.argsort(m.indices, kind="stable")
+            self.in_ptr = np.concatenate([[0], np.cumsum(np.bincount(m.indices, minlength=m.shape[0]))])
+        n = len(self.node_ids)
+        if len(self.stop_of) > n:
+            at = np.flatnonzero(np.isin(self.stop_of[n:], nodes)) + n
+            nodes = [*nodes, *at.tolist()]
+        parts = []
+        for i in nodes:
+            parts.append(np.arange(m.indptr[i], m.indptr[i + 1]))
+            parts.append(self.in_pos[self.in_ptr[i]:self.in_ptr[i + 1]])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def close(self, nodes: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Close ``nodes`` in place: their edges get infinite cost and snapping
+        skips them. Costs O(degree); returns what ``reopen`` needs to undo it."""
+        nodes_arr = np.asarray(nodes, dtype=np.int64)
+        pos = self._entries(nodes)
+        undo = (nodes_arr, self.alive[nodes_arr].copy(), pos, self.matrix.data[pos].copy())
+        self.matrix.data[pos] = np.inf
+        self.alive[nodes_arr] = False
+        return undo
+
+    def reopen(self, undo: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]) -> None:
+        """Undo a ``close``."""
+        nodes, alive, pos, data = undo
+        self.matrix.data[pos] = data
+        self.alive[nodes] = alive
+
+    def with_edges(
+        self,
+        drop_src: np.ndarray,
+        drop_dst: np.ndarray,
+        src: np.ndarray,
+        dst: np.ndarray,
+        weight: np.ndarray,
+        routes: Optional[List[Tuple[str, ...]]] = None,
+    ) -> Tuple["_Network", Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Copy without the edges ``drop_src -> drop_dst`` and with ``src -> dst``
+        at ``weight`` (run by ``routes``) added, infinite where an endpoint is
+        closed, and the matrix entries added. Costs O(edges) in array
+        operations; the snapping tree is shared."""
+        n = len(self.node_ids)
+        m = self.matrix.tocoo()
+        row, col = m.row.astype(np.int64), m.col.astype(np.int64)
+        # boarding and alighting entries stay; stop-to-stop and ride entries of a dropped pair go
+        keep = ((row >= n) != (col >= n)) | ~np.isin(
+            self.stop_of[row] * n + self.stop_of[col], np.asarray(drop_src, dtype=np.int64) * n + drop_dst
+        )
+        src, dst = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+        weight = np.where(self.alive[src] & self.alive[dst], np.maximum(np.asarray(weight, dtype=np.float64), 1e-6), np.inf)
+        stop_of, route_of, route_nodes = self.stop_of, self.route_of, self.route_nodes
+        if self.penalty > 0:
+            if route_nodes is None:
+                route_nodes = self.route_nodes = {
+                    (s, r): n + j for j, (s, r) in enumerate(zip(self.stop_of[n:].tolist(), self.route_of))
+                }
+            route_nodes, route_of, new_stops = dict(route_nodes), list(route_of), []
+
+            def node(stop: int, route: str) -> int:
+                j = route_nodes.get((stop, route))
+                if j is None:
+                    j = route_nodes[stop, route] = n + len(route_of)
+                    route_of.append(route)
+                    new_stops.append(stop)
+                return j
+
+            a_src, a_dst, a_w, a_keys = [], [], [], []
+            for u, v, w, rs in zip(src.tolist(), dst.tolist(), weight.tolist(), routes or [()] * len(src)):
+                for r in rs or (None,):
+                    if r is None:
+                        a_src.append(u), a_dst.append(v)
+                    else:
+                        a_src.append(node(u, str(r))), a_dst.append(node(v, str(r)))
+                    a_w.append(w)
+                    a_keys.append((self.node_ids[u], self.node_ids[v], "" if r is None else str(r)))
+            added = np.arange(len(stop_of), len(stop_of) + len(new_stops))
+            new_stops = np.asarray(new_stops, dtype=np.int64)
+            open_new = self.alive[new_stops]
+            src = np.r_[np.asarray(a_src, dtype=np.int64), new_stops, added]
+            dst = np.r_[np.asarray(a_dst, dtype=np.int64), added, new_stops]
+            u_ids, v_ids, route_ids = (np.asarray(x, dtype=object) for x in zip(*a_keys)) if a_keys else ([],) * 3
+            weight = np.r_[
+                np.asarray(a_w, dtype=np.float64) + _tie_break(u_ids, v_ids, route_ids),
+                np.where(open_new, self.penalty, np.inf),
+                np.where(open_new, 1e-6, np.inf),
+            ]
+            stop_of = np.r_[stop_of, new_stops]
+        size = len(stop_of)
+        all_src, all_dst = np.r_[row[keep], src], np.r_[col[keep], dst]
+        all_weight = np.r_[m.data[keep], weight]
+        matrix = csr_matrix((all_weight, (all_src, all_dst)), shape=(size, size))
+        net = _Network(
+            self.node_ids, self.index, all_src, all_dst, all_weight, self.alive.copy(), matrix=matrix, tree=self.tree,
+            penalty=self.penalty, stop_of=stop_of, route_of=route_of, route_nodes=route_nodes,
+        )
+        return net, (src, dst, weight)
+
+
+def _network(graph: Union[nx.DiGraph, CSRGraph], transfer_penalty: float = 0.0) -> _Network:
+    routes = None
+    if isinstance(graph, CSRGraph):
+        src = graph.edge_src
+        dst = graph.indices
+        if "travel_time" in graph.edge_attrs:
+            weight = np.asarray(graph.edge_attrs["travel_time"], dtype=np.float64)
+        else:
+            weight = np.ones(len(src))
+        node_ids, index, alive = graph.node_ids, graph._index, graph.alive.copy()
+        if transfer_penalty > 0:
+            routes = graph.edge_attrs.get("route_ids")
+            if routes is not None and not isinstance(routes, RaggedColumn):
+                routes = RaggedColumn.from_tuples([r or () for r in routes])
+    else:
+        node_ids = list(graph.nodes)
+        index = {n: i for i, n in enumerate(node_ids)}
+        edges = list(graph.edges(data="travel_time", default=1))
+        src = np.fromiter((index[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+        dst = np.fromiter((index[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+        weight = np.fromiter((w for _, _, w in edges), dtype=np.float64, count=len(edges))
+        alive = np.ones(len(node_ids), dtype=bool)
+        if transfer_penalty > 0:
+            routes = RaggedColumn.from_tuples([r or () for _, _, r in graph.edges(data="route_ids", default=())])
+    # zero-weight edges would vanish from the sparse matrix; keep them as tiny costs
+    weight = np.maximum(weight, 1e-6)
+    if transfer_penalty <= 0:
+        return _Network(node_ids, index, src, dst, weight, alive)
+    n = len(node_ids)
+    if routes is None:
+        routes = RaggedColumn(np.zeros(len(src) + 1, dtype=np.int64), np.empty(0), [])
+    # one ride entry per (edge, route), between (stop, route) nodes numbered after the stops
+    lengths = np.diff(routes.offsets)
+    e = np.repeat(np.arange(len(src)), lengths)
+    entry_routes = np.asarray([str(r) for r in routes.vocab], dtype=object)[routes.codes]
+    route_codes, route_names = pd.factorize(entry_routes, sort=True)
+    n_routes = max(1, len(route_names))
+    keys, inv = np.unique(np.r_[src[e], dst[e]].astype(np.int64) * n_routes + np.r_[route_codes, route_codes], return_inverse=True)
+    k, stops, nodes = len(e), keys // n_routes, n + np.arange(len(keys))
+    plain = lengths == 0
+    ids = np.asarray(node_ids, dtype=object)
+    ride = weight[e] + _tie_break(ids[src[e]], ids[dst[e]], entry_routes)
+    direct = weight[plain] + _tie_break(ids[src[plain]], ids[dst[plain]], np.full(int(plain.sum()), "", dtype=object))
+    return _Network(
+        node_ids,
+        index,
+        np.r_[src[plain], n + inv[:k], stops, nodes],
+        np.r_[dst[plain], n + inv[k:], nodes, stops],
+        np.r_[direct, ride, np.full(len(keys), float(transfer_penalty)), np.full(len(keys), 1e-6)],
+        alive,
+        penalty=float(transfer_penalty),
+        stop_of=np.r_[np.arange(n), stops],
+        route_of=np.asarray(route_names, dtype=object)[keys % n_routes].tolist(),
+    )
+
+
+class PassengerSimulator:
+    """Route sampled passengers over a transit graph and report KPI aggregates.
+
+    Each passenger walks to the nearest open stop if their stop is not in the
+    graph and takes the path of least in-vehicle time plus
+    ``transfer_penalty`` per boarding (one batched Dijkstra per distinct
+    origin over a network with a node per stop and route, see ``_network``),
+    whose legs are the runs on one route. Without a penalty the shortest
+    in-vehicle path over the stops is split into the fewest single-route
+    legs instead. Boarding and transfer waits are looked up in the timetable
+    at the time the passenger reaches each stop.
+    """
+
+    def __init__(
+        self,
+        canonical: Dict[str, pd.DataFrame],
+        sample: ODSample,
+        fallback_wait: float,
+        max_wait: float = MAX_WAIT_S,
+        unreachable_penalty: float = UNREACHABLE_PENALTY_S,
+        batch_sources: int = DEFAULT_BATCH_SOURCES,
+        timetable: Optional[Timetable] = None,
+        transfer_penalty: float = TRANSFER_PENALTY_S,
+    ) -> None:
+        self.timetable = timetable if timetable is not None else Timetable(canonical)
+        self.sample = sample
+        self.fallback_wait = float(fallback_wait)
+        self.max_wait = float(max_wait)
+        self.unreachable_penalty = float(unreachable_penalty)
+        self.batch_sources = int(batch_sources)
+        self.transfer_penalty = float(transfer_penalty)
+        stops = canonical["stops"].drop_duplicates("stop_id", keep="last")
+        coords = stops[["lat", "lon"]].to_numpy(dtype=np.float64)
+        self.coords: Dict[str, Tuple[float, float]] = {
+            sid: (la, lo) for sid, (la, lo) in zip(stops["stop_id"].astype(str).tolist(), coords.tolist())
+        }
+        self._edge_masks: Dict[Tuple[str, str], int] = {}
+
+    def network(self, graph: Union[nx.DiGraph, CSRGraph]) -> _Network:
+        """The routing network ``run`` builds for ``graph``."""
+        return _network(graph, self.transfer_penalty)
+
+    def patched(self, timetable: Timetable, fallback_wait: float, pairs: List[Tuple[str, str]]) -> "PassengerSimulator":
+        """Copy on the same sample with another ``timetable``; route masks
+        cached for edges other than ``pairs`` are kept."""
+        new = copy.copy(self)
+        new.timetable = timetable
+        new.fallback_wait = float(fallback_wait)
+        new._edge_masks = dict(self._edge_masks)
+        for pair in pairs:
+            new._edge_masks.pop(pair, None)
+        return new
+
+    def _edge_mask(self, graph: Union[nx.DiGraph, CSRGraph], u: str, v: str) -> int:
+        key = (u, v)
+        mask = self._edge_masks.get(key)
+        if mask is None:
+            if isinstance(graph, CSRGraph):
+                routes = graph.get_edge_attr(u, v, "route_ids")
+            else:
+                routes = (graph.get_edge_data(u, v) or {}).get("route_ids")
+            mask = self._edge_masks[key] = self.timetable.route_mask(routes)
+        return mask
+
+    def _snap(self, net: _Network, stop_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # node index and walking distance (m) of the nearest open stop
+        idx = np.fromiter((net.index.get(s, -1) for s in stop_ids), dtype=np.int64, count=len(stop_ids))
+        known = idx >= 0
+        idx[known] = np.where(net.alive[idx[known]], idx[known], -1)
+        walk = np.zeros(len(stop_ids))
+        missing = np.flatnonzero(idx < 0)
+        if missing.size == 0:
+            return idx, walk
+        if net.tree is None:
+            nodes = np.asarray([i for i, sid in enumerate(net.node_ids) if sid in self.coords], dtype=np.int64)
+            xy = np.asarray([self.coords[net.node_ids[i]] for i in nodes.tolist()]).reshape(-1, 2)
+            tree = cKDTree(np.column_stack([xy[:, 0], xy[:, 1] * np.cos(np.radians(xy[:, 0]))]))
+            net.tree = (nodes, xy, tree)
+        nodes, node_xy, tree = net.tree
+        # one query per distinct stop; passengers at the same stop share it
+        codes, distinct = pd.factorize(pd.Series(stop_ids[missing], dtype=object))
+        snapped = np.full(len(distinct), -1, dtype=np.int64)
+        snap_walk = np.zeros(len(distinct))
+        for k, sid in enumerate(distinct.tolist()):
+            xy = self.coords.get(sid)
+            if xy is None or not len(nodes):
+                continue
+            # nearest open node, ties to the lowest stop ID: widen the query until an open one is
+            # among the neighbours and no farther neighbour could tie with it
+            q = [xy[0], xy[1] * np.cos(np.radians(xy[0]))]
+            n_near = min(SNAP_NEIGHBOURS, len(nodes))
+            while True:
+                d, near = tree.query(q, k=n_near)
+                d, near = np.atleast_1d(d), np.atleast_1d(near)
+                hit = np.flatnonzero(net.alive[nodes[near]])
+                if n_near == len(nodes) or (hit.size and d[-1] > d[hit[0]]):
+                    break
+                n_near = min(4 * n_near, len(nodes))
+            if not hit.size:
+                continue
+            ties = hit[d[hit] == d[hit[0]]]
+            j = int(near[min(ties.tolist(), key=lambda t: net.node_ids[nodes[near[t]]])])
+            snapped[k] = nodes[j]
+            snap_walk[k] = float(haversine_m(xy[0], xy[1], node_xy[j, 0], node_xy[j, 1]))
+        idx[missing] = snapped[codes]
+        walk[missing] = snap_walk[codes]
+        return idx, walk
+
+    def _ride(
+        self,
+        graph: Union[nx.DiGraph, CSRGraph],
+        net: _Network,
+        path: List[int],
+        dist: np.ndarray,
+        t: float,
+    ) -> Tuple[float, float, int, List[Tuple[int, Optional[str]]]]:
+        # fewest single-route legs along the path, then walk the clock through them
+        ids = net.node_ids
+        legs: List[Tuple[int, int, int]] = []
+        board, current = path[0], 0
+        for a, b in zip(path[:-1], path[1:]):
+            mask = self._edge_mask(graph, ids[a], ids[b])
+            if mask == 0 or current & mask:
+                current = current & mask if mask else current
+            elif current == 0:
+                current = mask
+            else:
+                legs.append((board, a, current))
+                board, current = a, mask
+        legs.append((board, path[-1], current))
+
+        wait = 0.0
+        for board, alight, mask in legs:
+            dep = self.timetable.next_departure(ids[board], mask, t) if mask else None
+            w = self.fallback_wait if dep is None else min(dep - t, self.max_wait)
+            wait += w
+            t += w + dist.item(alight) - dist.item(board)
+        # waits were looked up at these stops (for any of the legs' routes)
+        boarded = [(board, None) for board, _, mask in legs if mask]
+        return wait, dist.item(path[-1]), len(legs) - 1, boarded
+
+    def _ride_routes(
+        self, net: _Network, path: List[int], dist: np.ndarray, t: float
+    ) -> Tuple[float, float, int, List[Tuple[int, Optional[str]]]]:
+        # legs are the path's runs over one route's nodes (or over stop-to-stop edges of no known route)
+        n, ids, stop_of = len(net.node_ids), net.node_ids, net.stop_of
+        legs: List[Tuple[int, int, Optional[str]]] = []
+        board = -1
+        for a, b in zip(path[:-1], path[1:]):
+            if b >= n > a:
+                board = b
+            elif a >= n > b:
+                legs.append((board, a, net.route_of[a - n]))
+            elif a < n and b < n:
+                if legs and legs[-1][2] is None and legs[-1][1] == a:
+                    legs[-1] = (legs[-1][0], b, None)
+                else:
+                    legs.append((a, b, None))
+
+        wait = in_vehicle = 0.0
+        codes = self.timetable.route_codes
+        boarded = []
+        for board, alight, route in legs:
+            code = codes.get(route) if route is not None else None
+            dep = self.timetable.next_departure(ids[stop_of.item(board)], 1 << code, t) if code is not None else None
+            w = self.fallback_wait if dep is None else min(dep - t, self.max_wait)
+            ride = dist.item(alight) - dist.item(board)
+            wait += w
+            in_vehicle += ride
+            t += w + ride
+            if route is not None:
+                boarded.append((stop_of.item(board), route))
+        return wait, in_vehicle, len(legs) - 1, boarded
+
+    def run(
+        self,
+        graph: Union[nx.DiGraph, CSRGraph],
+        net: Optional[_Network] = None,
+        passengers: Optional[np.ndarray] = None,
+        with_paths: bool = False,
+    ) -> Dict[str, Any]:
+        """Per-passenger travel, wait, in-vehicle and walking time, transfers and reachability.
+
+        ``passengers`` restricts the run to those sample rows (results are in
+        that order). ``net`` overrides the routing network built from
+        ``graph``; ``graph`` is then only used to look up edge routes. With
+        ``with_paths`` the stop (node) indices each passenger touches are returned
+        under ``"paths"`` (snapped endpoints included, also when unreachable),
+        their snapped origins and destinations (-1 if none) under
+        ``"origins"`` and ``"destinations"``, the routing cost of their path
+        (``inf`` if none) under ``"costs"`` and the ``(stop index, route)`` of
+        each departure looked up under ``"boardings"`` (route ``None``: any
+        route of the leg).
+        """
+        net = net if net is not None else self.network(graph)
+        routed = net.penalty > 0
+        rows = np.arange(len(self.sample)) if passengers is None else np.asarray(passengers, dtype=np.int64)
+        n = len(rows)
+        depart = self.sample.depart[rows]
+        o_idx, o_walk = self._snap(net, self.sample.origin[rows])
+        d_idx, d_walk = self._snap(net, self.sample.destination[rows])
+        walk_s = (o_walk + d_walk) / WALK_SPEED_MPS
+        wait = np.zeros(n)
+        cost = np.where((o_idx >= 0) & (o_idx == d_idx), 0.0, np.inf)
+        in_vehicle = np.zeros(n)
+        transfers = np.zeros(n, dtype=np.int64)
+        reached = (o_idx >= 0) & (d_idx >= 0)
+        paths: List[List[int]] = [[i for i in (o, d) if i >= 0] for o, d in zip(o_idx.tolist(), d_idx.tolist())] if with_paths else []
+        boardings: List[List[Tuple[int, Optional[str]]]] = [[] for _ in range(n)] if with_paths else []
+
+        sources = np.unique(o_idx[reached])
+        order = np.argsort(o_idx, kind="stable")
+        sorted_o = o_idx[order]
+        for start in range(0, len(sources), self.batch_sources):
+            batch = sources[start:start + self.batch_sources]
+            dist_m, pred_m = dijkstra(net.matrix, directed=True, indices=batch, return_predecessors=True)
+            for row, src in enumerate(batch.tolist()):
+                lo, hi = np.searchsorted(sorted_o, [src, src + 1])
+                # paths touch few nodes, so scalar .item() beats converting whole rows
+                dist = dist_m[row]
+                pred = pred_m[row]
+                for k in order[lo:hi].tolist():
+                    if not reached[k]:
+                        continue
+                    dst = int(d_idx[k])
+                    if dst == src:
+                        continue
+                    if dist.item(dst) == np.inf:
+                        reached[k] = False
+                        continue
+                    cost[k] = dist.item(dst)
+                    path = [dst]
+                    while path[-1] != src:
+                        path.append(pred.item(path[-1]))
+                    path.reverse()
+                    t0 = float(depart[k]) + o_walk[k] / WALK_SPEED_MPS
+                    if routed:
+                        wait[k], in_vehicle[k], transfers[k], boarded = self._ride_routes(net, path, dist, t0)
+                    else:
+                        wait[k], in_vehicle[k], transfers[k], boarded = self._ride(graph, net, path, dist, t0)
+                    if with_paths:
+                        paths[k] = net.stop_of[path].tolist() if routed else path
+                        boardings[k] = boarded
+
+        total = np.where(reached, walk_s + wait + in_vehicle, self.unreachable_penalty)
+        out: Dict[str, Any] = {
+            "total": total,
+            "wait": wait,
+            "in_vehicle": in_vehicle,
+            "walk": walk_s,
+            "access_m": o_walk,
+            "egress_m": d_walk,
+            "transfers": transfers,
+            "reached": reached,
+        }
+        if with_paths:
+            out["paths"] = paths
+            out["origins"] = o_idx
+            out["destinations"] = d_idx
+            out["costs"] = cost
+            out["boardings"] = boardings
+        return out
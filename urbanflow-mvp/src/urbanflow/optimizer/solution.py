@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+import networkx as nx
+import pandas as pd
+
+from ..graph.build_graph import _trip_route_ids, build_graph_from_canonical, changed_edges
+from ..graph.calibration import EdgeCalibration
+from ..graph.csr import CSRGraph
+from .moves import TRANSFORMS, touched_trips
+
+
+Graph = Union[nx.DiGraph, CSRGraph]
+SOLUTION_KEYS = ("graph", "canonical", "changed_routes", "removed_stops")
+
+
+def _remove_stop(solution: "Solution", move: Dict[str, Any]) -> Any:
+    graph, stop = solution._working_graph(), move["stop_id"]
+    if isinstance(graph, CSRGraph):
+        graph.remove_node(stop)
+        return None
+    # keep what remove_node drops so revert can put it back
+    undo = (
+        dict(graph.nodes[stop]),
+        [(u, d) for u, _, d in graph.in_edges(stop, data=True)],
+        [(v, d) for _, v, d in graph.out_edges(stop, data=True)],
+    )
+    graph.remove_node(stop)
+    return undo
+
+
+def _restore_stop(solution: "Solution", move: Dict[str, Any], undo: Any) -> None:
+    graph, stop = solution._work, move["stop_id"]
+    if isinstance(graph, CSRGraph):
+        graph.restore_node(stop)
+        return
+    attrs, in_edges, out_edges = undo
+    graph.add_node(stop, **attrs)
+    graph.add_edges_from((u, stop, d) for u, d in in_edges)
+    graph.add_edges_from((stop, v, d) for v, d in out_edges)
+
+
+@dataclass
+class RouteChange:
+    """What a route-level move changed, for incremental evaluation.
+
+    ``pairs`` (``u``, ``v``) are the stop pairs whose edge changed, appeared
+    or went away, ``edges`` the edges of those still served (as the graph
+    has them), ``before`` / ``after`` the edited trips' stop times with the
+    ``route_id`` they run as, and ``removed_stops`` the stops taken out of
+    the graph.
+    """
+
+    pairs: pd.DataFrame
+    edges: pd.DataFrame
+    before: pd.DataFrame
+    after: pd.DataFrame
+    removed_stops: List[Any]
+
+    @property
+    def stops(self) -> Set[Any]:
+        """Stops whose edges or departures changed."""
+        return {
+            *self.pairs["u"].tolist(), *self.pairs["v"].tolist(), *self.removed_stops,
+            *self.before["stop_id"].astype(str).tolist(), *self.after["stop_id"].astype(str).tolist(),
+        }
+
+
+def _trip_rows(canonical: Dict[str, pd.DataFrame], trips: Set[str]) -> pd.DataFrame:
+    # stop times of ``trips`` with the route each runs as
+    st, trip_table = canonical["stop_times"], canonical["trips"]
+    rows = st[st["trip_id"].astype(str).isin(trips).to_numpy()]
+    trip_table = trip_table[trip_table["trip_id"].astype(str).isin(trips).to_numpy()]
+    return rows.assign(route_id=_trip_route_ids(trip_table, rows["trip_id"].astype(str).to_numpy(dtype=object)))
+
+
+def _patch_edges(graph: nx.DiGraph, pairs: pd.DataFrame, edges: pd.DataFrame) -> List[Tuple[Any, Any, Optional[Dict[str, Any]]]]:
+    # replace the attributes of ``pairs`` in place by ``edges`` (dropping pairs it lacks); returns
+    # each pair's previous attributes (None: no edge) for _unpatch_edges
+    attr_cols = [c for c in edges.columns if c not in ("u", "v")]
+    rows = {
+        (u, v): dict(zip(attr_cols, values))
+        for u, v, *values in zip(edges["u"].tolist(), edges["v"].tolist(), *(edges[c].tolist() for c in attr_cols))
+    }
+    undo = []
+    for u, v in zip(pairs["u"].tolist(), pairs["v"].tolist()):
+        data, attrs = graph.get_edge_data(u, v), rows.get((u, v))
+        undo.append((u, v, None if data is None else dict(data)))
+        if attrs is None:
+            if data is not None:
+                graph.remove_edge(u, v)
+        elif data is None:
+            graph.add_edge(u, v, **attrs)
+        else:
+            data.clear()
+            data.update(attrs)
+    return undo
+
+
+def _unpatch_edges(graph: nx.DiGraph, undo: List[Tuple[Any, Any, Optional[Dict[str, Any]]]]) -> None:
+    for u, v, attrs in reversed(undo):
+        if attrs is None:
+            graph.remove_edge(u, v)
+        elif graph.has_edge(u, v):
+            data = graph.edges[u, v]
+            data.clear()
+            data.update(attrs)
+        else:
+            graph.add_edge(u, v, **attrs)
+
+
+def _transform(solution: "Solution", move: Dict[str, Any]) -> Any:
+    # route-level moves rewrite the canonical tables copy-on-write; only the edges of the trips they
+    # touch are re-aggregated (calibrated like the base graph) and patched into the working graph
+    before = solution.canonical
+    undo = (before, solution._work, None, None, None)
+    after = TRANSFORMS[move["type"]](before, move)
+    solution.canonical = after
+    trips = touched_trips(before, after, move)
+    if trips is None:
+        backend = "csr" if isinstance(solution.graph, CSRGraph) else "networkx"
+        graph = build_graph_from_canonical(after, backend=backend, calibration=solution.calibration)
+        graph.remove_nodes_from(solution.removed_stops)
+        solution._work = graph
+        return undo
+    graph = solution._working_graph()
+    old_rows, new_rows = _trip_rows(before, trips), _trip_rows(after, trips)
+    pairs, edges = changed_edges(graph, after, old_rows, new_rows)
+    if solution.calibration is not None and len(edges):
+        edges = solution.calibration.apply_edges(edges)
+    # pairs at stops out of the graph stay out
+    pairs = pairs[[graph.has_node(u) and graph.has_node(v) for u, v in zip(pairs["u"], pairs["v"])]]
+    edges = edges[[graph.has_node(u) and graph.has_node(v) for u, v in zip(edges["u"], edges["v"])]]
+    edge_undo = None
+    if isinstance(graph, CSRGraph):
+        attrs = {c: edges[c].tolist() for c in edges.columns if c not in ("u", "v")}
+        solution._work = graph.replace_edges(zip(pairs["u"], pairs["v"]), edges["u"].tolist(), edges["v"].tolist(), attrs)
+    else:
+        edge_undo = (graph, _patch_edges(graph, pairs, edges))
+    removed = [move["stop_id"]] if move["type"] in STOP_REMOVALS and solution.graph.has_node(move["stop_id"]) else []
+    node_undo = _remove_stop(solution, move) if removed else None
+    return before, undo[1], edge_undo, node_undo, RouteChange(pairs, edges, old_rows, new_rows, removed)
+
+
+def _untransform(solution: "Solution", move: Dict[str, Any], undo: Any) -> None:
+    canonical, work, edge_undo, node_undo, change = undo
+    if change is not None and change.removed_stops:
+        _restore_stop(solution, move, node_undo)
+    if edge_undo is not None:
+        _unpatch_edges(*edge_undo)
+    solution.canonical, solution._work = canonical, work
+
+
+# move type -> (apply(solution, move) -> undo data, revert(solution, move, undo)); apply runs after
+# the move is appended to the log
+MOVE_HANDLERS: Dict[str, Tuple[Callable[["Solution", Dict[str, Any]], Any], Callable[["Solution", Dict[str, Any], Any], None]]] = {
+    "remove_stop": (_remove_stop, _restore_stop),
+    **{name: (_transform, _untransform) for name in TRANSFORMS},
+}
+# moves that take a stop out of the network
+STOP_REMOVALS = ("remove_stop", "consolidate_stop")
+
+
+class Solution(Mapping):
+    """A base network plus an undoable log of moves applied to it.
+
+    The base graph and canonical tables are shared and never modified. Stop
+    removals are applied to one private working graph (created on the first
+    move: a ``copy()`` of the base, which for :class:`CSRGraph` shares the edge
+    arrays); route-level moves (see ``moves.TRANSFORMS``) replace only the
+    canonical tables they change and re-aggregate only the edges of the trips
+    they touch, re-applying ``calibration`` when the base graph carries
+    AVL-observed travel times (see ``FeedSession.calibrate``); what they
+    changed is ``last_change``. ``revert`` restores
+    the previous state in O(move size), so candidates are evaluated by
+    applying a move and reverting it instead of copying the solution.
+
+    Reads like the legacy solution dict (``solution["graph"]``,
+    ``["removed_stops"]``, ...); ``solution["graph"]`` is the live working
+    graph and must not be modified by callers. ``materialize()`` returns a
+    plain dict with a graph of its own, for exports.
+    """
+
+    def __init__(
+        self,
+        graph: Graph,
+        canonical: Dict[str, pd.DataFrame],
+        changed_routes: Optional[List[Any]] = None,
+        removed_stops: Optional[List[Any]] = None,
+        calibration: Optional[EdgeCalibration] = None,
+    ) -> None:
+        self.base = graph
+        self.canonical = canonical
+        self.calibration = calibration
+        # history already reflected in ``graph`` when the solution was created
+        self._base_changed_routes = list(changed_routes or [])
+        self._base_removed_stops = list(removed_stops or [])
+        self.moves: List[Dict[str, Any]] = []
+        self._undo: List[Any] = []
+        self._work: Optional[Graph] = None
+
+    @classmethod
+    def coerce(cls, solution: Mapping) -> "Solution":
+        if isinstance(solution, Solution):
+            return solution
+        return cls(
+            solution["graph"],
+            solution["canonical"],
+            solution.get("changed_routes"),
+            solution.get("removed_stops"),
+        )
+
+    @property
+    def graph(self) -> Graph:
+        return self._work if self._work is not None else self.base
+
+    def _working_graph(self) -> Graph:
+        if self._work is None:
+            self._work = self.base.copy()
+        return self._work
+
+    @property
+    def removed_stops(self) -> List[Any]:
+        return self._base_removed_stops + [m["stop_id"] for m in self.moves if m["type"] in STOP_REMOVALS]
+
+    @property
+    def changed_routes(self) -> List[Any]:
+        routes = list(self._base_changed_routes)
+        for m in self.moves:
+            for r in (m.get("route_id"), m.get("other")):
+                if r is not None and r not in routes:
+                    routes.append(r)
+        return routes
+
+    @property
+    def last_change(self) -> Optional[RouteChange]:
+        """What the most recent move changed, if it was a route-level move
+        patched into the graph (``None`` otherwise)."""
+        if not self.moves or self.moves[-1]["type"] not in TRANSFORMS:
+            return None
+        return self._undo[-1][4]
+
+    def apply(self, move: Dict[str, Any]) -> None:
+        handlers = MOVE_HANDLERS.get(move.get("type"))
+        if handlers is None:
+            raise ValueError(f"Unknown move type {move.get('type')!r}; expected one of {sorted(MOVE_HANDLERS)}")
+        self.moves.append(move)
+        try:
+            self._undo.append(handlers[0](self, move))
+        except Exception:
+            self.moves.pop()
+            raise
+
+    def revert(self) -> Dict[str, Any]:
+        """Undo the most recent move and return it."""
+        if not self.moves:
+            raise IndexError("revert() on a solution with no applied moves")
+        move = self.moves.pop()
+        MOVE_HANDLERS[move["type"]][1](self, move, self._undo.pop())
+        return move
+
+    def fork(self) -> "Solution":
+        """Independent solution starting from this one's current state.
+
+        The current graph becomes the fork's base (shared when no move has
+        been applied, copied otherwise) and this solution's moves become its
+        history, so ``fork().moves`` holds only moves made after the fork.
+        """
+        graph = self.base if self._work is None else self._work.copy()
+        return Solution(graph, self.canonical, self.changed_routes, self.removed_stops, self.calibration)
+
+    def materialize(self) -> Dict[str, Any]:
+        return {
+            "graph": self.graph.copy(),
+            "canonical": self.canonical,
+            "changed_routes": self.changed_routes,
+            "removed_stops": self.removed_stops,
+        }
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in SOLUTION_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(SOLUTION_KEYS)
+
+    def __len__(self) -> int:
+        return len(SOLUTION_KEYS)
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import itertools
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from ..exports.vehicle_block_writer import block_trips
+from ..graph.calibration import EdgeCalibration
+from ..graph.csr import CSRGraph
+from ..graph.graph_io import load_graph, save_graph
+from .evaluator import Evaluator
+from .frequency import (
+    DEFAULT_BAND_S,
+    DEFAULT_LAYOVER_RATIO,
+    FrequencyOptimizer,
+    route_cycle_times,
+    sample_demand,
+    time_bands,
+)
+from .greedy_seed import GreedySeed
+from .local_search import LocalSearch
+from .metaheuristic import MetaheuristicSearch
+from .multistart import SEARCHES
+
+
+# Pareto-front criteria of a sweep: column -> "min" or "max"
+PARETO_CRITERIA = {
+    "p90_travel_time": "min",
+    "passenger_weighted_travel_time": "min",
+    "coverage_ratio": "max",
+    "vehicles_required": "min",
+}
+OVERRIDE_ROOTS = ("constraints", "objective")
+# per-process state set by _init_worker: the shared network and the evaluator settings
+_WORKER: Dict[str, Any] = {}
+
+
+def expand_variants(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Variants of a sweep spec, each ``{"name": ..., "overrides": {dotted path: value}}``.
+
+    ``spec["grid"]`` maps dotted paths (``"constraints.fleet_size"``,
+    ``"objective.weights.p90_travel_time"``) to lists of values and yields
+    their cartesian product; ``spec["variants"]`` lists further variants as
+    flat dicts of dotted paths plus an optional ``name``.
+    """
+    variants: List[Dict[str, Any]] = []
+    grid = spec.get("grid") or {}
+    keys = list(grid)
+    for values in itertools.product(*(grid[k] if isinstance(grid[k], list) else [grid[k]] for k in keys)) if keys else []:
+        overrides = dict(zip(keys, values))
+        variants.append({"name": ",".join(f"{k.split('.')[-1]}={v}" for k, v in overrides.items()), "overrides": overrides})
+    for i, v in enumerate(spec.get("variants") or []):
+        overrides = {k: val for k, val in v.items() if k != "name"}
+        variants.append({"name": str(v.get("name", f"variant_{i}")), "overrides": overrides})
+    for v in variants:
+        bad = [k for k in v["overrides"] if k.split(".")[0] not in OVERRIDE_ROOTS or "." not in k]
+        if bad:
+            raise ValueError(f"Override paths must start with 'constraints.' or 'objective.': {bad}")
+    names = [v["name"] for v in variants]
+    if len(set(names)) != len(names):
+        raise ValueError("Sweep variant names must be unique")
+    return variants
+
+
+def apply_overrides(
+    constraints: Dict[str, Any], objective: Dict[str, Any], overrides: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Copies of ``constraints`` and ``objective`` with the dotted-path ``overrides`` set."""
+    docs = {"constraints": copy.deepcopy(constraints), "objective": copy.deepcopy(objective)}
+    for path, value in overrides.items():
+        root, *keys = path.split(".")
+        node = docs[root]
+        for k in keys[:-1]:
+            node = node.setdefault(k, {})
+        node[keys[-1]] = value
+    return docs["constraints"], docs["objective"]
+
+
+def pareto_front(table: pd.DataFrame, criteria: Optional[Dict[str, str]] = None) -> np.ndarray:
+    """Mask of the rows no other row dominates on ``criteria`` (missing columns are skipped)."""
+    criteria = {c: d for c, d in (criteria or PARETO_CRITERIA).items() if c in table.columns}
+    if table.empty or not criteria:
+        return np.ones(len(table), dtype=bool)
+    # all criteria as "smaller is better"
+    x = np.column_stack([table[c].to_numpy(dtype=np.float64) * (1.0 if d == "min" else -1.0) for c, d in criteria.items()])
+    no_worse = (x[:, None, :] <= x[None, :, :]).all(axis=2)
+    better = (x[:, None, :] < x[None, :, :]).any(axis=2)
+    # dominates[j, i]: row j is no worse than row i everywhere and better somewhere
+    dominates = no_worse & better
+    return ~dominates.any(axis=0)
+
+
+def _init_worker(
+    graph_path: str,
+    backend: str,
+    canonical: Dict[str, pd.DataFrame],
+    evaluator_args: Dict[str, Any],
+    calibration: Optional[EdgeCalibration],
+) -> None:
+    # the graph file is memory-mapped, so all workers share its pages instead of unpickling a copy each
+    _WORKER["graph"] = load_graph(Path(graph_path), backend=backend, mmap=True)
+    _WORKER["canonical"] = canonical
+    _WORKER["calibration"] = calibration
+    _WORKER["evaluator_args"] = evaluator_args
+
+
+def _run_variant(
+    variant: Dict[str, Any],
+    constraints: Dict[str, Any],
+    objective: Dict[str, Any],
+    max_iters: int,
+    search: str,
+    headways: bool,
+    seed: Optional[int],
+) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    graph, canonical = _WORKER["graph"], _WORKER["canonical"]
+    constraints, objective = apply_overrides(constraints, objective, variant["overrides"])
+    # same passenger sample in every variant; only the objective differs
+    evaluator = Evaluator(objective=objective, **_WORKER["evaluator_args"])
+    solution = GreedySeed.create(graph, canonical, constraints, objective, calibration=_WORKER["calibration"])
+    if search == "hill":
+        best = LocalSearch.optimize(solution, evaluator, constraints, max_iters=max_iters, seed=seed)
+    else:
+        best = MetaheuristicSearch.optimize(solution, evaluator, constraints, max_iters=max_iters, seed=seed, acceptance=search)
+    if headways:
+        # as in ``urbanflow run --headways``
+        canonical_best = best.canonical
+        cycles = route_cycle_times(canonical_best, float(constraints.get("layover_ratio", DEFAULT_LAYOVER_RATIO)))
+        bands = time_bands(canonical_best, constraints.get("time_bands"), int(constraints.get("band_s", DEFAULT_BAND_S)))
+        demand = None
+        if constraints.get("daily_riders"):
+            sample = evaluator.simulator(canonical_best).sample
+            demand = sample_demand(canonical_best, cycles.route_ids, bands, sample, total=float(constraints["daily_riders"]))
+        best.apply(FrequencyOptimizer.optimize(canonical_best, constraints, demand=demand, bands=bands, cycles=cycles).move())
+    kpis = evaluator.compute_kpis(best.graph, best.canonical)
+    return {
+        "variant": variant["name"],
+        **variant["overrides"],
+        "score": LocalSearch._score(kpis, objective),
+        **kpis,
+        "vehicles_required": block_trips(best.canonical, constraints).fleet_size,
+        "stops_removed": len(best.removed_stops),
+        "routes_changed": len(best.changed_routes),
+        "seconds": time.perf_counter() - t0,
+        "pid": os.getpid(),
+    }
+
+
+class Sweep:
+    @staticmethod
+    def run(
+        graph: Any,
+        canonical: Dict[str, pd.DataFrame],
+        constraints: Dict[str, Any],
+        objective: Dict[str, Any],
+        variants: List[Dict[str, Any]],
+        evaluator: Evaluator,
+        max_iters: int = 200,
+        workers: int = 1,
+        search: str = "hill",
+        headways: bool = False,
+        seed: Optional[int] = 42,
+        calibration: Optional[EdgeCalibration] = None,
+    ) -> pd.DataFrame:
+        """Optimize every variant of ``constraints`` / ``objective`` on one loaded network.
+
+        ``variants`` come from :func:`expand_variants`. The feed is parsed
+        and the graph built once by the caller; with ``workers`` > 1 the
+        graph is written to a ``.ufg`` file that every worker memory-maps
+        read-only and the canonical tables are sent to each worker once, so
+        a variant only costs its search. Every variant uses ``evaluator``'s
+        passenger sample and every search the same ``seed``, so rows differ
+        only by their overrides. ``calibration`` (``FeedSession.calibration``)
+        is re-applied to every graph a variant rebuilds, so a calibrated
+        ``graph`` keeps its observed travel times through route-level moves.
+
+        Returns one row per variant, after a ``baseline`` row for the
+        unoptimized network: the overrides, objective score, KPIs, vehicles
+        required by blocking, and a ``pareto`` flag for rows on the front of
+        ``PARETO_CRITERIA``.
+        """
+        if search not in SEARCHES:
+            raise ValueError(f"Unknown search {search!r}; expected one of {SEARCHES}")
+        sample_seed = evaluator.seed if evaluator.seed is not None else random.Random().randrange(2**31)
+        evaluator_args = {
+            "sample_size": evaluator.sample_size,
+            "seed": sample_seed,
+            "demand": evaluator.demand,
+            "zone_cell_m": evaluator.zone_cell_m,
+            "coverage_points": evaluator.coverage_points,
+        }
+        base_evaluator = Evaluator(objective=objective, **evaluator_args)
+        baseline = base_evaluator.compute_kpis(graph, canonical)
+        rows = [{
+            "variant": "baseline",
+            "score": LocalSearch._score(baseline, objective),
+            **baseline,
+            "vehicles_required": block_trips(canonical, constraints).fleet_size,
+            "stops_removed": 0,
+            "routes_changed": 0,
+        }]
+        n = len(variants)
+        args = ([constraints] * n, [objective] * n, [int(max_iters)] * n, [search] * n, [bool(headways)] * n, [seed] * n)
+        workers = max(1, min(int(workers), n or 1))
+        if workers == 1:
+            _WORKER.update(graph=graph, canonical=canonical, evaluator_args=evaluator_args, calibration=calibration)
+            rows += [_run_variant(*a) for a in zip(variants, *args)]
+        else:
+            backend = "csr" if isinstance(graph, CSRGraph) else "networkx"
+            with tempfile.TemporaryDirectory(prefix="urbanflow-sweep-") as td:
+                graph_path = Path(td) / "base.ufg"
+                save_graph(graph, graph_path)
+                init_args = (str(graph_path), backend, canonical, evaluator_args, calibration)
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+                    rows += list(pool.map(_run_variant, variants, *args))
+        _WORKER.clear()
+        table = pd.DataFrame(rows)
+        # overrides right after the variant name; the baseline row has none
+        overridden = list(dict.fromkeys(k for v in variants for k in v["overrides"]))
+        table = table[["variant"] + overridden + [c for c in table.columns if c != "variant" and c not in overridden]]
+        table["pareto"] = pareto_front(table)
+        return table
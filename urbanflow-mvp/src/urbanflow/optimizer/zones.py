@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Union
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from ..data.od_generator import Demand, aggregate_to_zones, stop_activity
+from ..graph.build_graph import project_xy
+from ..graph.csr import CSRGraph
+from .simulation import ODSample, _network
+
+
+# departure times of coarse passengers are bucketed to this resolution
+DEFAULT_BUCKET_S = 3600
+# zone-to-zone skims are computed for this many origin zones at a time
+SKIM_BATCH_ZONES = 256
+
+
+class ZoneIndex:
+    """Stops assigned to zones, with a k-d tree over zone centroids.
+
+    ``grid`` cuts the stops' extent into square cells of ``cell_m`` metres
+    (equirectangular); ``from_column`` uses an existing column such as the
+    canonical ``stops.zone_id``, with stops lacking one falling back to the
+    zone of the nearest centroid.
+    """
+
+    def __init__(self, stop_ids: pd.Index, lat: np.ndarray, lon: np.ndarray, zone_ids: np.ndarray, codes: np.ndarray) -> None:
+        self.stop_ids = stop_ids
+        self.lat = lat
+        self.lon = lon
+        self.zone_ids = zone_ids
+        # zone code per stop, in stop_ids order
+        self.codes = codes
+        self.n_zones = len(zone_ids)
+        counts = np.bincount(codes, minlength=self.n_zones)
+        self.centroids = np.column_stack([
+            np.bincount(codes, weights=lat, minlength=self.n_zones) / np.maximum(counts, 1),
+            np.bincount(codes, weights=lon, minlength=self.n_zones) / np.maximum(counts, 1),
+        ])
+        self.lat0 = float(lat.mean()) if len(lat) else 0.0
+        self.tree = cKDTree(project_xy(self.centroids[:, 0], self.centroids[:, 1], self.lat0)) if self.n_zones else None
+
+    @staticmethod
+    def _stops(stops: pd.DataFrame) -> pd.DataFrame:
+        return stops.drop_duplicates("stop_id", keep="last").dropna(subset=["lat", "lon"])
+
+    @classmethod
+    def grid(cls, stops: pd.DataFrame, cell_m: float) -> "ZoneIndex":
+        stops = cls._stops(stops)
+        lat = stops["lat"].to_numpy(dtype=np.float64)
+        lon = stops["lon"].to_numpy(dtype=np.float64)
+        lat0 = float(lat.mean()) if len(lat) else 0.0
+        xy = project_xy(lat, lon, lat0)
+        x, y = xy[:, 0], xy[:, 1]
+        ix = np.floor((x - x.min(initial=0.0)) / float(cell_m)).astype(np.int64)
+        iy = np.floor((y - y.min(initial=0.0)) / float(cell_m)).astype(np.int64)
+        cell = pd.Series(ix).astype(str) + "_" + pd.Series(iy).astype(str)
+        codes, zone_ids = pd.factorize(cell, sort=True)
+        return cls(pd.Index(stops["stop_id"].astype(str)), lat, lon, np.asarray(zone_ids, dtype=object), codes)
+
+    @classmethod
+    def from_column(cls, stops: pd.DataFrame, column: str = "zone_id") -> "ZoneIndex":
+        stops = cls._stops(stops)
+        lat = stops["lat"].to_numpy(dtype=np.float64)
+        lon = stops["lon"].to_numpy(dtype=np.float64)
+        zones = stops[column].astype(object).where(stops[column].notna(), None)
+        has = zones.notna().to_numpy()
+        if not has.any():
+            raise ValueError(f"No stop has a {column!r}; use ZoneIndex.grid instead")
+        codes = np.full(len(stops), -1, dtype=np.int64)
+        codes[has], zone_ids = pd.factorize(zones[has].astype(str), sort=True)
+        index = cls(pd.Index(stops["stop_id"].astype(str))[has], lat[has], lon[has], np.asarray(zone_ids, dtype=object), codes[has])
+        if has.all():
+            return index
+        codes[~has] = index.locate(lat[~has], lon[~has])
+        return cls(pd.Index(stops["stop_id"].astype(str)), lat, lon, index.zone_ids, codes)
+
+    def locate(self, lat: Any, lon: Any) -> np.ndarray:
+        """Zone code of the nearest centroid to each point."""
+        _, j = self.tree.query(project_xy(np.atleast_1d(lat), np.atleast_1d(lon), self.lat0))
+        return np.asarray(j, dtype=np.int64)
+
+    def zone_of(self, stop_ids: Any) -> np.ndarray:
+        """Zone code per stop ID (-1 for unknown stops)."""
+        idx = self.stop_ids.get_indexer(pd.Index(np.asarray(stop_ids, dtype=object).astype(str)))
+        return np.where(idx >= 0, self.codes[np.maximum(idx, 0)], -1)
+
+    def series(self) -> pd.Series:
+        """zone_id by stop_id, as ``aggregate_to_zones`` takes it."""
+        return pd.Series(self.zone_ids[self.codes], index=self.stop_ids)
+
+    def representatives(self, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """Stop ID per zone with the largest ``weights`` (in ``stop_ids`` order; first stop by default)."""
+        w = np.zeros(len(self.stop_ids)) if weights is None else np.asarray(weights, dtype=np.float64)
+        order = np.lexsort((-w, self.codes))
+        first = order[np.r_[True, self.codes[order][1:] != self.codes[order][:-1]]]
+        reps = np.empty(self.n_zones, dtype=object)
+        reps[self.codes[first]] = self.stop_ids.to_numpy()[first]
+        return reps
+
+
+def assign_zones(canonical: Dict[str, pd.DataFrame], cell_m: float) -> Dict[str, pd.DataFrame]:
+    """Canonical tables with ``stops.zone_id`` set to ``cell_m`` grid cells (only the stops table is copied)."""
+    zones = ZoneIndex.grid(canonical["stops"], cell_m).series()
+    stops = canonical["stops"].copy()
+    stops["zone_id"] = stops["stop_id"].astype(str).map(zones)
+    return {**canonical, "stops": stops}
+
+
+def zone_demand(demand: Demand, zones: ZoneIndex) -> pd.DataFrame:
+    """``demand`` summed by (origin zone, destination zone)."""
+    return aggregate_to_zones(demand, zones.series(), zones.stop_ids)
+
+
+def zone_skims(graph: Union[nx.DiGraph, CSRGraph], zones: ZoneIndex, batch: int = SKIM_BATCH_ZONES) -> np.ndarray:
+    """``(zones, zones)`` in-vehicle time (s) between the closest stops of each pair of zones.
+
+    One multi-source Dijkstra per origin zone (all its open stops at once),
+    reduced to destination zones with ``np.minimum.reduceat``; ``inf`` where
+    no path exists, 0 within a zone.
+    """
+    net = _network(graph)
+    node_zone = zones.zone_of(net.node_ids)
+    node_zone[~net.alive] = -1
+    nodes = np.flatnonzero(node_zone >= 0)
+    nodes = nodes[np.argsort(node_zone[nodes], kind="stable")]
+    present, starts = np.unique(node_zone[nodes], return_index=True)
+    skims = np.full((zones.n_zones, zones.n_zones), np.inf)
+    for lo in range(0, len(present), batch):
+        rows = []
+        for z, a, b in zip(present[lo:lo + batch].tolist(), starts[lo:lo + batch].tolist(), np.r_[starts, len(nodes)][lo + 1:lo + batch + 1].tolist()):
+            rows.append((z, dijkstra(net.matrix, directed=True, indices=nodes[a:b], min_only=True)))
+        for z, dist in rows:
+            skims[z, present] = np.minimum.reduceat(dist[nodes], starts)
+    return skims
+
+
+def coarsen_sample(sample: ODSample, zones: ZoneIndex, representatives: np.ndarray, bucket_s: int = DEFAULT_BUCKET_S) -> ODSample:
+    """Merge passengers sharing origin zone, destination zone and departure bucket.
+
+    Each group becomes one passenger between the zones' representative stops,
+    departing mid-bucket and weighted by the group's size, so routing cost
+    scales with occupied zone pairs instead of passengers. Passengers whose
+    stops have no zone are kept as they are.
+    """
+    o = zones.zone_of(sample.origin)
+    d = zones.zone_of(sample.destination)
+    w = sample.weight if sample.weight is not None else np.ones(len(sample))
+    bucket = np.asarray(sample.depart, dtype=np.int64) // int(bucket_s)
+    zoned = (o >= 0) & (d >= 0)
+    key = pd.MultiIndex.from_arrays([o[zoned], d[zoned], bucket[zoned]])
+    codes, groups = key.factorize()
+    weight = np.bincount(codes, weights=w[zoned], minlength=len(groups))
+    go, gd, gb = (np.asarray(groups.get_level_values(i), dtype=np.int64) for i in range(3))
+    keep = ~zoned
+    return ODSample(
+        np.concatenate([representatives[go], sample.origin[keep]]),
+        np.concatenate([representatives[gd], sample.destination[keep]]),
+        np.concatenate([gb * int(bucket_s) + int(bucket_s) // 2, np.asarray(sample.depart, dtype=np.int64)[keep]]),
+        np.concatenate([weight, w[keep]]),
+    )
+
+
+def zone_index_for(canonical: Dict[str, pd.DataFrame], cell_m: float) -> tuple:
+    """Grid zones over the canonical stops and each zone's busiest stop (by ``stop_activity``)."""
+    zones = ZoneIndex.grid(canonical["stops"], cell_m)
+    stops = canonical["stops"]["stop_id"].astype(str).drop_duplicates()
+    activity = pd.Series(stop_activity(canonical), index=stops.to_numpy()).reindex(zones.stop_ids).fillna(0.0)
+    return zones, zones.representatives(activity.to_numpy())
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import io
+import os
+import threading
+import time
+import uuid
+
+from .cache import FeedCache, hash_source
+from .optimizer.evaluator import Evaluator
+from .optimizer.incremental import IncrementalEvaluator
+from .optimizer.solution import MOVE_HANDLERS, STOP_REMOVALS, Solution
+from .session import FeedSession
+
+
+# idle seconds before a scenario is dropped
+DEFAULT_SCENARIO_TTL_S = 1800.0
+# scenarios kept in memory at once; the least recently used goes first
+DEFAULT_MAX_SCENARIOS = 8
+
+
+class Scenario:
+    """A loaded feed kept in memory with its evaluator state, edited in place.
+
+    Edits are the optimizer's move dicts (``{"type": "remove_stop",
+    "stop_id": ...}``, ``{"type": "change_headway", "route_id": ...,
+    "factor": ...}``, any of ``solution.MOVE_HANDLERS``). Stop removals are
+    re-evaluated incrementally, re-routing only the passengers who used the
+    stop; route-level edits patch the edges of the trips they change and
+    re-route the passengers those edges can affect. A batch is all-or-nothing.
+    """
+
+    def __init__(self, scenario_id: str, session: FeedSession, evaluator: Evaluator) -> None:
+        self.scenario_id = scenario_id
+        self.session = session
+        self.evaluator = evaluator
+        self.solution = Solution(session.graph, session.canonical, calibration=session.calibration)
+        self.incremental = IncrementalEvaluator(evaluator)
+        with session.timed("baseline_kpis"):
+            self.baseline = dict(self.incremental.reset(self.solution.graph, self.solution.canonical))
+        self.lock = threading.Lock()
+
+    @property
+    def kpis(self) -> Dict[str, float]:
+        return self.incremental.kpis
+
+    def _check(self, move: Dict[str, Any]) -> None:
+        if move.get("type") not in MOVE_HANDLERS:
+            raise ValueError(f"Unknown edit type {move.get('type')!r}; expected one of {sorted(MOVE_HANDLERS)}")
+        if move["type"] in STOP_REMOVALS and not self.solution.graph.has_node(move.get("stop_id")):
+            raise ValueError(f"Stop {move.get('stop_id')!r} is not in the network")
+
+    def _apply_one(self, move: Dict[str, Any]) -> None:
+        # same order as the metaheuristic: stop removals are scored on the evaluator's own network
+        # before the graph changes, route-level moves on the patched graph
+        self._check(move)
+        if move["type"] == "remove_stop":
+            self.incremental.evaluate_move(move)
+            self.solution.apply(move)
+        else:
+            self.solution.apply(move)
+            self.incremental.evaluate_move(move, self.solution.graph, self.solution.canonical, self.solution.last_change)
+        self.incremental.commit(move)
+
+    def apply(self, edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply a batch of edits; KPIs, their change against the baseline and the time taken."""
+        t0 = time.perf_counter()
+        rerouted = self.incremental.passengers_rerouted
+        with self.lock:
+            before = len(self.solution.moves)
+            try:
+                for move in edits:
+                    self._apply_one(dict(move))
+            except Exception:
+                if len(self.solution.moves) > before:
+                    while len(self.solution.moves) > before:
+                        self.solution.revert()
+                    self.incremental.reset(self.solution.graph, self.solution.canonical)
+                raise
+            out = self.summary()
+        out["elapsed_ms"] = (time.perf_counter() - t0) * 1e3
+        out["passengers_rerouted"] = self.incremental.passengers_rerouted - rerouted
+        return out
+
+    def undo(self, steps: int = 1) -> Dict[str, Any]:
+        """Revert the last ``steps`` edits (one full re-evaluation)."""
+        with self.lock:
+            for _ in range(min(int(steps), len(self.solution.moves))):
+                self.solution.revert()
+            self.incremental.reset(self.solution.graph, self.solution.canonical)
+            return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        kpis = dict(self.kpis)
+        return {
+            "scenario_id": self.scenario_id,
+            "kpis": kpis,
+            "delta": {k: kpis[k] - self.baseline.get(k, 0.0) for k in kpis},
+            "edits": list(self.solution.moves),
+            "removed_stops": self.solution.removed_stops,
+            "changed_routes": self.solution.changed_routes,
+        }
+
+
+class ScenarioStore:
+    """Scenarios by ID, dropped after ``ttl_s`` idle seconds or when more than
+    ``max_scenarios`` are held (least recently used first)."""
+
+    def __init__(
+        self,
+        ttl_s: float = DEFAULT_SCENARIO_TTL_S,
+        max_scenarios: int = DEFAULT_MAX_SCENARIOS,
+        cache: Optional[FeedCache] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl_s = float(ttl_s)
+        self.max_scenarios = max(1, int(max_scenarios))
+        self.cache = cache if cache is not None and FeedCache.available() else None
+        self.clock = clock
+        # scenario_id -> (last used, scenario), least recently used first
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ScenarioStore":
+        """Store sized by ``URBANFLOW_SCENARIO_TTL_S`` / ``URBANFLOW_MAX_SCENARIOS``."""
+        return cls(
+            ttl_s=float(os.environ.get("URBANFLOW_SCENARIO_TTL_S", DEFAULT_SCENARIO_TTL_S)),
+            max_scenarios=int(os.environ.get("URBANFLOW_MAX_SCENARIOS", DEFAULT_MAX_SCENARIOS)),
+            cache=FeedCache(),
+        )
+
+    def _evict(self, now: float) -> None:
+        while self._items and (len(self._items) > self.max_scenarios or next(iter(self._items.values()))[0] + self.ttl_s < now):
+            self._items.popitem(last=False)
+
+    def create(self, feed: Any, objective: Dict[str, Any], sample_size: int = 2000, seed: Optional[int] = None) -> Scenario:
+        """Load the GTFS zip ``feed`` (bytes or a seekable file) and evaluate its baseline.
+
+        A feed whose content hash is in the cache is loaded from there
+        without being parsed.
+        """
+        if isinstance(feed, bytes):
+            feed = io.BytesIO(feed)
+        key = FeedCache.key_for_hash(hash_source(feed)) if self.cache is not None else None
+        session = FeedSession(feed, cache=self.cache, cache_key=key)
+        evaluator = Evaluator(objective=objective, sample_size=sample_size, seed=seed)
+        scenario = Scenario(uuid.uuid4().hex, session, evaluator)
+        # the scenario keeps the canonical tables and graph, not the upload
+        session.release_source()
+        with self._lock:
+            now = self.clock()
+            self._items[scenario.scenario_id] = (now, scenario)
+            self._evict(now)
+        return scenario
+
+    def get(self, scenario_id: str) -> Optional[Scenario]:
+        with self._lock:
+            now = self.clock()
+            self._evict(now)
+            item = self._items.get(scenario_id)
+            if item is None:
+                return None
+            self._items[scenario_id] = (now, item[1])
+            self._items.move_to_end(scenario_id)
+            return item[1]
+
+    def delete(self, scenario_id: str) -> bool:
+        with self._lock:
+            return self._items.pop(scenario_id, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(self.clock())
+            return len(self._items)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+from pathlib import Path
+import hashlib
+import json
+import time
+
+import networkx as nx
+import pandas as pd
+
+from .gtfs.parser import GtfsSource, read_gtfs_zip
+from .gtfs.validator import validate_feed
+from .gtfs.canonicalizer import canonicalize_feed
+from .gtfs.streaming import stream_feed, DEFAULT_CHUNK_SIZE
+from .graph.build_graph import build_graph_from_canonical, GRAPH_BACKENDS
+from .graph.calibration import MIN_OBSERVATIONS, EdgeCalibration
+from .graph.csr import CSRGraph
+from .optimizer.evaluator import Evaluator
+from .data.avl_ingest import AVLObservations, ingest_avl
+from .cache import FeedCache
+
+
+class FeedSession:
+    """Parse a GTFS feed once and memoize everything derived from it.
+
+    The raw tables, validation report, canonical tables, graph and baseline
+    KPIs are each computed on first access and reused afterwards, so CLI
+    commands and API handlers that share a session run every expensive stage
+    at most once. Wall time per stage is collected in ``timings``.
+
+    With a ``cache``, the report, canonical tables and graph are looked up by
+    the zip's content hash before anything is parsed, and stored once built.
+    ``graph_backend="csr"`` builds a :class:`CSRGraph` instead of an
+    ``nx.DiGraph``. A ``cache_key`` computed by the caller (e.g. from an
+    upload hashed as it arrived) skips hashing the source; with a cache hit
+    the source is never read and may be ``None``.
+    """
+
+    def __init__(
+        self,
+        source: Optional[GtfsSource],
+        csv_engine: str = "pandas",
+        stream: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        cache: Optional[FeedCache] = None,
+        graph_backend: str = "networkx",
+        cache_key: Optional[str] = None,
+    ) -> None:
+        if graph_backend not in GRAPH_BACKENDS:
+            raise ValueError(f"Unknown graph backend {graph_backend!r}; expected one of {GRAPH_BACKENDS}")
+        self.source = source
+        self.graph_backend = graph_backend
+        self.csv_engine = csv_engine
+        self.stream = bool(stream)
+        self.chunk_size = int(chunk_size)
+        self.cache = cache if cache is not None and FeedCache.available() else None
+        self.cache_key: Optional[str] = cache_key
+        self.cache_hit = False
+        self._cache_checked = False
+        self.timings: Dict[str, float] = {}
+        self._feed: Optional[Dict[str, pd.DataFrame]] = None
+        self._report: Optional[Dict[str, Any]] = None
+        self._canonical: Optional[Dict[str, pd.DataFrame]] = None
+        self._graph: Optional[Union[nx.DiGraph, CSRGraph]] = None
+        # evaluator settings (see _evaluator_key) -> baseline KPIs
+        self._baselines: Dict[Tuple[str, int, Optional[int], Optional[float], Optional[str], Optional[str]], Dict[str, float]] = {}
+        self.observations: Optional[AVLObservations] = None
+        # how ``graph`` was calibrated, for graphs rebuilt from edited schedules
+        self.calibration: Optional[EdgeCalibration] = None
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - t0
+
+    def _load_cached(self) -> None:
+        if self.cache is None or self._cache_checked:
+            return
+        self._cache_checked = True
+        if self.cache_key is None:
+            with self.timed("hash"):
+                self.cache_key = self.cache.key_for(self.source)
+        with self.timed("cache_load"):
+            cached = self.cache.load(self.cache_key, graph_backend=self.graph_backend)
+        if cached is not None:
+            self.cache_hit = True
+            self._report = cached["report"]
+            self._canonical = cached["canonical"]
+            self._graph = cached["graph"]
+
+    def _store_cached(self) -> None:
+        if self.cache is None or self.cache_hit:
+            return
+        report, canonical, graph = self.report, self.canonical, self._graph
+        with self.timed("cache_store"):
+            self.cache.store(self.cache_key, canonical, graph, report)
+
+    def _run_stream(self) -> None:
+        # one pass yields report, canonical tables and graph together
+        with self.timed("stream"):
+            result = stream_feed(
+                self.source, chunk_size=self.chunk_size, engine=self.csv_engine, graph_backend=self.graph_backend
+            )
+        self._report = result["report"]
+        self._canonical = result["canonical"]
+        self._graph = result["graph"]
+        self._store_cached()
+
+    @property
+    def feed(self) -> Dict[str, pd.DataFrame]:
+        if self._feed is None:
+            if self.source is None:
+                raise ValueError("No GTFS source: the feed is not in the cache and was not provided")
+            with self.timed("parse"):
+                self._feed = read_gtfs_zip(self.source, engine=self.csv_engine)
+        return self._feed
+
+    @property
+    def report(self) -> Dict[str, Any]:
+        self._load_cached()
+        if self._report is None:
+            if self.stream:
+                self._run_stream()
+            else:
+                feed = self.feed
+                with self.timed("validate"):
+                    self._report = validate_feed(feed)
+        return self._report
+
+    @property
+    def canonical(self) -> Dict[str, pd.DataFrame]:
+        self._load_cached()
+        if self._canonical is None:
+            if self.stream:
+                self._run_stream()
+            else:
+                feed = self.feed
+                with self.timed("canonicalize"):
+                    self._canonical = canonicalize_feed(feed)
+        return self._canonical
+
+    @property
+    def graph(self) -> Union[nx.DiGraph, CSRGraph]:
+        self._load_cached()
+        if self._graph is None:
+            if self.stream:
+                self._run_stream()
+            else:
+                canonical = self.canonical
+                with self.timed("build_graph"):
+                    self._graph = build_graph_from_canonical(canonical, backend=self.graph_backend)
+                self._store_cached()
+        return self._graph
+
+    def release_source(self) -> None:
+        """Drop the source and the raw parsed tables once the canonical tables and graph are built."""
+        # built before the source goes away
+        _ = self.canonical
+        _ = self.graph
+        self.source = None
+        self._feed = None
+
+    def calibrate(self, avl_path: Union[str, Path], min_obs: int = MIN_OBSERVATIONS, **ingest_kwargs: Any) -> AVLObservations:
+        """Replace the graph's scheduled travel times with those observed in an AVL file.
+
+        The calibrated graph is what ``graph`` returns from then on (the
+        cached graph stays the scheduled one), ``calibration`` holds what
+        solutions need to calibrate the graphs they rebuild, and memoized
+        baselines are dropped. ``ingest_kwargs`` go to :func:`ingest_avl`.
+        """
+        graph, canonical = self.graph, self.canonical
+        with self.timed("avl_ingest"):
+            self.observations = ingest_avl(Path(avl_path), canonical, **ingest_kwargs)
+        with self.timed("calibrate"):
+            self.calibration = EdgeCalibration(self.observations.by_edge, min_obs=int(min_obs))
+            self._graph = self.calibration.apply(graph)
+        self._baselines.clear()
+        return self.observations
+
+    def baseline_kpis(self, evaluator: Evaluator) -> Dict[str, float]:
+        key = (
+            json.dumps(evaluator.objective, sort_keys=True, default=str),
+            evaluator.sample_size,
+            evaluator.seed,
+            evaluator.zone_cell_m,
+            _frame_key(evaluator.demand),
+            _frame_key(evaluator.coverage_points),
+        )
+        if key not in self._baselines:
+            graph, canonical = self.graph, self.canonical
+            with self.timed("baseline_kpis"):
+                self._baselines[key] = evaluator.compute_kpis(graph, canonical)
+        return self._baselines[key]
+
+    def timing_report(self) -> Dict[str, float]:
+        return {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+
+
+def _frame_key(frame: Optional[pd.DataFrame]) -> Optional[str]:
+    # content hash of a demand or coverage-points table, so equal tables share a memoized baseline
+    if frame is None:
+        return None
+    digest = hashlib.sha256(json.dumps([str(c) for c in frame.columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,107 @@
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from urbanflow import api
+from urbanflow.cli import _create_sample_gtfs_zip, _default_constraints, _default_objective
+from urbanflow.cache import FeedCache
+from urbanflow import jobs
+from urbanflow.jobs import JobQueue
+
+
+def _files(tmp_path):
+    feed = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(feed, sample_type="complex")
+    return {
+        "gtfs_zip": ("feed.zip", feed.read_bytes(), "application/zip"),
+        "constraints_json": ("constraints.json", json.dumps(_default_constraints()), "application/json"),
+        "objective_json": ("objective.json", json.dumps(_default_objective()), "application/json"),
+    }
+
+
+def _wait(client, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while True:
+        info = client.get(f"/api/v1/status/{job_id}").json()
+        if info["status"] in ("succeeded", "failed", "cancelled") or time.monotonic() > deadline:
+            return info
+        time.sleep(0.1)
+
+
+def test_optimize_jobs_run_in_the_background_with_status_cancel_and_limits(tmp_path):
+    api.set_queue(JobQueue(max_workers=1, max_pending=3, root=tmp_path / "jobs", cache=FeedCache(tmp_path / "cache")))
+    try:
+        with TestClient(api.app) as client:
+            files = _files(tmp_path)
+            first = client.post("/api/v1/optimize", files=files, data={"sample_size": "200", "seed": "1", "max_iters": "20"})
+            assert first.status_code == 202 and first.json()["status"] == "queued"
+            job_id = first.json()["job_id"]
+            # one worker: these wait behind the first job; the pending limit refuses a fourth
+            queued = [client.post("/api/v1/optimize", files=files).json()["job_id"] for _ in range(2)]
+            assert client.post("/api/v1/optimize", files=files).status_code == 429
+            assert client.post(f"/api/v1/cancel/{queued[1]}").json()["cancelled"]
+
+            info = _wait(client, job_id)
+            assert info["status"] == "succeeded"
+            assert info["progress"]["stage"] == "done" and info["progress"]["iteration"] <= 20
+            assert "average_travel_time" in info["progress"]["best_kpis"]
+            result = client.get(f"/api/v1/results/{job_id}").json()
+            assert set(result) >= {"baseline", "optimized", "timings"}
+            assert result["optimized"]["p90_travel_time"] == info["progress"]["best_kpis"]["p90_travel_time"]
+
+            assert _wait(client, queued[1])["status"] == "cancelled"
+            assert client.get(f"/api/v1/results/{queued[1]}").status_code == 409
+            assert client.get("/api/v1/status/nope").status_code == 404
+            assert _wait(client, queued[0])["status"] == "succeeded"
+            # uploads are never written into the job directories
+            assert not [p.name for p in (tmp_path / "jobs").rglob("*") if p.is_file() and p.name != "progress.json"]
+
+            # the same feed again is recognised by its hash and loaded from the cache
+            again = client.post("/api/v1/optimize", files=files, data={"sample_size": "200", "seed": "1", "max_iters": "20"}).json()
+            assert again["job_id"] != job_id
+            assert _wait(client, again["job_id"])["feed_key"] == info["feed_key"]
+            repeat = client.get(f"/api/v1/results/{again['job_id']}").json()
+            assert repeat["cache_hit"] and not result["cache_hit"] and "parse" not in repeat["timings"]
+            assert repeat["optimized"] == result["optimized"]
+
+            bad = dict(files, objective_json=("objective.json", "{not json", "application/json"))
+            assert client.post("/api/v1/optimize", files=bad).status_code == 400
+    finally:
+        api.set_queue(None)
+
+
+def test_a_cancel_after_the_last_evaluation_reports_cancelled(tmp_path, monkeypatch):
+    feed = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(feed, sample_type="complex")
+    stage = jobs._Progress.stage
+
+    def cancel_while_evaluating(self, name, **extra):
+        stage(self, name, **extra)
+        if name == "optimized_kpis":
+            # the cancel lands after the last check inside the search
+            (self.job_dir / "cancel").touch()
+
+    monkeypatch.setattr(jobs._Progress, "stage", cancel_while_evaluating)
+    out = jobs.run_optimize_job(str(tmp_path), feed.read_bytes(), None, None, _default_constraints(),
+                                _default_objective(), 100, 1, 3)
+    assert out == {"status": "cancelled"}
+
+
+def test_a_job_whose_cache_entry_was_evicted_parses_the_feed_it_was_sent(tmp_path):
+    feed = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(feed, sample_type="complex")
+    cache = FeedCache(tmp_path / "cache")
+    key = cache.key_for(feed)
+
+    def run():
+        return jobs.run_optimize_job(str(tmp_path), feed.read_bytes(), key, str(cache.root), _default_constraints(),
+                                     _default_objective(), 100, 1, 3)
+
+    first = run()
+    assert first["status"] == "succeeded" and cache.has(key)
+    cache.prune(0)
+    assert not cache.has(key)
+    rebuilt = run()
+    assert rebuilt["status"] == "succeeded" and not rebuilt["result"]["cache_hit"] and cache.has(key)
+    assert run()["result"]["cache_hit"]
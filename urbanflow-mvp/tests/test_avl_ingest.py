@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from urbanflow.data.avl_ingest import QuantileSketch, ingest_avl
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.graph.calibration import EdgeCalibration, calibrate_graph
+from urbanflow.graph.csr import CSRGraph
+from urbanflow.optimizer.solution import Solution
+
+from test_evaluator import _canonical
+
+
+def _avl(canonical):
+    # R1 trips observed slower than scheduled: A -> B takes 150, 160, ..., 260 s, B -> C 200 s
+    rows = []
+    for k in range(12):
+        t = 6 * 3600 + 600 * k
+        at_b = t + 10 + 150 + 10 * k
+        rows += [
+            (f"r1_{k}", t, 0.0, 0.0), (f"r1_{k}", t + 10, 0.0, 0.0001),
+            # between stops: no stop within the match radius
+            (f"r1_{k}", t + 60, 0.0, 0.005),
+            (f"r1_{k}", at_b, 0.0, 0.01), (f"r1_{k}", at_b + 200, 0.0, 0.02),
+        ]
+    avl = pd.DataFrame(rows, columns=["trip_id", "t", "lat", "lon"]).sort_values("t", kind="stable")
+    avl["timestamp_iso"] = pd.to_datetime(avl["t"], unit="s").dt.strftime("%Y-%m-%dT%H:%M:%S")
+    avl["vehicle_id"] = "veh_1"
+    return avl[["trip_id", "timestamp_iso", "lat", "lon", "vehicle_id"]]
+
+
+def test_quantile_sketch_is_within_alpha_and_mergeable():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(5, 1, 20_000)
+    keys = rng.integers(0, 3, len(values))
+    whole, a, b = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    whole.add(keys, values)
+    a.add(keys[:7000], values[:7000])
+    b.add(keys[7000:], values[7000:])
+    a.merge(b)
+    assert np.array_equal(a.codes, whole.codes) and np.array_equal(a.counts, whole.counts)
+    key, count, q = whole.quantiles([0.5, 0.9])
+    for k in key.tolist():
+        exact = np.quantile(values[keys == k], [0.5, 0.9], method="inverted_cdf")
+        assert np.all(np.abs(q[k] - exact) <= 0.01 * exact + 1e-9)
+    assert count.tolist() == np.bincount(keys).tolist()
+
+
+def test_ingest_calibrates_graph_travel_times(tmp_path):
+    canonical = _canonical()
+    path = tmp_path / "avl.csv"
+    _avl(canonical).to_csv(path, index=False)
+
+    obs = ingest_avl(path, canonical)
+    assert obs.pings == 60 and obs.matched == 48
+    edges = obs.by_edge.set_index(["u", "v"])
+    assert edges.loc[("A", "B"), "count"] == 12 and edges.loc[("B", "C"), "count"] == 12
+    assert edges.loc[("A", "B"), "p50"] == pytest.approx(200, rel=0.01)
+    assert edges.loc[("A", "B"), "p90"] == pytest.approx(250, rel=0.01)
+    assert edges.loc[("B", "C"), "p50"] == pytest.approx(200, rel=0.01)
+    # departures from A fall in the 06:00 and 07:00 bands, six trips each
+    ab = obs.by_band[(obs.by_band["u"] == "A") & (obs.by_band["v"] == "B")]
+    assert ab["band_start_s"].tolist() == [6 * 3600, 7 * 3600] and ab["count"].tolist() == [6, 6]
+    # trips split across chunks give the same observations
+    small = ingest_avl(path, canonical, chunk_rows=4)
+    assert small.by_band.equals(obs.by_band)
+
+    graph = build_graph_from_canonical(canonical)
+    for g in (graph, CSRGraph.from_networkx(graph)):
+        calibrated = calibrate_graph(g, obs.by_edge)
+        assert calibrated.get_edge_data("A", "B")["travel_time"] == round(edges.loc[("A", "B"), "p50"])
+        assert calibrated.get_edge_data("A", "B")["observed_count"] == 12
+        # unobserved edges keep the schedule; the input graph is untouched
+        assert calibrated.get_edge_data("C", "D")["travel_time"] == 180
+        assert calibrated.get_edge_data("C", "D")["observed_count"] == 0
+        assert g.get_edge_data("A", "B")["travel_time"] == 120
+    assert calibrate_graph(graph, obs.by_edge, min_obs=13).get_edge_data("A", "B")["travel_time"] == 120
+
+
+@pytest.mark.parametrize("backend", ["networkx", "csr"])
+def test_route_moves_keep_the_calibrated_travel_times(tmp_path, backend):
+    canonical = _canonical()
+    path = tmp_path / "avl.csv"
+    _avl(canonical).to_csv(path, index=False)
+    calibration = EdgeCalibration(ingest_avl(path, canonical).by_edge)
+    graph = build_graph_from_canonical(canonical, backend=backend, calibration=calibration)
+    observed = graph.get_edge_data("A", "B")["travel_time"]
+    assert observed != 120
+
+    # the rebuilt graph of a route-level move is calibrated like the base graph, also after a fork
+    solution = Solution(graph, canonical, calibration=calibration).fork()
+    solution.apply({"type": "change_headway", "route_id": "R1", "factor": 2.0})
+    assert solution.graph.get_edge_data("A", "B")["travel_time"] == observed
+    assert solution.graph.get_edge_data("C", "D")["travel_time"] == 180
+    uncalibrated = Solution(graph, canonical)
+    uncalibrated.apply({"type": "change_headway", "route_id": "R1", "factor": 2.0})
+    assert uncalibrated.graph.get_edge_data("A", "B")["travel_time"] == 120
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from urbanflow.graph.build_graph import aggregate_edges, build_graph_from_canonical
+
+
+def test_parallel_edges_are_aggregated():
+    stops = pd.DataFrame({"stop_id": ["A", "B"], "lat": [0.0, 0.0], "lon": [0.0, 0.01]})
+    trips = pd.DataFrame({"trip_id": ["t1", "t2", "t3"], "route_id": ["R2", "R1", "R1"]})
+    edges = pd.DataFrame({
+        "u": ["A", "A", "A"],
+        "v": ["B", "B", "B"],
+        "travel_time": [60, 90, 120],
+        "trip_id": ["t3", "t1", "t2"],
+    })
+    agg = aggregate_edges(edges, stops, trips)
+    assert len(agg) == 1
+    row = agg.iloc[0]
+    assert row["trip_count"] == 3
+    assert row["travel_time"] == 90
+    assert row["travel_time_min"] == 60
+    assert row["travel_time_mean"] == pytest.approx(90.0)
+    assert row["trip_ids"] == ("t1", "t2", "t3")
+    assert row["route_ids"] == ("R1", "R2")
+    assert row["distance_m"] == pytest.approx(1111.95, rel=1e-3)
+
+
+def test_build_groups_trips_by_stop_pair_in_sequence_order():
+    stops = pd.DataFrame({"stop_id": ["A", "B", "C"], "lat": [0.0, 0.0, 0.0], "lon": [0.0, 0.01, 0.02]})
+    # rows out of order; t2 has no route, and a stop_times row without a trip forms no edge
+    stop_times = pd.DataFrame({
+        "trip_id": ["t2", "t1", "t1", "t2", "t1", None],
+        "stop_id": ["B", "B", "A", "A", "C", "C"],
+        "stop_sequence": [2, 2, 1, 1, 3, 4],
+        "arrival_time_sec": [100, 60, 0, 0, 150, 300],
+        "departure_time_sec": [100, 60, 0, 0, 150, 300],
+    })
+    trips = pd.DataFrame({"trip_id": ["t1"], "route_id": ["R1"]})
+    graph = build_graph_from_canonical({"stops": stops, "stop_times": stop_times, "trips": trips})
+    assert list(graph.edges) == [("A", "B"), ("B", "C")]
+    ab = graph.edges["A", "B"]
+    assert ab["trip_ids"] == ("t1", "t2") and ab["route_ids"] == ("R1",)
+    assert (ab["travel_time_min"], ab["travel_time_median"], ab["travel_time"]) == (60, 80.0, 80)
+    assert graph.edges["B", "C"]["travel_time"] == 90
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.optimizer.coverage import CoverageIndex
+from urbanflow.optimizer.evaluator import Evaluator
+
+from test_evaluator import _canonical, _random_canonical
+
+
+def test_coverage_index_counts_points_near_open_stops():
+    # stops 0.01 deg (~1.1 km) apart; points 300 m east of A, 310 m west of B and on D
+    lon = np.array([0.0, 0.01, 0.02, 0.03])
+    points = pd.DataFrame({"lat": 0.0, "lon": [0.0027, 0.0072, 0.03], "population": [10.0, 5.0, 1.0]})
+    index = CoverageIndex(list("ABCD"), np.zeros(4), lon, points["lat"], points["lon"], points["population"], 400)
+    assert index.counts(np.ones(4, dtype=bool)).tolist() == [1, 1, 1]
+    assert index.ratio(np.array([True, False, False, True])) == pytest.approx(11 / 16)
+
+    state = index.state(np.ones(4, dtype=bool))
+    ratio, change = state.after(remove=["B", "X"])
+    assert ratio == pytest.approx(11 / 16) and state.ratio == 1.0
+    state.apply(change)
+    # closing an already closed stop changes nothing
+    assert state.after(remove=["B"])[0] == pytest.approx(11 / 16)
+    ratio, change = state.after(add=["B"], remove=["A", "D"])
+    state.apply(change)
+    assert ratio == pytest.approx(5 / 16) == index.ratio(state.active)
+
+    canonical = _canonical()
+    evaluator = Evaluator({"weights": {}}, sample_size=50, seed=1, coverage_points=points)
+    graph = build_graph_from_canonical(canonical, backend="csr")
+    graph.remove_node("B")
+    assert evaluator.compute_kpis(graph, canonical)["coverage_ratio"] == pytest.approx(11 / 16)
+
+
+def test_incremental_coverage_matches_full_recount():
+    from urbanflow.optimizer.incremental import IncrementalEvaluator
+
+    canonical = _random_canonical(n_stops=60)
+    evaluator = Evaluator({"weights": {}}, sample_size=100, seed=2)
+    graph = build_graph_from_canonical(canonical, backend="csr")
+    inc = IncrementalEvaluator(evaluator)
+    inc.reset(graph.copy(), canonical)
+    index = evaluator.coverage_index(canonical)
+    for stop in ["S1", "S2", "S5", "S8", "S13"]:
+        move = {"type": "remove_stop", "stop_id": stop}
+        kpis, _ = inc.evaluate_move(move)
+        inc.commit(move)
+        graph.remove_node(stop)
+        assert kpis["coverage_ratio"] == pytest.approx(index.ratio(index.active_stops(graph)))
+    assert inc.kpis["coverage_ratio"] < 1.0
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from urbanflow.cli import _create_sample_gtfs_zip
+from urbanflow.gtfs.parser import read_gtfs_zip
+from urbanflow.gtfs.canonicalizer import canonicalize_feed
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.graph.csr import CSRGraph
+from urbanflow.optimizer.evaluator import Evaluator
+from urbanflow.optimizer.greedy_seed import GreedySeed
+from urbanflow.optimizer.local_search import LocalSearch
+
+
+@pytest.fixture
+def canonical(tmp_path: Path):
+    gtfs = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(gtfs, sample_type="complex")
+    return canonicalize_feed(read_gtfs_zip(gtfs))
+
+
+def test_csr_graph_matches_networkx(canonical):
+    G = build_graph_from_canonical(canonical)
+    C = build_graph_from_canonical(canonical, backend="csr")
+    assert list(C.nodes) == list(G.nodes)
+    assert list(C.edges) == list(G.edges)
+    assert dict(C.degree()) == dict(G.degree())
+    u, v = next(iter(G.edges))
+    assert C.get_edge_data(u, v)["trip_ids"] == G[u][v]["trip_ids"]
+    assert C.get_edge_data(u, v)["distance_m"] == pytest.approx(G[u][v]["distance_m"], rel=1e-6)
+    assert list(CSRGraph.from_networkx(G).edges) == list(G.edges)
+    assert nx.utils.graphs_equal(C.to_networkx(), CSRGraph.from_networkx(C.to_networkx()).to_networkx())
+
+    node = list(G.nodes)[1]
+    G2, C2 = G.copy(), C.copy()
+    G2.remove_node(node)
+    C2.remove_node(node)
+    assert C.has_node(node) and not C2.has_node(node)
+    assert C2.number_of_edges() == G2.number_of_edges()
+    assert list(C2.edges) == list(G2.edges)
+    assert dict(C2.degree()) == dict(G2.degree())
+    for n in G2.nodes:
+        assert sorted(C2.predecessors(n)) == sorted(G2.predecessors(n))
+        assert sorted(C2.successors(n)) == sorted(G2.successors(n))
+
+
+def test_local_search_runs_natively_on_csr(canonical):
+    results = {}
+    for backend in ("networkx", "csr"):
+        graph = build_graph_from_canonical(canonical, backend=backend)
+        evaluator = Evaluator({"weights": {}}, sample_size=100, seed=1)
+        seed = GreedySeed.create(graph, canonical, {}, evaluator.objective)
+        best = LocalSearch.optimize(seed, evaluator, {}, max_iters=20)
+        results[backend] = (best["removed_stops"], evaluator.compute_kpis(best["graph"], best["canonical"]))
+    assert results["csr"][0] == results["networkx"][0]
+    assert results["csr"][1] == pytest.approx(results["networkx"][1])
+
+
+def test_graph_file_round_trip_and_mmap(canonical, tmp_path: Path):
+    from urbanflow.graph.graph_io import save_graph, load_graph
+
+    G = build_graph_from_canonical(canonical)
+    G.add_node("orphan", name="no coords")
+    path = tmp_path / "graph.ufg"
+    save_graph(G, path)
+    assert nx.utils.graphs_equal(load_graph(path), G)
+
+    C = load_graph(path, backend="csr")
+    assert isinstance(C.indices, np.memmap)
+    assert list(C.edges) == list(G.edges)
+    assert C.nodes["orphan"] == {"name": "no coords"}
+    u, v = next(iter(G.edges))
+    assert C.get_edge_data(u, v) == G[u][v]
+
+    # CSR graphs with removed nodes are written as the live graph
+    C.remove_node(u)
+    save_graph(C, tmp_path / "removed.ufg")
+    assert list(load_graph(tmp_path / "removed.ufg").edges) == list(C.edges)
+    # ... without narrowing the 64-bit columns read from the networkx file
+    live = load_graph(tmp_path / "removed.ufg", backend="csr")
+    assert live.edge_attrs["distance_m"].dtype == C.edge_attrs["distance_m"].dtype == np.float64
+    assert nx.utils.graphs_equal(live.to_networkx(), C.to_networkx())
+
+    # pickle is only read when asked for explicitly
+    save_graph(G, tmp_path / "graph.pkl", format="pickle")
+    with pytest.raises(ValueError):
+        load_graph(tmp_path / "graph.pkl")
+    assert nx.utils.graphs_equal(load_graph(tmp_path / "graph.pkl", format="pickle"), G)
+
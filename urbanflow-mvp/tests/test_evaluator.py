@@ -0,0 +1,136 @@
+import pandas as pd
+import pytest
+
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.optimizer.evaluator import Evaluator
+
+
+def _canonical():
+    # R1 runs A -> B -> C every 10 minutes, R2 runs C -> D every 30 minutes
+    stops = pd.DataFrame({
+        "stop_id": ["A", "B", "C", "D"],
+        "lat": [0.0, 0.0, 0.0, 0.0],
+        "lon": [0.0, 0.01, 0.02, 0.03],
+    })
+    trips, rows = [], []
+    for k in range(12):
+        t = 6 * 3600 + 600 * k
+        trips.append({"trip_id": f"r1_{k}", "route_id": "R1"})
+        rows += [(f"r1_{k}", "A", 1, t), (f"r1_{k}", "B", 2, t + 120), (f"r1_{k}", "C", 3, t + 240)]
+    for k in range(4):
+        t = 6 * 3600 + 300 + 1800 * k
+        trips.append({"trip_id": f"r2_{k}", "route_id": "R2"})
+        rows += [(f"r2_{k}", "C", 1, t), (f"r2_{k}", "D", 2, t + 180)]
+    st = pd.DataFrame(rows, columns=["trip_id", "stop_id", "stop_sequence", "arrival_time_sec"])
+    st["departure_time_sec"] = st["arrival_time_sec"]
+    return {
+        "stops": stops,
+        "routes": pd.DataFrame({"route_id": ["R1", "R2"]}),
+        "trips": pd.DataFrame(trips),
+        "stop_times": st,
+        "frequencies": pd.DataFrame(),
+    }
+
+
+def test_passenger_simulation_counts_transfers_and_timetable_waits():
+    canonical = _canonical()
+    demand = pd.DataFrame(0.0, index=list("ABCD"), columns=list("ABCD"))
+    demand.loc["A", "D"] = 1.0
+    evaluator = Evaluator({"weights": {}}, sample_size=200, seed=3, demand=demand)
+    graph = build_graph_from_canonical(canonical)
+
+    kpis = evaluator.compute_kpis(graph, canonical)
+    assert kpis["served_ratio"] == 1.0
+    assert kpis["mean_transfers"] == 1.0
+    assert kpis["mean_in_vehicle_time"] == pytest.approx(240 + 180)
+    # boarding wait on R1 is under one headway; the R2 connection adds up to 30 minutes
+    assert 0 < kpis["mean_wait_time"] <= 600 + 1800
+    assert kpis["passenger_weighted_travel_time"] == pytest.approx(
+        kpis["mean_wait_time"] + kpis["mean_in_vehicle_time"]
+    )
+    assert kpis["p50_travel_time"] <= kpis["p90_travel_time"]
+    assert kpis == evaluator.compute_kpis(build_graph_from_canonical(canonical, backend="csr"), canonical)
+
+    # closing D makes A -> D riders stay on R1 to C and walk the rest
+    for backend in ("networkx", "csr"):
+        g = build_graph_from_canonical(canonical, backend=backend)
+        g.remove_node("D")
+        closed = evaluator.compute_kpis(g, canonical)
+        assert closed["mean_transfers"] == 0.0
+        assert closed["mean_walk_time"] == pytest.approx(1111.95 / 1.3, rel=1e-3)
+        # D's trip ends have no open stop within 400 m; A's still do
+        assert closed["coverage_ratio"] == 0.5
+
+
+def test_transfer_penalty_prefers_a_slower_direct_route():
+    # R3 runs A -> D in 600 s: slower than R1 + R2 (420 s in vehicle) but quicker than it plus a transfer
+    canonical = _canonical()
+    trips = [{"trip_id": f"r3_{k}", "route_id": "R3"} for k in range(4)]
+    rows = [(f"r3_{k}", s, q, 6 * 3600 + 1800 * k + dt) for k in range(4) for s, q, dt in (("A", 1, 0), ("D", 2, 600))]
+    extra = pd.DataFrame(rows, columns=["trip_id", "stop_id", "stop_sequence", "arrival_time_sec"])
+    extra["departure_time_sec"] = extra["arrival_time_sec"]
+    canonical["trips"] = pd.concat([canonical["trips"], pd.DataFrame(trips)], ignore_index=True)
+    canonical["stop_times"] = pd.concat([canonical["stop_times"], extra], ignore_index=True)
+    demand = pd.DataFrame(0.0, index=list("ABCD"), columns=list("ABCD"))
+    demand.loc["A", "D"] = 1.0
+    for backend in ("networkx", "csr"):
+        graph = build_graph_from_canonical(canonical, backend=backend)
+        direct = Evaluator({"weights": {}}, sample_size=50, seed=3, demand=demand).compute_kpis(graph, canonical)
+        assert direct["mean_transfers"] == 0.0 and direct["mean_in_vehicle_time"] == pytest.approx(600)
+        fastest = Evaluator({"weights": {}, "transfer_penalty_s": 0}, sample_size=50, seed=3, demand=demand)
+        kpis = fastest.compute_kpis(graph, canonical)
+        assert kpis["mean_transfers"] == 1.0 and kpis["mean_in_vehicle_time"] == pytest.approx(420)
+
+
+def _random_canonical(n_stops=40, n_routes=8, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    stops = pd.DataFrame({
+        "stop_id": [f"S{i}" for i in range(n_stops)],
+        "lat": rng.uniform(0, 0.05, n_stops),
+        "lon": rng.uniform(0, 0.05, n_stops),
+    })
+    trips, rows = [], []
+    for r in range(n_routes):
+        pattern = rng.choice(n_stops, size=8, replace=False)
+        for k in range(6):
+            trip = f"R{r}_{k}"
+            trips.append({"trip_id": trip, "route_id": f"R{r}"})
+            t = 6 * 3600 + int(rng.integers(0, 4 * 3600))
+            for seq, s in enumerate(pattern):
+                rows.append((trip, f"S{s}", seq + 1, t + 150 * seq))
+    st = pd.DataFrame(rows, columns=["trip_id", "stop_id", "stop_sequence", "arrival_time_sec"])
+    st["departure_time_sec"] = st["arrival_time_sec"]
+    return {"stops": stops, "routes": pd.DataFrame({"route_id": [f"R{r}" for r in range(n_routes)]}),
+            "trips": pd.DataFrame(trips), "stop_times": st, "frequencies": pd.DataFrame()}
+
+
+@pytest.mark.parametrize("backend,zone_cell_m", [("networkx", None), ("csr", None), ("csr", 1500)])
+def test_incremental_moves_match_full_evaluation(backend, zone_cell_m):
+    from urbanflow.optimizer.incremental import IncrementalEvaluator
+
+    canonical = _random_canonical()
+    evaluator = Evaluator({"weights": {}}, sample_size=300, seed=5, zone_cell_m=zone_cell_m)
+    graph = build_graph_from_canonical(canonical, backend=backend)
+    inc = IncrementalEvaluator(evaluator)
+    assert inc.reset(graph, canonical) == pytest.approx(evaluator.compute_kpis(graph, canonical))
+    # candidates close stops in the one routing matrix and reopen them; it is never rebuilt
+    matrix = inc._net.matrix
+
+    current = graph.copy()
+    for i, stop in enumerate(["S3", "S17", "S3", "S25", "S8"]):
+        move = {"type": "remove_stop", "stop_id": stop}
+        kpis, delta = inc.evaluate_move(move)
+        expected_graph = current.copy()
+        if expected_graph.has_node(stop):
+            expected_graph.remove_node(stop)
+        full = evaluator.compute_kpis(expected_graph, canonical)
+        assert kpis == pytest.approx(full)
+        assert (kpis["p50_travel_time"], kpis["p90_travel_time"]) == (full["p50_travel_time"], full["p90_travel_time"])
+        assert delta == pytest.approx({k: kpis[k] - inc.kpis[k] for k in kpis})
+        if i % 2 == 0:
+            inc.commit(move)
+            current = expected_graph
+    assert 0 < inc.passengers_rerouted < 5 * 300
+    assert inc._net.matrix is matrix
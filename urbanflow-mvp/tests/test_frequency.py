@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from urbanflow.optimizer.frequency import FrequencyOptimizer, route_cycle_times, time_bands
+from urbanflow.optimizer.solution import Solution
+from urbanflow.graph.build_graph import build_graph_from_canonical
+
+
+def _canonical():
+    stop_times = []
+    for trip, route_stops, start in [("A1", ["S1", "S2"], 0), ("A2", ["S2", "S1"], 3600), ("B1", ["S3", "S4"], 0)]:
+        for seq, stop in enumerate(route_stops):
+            t = start + 600 * seq
+            stop_times.append({"trip_id": trip, "arrival_time_sec": t, "departure_time_sec": t, "stop_sequence": seq + 1, "stop_id": stop, "timepoint": 1})
+    return {
+        "stops": pd.DataFrame({"stop_id": ["S1", "S2", "S3", "S4"], "name": "x", "lat": 0.0, "lon": [0.0, 0.01, 0.02, 0.03], "zone_id": None}),
+        "routes": pd.DataFrame({"route_id": ["A", "B"], "short_name": ["A", "B"], "long_name": "", "route_type": 3}),
+        "trips": pd.DataFrame({"trip_id": ["A1", "A2", "B1"], "route_id": ["A", "A", "B"], "service_id": "WEEK", "trip_headsign": None, "shape_id": None}),
+        "stop_times": pd.DataFrame(stop_times),
+        "frequencies": pd.DataFrame(),
+    }
+
+
+def test_frequency_allocation_respects_fleet_and_retimetables():
+    canonical = _canonical()
+    cycles = route_cycle_times(canonical, layover_ratio=0.0)
+    # A runs both ways (600 + 600 s), B one way (twice its 600 s)
+    assert list(cycles.route_ids) == ["A", "B"] and cycles.cycle_s.tolist() == [1200.0, 1200.0]
+    bands = time_bands(canonical, [["00:00:00", "01:00:00"], ["01:00:00", "02:00:00"]])
+    demand = np.array([[100.0, 10.0], [10.0, 0.0]])
+
+    plan = FrequencyOptimizer.optimize(canonical, {"fleet_size": 6}, demand=demand, bands=bands, cycles=cycles)
+    assert (plan.fleet <= 6).all()
+    # the busy route gets the shorter headway; B does not run without demand
+    assert plan.headway_s[0, 0] < plan.headway_s[1, 0] and plan.headway_s[1, 1] == 0
+    assert plan.vehicles.tolist() == np.ceil(1200.0 / np.where(plan.headway_s > 0, plan.headway_s, np.inf)).tolist()
+    unlimited = FrequencyOptimizer.optimize(canonical, {}, demand=demand, bands=bands, cycles=cycles)
+    assert unlimited.expected_wait_s < plan.expected_wait_s and unlimited.headway_s.max() == 120
+    # a budget below minimum service drops the quietest service instead of overrunning
+    tight = FrequencyOptimizer.optimize(canonical, {"fleet_size": 1}, demand=demand, bands=bands, cycles=cycles)
+    assert (tight.fleet <= 1).all() and tight.headway_s[0, 0] > 0 and tight.unserved == 10.0
+
+    sol = Solution(build_graph_from_canonical(canonical), canonical)
+    sol.apply(plan.move())
+    trips = sol.canonical["trips"]
+    st = sol.canonical["stop_times"]
+    a_out = st[st["trip_id"].str.startswith("A1@")].groupby("trip_id")["departure_time_sec"].min().sort_values()
+    assert a_out.diff().dropna().unique().tolist()[0] == plan.headway_s[0, 0]
+    assert set(trips["route_id"]) == {"A", "B"} and "A1" not in set(trips["trip_id"])
+    sol.revert()
+    assert sol.canonical is canonical
@@ -0,0 +1,100 @@
+from pathlib import Path
+
+import pytest
+
+from urbanflow.cli import _create_sample_gtfs_zip
+from urbanflow.gtfs.parser import read_gtfs_zip
+from urbanflow.gtfs.canonicalizer import canonicalize_feed
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.optimizer.evaluator import Evaluator
+from urbanflow.optimizer.incremental import IncrementalEvaluator
+from urbanflow.optimizer.local_search import LocalSearch
+from urbanflow.optimizer.metaheuristic import DegreeHeap, MetaheuristicSearch
+from urbanflow.optimizer.moves import TRANSFORMS
+from urbanflow.optimizer.solution import Solution
+
+
+@pytest.fixture
+def canonical(tmp_path: Path):
+    gtfs = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(gtfs, sample_type="complex")
+    return canonicalize_feed(read_gtfs_zip(gtfs))
+
+
+def _stops(canonical, trip_id):
+    st = canonical["stop_times"]
+    return st[st["trip_id"] == trip_id].sort_values("stop_sequence")["stop_id"].tolist()
+
+
+def test_route_transforms(canonical):
+    split = TRANSFORMS["split_route"](canonical, {"type": "split_route", "route_id": "R1", "stop_id": "S3"})
+    assert _stops(split, "T1") == ["S1", "S2", "S3"] and _stops(split, "T1~S3") == ["S3", "S4", "S5"]
+    assert "R1~S3" in set(split["routes"]["route_id"]) and canonical["stop_times"] is not split["stop_times"]
+    assert split["stops"] is canonical["stops"]
+
+    swap = TRANSFORMS["interline_swap"](canonical, {"type": "interline_swap", "route_id": "R1", "other": "R2", "stop_id": "S3"})
+    assert _stops(swap, "T1") == ["S1", "S2", "S3", "S2", "S1"]
+    st = swap["stop_times"]
+    t1 = st[st["trip_id"] == "T1"].sort_values("stop_sequence")["arrival_time_sec"].tolist()
+    assert t1 == sorted(t1) and t1[3] - t1[2] == 5760 - 4920
+
+    more = TRANSFORMS["change_headway"](split, {"type": "change_headway", "route_id": "R1", "factor": 0.5})
+    assert len(more["trips"]) == len(split["trips"])  # a single trip has no gap to fill
+    merged = TRANSFORMS["merge_routes"](canonical, {"type": "merge_routes", "route_id": "R1", "other": "R2"})
+    assert set(merged["trips"]["route_id"]) == {"R1", "R3"}
+
+
+def test_route_moves_revert_and_degree_heap(canonical):
+    graph = build_graph_from_canonical(canonical, backend="csr")
+    sol = Solution(graph, canonical)
+    heap = DegreeHeap(sol.graph)
+    assert heap.lowest(1, lambda n, d: True) == ["SX"]
+    sol.apply({"type": "consolidate_stop", "stop_id": "S3"})
+    assert not sol.graph.has_node("S3") and sol.graph.has_edge("S2", "S4")
+    assert sol["removed_stops"] == ["S3"] and graph.has_node("S3")
+    heap.update(sol.graph, ["S2", "S3", "S4"])
+    assert "S3" not in heap.lowest(10, lambda n, d: True)
+    sol.revert()
+    assert sol.canonical is canonical and sol.graph.has_node("S3") and not sol.graph.has_edge("S2", "S4")
+
+
+@pytest.mark.parametrize("backend", ["networkx", "csr"])
+def test_route_moves_patch_graph_and_score_incrementally(canonical, backend):
+    evaluator = Evaluator({"weights": {}}, sample_size=300, seed=3)
+    sol = Solution(build_graph_from_canonical(canonical, backend=backend), canonical)
+    inc = IncrementalEvaluator(evaluator)
+    inc.reset(sol.graph, sol.canonical)
+    for move in [
+        {"type": "split_route", "route_id": "R1", "stop_id": "S3"},
+        {"type": "change_headway", "route_id": "R2", "factor": 0.5},
+        {"type": "interline_swap", "route_id": "R1", "other": "R2", "stop_id": "S3"},
+        {"type": "extend_route", "route_id": "R3", "stop_id": "SX", "travel_time_s": 300},
+        {"type": "consolidate_stop", "stop_id": "S2"},
+    ]:
+        sol.apply(move)
+        assert sol.last_change is not None
+        rebuilt = build_graph_from_canonical(sol.canonical, backend=backend)
+        rebuilt.remove_nodes_from(sol.removed_stops)
+        assert sorted(sol.graph.edges()) == sorted(rebuilt.edges())
+        for u, v in rebuilt.edges():
+            assert sol.graph.edges[u, v]["travel_time"] == rebuilt.edges[u, v]["travel_time"]
+        kpis, _ = inc.evaluate_move(move, sol.graph, sol.canonical, sol.last_change)
+        assert kpis == pytest.approx(evaluator.compute_kpis(sol.graph, sol.canonical))
+        inc.commit(move)
+    sol.revert()
+    assert sol.graph.has_node("S2")
+
+
+@pytest.mark.parametrize("acceptance", ["annealing", "tabu"])
+def test_metaheuristic_improves_on_start(canonical, acceptance):
+    graph = build_graph_from_canonical(canonical)
+    evaluator = Evaluator({"weights": {}}, sample_size=100, seed=1)
+    start = LocalSearch._score(evaluator.compute_kpis(graph, canonical), evaluator.objective)
+    trace, stats = [], {}
+    best = MetaheuristicSearch.optimize(
+        Solution(graph, canonical), evaluator, {}, max_iters=25, acceptance=acceptance, trace=trace, stats=stats
+    )
+    assert trace[0] == pytest.approx(start) and trace == sorted(trace, reverse=True)
+    assert LocalSearch._score(evaluator.compute_kpis(best["graph"], best["canonical"]), evaluator.objective) == pytest.approx(trace[-1])
+    assert sum(sum(c.values()) for c in stats["outcomes"].values()) > 0
+    assert graph.number_of_nodes() == len(canonical["stops"])
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+
+from urbanflow.cli import _create_sample_gtfs_zip
+from urbanflow.gtfs.parser import read_gtfs_zip
+from urbanflow.gtfs.canonicalizer import canonicalize_feed
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.optimizer.evaluator import Evaluator
+from urbanflow.optimizer.greedy_seed import GreedySeed
+from urbanflow.optimizer.multistart import MultiStartSearch
+
+
+@pytest.fixture
+def canonical(tmp_path: Path):
+    gtfs = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(gtfs, sample_type="complex")
+    return canonicalize_feed(read_gtfs_zip(gtfs))
+
+
+def test_multistart_pool_matches_in_process(canonical):
+    graph = build_graph_from_canonical(canonical, backend="csr")
+    evaluator = Evaluator({"weights": {}}, sample_size=100, seed=1)
+    seed = GreedySeed.create(graph, canonical, {}, evaluator.objective)
+    best, traces = MultiStartSearch.optimize(seed, evaluator, {}, max_iters=20, workers=2, starts=3)
+    assert [t["seed"] for t in traces] == [42, 43, 44]
+    assert all(t["trace"] == sorted(t["trace"], reverse=True) for t in traces)
+    assert graph.number_of_nodes() == len(graph.node_ids)
+
+    serial, serial_traces = MultiStartSearch.optimize(seed, evaluator, {}, max_iters=20, workers=1, starts=3)
+    assert [t["score"] for t in traces] == pytest.approx([t["score"] for t in serial_traces])
+    assert best["removed_stops"] == serial["removed_stops"]
+
+    _, seeded = MultiStartSearch.optimize(seed, evaluator, {}, max_iters=2, workers=1, starts=2, seed=7)
+    assert [t["seed"] for t in seeded] == [7, 8]
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from urbanflow.data.od_generator import (
+    aggregate_to_zones,
+    demand_long,
+    generate_gravity_demand,
+    generate_synthetic_demand,
+    to_sparse,
+)
+from urbanflow.optimizer.simulation import sample_od
+
+
+def _canonical(n=200):
+    rng = np.random.default_rng(0)
+    stops = pd.DataFrame({
+        "stop_id": [f"S{i}" for i in range(n)],
+        "lat": rng.uniform(0.0, 0.1, n),
+        "lon": rng.uniform(0.0, 0.1, n),
+        "zone_id": [f"Z{i % 4}" for i in range(n)],
+    })
+    return {"stops": stops}
+
+
+def test_sparse_demand_generators_and_zone_aggregation():
+    canonical = _canonical()
+    n = len(canonical["stops"])
+    od = generate_synthetic_demand(canonical, seed=1, density=0.1)
+    assert list(od.columns) == ["origin", "destination", "trips"]
+    assert (od["origin"] != od["destination"]).all() and not od.duplicated(["origin", "destination"]).any()
+    assert abs(len(od) / (n * (n - 1)) - 0.1) < 0.01
+    assert np.isclose(od["trips"].sum(), n * 10.0)
+
+    gravity = generate_gravity_demand(canonical, total=1000.0, destinations=10)
+    assert len(gravity) == n * 10 and np.isclose(gravity["trips"].sum(), 1000.0)
+    first = gravity[gravity["origin"] == "S0"]
+    stops = canonical["stops"].set_index("stop_id")
+    dist = np.hypot(*(stops.loc[first["destination"], ["lat", "lon"]].to_numpy() - stops.loc["S0", ["lat", "lon"]].to_numpy()).T)
+    # closer destinations of an origin get more trips
+    assert np.corrcoef(dist, first["trips"])[0, 1] < 0
+    ids = pd.Index(canonical["stops"]["stop_id"])
+    matrix = to_sparse(gravity, ids)
+    assert matrix.shape == (n, n) and matrix.nnz == n * 10 and matrix.diagonal().sum() == 0
+
+    zones = aggregate_to_zones(od, canonical["stops"].set_index("stop_id")["zone_id"])
+    assert len(zones) == 16 and np.isclose(zones["trips"].sum(), od["trips"].sum())
+
+    # a dense matrix and its long form draw the same passengers
+    dense = pd.DataFrame(matrix.toarray(), index=ids, columns=ids)
+    assert demand_long(dense).shape[0] == matrix.nnz
+    draws = [sample_od(list(ids), 500, np.random.default_rng(7), (0, 3600), demand=d) for d in (dense, gravity)]
+    assert (draws[0].origin == draws[1].origin).all() and (draws[0].destination == draws[1].destination).all()
@@ -35,3 +35,32 @@ def test_optimizer_smoke():
     assert "graph" in best and "canonical" in best
 
 
+def test_solution_moves_share_base_and_revert():
+    import pytest
+    from urbanflow.graph.csr import CSRGraph
+    from urbanflow.optimizer.solution import Solution
+
+    G = nx.DiGraph()
+    for i, s in enumerate(["S1", "S2", "S3"]):
+        G.add_node(s, lat=0.0, lon=0.1 * i)
+    G.add_edge("S1", "S2", travel_time=600, distance_m=1000)
+    G.add_edge("S2", "S3", travel_time=300, distance_m=500)
+    G.add_edge("S3", "S2", travel_time=300, distance_m=500)
+    for base in (G, CSRGraph.from_networkx(G)):
+        sol = Solution(base, canonical={})
+        assert sol["graph"] is base
+        sol.apply({"type": "remove_stop", "stop_id": "S2"})
+        assert sol["removed_stops"] == ["S2"]
+        assert sorted(sol.graph.nodes) == ["S1", "S3"] and sol.graph.number_of_edges() == 0
+        assert base.has_node("S2") and base.number_of_edges() == 3
+
+        fork = sol.fork()
+        assert sol.revert()["stop_id"] == "S2"
+        assert sol.graph.number_of_edges() == 3 and sol.graph.degree("S2") == 3
+        assert sol.graph.get_edge_data("S1", "S2")["travel_time"] == 600
+        assert fork["removed_stops"] == ["S2"] and not fork.graph.has_node("S2")
+
+        exported = fork.materialize()
+        assert exported["graph"] is not fork.graph and exported["removed_stops"] == ["S2"]
+        with pytest.raises(ValueError):
+            sol.apply({"type": "teleport"})
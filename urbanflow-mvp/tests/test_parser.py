@@ -11,3 +11,61 @@ def test_parser_missing_file(tmp_path: Path):
         read_gtfs_zip(z)
 
 
+
+
+def _write_zip(path: Path, files: dict) -> Path:
+    import zipfile
+
+    with zipfile.ZipFile(path, "w") as z:
+        for name, text in files.items():
+            z.writestr(name, text)
+    return path
+
+
+FEED_FILES = {
+    "stops.txt": "﻿stop_id,stop_name,stop_lat,stop_lon,wheelchair_boarding\n00123,A,0.0,0.0,1\nNA,B,0.0,0.1,0\n",
+    "routes.txt": "route_id,route_short_name,route_long_name,route_type,route_color\n001,1,Route 1,3,FF0000\n",
+    "trips.txt": "route_id,service_id,trip_id\n001,WEEK,0042\n",
+    "stop_times.txt": "trip_id,arrival_time,departure_time,stop_id,stop_sequence,pickup_type\n"
+    "0042,08:00:00,08:00:00,00123,1,0\n0042,25:10:00,25:10:00,NA,2,0\n",
+}
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_parser_typed_schema(tmp_path: Path, engine: str):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    feed = read_gtfs_zip(_write_zip(tmp_path / "feed.zip", FEED_FILES), engine=engine)
+    stops = feed["stops.txt"]
+    st = feed["stop_times.txt"]
+    # leading zeros and "NA" survive as string IDs; unused columns are pruned
+    assert list(stops["stop_id"]) == ["00123", "NA"]
+    assert "wheelchair_boarding" not in stops.columns
+    assert "route_color" not in feed["routes.txt"].columns
+    assert list(st.columns) == ["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"]
+    assert st["stop_sequence"].dtype == "Int32"
+    assert stops["stop_lat"].dtype == "float64"
+    assert list(st["arrival_time"]) == ["08:00:00", "25:10:00"]
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_blank_stop_sequence_is_reported_and_dropped(tmp_path: Path, engine: str):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    from urbanflow.gtfs.canonicalizer import canonicalize_feed
+    from urbanflow.gtfs.streaming import stream_feed
+    from urbanflow.gtfs.validator import validate_feed
+
+    files = dict(FEED_FILES)
+    files["stop_times.txt"] += "0042,25:20:00,25:20:00,00123,,0\n"
+    path = _write_zip(tmp_path / "feed.zip", files)
+    feed = read_gtfs_zip(path, engine=engine)
+    assert feed["stop_times.txt"]["stop_sequence"].isna().sum() == 1
+    report = validate_feed(feed)
+    assert report["status"] == "ok"
+    assert "stop_times.stop_sequence is blank in 1 rows; they are dropped" in report["warnings"]
+    st = canonicalize_feed(feed)["stop_times"]
+    assert st["stop_sequence"].tolist() == [1, 2] and st["stop_sequence"].dtype == "int32"
+    streamed = stream_feed(path)
+    assert streamed["report"] == report
+    assert streamed["canonical"]["stop_times"].equals(st)
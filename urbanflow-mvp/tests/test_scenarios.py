@@ -0,0 +1,65 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from urbanflow import api
+from urbanflow.cache import FeedCache
+from urbanflow.cli import _default_objective
+from urbanflow.optimizer.evaluator import Evaluator
+from urbanflow.scenarios import ScenarioStore
+
+from test_api import _files
+
+
+def test_scenario_edits_match_full_evaluation_and_store_evicts(tmp_path):
+    feed = _files(tmp_path)["gtfs_zip"][1]
+    now = [0.0]
+    store = ScenarioStore(ttl_s=10, max_scenarios=2, cache=FeedCache(tmp_path / "cache"), clock=lambda: now[0])
+    scenario = store.create(feed, _default_objective(), sample_size=300, seed=1)
+    base_graph = scenario.solution.graph
+
+    out = scenario.apply([{"type": "remove_stop", "stop_id": "S2"}])
+    graph = base_graph.copy()
+    graph.remove_node("S2")
+    full = Evaluator(_default_objective(), sample_size=300, seed=1).compute_kpis(graph, scenario.solution.canonical)
+    assert out["kpis"] == pytest.approx(full)
+    assert out["removed_stops"] == ["S2"] and out["passengers_rerouted"] > 0
+    assert out["delta"]["served_ratio"] == pytest.approx(full["served_ratio"] - scenario.baseline["served_ratio"])
+    # the base network is never modified
+    assert base_graph.has_node("S2")
+
+    # a failing batch leaves the scenario as it was
+    before = dict(scenario.kpis)
+    with pytest.raises(ValueError):
+        scenario.apply([{"type": "change_headway", "route_id": "R1", "factor": 0.5}, {"type": "remove_stop", "stop_id": "S2"}])
+    assert scenario.kpis == before and len(scenario.solution.moves) == 1
+
+    headway = scenario.apply([{"type": "change_headway", "route_id": "R1", "factor": 0.5}])
+    assert headway["changed_routes"] == ["R1"]
+    assert scenario.undo(2)["kpis"] == pytest.approx(scenario.baseline)
+
+    # least recently used goes first once more than two are held, idle ones after the TTL
+    others = [store.create(feed, _default_objective(), sample_size=50, seed=1) for _ in range(2)]
+    assert store.get(scenario.scenario_id) is None and len(store) == 2
+    now[0] = 5.0
+    assert store.get(others[1].scenario_id) is others[1]
+    now[0] = 12.0
+    assert store.get(others[0].scenario_id) is None and store.get(others[1].scenario_id) is others[1]
+
+
+def test_scenario_endpoints(tmp_path):
+    files = _files(tmp_path)
+    api.set_scenarios(ScenarioStore(cache=FeedCache(tmp_path / "cache")))
+    try:
+        with TestClient(api.app) as client:
+            created = client.post("/api/v1/scenarios", files={k: files[k] for k in ("gtfs_zip", "objective_json")}, data={"sample_size": "200"})
+            assert created.status_code == 201
+            sid = created.json()["scenario_id"]
+            edited = client.post(f"/api/v1/scenarios/{sid}/edits", json={"edits": [{"type": "remove_stop", "stop_id": "SX"}]})
+            assert edited.status_code == 200 and edited.json()["removed_stops"] == ["SX"]
+            assert client.get(f"/api/v1/scenarios/{sid}").json()["kpis"] == edited.json()["kpis"]
+            assert client.post(f"/api/v1/scenarios/{sid}/edits", json={"edits": [{"type": "teleport"}]}).status_code == 400
+            assert client.post(f"/api/v1/scenarios/{sid}/undo").json()["removed_stops"] == []
+            assert client.delete(f"/api/v1/scenarios/{sid}").status_code == 200
+            assert client.get(f"/api/v1/scenarios/{sid}").status_code == 404
+    finally:
+        api.set_scenarios(None)
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pandas as pd
+
+from urbanflow.cli import _create_sample_gtfs_zip
+from urbanflow.optimizer.evaluator import Evaluator
+from urbanflow.session import FeedSession
+
+
+def test_feed_session_runs_each_stage_once(tmp_path: Path, monkeypatch):
+    import urbanflow.session as session_mod
+
+    gtfs = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(gtfs, sample_type="complex")
+    calls = {"read": 0}
+    real_read = session_mod.read_gtfs_zip
+
+    def counting_read(*args, **kwargs):
+        calls["read"] += 1
+        return real_read(*args, **kwargs)
+
+    monkeypatch.setattr(session_mod, "read_gtfs_zip", counting_read)
+    session = FeedSession(gtfs)
+    assert session.report["status"] == "ok"
+    assert session.canonical is session.canonical
+    assert session.graph.number_of_nodes() == 6
+    evaluator = Evaluator(objective={"weights": {}}, sample_size=100, seed=1)
+    assert session.baseline_kpis(evaluator) is session.baseline_kpis(evaluator)
+    # evaluators that differ only in their coverage points get their own baseline
+    points = pd.DataFrame({"lat": [1.0], "lon": [1.0], "population": [1.0]})
+    far = Evaluator(objective={"weights": {}}, sample_size=100, seed=1, coverage_points=points)
+    assert session.baseline_kpis(far)["coverage_ratio"] == 0.0 < session.baseline_kpis(evaluator)["coverage_ratio"]
+    assert session.baseline_kpis(far) is session.baseline_kpis(Evaluator(objective={"weights": {}}, sample_size=100, seed=1, coverage_points=points.copy()))
+    assert calls["read"] == 1
+    assert {"parse", "validate", "canonicalize", "build_graph", "baseline_kpis"} <= set(session.timing_report())
+
+
+def test_feed_cache_round_trip_and_prune(tmp_path: Path):
+    import networkx as nx
+    import pytest
+
+    pytest.importorskip("pyarrow")
+    from urbanflow.cache import FeedCache
+
+    gtfs = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(gtfs, sample_type="complex")
+    cache = FeedCache(tmp_path / "cache")
+
+    first = FeedSession(gtfs, cache=cache)
+    graph = first.graph
+    assert not first.cache_hit
+    assert len(cache.entries()) == 1
+
+    second = FeedSession(gtfs, cache=cache)
+    assert nx.utils.graphs_equal(second.graph, graph)
+    assert second.cache_hit
+    assert "parse" not in second.timings
+    assert second.report == first.report
+    assert list(second.canonical["stop_times"]["trip_id"]) == list(first.canonical["stop_times"]["trip_id"])
+
+    assert len(cache.prune(max_bytes=0)) == 1
+    assert cache.entries() == []
+
+    # a streamed build is stored too, even when the report is read before the graph
+    streamed = FeedSession(gtfs, cache=cache, stream=True)
+    assert streamed.report == first.report and not streamed.cache_hit
+    assert len(cache.entries()) == 1
+    reloaded = FeedSession(gtfs, cache=cache)
+    assert reloaded.report == first.report and reloaded.cache_hit
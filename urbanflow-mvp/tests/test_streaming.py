@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import networkx as nx
+import pytest
+
+from urbanflow.cli import _create_sample_gtfs_zip
+from urbanflow.gtfs.parser import read_gtfs_zip, iter_stop_times_chunks
+from urbanflow.gtfs.validator import validate_feed
+from urbanflow.gtfs.canonicalizer import canonicalize_feed
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.gtfs.streaming import stream_feed
+
+
+def test_stop_times_chunks_are_trip_aligned(tmp_path: Path):
+    gtfs = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(gtfs, sample_type="complex")
+    chunks = list(iter_stop_times_chunks(gtfs, chunk_size=3))
+    seen = [set(c["trip_id"]) for c in chunks]
+    assert sum(len(c) for c in chunks) == 12
+    for i, trips in enumerate(seen):
+        for other in seen[i + 1:]:
+            assert not trips & other
+
+
+def test_stream_feed_matches_in_memory(tmp_path: Path):
+    gtfs = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(gtfs, sample_type="complex")
+    feed = read_gtfs_zip(gtfs)
+    canonical = canonicalize_feed(feed)
+
+    streamed = stream_feed(gtfs, chunk_size=2)
+    assert streamed["stats"]["chunks"] == 3
+    assert streamed["report"] == validate_feed(feed)
+    assert streamed["canonical"]["stop_times"].equals(canonical["stop_times"])
+    assert nx.utils.graphs_equal(streamed["graph"], build_graph_from_canonical(canonical))
+
+
+def test_stream_rejects_ungrouped_stop_times(tmp_path: Path):
+    import zipfile
+
+    with zipfile.ZipFile(tmp_path / "bad.zip", "w") as z:
+        z.writestr(
+            "stop_times.txt",
+            "trip_id,arrival_time,departure_time,stop_sequence,stop_id\n"
+            "T1,00:00:00,00:00:00,1,S1\nT2,00:05:00,00:05:00,1,S1\nT1,00:10:00,00:10:00,2,S2\n",
+        )
+    with pytest.raises(ValueError):
+        list(iter_stop_times_chunks(tmp_path / "bad.zip", chunk_size=1))
@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+import pytest
+
+from urbanflow.cli import _create_sample_gtfs_zip, _default_constraints, _default_objective, build_parser
+from urbanflow.optimizer.evaluator import Evaluator
+from urbanflow.optimizer.sweep import Sweep, apply_overrides, expand_variants, pareto_front
+from urbanflow.session import FeedSession
+
+
+SPEC = {
+    "grid": {"constraints.fleet_size": [5, 40], "objective.weights.coverage_ratio": [0.1, 0.5]},
+    "variants": [{"name": "lean", "constraints.max_interline": 0}],
+}
+
+
+def test_variants_overrides_and_pareto_front():
+    variants = expand_variants(SPEC)
+    assert [v["name"] for v in variants][-1] == "lean" and len(variants) == 5
+    assert variants[0]["overrides"] == {"constraints.fleet_size": 5, "objective.weights.coverage_ratio": 0.1}
+    with pytest.raises(ValueError):
+        expand_variants({"variants": [{"fleet_size": 5}]})
+
+    base = _default_objective()
+    constraints, objective = apply_overrides(_default_constraints(), base, variants[1]["overrides"])
+    assert constraints["fleet_size"] == 5 and objective["weights"]["coverage_ratio"] == 0.5
+    assert base == _default_objective()
+
+    table = pd.DataFrame({"p90_travel_time": [10, 12, 9, 12], "coverage_ratio": [0.5, 0.6, 0.4, 0.5]})
+    assert pareto_front(table, {"p90_travel_time": "min", "coverage_ratio": "max"}).tolist() == [True, True, True, False]
+
+
+def test_sweep_in_process_matches_worker_pool(tmp_path):
+    feed = tmp_path / "feed.zip"
+    _create_sample_gtfs_zip(feed, sample_type="complex")
+    session = FeedSession(feed)
+    variants = expand_variants(SPEC)
+    runs = [
+        Sweep.run(
+            session.graph, session.canonical, _default_constraints(), _default_objective(), variants,
+            Evaluator(_default_objective(), sample_size=200, seed=1), max_iters=10, workers=workers,
+        )
+        for workers in (1, 2)
+    ]
+    assert list(runs[0]["variant"]) == ["baseline"] + [v["name"] for v in variants]
+    assert list(runs[0].columns[:4]) == ["variant", "constraints.fleet_size", "objective.weights.coverage_ratio", "constraints.max_interline"]
+    cols = ["score", "p90_travel_time", "coverage_ratio", "vehicles_required", "stops_removed", "pareto"]
+    pd.testing.assert_frame_equal(runs[0][cols], runs[1][cols])
+    assert runs[0]["pareto"].any()
+
+    outdir = tmp_path / "out"
+    spec = tmp_path / "sweep.json"
+    spec.write_text(json.dumps(SPEC))
+    args = build_parser().parse_args(
+        ["sweep", "--gtfs", str(feed), "--variants", str(spec), "--outdir", str(outdir), "--sample-size", "200", "--max_iters", "10", "--no-cache"]
+    )
+    args.func(args)
+    written = pd.read_csv(outdir / "sweep_results.csv")
+    assert len(written) == 6 and len(pd.read_csv(outdir / "pareto_front.csv")) == written["pareto"].sum()
+    assert "sweep" in json.loads((outdir / "stage_timings.json").read_text())
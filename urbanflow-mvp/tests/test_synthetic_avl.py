@@ -0,0 +1,58 @@
+import pandas as pd
+
+from urbanflow.data.synthetic_avl import iter_avl_chunks, synthesize_avl
+
+
+def test_synthetic_avl_streams_chunks_to_csv_and_parquet(tmp_path):
+    # stop_times out of order, with one event at a stop missing from the stops table
+    st = pd.DataFrame({
+        "trip_id": ["t2", "t2", "t1", "t1", "t1"],
+        "stop_sequence": [2, 1, 1, 2, 3],
+        "stop_id": ["S2", "S1", "S1", "SX", "S2"],
+        "arrival_time_sec": [600, 0, 100, 200, 300],
+    })
+    canonical = {"stops": pd.DataFrame({"stop_id": ["S1", "S2"], "lat": [1.0, 2.0], "lon": [3.0, 4.0]}), "stop_times": st}
+    params = {"epoch": 0, "mean_dwell": 1e-9, "percent_of_trips_delayed": 0.0, "chunk_rows": 1}
+
+    chunks = list(iter_avl_chunks(canonical, params, chunk_rows=1))
+    # one chunk per trip: chunks never split a trip
+    assert [c["trip_id"].tolist() for c in chunks] == [["t1", "t1"], ["t2", "t2"]]
+    assert chunks[1]["timestamp_iso"].tolist() == ["1970-01-01T00:00:00", "1970-01-01T00:10:00"]
+    assert chunks[0][["lat", "lon"]].values.tolist() == [[1.0, 3.0], [2.0, 4.0]]
+
+    assert synthesize_avl(canonical, tmp_path / "avl.csv", params) == 4
+    assert synthesize_avl(canonical, tmp_path / "avl.parquet", params) == 4
+    csv = pd.read_csv(tmp_path / "avl.csv")
+    assert csv.equals(pd.read_parquet(tmp_path / "avl.parquet"))
+    # vehicle IDs depend on the trip only, not on the process
+    assert csv.groupby("trip_id")["vehicle_id"].first().to_dict() == {"t1": "veh_279", "t2": "veh_173"}
+
+
+def test_interpolated_pings_follow_shapes_or_straight_segments():
+    from urbanflow.gtfs.canonicalizer import canonicalize_shapes
+
+    st = pd.DataFrame({
+        "trip_id": ["a", "a", "b", "b"],
+        "stop_sequence": [1, 2, 1, 2],
+        "stop_id": ["S1", "S2", "S1", "S2"],
+        "arrival_time_sec": [0, 200, 0, 200],
+    })
+    # trip a runs an L-shaped shape (east, then north); b has no shape and cuts the corner
+    shapes = canonicalize_shapes(pd.DataFrame({
+        "shape_id": "L", "shape_pt_lat": [0.01, 0.0, 0.0], "shape_pt_lon": [0.01, 0.0, 0.01], "shape_pt_sequence": [3, 1, 2],
+    }))
+    canonical = {
+        "stops": pd.DataFrame({"stop_id": ["S1", "S2"], "lat": [0.0, 0.01], "lon": [0.0, 0.01]}),
+        "trips": pd.DataFrame({"trip_id": ["a", "b"], "shape_id": ["L", None]}),
+        "stop_times": st,
+        "shapes": shapes,
+    }
+    params = {"epoch": 0, "mean_dwell": 1e-9, "percent_of_trips_delayed": 0.0, "ping_interval_s": 50}
+    pings = pd.concat(iter_avl_chunks(canonical, params), ignore_index=True)
+    a, b = pings[pings["trip_id"] == "a"], pings[pings["trip_id"] == "b"]
+    assert len(a) == len(b) == 4
+    # every ping of a lies on one leg of the L; b's on the diagonal
+    assert ((a["lat"] == 0.0) | (a["lon"] == 0.01)).all() and (a["lat"].iloc[-1] > 0) and (a["lon"].iloc[0] < 0.01)
+    assert (b["lat"] - b["lon"]).abs().max() < 1e-12
+    # one chunk per trip gives the same pings
+    assert pings.equals(pd.concat(iter_avl_chunks(canonical, params, chunk_rows=1), ignore_index=True))
@@ -15,3 +15,23 @@ def test_validator_minimal():
     assert "status" in report
 
 
+
+
+def test_time_codec_and_overnight_rollover():
+    import numpy as np
+    from urbanflow.gtfs.times import hms_to_seconds, seconds_to_hms
+    from urbanflow.gtfs.validator import _normalize_times
+
+    secs = hms_to_seconds(pd.Series(["08:00:00", "7:05:09", "25:10:00", None]))
+    assert secs.dtype == np.int32
+    assert list(secs) == [28800, 25509, 90600, 0]
+    assert list(seconds_to_hms(secs)) == ["08:00:00", "07:05:09", "25:10:00", "00:00:00"]
+
+    st = pd.DataFrame([
+        {"trip_id": "T1", "arrival_time": "23:50:00", "departure_time": "23:51:00", "stop_sequence": 1, "stop_id": "S1"},
+        {"trip_id": "T1", "arrival_time": "00:05:00", "departure_time": "00:06:00", "stop_sequence": 2, "stop_id": "S2"},
+        {"trip_id": "T2", "arrival_time": "bad", "departure_time": "01:00:00", "stop_sequence": 1, "stop_id": "S1"},
+    ])
+    norm = _normalize_times(st)
+    assert list(norm["arrival_time_sec"]) == [85800, 86700, 0]
+    assert list(norm["departure_time_sec"]) == [85860, 86760, 3600]
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from urbanflow.exports.vehicle_block_writer import block_trips, write_vehicle_blocks
+
+
+def test_block_trips_chains_with_layover_and_deadhead(tmp_path):
+    # (trip, service, first stop, last stop, start, end); S3 is ~1.1 km from S2, the depot ~5.6 km from S2
+    spec = [
+        ("T1", "WEEK", "S1", "S2", 0, 1000),
+        ("T2", "WEEK", "S2", "S1", 1300, 2300),  # after T1's 300 s layover: same vehicle
+        ("T3", "WEEK", "S2", "S1", 1100, 2000),  # before it: a second vehicle
+        ("T4", "WEEK", "S1", "S2", 1000, 1500),
+        ("T5", "WEEK", "S3", "S1", 2200, 3000),  # deadheads from S2 on T4's vehicle
+        ("T6", "SAT", "S1", "S2", 0, 1000),
+    ]
+    stop_times = []
+    for trip, _, a, b, t0, t1 in spec:
+        stop_times += [
+            {"trip_id": trip, "arrival_time_sec": t0, "departure_time_sec": t0, "stop_sequence": 1, "stop_id": a},
+            {"trip_id": trip, "arrival_time_sec": t1, "departure_time_sec": t1, "stop_sequence": 2, "stop_id": b},
+        ]
+    canonical = {
+        "stops": pd.DataFrame({"stop_id": ["S1", "S2", "S3"], "lat": [0.0, 0.0, 0.01], "lon": [0.0, 0.05, 0.05]}),
+        "trips": pd.DataFrame({"trip_id": [s[0] for s in spec], "route_id": "R", "service_id": [s[1] for s in spec]}),
+        "stop_times": pd.DataFrame(stop_times),
+    }
+    result = block_trips(canonical, {"depots": [{"id": "D1", "lat": 0.0, "lon": 0.0}], "min_layover_s": 300})
+    trips = result.trips.set_index("trip_id")
+    block = trips["block_id"]
+    assert block["T1"] == block["T2"] and block["T4"] == block["T5"] and block["T3"] not in (block["T1"], block["T4"])
+    assert trips.loc["T5", "deadhead_s"] == 139 and trips.loc["T3", "deadhead_s"] == 695
+    # vehicles do not carry over between service days
+    assert result.fleet_size == 3 and (result.blocks["service_id"] == "SAT").sum() == 1
+    assert result.blocks["vehicle_id"].is_unique and result.blocks["depot_id"].eq("D1").all()
+
+    blocks = write_vehicle_blocks({"canonical": canonical}, tmp_path / "blocks.csv")
+    written = pd.read_csv(tmp_path / "blocks.csv")
+    assert len(written) == len(blocks.blocks) and written["n_trips"].sum() == len(spec)
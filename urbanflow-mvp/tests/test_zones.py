@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from urbanflow.graph.build_graph import build_graph_from_canonical
+from urbanflow.optimizer.evaluator import Evaluator
+from urbanflow.optimizer.simulation import ODSample
+from urbanflow.optimizer.zones import ZoneIndex, assign_zones, coarsen_sample, zone_demand, zone_skims
+
+from test_evaluator import _canonical
+
+
+def test_zone_index_demand_skims_and_coarse_evaluation():
+    canonical = _canonical()
+    # stops ~1.1 km apart: A, B in one 2 km cell, C, D in the next
+    zones = ZoneIndex.grid(canonical["stops"], 2000)
+    assert zones.n_zones == 2 and zones.zone_of(["A", "B", "C", "D", "X"]).tolist() == [0, 0, 1, 1, -1]
+    assert zones.locate(0.0, 0.029).tolist() == [1]
+    assert assign_zones(canonical, 2000)["stops"]["zone_id"].tolist() == ["0_0", "0_0", "1_0", "1_0"]
+    assert "zone_id" not in canonical["stops"]
+    partial = canonical["stops"].assign(zone_id=["west", None, "east", "east"])
+    assert ZoneIndex.from_column(partial).series().to_dict() == {"A": "west", "B": "west", "C": "east", "D": "east"}
+
+    od = pd.DataFrame({"origin": ["A", "B", "A"], "destination": ["D", "C", "B"], "trips": [1.0, 2.0, 4.0]})
+    assert zone_demand(od, zones).values.tolist() == [["0_0", "0_0", 4.0], ["0_0", "1_0", 3.0]]
+
+    skims = zone_skims(build_graph_from_canonical(canonical), zones)
+    # B -> C is the closest pair across the cells; nothing runs back west
+    assert skims[0, 0] == 0 and skims[0, 1] == 120 and np.isinf(skims[1, 0])
+
+    sample = ODSample(np.array(["A", "B", "A"], dtype=object), np.array(["D", "C", "C"], dtype=object), np.array([100, 200, 4000]))
+    coarse = coarsen_sample(sample, zones, np.array(["A", "C"], dtype=object))
+    assert len(coarse) == 2 and coarse.weight.tolist() == [2.0, 1.0] and coarse.depart.tolist() == [1800, 5400]
+
+    demand = pd.DataFrame({"origin": ["A"], "destination": ["D"], "trips": [1.0]})
+    stop_level = Evaluator({"weights": {}}, sample_size=200, seed=3, demand=demand)
+    zone_level = Evaluator({"weights": {}}, sample_size=200, seed=3, demand=demand, zone_cell_m=2000)
+    graph = build_graph_from_canonical(canonical)
+    kpis = zone_level.compute_kpis(graph, canonical)
+    rows = zone_level._sample[1]
+    # 200 passengers become a handful of weighted A -> C rows (C is the east cell's busiest stop)
+    assert len(rows) < 200 and rows.weight.sum() == 200 and set(rows.destination) == {"C"}
+    assert kpis["served_ratio"] == 1.0 and kpis["mean_transfers"] == 0.0
+    assert kpis["mean_in_vehicle_time"] == pytest.approx(240)
+    assert stop_level.compute_kpis(graph, canonical)["mean_in_vehicle_time"] == pytest.approx(240 + 180)